@@ -1,3 +1,4 @@
+import re
 from logging.config import fileConfig
 
 from sqlalchemy import engine_from_config
@@ -21,6 +22,26 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
 
+# Monthly partitions of transactions are created by the partition
+# maintenance routine, not declared in the models.
+transactions_partition = re.compile(r"transactions_(y\d{4}m\d{2}|default)")
+
+
+def include_name(name, type_, parent_names):
+    if type_ == "table":
+        return not transactions_partition.fullmatch(name)
+    return True
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Postgres clones foreign keys to a partitioned table per partition.
+    if type_ == "foreign_key_constraint" and reflected:
+        return not transactions_partition.fullmatch(
+            object.referred_table.name
+        )
+    return True
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -43,6 +64,8 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_name=include_name,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -66,7 +89,10 @@ def run_migrations_online() -> None:
 
     with connectable.connect() as connection:
         context.configure(
-            connection=connection, target_metadata=target_metadata
+            connection=connection,
+            target_metadata=target_metadata,
+            include_name=include_name,
+            include_object=include_object,
         )
 
         with context.begin_transaction():
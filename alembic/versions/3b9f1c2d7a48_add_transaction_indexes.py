@@ -0,0 +1,62 @@
+"""add transaction indexes
+
+Revision ID: 3b9f1c2d7a48
+Revises: e1369f771946
+Create Date: 2026-10-18 10:12:41.208513
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b9f1c2d7a48'
+down_revision: Union[str, None] = 'e1369f771946'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    # If a build fails it leaves an INVALID index: drop it and rerun.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_transactions_id_user_created_at',
+            'transactions',
+            ['id_user', 'created_at', 'id'],
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_report_transaction_id_report',
+            'report_transaction',
+            ['id_report'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_report_transaction_id_transaction',
+            'report_transaction',
+            ['id_transaction'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_report_transaction_id_transaction',
+            table_name='report_transaction',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_report_transaction_id_report',
+            table_name='report_transaction',
+            postgresql_concurrently=True,
+        )
+        op.drop_index(
+            'ix_transactions_id_user_created_at',
+            table_name='transactions',
+            postgresql_concurrently=True,
+        )
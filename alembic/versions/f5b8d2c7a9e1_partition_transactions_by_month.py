@@ -0,0 +1,145 @@
+"""partition transactions by month
+
+Revision ID: f5b8d2c7a9e1
+Revises: c2a8e4f05b17
+Create Date: 2026-10-18 14:03:27.915402
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5b8d2c7a9e1'
+down_revision: Union[str, None] = 'c2a8e4f05b17'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+partitions_ahead = 3
+transaction_link_fkey = (
+    'report_transaction_id_transaction_transaction_created_at_fkey'
+)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def create_transactions_table(*args, **kw) -> None:
+    op.create_table('transactions',
+    sa.Column(
+        'id',
+        sa.Integer(),
+        server_default=sa.text("nextval('transactions_id_seq')"),
+        nullable=False,
+    ),
+    sa.Column('transaction_type', sa.Boolean(), nullable=False),
+    sa.Column('amount', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('is_deleted', sa.Boolean(), nullable=False),
+    sa.Column('id_user', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(
+        ['id_user'], ['users.id'], name='transactions_id_user_fkey',
+    ),
+    *args,
+    **kw,
+    )
+    op.execute('ALTER SEQUENCE transactions_id_seq OWNED BY transactions.id')
+
+
+def create_transactions_index() -> None:
+    op.create_index(
+        'ix_transactions_id_user_created_at',
+        'transactions',
+        ['id_user', 'created_at', 'id'],
+        postgresql_where=sa.text('NOT is_deleted'),
+    )
+
+
+def rename_transactions_table(new_name: str) -> None:
+    op.rename_table('transactions', new_name)
+    op.execute(f'ALTER INDEX transactions_pkey RENAME TO {new_name}_pkey')
+    op.execute(
+        'ALTER INDEX ix_transactions_id_user_created_at '
+        f'RENAME TO ix_{new_name}_id_user_created_at'
+    )
+
+
+def copy_transactions(source: str) -> None:
+    op.execute(
+        'INSERT INTO transactions '
+        '(id, transaction_type, amount, created_at, is_deleted, id_user) '
+        'SELECT id, transaction_type, amount, created_at, is_deleted, id_user '
+        f'FROM {source}'
+    )
+
+
+def upgrade() -> None:
+    # The table is rewritten under an ACCESS EXCLUSIVE lock:
+    # run in a maintenance window. Months from the oldest transaction
+    # up to partitions_ahead months from now get their own partition,
+    # anything else lands in transactions_default.
+    op.drop_constraint(
+        'report_transaction_id_transaction_fkey',
+        'report_transaction',
+        type_='foreignkey',
+    )
+    op.add_column(
+        'report_transaction',
+        sa.Column('transaction_created_at', sa.DateTime(), nullable=True),
+    )
+    op.execute(
+        'UPDATE report_transaction SET transaction_created_at = t.created_at '
+        'FROM transactions t WHERE t.id = report_transaction.id_transaction'
+    )
+    rename_transactions_table('transactions_unpartitioned')
+    create_transactions_table(
+        sa.PrimaryKeyConstraint('id', 'created_at'),
+        postgresql_partition_by='RANGE (created_at)',
+    )
+    oldest = op.get_bind().execute(
+        sa.text('SELECT min(created_at) FROM transactions_unpartitioned'),
+    ).scalar() or date.today()
+    month = add_months(oldest, 0)
+    last_month = add_months(date.today(), partitions_ahead)
+    while month <= last_month:
+        op.execute(
+            f'CREATE TABLE transactions_y{month.year}m{month.month:02} '
+            f"PARTITION OF transactions FOR VALUES FROM ('{month}') "
+            f"TO ('{add_months(month, 1)}')"
+        )
+        month = add_months(month, 1)
+    op.execute('CREATE TABLE transactions_default PARTITION OF transactions DEFAULT')
+    copy_transactions('transactions_unpartitioned')
+    op.drop_table('transactions_unpartitioned')
+    create_transactions_index()
+    op.create_foreign_key(
+        transaction_link_fkey,
+        'report_transaction',
+        'transactions',
+        ['id_transaction', 'transaction_created_at'],
+        ['id', 'created_at'],
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        transaction_link_fkey, 'report_transaction', type_='foreignkey',
+    )
+    rename_transactions_table('transactions_partitioned')
+    create_transactions_table(sa.PrimaryKeyConstraint('id'))
+    copy_transactions('transactions_partitioned')
+    op.drop_table('transactions_partitioned')
+    create_transactions_index()
+    op.drop_column('report_transaction', 'transaction_created_at')
+    op.create_foreign_key(
+        'report_transaction_id_transaction_fkey',
+        'report_transaction',
+        'transactions',
+        ['id_transaction'],
+        ['id'],
+    )
@@ -1,17 +1,39 @@
 import asyncio
+import gzip
 import logging
+import re
+from collections.abc import AsyncIterator
+from pathlib import Path
+from typing import Annotated
 
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Header, HTTPException, Response, status
+from fastapi.responses import StreamingResponse
 from opentracing import global_tracer
 
+from app.core.batching import BatchingRepository
+from app.core.columnar import ColumnarRepository
+from app.core.config import PostgresBackend, ReportCacheFormat, get_settings
 from app.core.errors import ServerError, ValidationError
-from app.core.models import (
+from app.core.interfaces import Cache, Repository
+from app.core.models import (  # noqa: WPS235 router uses all models
+    ReportBody,
     Transaction,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionBatchRequest,
+    TransactionBatchResult,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
     TransactionReport,
     TransactionReportRequest,
     TransactionRequest,
+    TransactionSummary,
+    TransactionSummaryRequest,
 )
+from app.core.near_cache import NearCache
 from app.core.transactions import TransactionService
+from app.external.ledger.repository import LedgerRepository
+from app.external.postgres.async_storage import AsyncDBStorage
 from app.external.postgres.storage import DBStorage
 from app.external.redis import TransactionReportCache
 from app.metrics.tracing import Tag
@@ -20,6 +42,75 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+ndjson_media_type = 'application/x-ndjson'
+json_media_type = 'application/json'
+ndjson_chunk_size = 100
+server_error_message = 'Ошибка сервера'
+quality_pattern = re.compile(r';\s*q\s*=\s*([^;]*)', re.IGNORECASE)
+
+
+def get_storage() -> Repository:
+    """
+    Создает хранилище данных выбранное в конфигурации postgres.
+
+    Если в конфигурации включен ledger, вместо postgres используется
+    встроенное хранилище с журналом на диске.
+
+    Если в конфигурации включен batching, одиночные транзакции
+    объединяются в пакеты перед записью в хранилище.
+
+    Если в конфигурации включен columnar, сводки и агрегаты
+    считаются по столбцам транзакций в памяти процесса.
+
+    :return: Объект хранилища данных.
+    :rtype: Repository
+    """
+    settings = get_settings()
+    if settings.ledger.enabled:
+        storage: Repository = LedgerRepository(
+            Path(settings.ledger.path),
+            commit_window=settings.ledger.commit_window,
+            snapshot_interval=settings.ledger.snapshot_interval,
+        )
+    elif settings.postgres.backend == PostgresBackend.asyncpg:
+        storage = AsyncDBStorage()
+    else:
+        storage = DBStorage()
+    if settings.batching.enabled:
+        storage = BatchingRepository(
+            storage,
+            window=settings.batching.window,
+            max_batch_size=settings.batching.max_batch_size,
+        )
+    if settings.columnar.enabled:
+        return ColumnarRepository(
+            storage,
+            max_users=settings.columnar.max_users,
+            ttl=settings.columnar.ttl,
+        )
+    return storage
+
+
+def get_cache() -> Cache:
+    """
+    Создает кэш сервиса.
+
+    Если в конфигурации включен near_cache, перед redis
+    добавляется кэш в памяти процесса.
+
+    :return: Объект кэша.
+    :rtype: Cache
+    """
+    settings = get_settings()
+    cache: Cache = TransactionReportCache()
+    if settings.near_cache.enabled:
+        return NearCache(
+            cache,
+            max_entries=settings.near_cache.max_entries,
+            ttl=settings.near_cache.ttl,
+        )
+    return cache
+
 
 def get_service() -> TransactionService:
     """
@@ -28,9 +119,11 @@ def get_service() -> TransactionService:
     :return: Объект сервиса.
     :rtype: TransactionService
     """
-    storage = DBStorage()
-    cache = TransactionReportCache()
-    return TransactionService(repository=storage, cache=cache)
+    return TransactionService(
+        repository=get_storage(),
+        cache=get_cache(),
+        segment_days=get_settings().redis.segment_days,
+    )
 
 
 service = get_service()
@@ -78,28 +171,77 @@ async def create_transaction(
             ) from err
 
 
-@router.post('/create_report', status_code=status.HTTP_200_OK)
+@router.post('/create_transactions', status_code=status.HTTP_200_OK)
+async def create_transactions(
+    batch_request: TransactionBatchRequest,
+) -> TransactionBatchResult:
+    """
+    Создает пакет транзакций.
+
+    Результат каждой транзакции возвращается отдельно
+    в порядке запроса, отклоненные транзакции не прерывают пакет.
+
+    :param batch_request: Данные для создания пакета транзакций.
+    :type batch_request: TransactionBatchRequest
+    :return: Результаты транзакций пакета.
+    :rtype: TransactionBatchResult
+    :raises HTTPException: При ошибке в ходе выполнения.
+    """
+    with global_tracer().start_active_span('create_transactions') as scope:
+        scope.span.set_tag(Tag.batch_size, len(batch_request.transactions))
+        task = asyncio.create_task(
+            service.create_transactions(batch_request.transactions),
+        )
+        try:
+            return TransactionBatchResult(results=await task)
+        except ValidationError as v_err:
+            logger.info('пакет транзакций запрещен')
+            scope.span.set_tag(Tag.warning, 'batch validation failed')
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+            ) from v_err
+        except ServerError as err:
+            logger.error('Неизвестная ошибка сервера')
+            scope.span.set_tag(
+                Tag.error, 'unexpected server error on create_transactions',
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            ) from err
+
+
+@router.post(
+    '/create_report',
+    status_code=status.HTTP_200_OK,
+    response_model=TransactionReport,
+)
 async def create_report(
     report_request: TransactionReportRequest,
-) -> TransactionReport:
+    accept_encoding: Annotated[str, Header()] = '',
+) -> TransactionReport | Response:
     """
     Создает отчет.
 
+    Если кэш отчетов хранит готовые тела ответов, отчет отдается
+    без повторной сериализации, сжатый gzip - если клиент его принимает.
+
     :param report_request: Данные для создания отчета.
     :type report_request: TransactionReportRequest
+    :param accept_encoding: Заголовок Accept-Encoding запроса.
+    :type accept_encoding: str
     :return: Отчет о транзакциях.
-    :rtype: TransactionReport
+    :rtype: TransactionReport | Response
     :raises HTTPException: При ошибке в ходе выполнения операции.
     """
     with global_tracer().start_active_span('create_report') as scope:
         scope.span.set_tag(Tag.username, report_request.username)
         task = asyncio.create_task(
-            service.create_transaction_report(report_request),
+            get_report(report_request, accept_encoding),
         )
         try:
             return await task
         except ServerError as r_err:
-            logger.error('Ошибка сервера')
+            logger.error(server_error_message)
             scope.span.set_tag(
                 Tag.error, 'unexpected server error on create_report',
             )
@@ -112,3 +254,228 @@ async def create_report(
             raise HTTPException(
                 status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             ) from r_err
+
+
+@router.post('/create_report/stream', status_code=status.HTTP_200_OK)
+async def stream_report(
+    report_request: TransactionReportRequest,
+) -> StreamingResponse:
+    """
+    Потоково возвращает транзакции отчета в формате NDJSON.
+
+    Каждая строка ответа - транзакция за период отчета.
+    Отчет не сохраняется и не кэшируется.
+
+    :param report_request: Данные для создания отчета.
+    :type report_request: TransactionReportRequest
+    :return: Поток транзакций отчета.
+    :rtype: StreamingResponse
+    :raises HTTPException: При ошибке в ходе выполнения операции.
+    """
+    with global_tracer().start_active_span('stream_report') as scope:
+        scope.span.set_tag(Tag.username, report_request.username)
+        try:
+            transactions = await service.stream_transaction_report(
+                report_request,
+            )
+        except ServerError as r_err:
+            logger.error(server_error_message)
+            scope.span.set_tag(
+                Tag.error, 'unexpected server error on stream_report',
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            ) from r_err
+    return StreamingResponse(
+        to_ndjson(transactions), media_type=ndjson_media_type,
+    )
+
+
+@router.post('/history', status_code=status.HTTP_200_OK)
+async def get_history(
+    history_request: TransactionHistoryRequest,
+) -> TransactionHistoryPage:
+    """
+    Возвращает страницу истории транзакций от новых к старым.
+
+    Для следующей страницы передается next_cursor текущей страницы.
+
+    :param history_request: Данные запрашиваемой страницы.
+    :type history_request: TransactionHistoryRequest
+    :return: Страница истории транзакций.
+    :rtype: TransactionHistoryPage
+    :raises HTTPException: При ошибке в ходе выполнения операции.
+    """
+    with global_tracer().start_active_span('get_history') as scope:
+        scope.span.set_tag(Tag.username, history_request.username)
+        try:
+            return await service.get_transaction_history(history_request)
+        except ServerError as h_err:
+            logger.error(server_error_message)
+            scope.span.set_tag(
+                Tag.error, 'unexpected server error on get_history',
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            ) from h_err
+
+
+@router.post('/create_report/aggregate', status_code=status.HTTP_200_OK)
+async def create_aggregate_report(
+    aggregate_request: TransactionAggregateRequest,
+) -> TransactionAggregateReport:
+    """
+    Возвращает агрегаты транзакций пользователя за период.
+
+    Количество, сумма, минимальная и максимальная суммы транзакций
+    считаются за весь период и по интервалам bucket.
+
+    :param aggregate_request: Данные запрашиваемого отчета.
+    :type aggregate_request: TransactionAggregateRequest
+    :return: Агрегированный отчет о транзакциях.
+    :rtype: TransactionAggregateReport
+    :raises HTTPException: При ошибке в ходе выполнения операции.
+    """
+    with global_tracer().start_active_span('create_aggregate_report') as scope:
+        scope.span.set_tag(Tag.username, aggregate_request.username)
+        try:
+            return await service.create_aggregate_report(aggregate_request)
+        except ServerError as r_err:
+            logger.error(server_error_message)
+            scope.span.set_tag(
+                Tag.error, 'unexpected server error on create_aggregate_report',
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            ) from r_err
+
+
+@router.post('/summary', status_code=status.HTTP_200_OK)
+async def get_summary(
+    summary_request: TransactionSummaryRequest,
+) -> TransactionSummary:
+    """
+    Возвращает итоги пополнений и списаний пользователя за период.
+
+    Период задается днями, последний день включается в сводку.
+
+    :param summary_request: Данные запрашиваемой сводки.
+    :type summary_request: TransactionSummaryRequest
+    :return: Сводка по транзакциям.
+    :rtype: TransactionSummary
+    :raises HTTPException: При ошибке в ходе выполнения операции.
+    """
+    with global_tracer().start_active_span('get_summary') as scope:
+        scope.span.set_tag(Tag.username, summary_request.username)
+        try:
+            return await service.get_transaction_summary(summary_request)
+        except ServerError as h_err:
+            logger.error(server_error_message)
+            scope.span.set_tag(
+                Tag.error, 'unexpected server error on get_summary',
+            )
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            ) from h_err
+
+
+async def get_report(
+    report_request: TransactionReportRequest, accept_encoding: str,
+) -> TransactionReport | Response:
+    """
+    Создает отчет в формате кэша отчетов из конфигурации.
+
+    :param report_request: Данные для создания отчета.
+    :type report_request: TransactionReportRequest
+    :param accept_encoding: Заголовок Accept-Encoding запроса.
+    :type accept_encoding: str
+    :return: Отчет о транзакциях или ответ с готовым телом отчета.
+    :rtype: TransactionReport | Response
+    """
+    if get_settings().redis.report_format == ReportCacheFormat.hash:
+        return await service.create_transaction_report(report_request)
+    body = await service.get_transaction_report_body(report_request)
+    return to_response(body, accept_encoding)
+
+
+def to_response(body: ReportBody, accept_encoding: str) -> Response:
+    """
+    Создает ответ из готового тела отчета.
+
+    Сжатое тело отдается как есть, если клиент принимает его сжатие,
+    иначе распаковывается. Сжатие с q=0 клиент не принимает.
+
+    :param body: Готовое тело ответа с отчетом.
+    :type body: ReportBody
+    :param accept_encoding: Заголовок Accept-Encoding запроса.
+    :type accept_encoding: str
+    :return: Ответ с отчетом в формате JSON.
+    :rtype: Response
+    """
+    if body.encoding is None:
+        return Response(body.payload, media_type=json_media_type)
+    weights = get_encoding_weights(accept_encoding)
+    headers = {'Vary': 'Accept-Encoding'}
+    if weights.get(body.encoding, weights.get('*', 0)) > 0:
+        headers['Content-Encoding'] = body.encoding
+        return Response(
+            body.payload, media_type=json_media_type, headers=headers,
+        )
+    return Response(
+        gzip.decompress(body.payload),
+        media_type=json_media_type,
+        headers=headers,
+    )
+
+
+def get_encoding_weights(accept_encoding: str) -> dict[str, float]:
+    """
+    Разбирает веса сжатий из заголовка Accept-Encoding.
+
+    :param accept_encoding: Заголовок Accept-Encoding запроса.
+    :type accept_encoding: str
+    :return: Веса сжатий по их названиям в нижнем регистре.
+    :rtype: dict[str, float]
+    """
+    return dict(map(get_encoding_weight, accept_encoding.split(',')))
+
+
+def get_encoding_weight(coding: str) -> tuple[str, float]:
+    """
+    Разбирает сжатие из заголовка Accept-Encoding.
+
+    Сжатие без параметра q имеет вес 1, с некорректным q - вес 0.
+
+    :param coding: Сжатие с параметрами, например gzip;q=0.5.
+    :type coding: str
+    :return: Название сжатия в нижнем регистре и его вес.
+    :rtype: tuple[str, float]
+    """
+    name = coding.split(';')[0].strip().lower()
+    quality = quality_pattern.search(coding)
+    if quality is None:
+        return name, 1
+    try:
+        return name, float(quality.group(1))
+    except ValueError:
+        return name, 0
+
+
+async def to_ndjson(
+    transactions: AsyncIterator[Transaction],
+) -> AsyncIterator[str]:
+    """
+    Сериализует транзакции в NDJSON частями по ndjson_chunk_size строк.
+
+    :param transactions: Транзакции отчета.
+    :type transactions: AsyncIterator[Transaction]
+    :yield: Часть ответа NDJSON.
+    """
+    lines = []
+    async for transaction in transactions:
+        lines.append(f'{transaction.model_dump_json()}\n')
+        if len(lines) == ndjson_chunk_size:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
@@ -0,0 +1,19 @@
+import logging
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+logger = logging.getLogger(__name__)
+
+metrics_router = APIRouter(tags=['metrics'])
+
+
+@metrics_router.get('/metrics')
+async def metrics() -> Response:
+    """
+    Метрики сервиса в формате Prometheus.
+
+    :return: Метрики сервиса.
+    :rtype: Response
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,274 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncIterator
+from typing import NamedTuple
+
+from fastapi import status
+
+from app.core.errors import NotFoundError, ValidationError
+from app.core.interfaces import Repository, close_repository
+from app.core.models import (  # noqa: WPS235 repository uses all models
+    Transaction,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
+    TransactionReport,
+    TransactionReportRequest,
+    TransactionResult,
+    TransactionSummary,
+    TransactionSummaryRequest,
+    User,
+)
+from app.metrics.prometheus import batch_queue_delay, batch_size
+
+logger = logging.getLogger(__name__)
+
+
+class PendingTransaction(NamedTuple):
+    """Транзакция, ожидающая проведения в составе пакета."""
+
+    transaction: Transaction
+    future: asyncio.Future[TransactionResult]
+    enqueued_at: float
+
+
+def get_posted_transaction(outcome: TransactionResult) -> Transaction:
+    """
+    Преобразует результат транзакции пакета в результат post_transaction.
+
+    :param outcome: Результат транзакции пакета.
+    :type outcome: TransactionResult
+    :return: Проведенная транзакция.
+    :rtype: Transaction
+    :raises NotFoundError: Если пользователь не найден.
+    :raises ValidationError: Если транзакция запрещена.
+    """
+    if outcome.transaction is not None:
+        return outcome.transaction
+    if outcome.status_code == status.HTTP_404_NOT_FOUND:
+        raise NotFoundError(detail=str(outcome.detail))
+    raise ValidationError(
+        status_code=outcome.status_code, detail=str(outcome.detail),
+    )
+
+
+class BatchingRepository:  # noqa: WPS214 repository protocol methods
+    """
+    Хранилище данных, объединяющее одиночные транзакции в пакеты.
+
+    Транзакции, поступившие в post_transaction в течение window секунд,
+    проводятся одним вызовом post_transactions хранилища. Пакет
+    проводится сразу при достижении max_batch_size транзакций.
+    Каждый вызывающий получает результат своей транзакции.
+    Остальные методы передаются хранилищу без изменений.
+    """
+
+    def __init__(
+        self, repository: Repository, window: float, max_batch_size: int,
+    ) -> None:
+        """
+        Метод инициализации BatchingRepository.
+
+        :param repository: Хранилище данных.
+        :type repository: Repository
+        :param window: Время ожидания транзакций пакета в секундах.
+        :type window: float
+        :param max_batch_size: Максимальный размер пакета.
+        :type max_batch_size: int
+        """
+        self.repository = repository
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending: list[PendingTransaction] = []
+        self._timer: asyncio.TimerHandle | None = None
+        self._flushes: set[asyncio.Task[None]] = set()
+
+    async def post_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Проводит транзакцию в составе пакета.
+
+        :param transaction: Данные о проводимой транзакции.
+        :type transaction: Transaction
+        :return: Проведенная транзакция.
+        :rtype: Transaction
+        """
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future[TransactionResult] = loop.create_future()
+        self._pending.append(
+            PendingTransaction(transaction, future, time.perf_counter()),
+        )
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return get_posted_transaction(await future)
+
+    async def post_transactions(
+        self, transactions: list[Transaction],
+    ) -> list[TransactionResult]:
+        """
+        Проводит пакет транзакций в хранилище.
+
+        :param transactions: Данные о проводимых транзакциях.
+        :type transactions: list[Transaction]
+        :return: Результаты транзакций в порядке пакета.
+        :rtype: list[TransactionResult]
+        """
+        return await self.repository.post_transactions(transactions)
+
+    async def create_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Создает транзакцию в хранилище.
+
+        :param transaction: Данные о создаваемой транзакции.
+        :type transaction: Transaction
+        :return: Созданная транзакция.
+        :rtype: Transaction
+        """
+        return await self.repository.create_transaction(transaction)
+
+    async def create_transaction_report(
+        self, request: TransactionReportRequest,
+    ) -> TransactionReport:
+        """
+        Создает отчет в хранилище.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionReportRequest
+        :return: Отчет о транзакциях.
+        :rtype: TransactionReport
+        """
+        return await self.repository.create_transaction_report(request)
+
+    async def save_transaction_report(
+        self, report: TransactionReport,
+    ) -> TransactionReport:
+        """
+        Сохраняет собранный отчет в хранилище.
+
+        :param report: Собранный отчет о транзакциях.
+        :type report: TransactionReport
+        :return: Отчет с ID сохраненного отчета.
+        :rtype: TransactionReport
+        """
+        return await self.repository.save_transaction_report(report)
+
+    def stream_transactions(
+        self, request: TransactionReportRequest,
+    ) -> AsyncIterator[Transaction]:
+        """
+        Потоково читает транзакции отчета из хранилища.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionReportRequest
+        :return: Транзакции за период.
+        :rtype: AsyncIterator[Transaction]
+        """
+        return self.repository.stream_transactions(request)
+
+    async def get_transaction_history(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций из хранилища.
+
+        :param request: Данные о запрашиваемой странице.
+        :type request: TransactionHistoryRequest
+        :return: Страница истории транзакций.
+        :rtype: TransactionHistoryPage
+        """
+        return await self.repository.get_transaction_history(request)
+
+    async def get_transaction_summary(
+        self, request: TransactionSummaryRequest,
+    ) -> TransactionSummary:
+        """
+        Получает сводку по транзакциям за период из хранилища.
+
+        :param request: Данные о запрашиваемой сводке.
+        :type request: TransactionSummaryRequest
+        :return: Сводка по транзакциям.
+        :rtype: TransactionSummary
+        """
+        return await self.repository.get_transaction_summary(request)
+
+    async def create_aggregate_report(
+        self, request: TransactionAggregateRequest,
+    ) -> TransactionAggregateReport:
+        """
+        Создает агрегированный отчет в хранилище.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionAggregateRequest
+        :return: Агрегированный отчет о транзакциях.
+        :rtype: TransactionAggregateReport
+        """
+        return await self.repository.create_aggregate_report(request)
+
+    async def get_user(self, username: str) -> User | None:
+        """
+        Получает пользователя из хранилища.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :return: Пользователь.
+        :rtype: User | None
+        """
+        return await self.repository.get_user(username)
+
+    async def update_user(self, user: User) -> User | None:
+        """
+        Обновляет пользователя в хранилище.
+
+        :param user: Пользователь.
+        :type user: User
+        :return: Пользователь.
+        :rtype: User | None
+        """
+        return await self.repository.update_user(user)
+
+    async def close(self) -> None:
+        """Проводит ожидающие транзакции и закрывает хранилище."""
+        self._flush()
+        await asyncio.gather(*self._flushes)
+        await close_repository(self.repository)
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch = self._pending
+        self._pending = []
+        if batch:
+            task = asyncio.create_task(self._post_batch(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _post_batch(self, batch: list[PendingTransaction]) -> None:
+        self._observe(batch)
+        try:
+            outcomes = await self.repository.post_transactions(
+                [queued.transaction for queued in batch],
+            )
+        except Exception as err:
+            logger.error("can't post transactions batch")
+            self._reject(batch, err)
+            return
+        for pending, outcome in zip(batch, outcomes, strict=True):
+            if not pending.future.done():
+                pending.future.set_result(outcome)
+
+    def _observe(self, batch: list[PendingTransaction]) -> None:
+        flushed_at = time.perf_counter()
+        batch_size.observe(len(batch))
+        for pending in batch:
+            batch_queue_delay.observe(flushed_at - pending.enqueued_at)
+
+    def _reject(
+        self, batch: list[PendingTransaction], err: Exception,
+    ) -> None:
+        for pending in batch:
+            if not pending.future.done():
+                pending.future.set_exception(err)
@@ -0,0 +1,298 @@
+"""
+Хранилище, считающее сводки и агрегаты по столбцам транзакций.
+
+Модели Transaction используются только при загрузке столбцов
+и дописывании проведенных транзакций, сводки и агрегаты считаются
+по массивам numpy, см. app.core.columns.
+"""
+import logging
+from collections import Counter
+from collections.abc import AsyncIterator, Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from functools import partial
+
+from app.core.columns import (
+    TransactionColumns,
+    aggregate_columns,
+    summarize_columns,
+)
+from app.core.interfaces import Repository, close_repository
+from app.core.models import (  # noqa: WPS235 repository uses all models
+    Transaction,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
+    TransactionReport,
+    TransactionReportRequest,
+    TransactionResult,
+    TransactionSummary,
+    TransactionSummaryRequest,
+    User,
+)
+from app.core.near_cache import LRUCache
+from app.core.single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+load_chunk_size = 10000
+
+
+class ColumnarRepository:  # noqa: WPS214 repository protocol methods
+    """
+    Хранилище данных, считающее сводки и агрегаты по столбцам в памяти.
+
+    При первом запросе сводки или агрегатов пользователя все его
+    транзакции читаются из хранилища потоком и складываются в столбцы.
+    Транзакции, проведенные через этот процесс, дописываются в
+    загруженные столбцы сразу. Столбцы живут ttl секунд: столько
+    сводки могут отставать от транзакций, проведенных другими
+    процессами. В памяти хранятся столбцы не более max_users
+    пользователей, давно не читанные вытесняются. Остальные методы
+    передаются хранилищу без изменений.
+    """
+
+    def __init__(
+        self, repository: Repository, max_users: int, ttl: float,
+    ) -> None:
+        """
+        Метод инициализации ColumnarRepository.
+
+        :param repository: Хранилище данных.
+        :type repository: Repository
+        :param max_users: Максимальное число пользователей в памяти.
+        :type max_users: int
+        :param ttl: Время жизни столбцов пользователя в секундах.
+        :type ttl: float
+        """
+        self.repository = repository
+        self.columns = LRUCache(max_users, ttl)
+        self.flights = SingleFlight()
+        self._loading: set[str] = set()
+        self._stale: set[str] = set()
+        self._posting: Counter[str] = Counter()
+
+    async def get_transaction_summary(
+        self, request: TransactionSummaryRequest,
+    ) -> TransactionSummary:
+        """
+        Считает сводку по столбцам транзакций пользователя.
+
+        :param request: Запрос сводки.
+        :type request: TransactionSummaryRequest
+        :return: Итоги пополнений и списаний за период.
+        :rtype: TransactionSummary
+        """
+        columns = await self._get_columns(request.username)
+        return summarize_columns(columns, request)
+
+    async def create_aggregate_report(
+        self, request: TransactionAggregateRequest,
+    ) -> TransactionAggregateReport:
+        """
+        Считает агрегированный отчет по столбцам транзакций пользователя.
+
+        Период включает транзакции со временем от start_date
+        до end_date включительно, как в postgres.
+
+        :param request: Запрос агрегированного отчета.
+        :type request: TransactionAggregateRequest
+        :return: Агрегаты транзакций за период и по интервалам.
+        :rtype: TransactionAggregateReport
+        """
+        columns = await self._get_columns(request.username)
+        return aggregate_columns(columns, request)
+
+    async def post_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Проводит транзакцию и дописывает ее в столбцы пользователя.
+
+        :param transaction: Данные о проводимой транзакции.
+        :type transaction: Transaction
+        :return: Проведенная транзакция.
+        :rtype: Transaction
+        """
+        with self._post({transaction.username}):
+            posted = await self.repository.post_transaction(transaction)
+            self._append([posted])
+        return posted
+
+    async def post_transactions(
+        self, transactions: list[Transaction],
+    ) -> list[TransactionResult]:
+        """
+        Проводит пакет транзакций и дописывает их в столбцы.
+
+        :param transactions: Данные о проводимых транзакциях.
+        :type transactions: list[Transaction]
+        :return: Результаты транзакций в порядке пакета.
+        :rtype: list[TransactionResult]
+        """
+        with self._post({transaction.username for transaction in transactions}):
+            outcomes = await self.repository.post_transactions(transactions)
+            self._append([
+                outcome.transaction
+                for outcome in outcomes
+                if outcome.transaction is not None
+            ])
+        return outcomes
+
+    async def create_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Создает транзакцию и дописывает ее в столбцы пользователя.
+
+        :param transaction: Данные о создаваемой транзакции.
+        :type transaction: Transaction
+        :return: Созданная транзакция.
+        :rtype: Transaction
+        """
+        with self._post({transaction.username}):
+            created = await self.repository.create_transaction(transaction)
+            self._append([created])
+        return created
+
+    async def create_transaction_report(
+        self, request: TransactionReportRequest,
+    ) -> TransactionReport:
+        """
+        Создает отчет в хранилище.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionReportRequest
+        :return: Отчет о транзакциях.
+        :rtype: TransactionReport
+        """
+        return await self.repository.create_transaction_report(request)
+
+    async def save_transaction_report(
+        self, report: TransactionReport,
+    ) -> TransactionReport:
+        """
+        Сохраняет собранный отчет в хранилище.
+
+        :param report: Собранный отчет о транзакциях.
+        :type report: TransactionReport
+        :return: Отчет с ID сохраненного отчета.
+        :rtype: TransactionReport
+        """
+        return await self.repository.save_transaction_report(report)
+
+    def stream_transactions(
+        self, request: TransactionReportRequest,
+    ) -> AsyncIterator[Transaction]:
+        """
+        Потоково читает транзакции отчета из хранилища.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionReportRequest
+        :return: Транзакции за период.
+        :rtype: AsyncIterator[Transaction]
+        """
+        return self.repository.stream_transactions(request)
+
+    async def get_transaction_history(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций из хранилища.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :return: Страница истории транзакций.
+        :rtype: TransactionHistoryPage
+        """
+        return await self.repository.get_transaction_history(request)
+
+    async def get_user(self, username: str) -> User | None:
+        """
+        Получает пользователя из хранилища.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :return: Пользователь.
+        :rtype: User | None
+        """
+        return await self.repository.get_user(username)
+
+    async def update_user(self, user: User) -> User | None:
+        """
+        Обновляет пользователя в хранилище.
+
+        :param user: Пользователь.
+        :type user: User
+        :return: Пользователь.
+        :rtype: User | None
+        """
+        return await self.repository.update_user(user)
+
+    async def close(self) -> None:
+        """Закрывает хранилище."""
+        await close_repository(self.repository)
+
+    async def _get_columns(self, username: str) -> TransactionColumns:
+        try:
+            columns: TransactionColumns = self.columns.get(username)
+        except KeyError:
+            columns = await self.flights.run(
+                username, partial(self._load, username),
+            )
+        return columns
+
+    async def _load(self, username: str) -> TransactionColumns:
+        self._loading.add(username)
+        if self._posting[username]:
+            self._stale.add(username)
+        try:  # noqa: WPS501 the load mark is removed on errors too
+            columns = await self._read_columns(username)
+        finally:
+            self._loading.discard(username)
+        # Транзакция, проводимая во время чтения, могла в него не попасть
+        # или попасть и затем быть дописанной еще раз: такие столбцы
+        # отвечают на один запрос.
+        if username not in self._stale:
+            self.columns.set(username, columns)
+        self._stale.discard(username)
+        logger.info(f'loaded {columns.size} transactions of {username}')
+        return columns
+
+    async def _read_columns(self, username: str) -> TransactionColumns:
+        columns = TransactionColumns()
+        chunk: list[Transaction] = []
+        transactions = self.repository.stream_transactions(
+            TransactionReportRequest(
+                username=username,
+                start_date=datetime.min,
+                end_date=datetime.max,
+            ),
+        )
+        async for transaction in transactions:
+            chunk.append(transaction)
+            if len(chunk) >= load_chunk_size:
+                columns.extend(chunk)
+                chunk.clear()
+        columns.extend(chunk)
+        return columns
+
+    @contextmanager
+    def _post(self, usernames: set[str]) -> Iterator[None]:
+        # Загрузка, пересекшаяся с проведением, не сохраняет столбцы.
+        self._stale.update(usernames & self._loading)
+        self._posting.update(usernames)
+        try:  # noqa: WPS501 the posting mark is removed on errors too
+            yield
+        finally:
+            self._posting -= Counter(usernames)
+
+    def _append(self, transactions: list[Transaction]) -> None:
+        usernames = {transaction.username for transaction in transactions}
+        for username in usernames:
+            try:
+                columns: TransactionColumns = self.columns.get(username)
+            except KeyError:
+                continue
+            columns.extend([
+                transaction
+                for transaction in transactions
+                if transaction.username == username
+            ])
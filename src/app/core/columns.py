@@ -0,0 +1,292 @@
+"""
+Транзакции пользователя в столбцах numpy.
+
+Транзакции хранятся в параллельных массивах: время - datetime64[us]
+(int64 микросекунд от эпохи), сумма - int64, тип - uint8. Строка
+занимает 17 байт вместо объекта Transaction. Период выбирается
+двоичным поиском по времени, итоги и агрегаты по интервалам
+считаются векторно, без цикла по транзакциям.
+"""
+from collections.abc import Iterator
+from datetime import datetime, time
+from functools import partial
+from itertools import repeat
+from typing import NamedTuple
+
+import numpy as np
+from numpy import typing as npt
+
+from app.core.models import (
+    AggregateBucket,
+    Transaction,
+    TransactionAggregate,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionSummary,
+    TransactionSummaryRequest,
+    TransactionType,
+)
+
+timestamp_dtype = np.dtype('datetime64[us]')
+bucket_dtypes = {
+    AggregateBucket.hour: np.dtype('datetime64[h]'),
+    AggregateBucket.day: np.dtype('datetime64[D]'),
+    AggregateBucket.month: np.dtype('datetime64[M]'),
+}
+initial_capacity = 1024
+amount_limits = np.iinfo(np.int64)
+aggregate_fields = ('count', 'amount', 'min_amount', 'max_amount')
+
+
+class ColumnRows(NamedTuple):
+    """
+    Строки столбцов за период, без копирования.
+
+    Attributes:
+        timestamps: npt.NDArray[np.datetime64] - время транзакций.
+        amounts: npt.NDArray[np.int64] - суммы транзакций.
+        types: npt.NDArray[np.uint8] - типы транзакций.
+    """
+
+    timestamps: npt.NDArray[np.datetime64]
+    amounts: npt.NDArray[np.int64]
+    types: npt.NDArray[np.uint8]
+
+
+class TransactionColumns:
+    """
+    Транзакции пользователя в массивах numpy, упорядоченные по времени.
+
+    Массивы растут удвоением емкости. Транзакции, пришедшие не по
+    порядку времени, требуют пересортировки всех строк.
+    """
+
+    def __init__(self) -> None:
+        """Метод инициализации TransactionColumns."""
+        self.size = 0
+        self._timestamps = np.empty(initial_capacity, dtype=timestamp_dtype)
+        self._amounts = np.empty(initial_capacity, dtype=np.int64)
+        self._types = np.empty(initial_capacity, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        """
+        Возвращает число транзакций.
+
+        :return: Число транзакций.
+        :rtype: int
+        """
+        return self.size
+
+    def extend(self, transactions: list[Transaction]) -> None:
+        """
+        Добавляет транзакции, сохраняя порядок по времени.
+
+        :param transactions: Транзакции пользователя.
+        :type transactions: list[Transaction]
+        """
+        start = self.size
+        self._reserve(start + len(transactions))
+        self.size += len(transactions)
+        np.copyto(self._timestamps[start:self.size], np.array(
+            [transaction.timestamp for transaction in transactions],
+            dtype=timestamp_dtype,
+        ))
+        np.copyto(self._amounts[start:self.size], np.array(
+            [transaction.amount for transaction in transactions],
+            dtype=np.int64,
+        ))
+        np.copyto(self._types[start:self.size], np.array(
+            [
+                transaction.transaction_type.to_int()
+                for transaction in transactions
+            ],
+            dtype=np.uint8,
+        ))
+        tail = self._timestamps[max(start - 1, 0):self.size]
+        if np.any(np.diff(tail) < 0):
+            self._sort()
+
+    def select(self, first: datetime, last: datetime) -> ColumnRows:
+        """
+        Выбирает строки со временем от first до last включительно.
+
+        Конец периода не сдвигается, поэтому период может заканчиваться
+        datetime.max.
+
+        :param first: Начало периода.
+        :type first: datetime
+        :param last: Конец периода.
+        :type last: datetime
+        :return: Строки периода.
+        :rtype: ColumnRows
+        """
+        timestamps = self._timestamps[:self.size]
+        rows = slice(
+            np.searchsorted(timestamps, np.datetime64(first, 'us')),
+            np.searchsorted(
+                timestamps, np.datetime64(last, 'us'), side='right',
+            ),
+        )
+        return ColumnRows(
+            timestamps[rows], self._amounts[rows], self._types[rows],
+        )
+
+    def _reserve(self, size: int) -> None:
+        capacity = len(self._timestamps)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        self._timestamps = np.resize(self._timestamps, capacity)
+        self._amounts = np.resize(self._amounts, capacity)
+        self._types = np.resize(self._types, capacity)
+
+    def _sort(self) -> None:
+        order = np.argsort(self._timestamps[:self.size], kind='stable')
+        np.copyto(self._timestamps[:self.size], self._timestamps[order])
+        np.copyto(self._amounts[:self.size], self._amounts[order])
+        np.copyto(self._types[:self.size], self._types[order])
+
+
+def summarize_columns(
+    columns: TransactionColumns, request: TransactionSummaryRequest,
+) -> TransactionSummary:
+    """
+    Считает итоги транзакций за дни периода.
+
+    :param columns: Транзакции пользователя.
+    :type columns: TransactionColumns
+    :param request: Запрос сводки.
+    :type request: TransactionSummaryRequest
+    :return: Итоги пополнений и списаний за период.
+    :rtype: TransactionSummary
+    """
+    summary = TransactionSummary(
+        username=request.username,
+        start_date=request.start_date,
+        end_date=request.end_date,
+    )
+    rows = columns.select(
+        datetime.combine(request.start_date, time.min),
+        datetime.combine(request.end_date, time.max),
+    )
+    for transaction_type in TransactionType:
+        mask = rows.types == transaction_type.to_int()
+        summary.add_totals(
+            transaction_type,
+            int(np.count_nonzero(mask)),
+            int(rows.amounts[mask].sum()),
+        )
+    return summary
+
+
+def aggregate_columns(
+    columns: TransactionColumns, request: TransactionAggregateRequest,
+) -> TransactionAggregateReport:
+    """
+    Считает агрегаты транзакций за период и по интервалам.
+
+    Период включает транзакции со временем от start_date
+    до end_date включительно, как в postgres.
+
+    :param columns: Транзакции пользователя.
+    :type columns: TransactionColumns
+    :param request: Запрос агрегированного отчета.
+    :type request: TransactionAggregateRequest
+    :return: Агрегаты транзакций за период и по интервалам.
+    :rtype: TransactionAggregateReport
+    """
+    report = TransactionAggregateReport(
+        username=request.username,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        bucket=request.bucket,
+    )
+    buckets = get_buckets(
+        columns.select(request.start_date, request.end_date),
+        request.bucket,
+    )
+    for start, transaction_type, aggregate in buckets:
+        if aggregate.count:
+            report.add_aggregate(start, transaction_type, aggregate)
+    return report
+
+
+def get_buckets(
+    rows: ColumnRows, bucket: AggregateBucket,
+) -> Iterator[tuple[datetime, TransactionType, TransactionAggregate]]:
+    """
+    Считает агрегаты каждого типа транзакций по интервалам.
+
+    Строки упорядочены по времени, поэтому интервал - непрерывный
+    отрезок строк, и агрегаты считаются reduceat по началам отрезков.
+
+    :param rows: Строки периода.
+    :type rows: ColumnRows
+    :param bucket: Интервал группировки.
+    :type bucket: AggregateBucket
+    :yield: Начало интервала, тип и агрегаты транзакций, в том числе
+        пустые, в порядке времени.
+    """
+    starts = get_bucket_starts(rows.timestamps, bucket)
+    aggregates = zip(
+        *map(partial(get_bucket_aggregates, rows, starts), TransactionType),
+        strict=True,
+    )
+    firsts = rows.timestamps[starts].tolist()
+    for first, bucket_aggregates in zip(firsts, aggregates, strict=True):
+        yield from zip(
+            repeat(bucket.truncate(first)), TransactionType, bucket_aggregates,
+        )
+
+
+def get_bucket_starts(
+    timestamps: npt.NDArray[np.datetime64], bucket: AggregateBucket,
+) -> npt.NDArray[np.intp]:
+    """
+    Находит первые строки интервалов.
+
+    :param timestamps: Время транзакций, упорядоченное по возрастанию.
+    :type timestamps: npt.NDArray[np.datetime64]
+    :param bucket: Интервал группировки.
+    :type bucket: AggregateBucket
+    :return: Номера первых строк интервалов.
+    :rtype: npt.NDArray[np.intp]
+    """
+    buckets = timestamps.astype(bucket_dtypes[bucket]).astype(np.int64)
+    changes = np.diff(buckets, prepend=buckets[:1] - 1)
+    return np.flatnonzero(changes)
+
+
+def get_bucket_aggregates(
+    rows: ColumnRows,
+    starts: npt.NDArray[np.intp],
+    transaction_type: TransactionType,
+) -> list[TransactionAggregate]:
+    """
+    Считает агрегаты транзакций типа по интервалам.
+
+    :param rows: Строки периода.
+    :type rows: ColumnRows
+    :param starts: Номера первых строк интервалов.
+    :type starts: npt.NDArray[np.intp]
+    :param transaction_type: Тип транзакций.
+    :type transaction_type: TransactionType
+    :return: Агрегаты интервалов в порядке starts.
+    :rtype: list[TransactionAggregate]
+    """
+    mask = rows.types == transaction_type.to_int()
+    table = np.column_stack((
+        np.add.reduceat(mask.astype(np.int64), starts),
+        np.add.reduceat(np.where(mask, rows.amounts, 0), starts),
+        np.minimum.reduceat(
+            np.where(mask, rows.amounts, amount_limits.max), starts,
+        ),
+        np.maximum.reduceat(
+            np.where(mask, rows.amounts, amount_limits.min), starts,
+        ),
+    ))
+    return [
+        TransactionAggregate(**dict(zip(aggregate_fields, row, strict=True)))
+        for row in table.tolist()
+    ]
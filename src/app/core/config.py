@@ -1,5 +1,6 @@
 import logging
 import os
+from enum import StrEnum
 from functools import lru_cache
 from pathlib import Path
 from typing import Self
@@ -13,6 +14,47 @@ from app.core.errors import ConfigError
 logger = logging.getLogger(__name__)
 
 
+class PostgresBackend(StrEnum):
+    """
+    Реализация хранилища PostgreSQL.
+
+    sync - синхронный драйвер psycopg2, запросы блокируют event loop.
+    asyncpg - асинхронный драйвер asyncpg на AsyncEngine sqlalchemy.
+    """
+
+    sync = 'sync'
+    asyncpg = 'asyncpg'
+
+
+class ReportPersistence(StrEnum):
+    """
+    Способ сохранения отчетов в базе данных.
+
+    bulk - отчет и связи со всеми его транзакциями, одним запросом.
+    watermark - только период отчета и максимальный ID его транзакций.
+    disabled - отчеты не сохраняются.
+    """
+
+    bulk = 'bulk'
+    watermark = 'watermark'
+    disabled = 'disabled'
+
+
+class ReportCacheFormat(StrEnum):
+    """
+    Формат кэша отчетов в redis.
+
+    hash - отчет и его транзакции хранятся структурами redis,
+    при попадании в кэш отчет собирается заново.
+    json - хранится готовое тело ответа, которое отдается без разбора.
+    gzip - готовое тело ответа хранится сжатым gzip.
+    """
+
+    hash = 'hash'
+    json = 'json'
+    gzip = 'gzip'
+
+
 class PostgresSettings(BaseSettings):
     """Конфигурация postgres."""
 
@@ -22,6 +64,10 @@ class PostgresSettings(BaseSettings):
     )
     pool_size: int = 10
     max_overflow: int = 20
+    backend: PostgresBackend = PostgresBackend.sync
+    yield_per: int = 1000
+    report_persistence: ReportPersistence = ReportPersistence.bulk
+    partitions_ahead: int = 3
 
 
 class TracingSettings(BaseSettings):
@@ -38,12 +84,116 @@ class TracingSettings(BaseSettings):
 
 
 class RedisSettings(BaseSettings):
-    """Конфигурация redis."""
+    """
+    Конфигурация redis.
+
+    max_connections - размер общего пула соединений.
+    socket_timeout, socket_connect_timeout - таймауты в секундах.
+    health_check_interval - период проверки простаивающих соединений.
+    report_format - формат кэша отчетов.
+    report_ttl, segment_ttl, transaction_ttl, history_ttl, user_ttl -
+    время жизни ключей семейства в секундах.
+    user_cache_bytes - предельный объем кэша отчетов пользователя.
+    segment_days - наибольшее число дней отчета, собираемого
+    из сегментов, отчеты длиннее читаются из базы данных.
+    """
 
     host: str
     port: int = 6379
     decode_responses: bool = True
     db: int = 0
+    max_connections: int = 50
+    socket_timeout: float = 1
+    socket_connect_timeout: float = 1
+    health_check_interval: int = 30
+    report_format: ReportCacheFormat = ReportCacheFormat.hash
+    report_ttl: int = 3600
+    segment_ttl: int = 3600
+    transaction_ttl: int = 3600
+    history_ttl: int = 3600
+    user_ttl: int = 3600
+    user_cache_bytes: int = 1048576
+    segment_days: int = 366
+
+
+class BatchingSettings(BaseSettings):
+    """
+    Конфигурация объединения одиночных транзакций в пакеты.
+
+    window - время ожидания транзакций пакета в секундах.
+    max_batch_size - размер пакета, при котором он проводится сразу.
+    """
+
+    enabled: bool = False
+    window: float = 0.002
+    max_batch_size: int = 100
+
+
+class NearCacheSettings(BaseSettings):
+    """
+    Конфигурация кэша в памяти процесса перед кэшем redis.
+
+    max_entries - максимальное число записей в памяти.
+    ttl - время жизни записи в секундах, оно же предельное отставание
+    отчетов от транзакций, проведенных другими процессами.
+    """
+
+    enabled: bool = False
+    max_entries: int = 10000
+    ttl: float = 5
+
+
+class ReportLeaseSettings(BaseSettings):
+    """
+    Конфигурация аренды чтения отчетов в redis.
+
+    Пока один процесс читает дни отчета из хранилища, остальные
+    процессы ждут его сегментов в кэше.
+    ttl - время аренды в секундах.
+    timeout - предельное ожидание чужой аренды в секундах, после
+    которого дни читаются из хранилища без кэширования.
+    poll_interval - период проверки чужой аренды в секундах.
+
+    Как и другие необязательные части сервиса, аренды по умолчанию
+    выключены, а конфигурации из src/config включают их.
+    """
+
+    enabled: bool = False
+    ttl: float = 5
+    timeout: float = 5
+    poll_interval: float = 0.05
+
+
+class LedgerSettings(BaseSettings):
+    """
+    Конфигурация встроенного хранилища с журналом на диске.
+
+    Если хранилище включено, сервис работает без postgres.
+    path - каталог журнала и снимков.
+    commit_window - время ожидания записей группы перед fsync в секундах.
+    snapshot_interval - число записей журнала, после которого
+    состояние сохраняется в снимок, а журнал до него удаляется.
+    """
+
+    enabled: bool = False
+    path: str = 'ledger'
+    commit_window: float = 0.002
+    snapshot_interval: int = 100000
+
+
+class ColumnarSettings(BaseSettings):
+    """
+    Конфигурация сводок и агрегатов по столбцам транзакций в памяти.
+
+    max_users - максимальное число пользователей в памяти.
+    ttl - время жизни столбцов пользователя в секундах, оно же
+    предельное отставание сводок от транзакций, проведенных
+    другими процессами.
+    """
+
+    enabled: bool = False
+    max_users: int = 10000
+    ttl: float = 60
 
 
 class Settings(BaseSettings):
@@ -52,6 +202,13 @@ class Settings(BaseSettings):
     postgres: PostgresSettings
     tracing: TracingSettings
     redis: RedisSettings
+    batching: BatchingSettings = Field(default_factory=BatchingSettings)
+    near_cache: NearCacheSettings = Field(default_factory=NearCacheSettings)
+    report_lease: ReportLeaseSettings = Field(
+        default_factory=ReportLeaseSettings,
+    )
+    ledger: LedgerSettings = Field(default_factory=LedgerSettings)
+    columnar: ColumnarSettings = Field(default_factory=ColumnarSettings)
 
     @classmethod
     def from_yaml(cls, config_path: str) -> Self:
@@ -1,11 +1,22 @@
+from collections.abc import AsyncIterator
 from typing import Protocol
 
-from app.core.models import (
+from app.core.models import (  # noqa: WPS235 protocol uses all models
+    CacheVersion,
+    ReportBody,
     Transaction,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
     TransactionReport,
     TransactionReportRequest,
+    TransactionResult,
+    TransactionSummary,
+    TransactionSummaryRequest,
     User,
 )
+from app.core.segments import Segments
 
 
 class Repository(Protocol):
@@ -25,6 +36,35 @@ class Repository(Protocol):
         """
         ...  # noqa: WPS428 valid protocol syntax
 
+    async def post_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Абстрактный метод проведения транзакции.
+
+        Атомарно изменяет баланс пользователя и создает транзакцию.
+        Должен поднимать NotFoundError, если пользователь не найден,
+        и ValidationError, если транзакция запрещена правилом овердрафта.
+
+        :param transaction: Данные о проводимой транзакции.
+        :type transaction: Transaction
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def post_transactions(
+        self, transactions: list[Transaction],
+    ) -> list[TransactionResult]:
+        """
+        Абстрактный метод проведения пакета транзакций.
+
+        Проводит транзакции в одной транзакции базы данных.
+        Изменение баланса каждого пользователя применяется один раз.
+        Результаты возвращаются в порядке транзакций пакета,
+        отклоненные транзакции не прерывают проведение остальных.
+
+        :param transactions: Данные о проводимых транзакциях.
+        :type transactions: list[Transaction]
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
     async def create_transaction_report(
         self,
         request: TransactionReportRequest,
@@ -37,6 +77,76 @@ class Repository(Protocol):
         """
         ...  # noqa: WPS428 valid protocol syntax
 
+    async def save_transaction_report(
+        self, report: TransactionReport,
+    ) -> TransactionReport:
+        """
+        Абстрактный метод сохранения собранного отчета.
+
+        Сохраняет отчет, собранный из кэша, так же, как сохраняет отчеты
+        create_transaction_report, и возвращает его с ID отчета.
+
+        :param report: Собранный отчет о транзакциях.
+        :type report: TransactionReport
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    def stream_transactions(
+        self, request: TransactionReportRequest,
+    ) -> AsyncIterator[Transaction]:
+        """
+        Абстрактный метод потокового чтения транзакций за период отчета.
+
+        Возвращает транзакции по одной в порядке времени создания,
+        не загружая весь период в память. Отчет не сохраняется.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionReportRequest
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def get_transaction_history(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Абстрактный метод получения страницы истории транзакций.
+
+        Использует keyset пагинацию по (created_at, id) от новых
+        к старым, стоимость страницы не зависит от ее глубины.
+
+        :param request: Данные о запрашиваемой странице.
+        :type request: TransactionHistoryRequest
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def get_transaction_summary(
+        self, request: TransactionSummaryRequest,
+    ) -> TransactionSummary:
+        """
+        Абстрактный метод получения сводки по транзакциям за период.
+
+        Итоги считаются по дням, стоимость запроса зависит от числа
+        дней в периоде, а не от числа транзакций.
+
+        :param request: Данные о запрашиваемой сводке.
+        :type request: TransactionSummaryRequest
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def create_aggregate_report(
+        self, request: TransactionAggregateRequest,
+    ) -> TransactionAggregateReport:
+        """
+        Абстрактный метод создания агрегированного отчета о транзакциях.
+
+        Возвращает количество, сумму, минимальную и максимальную суммы
+        транзакций за период и по интервалам вместо самих транзакций.
+
+        :param request: Данные о запрашиваемом отчете.
+        :type request: TransactionAggregateRequest
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
     async def get_user(self, username: str) -> User | None:
         """
         Получает пользователя из базы данных.
@@ -65,26 +175,216 @@ class Repository(Protocol):
 class Cache(Protocol):
     """Интерфейс кэша сервиса."""
 
-    async def get_cache(
-        self, cache_value: TransactionReportRequest,
-    ) -> TransactionReport | None:
+    async def get_user_version(self, username: str) -> CacheVersion:
         """
-        Получает значение из кэша.
+        Получает версию кэша пользователя.
 
-        :param cache_value: Кэшированное значение
-        :type cache_value: TransactionReport
+        :param username: Имя пользователя.
+        :type username: str
         """
         ...  # noqa: WPS428 valid protocol syntax
 
-    async def create_cache(self, cache_value: TransactionReport) -> None:
+    async def invalidate_user(self, username: str) -> None:
         """
-        Записывает значение в кэш.
+        Делает недоступными все кэшированные отчеты пользователя.
 
-        :param cache_value: Кэшируемое значение
-        :type cache_value: TransactionReport
+        :param username: Имя пользователя.
+        :type username: str
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def append_transaction(self, transaction: Transaction) -> None:
+        """
+        Дописывает транзакцию в кэшированный сегмент ее дня.
+
+        :param transaction: Проведенная транзакция.
+        :type transaction: Transaction
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def get_user_cache(self, username: str) -> User:
+        """
+        Получает пользователя из кэша.
+
+        :param username: Имя пользователя.
+        :type username: str
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def create_user_cache(
+        self, user: User, version: CacheVersion,
+    ) -> None:
+        """
+        Записывает пользователя, прочитанного из хранилища, в кэш.
+
+        :param user: Пользователь.
+        :type user: User
+        :param version: Версия кэша пользователя до чтения из хранилища.
+        :type version: CacheVersion
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def get_segments(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> Segments:
+        """
+        Получает из кэша сегменты дней периода отчета.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def create_segments(
+        self,
+        username: str,
+        segments: Segments,
+        version: CacheVersion,
+        token: int = 0,
+    ) -> bool:
+        """
+        Записывает сегменты дней в кэш.
+
+        Возвращает True, если сегменты записаны, и False, если кэш
+        отклонил их: после чтения версии дописывались транзакции,
+        превышен объем кэша пользователя или дни записаны по новой
+        аренде.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :param segments: Транзакции по дням.
+        :type segments: Segments
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :param token: Токен аренды, под которой прочитаны дни, 0 - без аренды.
+        :type token: int
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def acquire_lease(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> int | None:
+        """
+        Берет аренду чтения дней периода из хранилища.
+
+        Возвращает токен аренды, который растет с каждой выданной
+        арендой, 0, если аренды отключены, и None, если период
+        уже читает другой процесс.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def release_lease(
+        self,
+        request: TransactionReportRequest,
+        version: CacheVersion,
+        token: int,
+    ) -> None:
+        """
+        Возвращает аренду, если она еще принадлежит токену.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :param token: Токен аренды.
+        :type token: int
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def wait_lease(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> bool:
+        """
+        Ожидает возврата или истечения чужой аренды периода.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def get_report_body(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> ReportBody:
+        """
+        Получает готовое тело ответа с отчетом из кэша.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def create_report_body(
+        self,
+        request: TransactionReportRequest,
+        payload: bytes,
+        version: CacheVersion,
+    ) -> bool:
+        """
+        Записывает готовое тело ответа с отчетом в кэш.
+
+        Возвращает True, если тело записано, и False, если кэш отклонил
+        его так же, как сегменты.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param payload: Отчет, сериализованный в JSON.
+        :type payload: bytes
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def get_history_cache(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций из кэша.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        """
+        ...  # noqa: WPS428 valid protocol syntax
+
+    async def create_history_cache(
+        self,
+        request: TransactionHistoryRequest,
+        page: TransactionHistoryPage,
+    ) -> None:
+        """
+        Записывает страницу истории транзакций в кэш.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :param page: Страница истории.
+        :type page: TransactionHistoryPage
         """
         ...  # noqa: WPS428 valid protocol syntax
 
     async def flush_cache(self) -> None:
         """Удаляет все ключи."""
         ...  # noqa: WPS428 valid protocol syntax
+
+
+async def close_repository(repository: Repository) -> None:
+    """
+    Закрывает хранилище данных, если оно держит соединения или файлы.
+
+    Хранилища без метода close закрывать не нужно.
+
+    :param repository: Хранилище данных.
+    :type repository: Repository
+    """
+    close = getattr(repository, 'close', None)
+    if close is not None:
+        await close()
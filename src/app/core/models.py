@@ -1,9 +1,11 @@
 import logging
-from datetime import datetime
-from enum import Enum
-from typing import Self
+from collections.abc import Callable
+from datetime import date, datetime
+from enum import Enum, StrEnum
+from typing import NamedTuple, Self
 
-from pydantic import BaseModel
+from fastapi import status
+from pydantic import BaseModel, Field
 
 from app.core.errors import ValidationError
 
@@ -87,6 +89,33 @@ class Transaction(BaseModel):
     transaction_id: int | None = None
 
 
+class TransactionBatchRequest(BaseModel):
+    """Запрос создания пакета транзакций."""
+
+    transactions: list[TransactionRequest]
+
+
+class TransactionResult(BaseModel):
+    """
+    Результат проведения транзакции из пакета.
+
+    Attributes:
+        status_code: int - код результата, как у запроса /create_transaction.
+        transaction: Transaction | None - проведенная транзакция.
+        detail: str | None - причина отказа.
+    """
+
+    status_code: int = status.HTTP_200_OK
+    transaction: Transaction | None = None
+    detail: str | None = None
+
+
+class TransactionBatchResult(BaseModel):
+    """Результаты проведения пакета транзакций в порядке запроса."""
+
+    results: list[TransactionResult]  # noqa: WPS110 api field name
+
+
 class TransactionReportRequest(BaseModel):
     """Запрос о транзакциях выполненных пользователем."""
 
@@ -114,6 +143,272 @@ class TransactionReport(BaseModel):
     transactions: list[Transaction]
 
 
+class ReportBody(NamedTuple):
+    """
+    Готовое тело ответа с отчетом о транзакциях.
+
+    Attributes:
+        payload: bytes - отчет, сериализованный в JSON.
+        encoding: str | None - сжатие payload, например gzip.
+    """
+
+    payload: bytes
+    encoding: str | None = None
+
+
+class CacheVersion(NamedTuple):
+    """
+    Версия кэша отчетов пользователя.
+
+    Attributes:
+        generation: int - поколение ключей, растет при сбросе кэша.
+        writes: int - число транзакций, дописанных в кэш.
+    """
+
+    generation: int = 0
+    writes: int = 0
+
+
+class TransactionHistoryRequest(BaseModel):
+    """
+    Запрос страницы истории транзакций пользователя.
+
+    Attributes:
+        username: str - имя пользователя.
+        page_size: int - количество транзакций на странице.
+        cursor: str | None - токен продолжения из предыдущей страницы.
+    """
+
+    username: str
+    page_size: int = 50
+    cursor: str | None = None
+
+
+class TransactionHistoryPage(BaseModel):
+    """
+    Страница истории транзакций, от новых к старым.
+
+    Attributes:
+        username: str - имя пользователя.
+        transactions: list[Transaction] - транзакции страницы.
+        next_cursor: str | None - токен следующей страницы, None в конце.
+    """
+
+    username: str
+    transactions: list[Transaction]
+    next_cursor: str | None = None
+
+
+class TransactionSummaryRequest(BaseModel):
+    """
+    Запрос сводки по транзакциям пользователя за период.
+
+    Attributes:
+        username: str - имя пользователя.
+        start_date: date - первый день периода.
+        end_date: date - последний день периода, включительно.
+    """
+
+    username: str
+    start_date: date
+    end_date: date
+
+
+class TransactionTotals(BaseModel):
+    """Количество и сумма транзакций одного типа."""
+
+    count: int = 0
+    amount: int = 0
+
+
+class TransactionSummary(BaseModel):
+    """
+    Сводка по транзакциям пользователя за период.
+
+    Attributes:
+        username: str - имя пользователя.
+        start_date: date - первый день периода.
+        end_date: date - последний день периода, включительно.
+        deposit: TransactionTotals - итоги пополнений.
+        withdraw: TransactionTotals - итоги списаний.
+    """
+
+    username: str
+    start_date: date
+    end_date: date
+    deposit: TransactionTotals = Field(default_factory=TransactionTotals)
+    withdraw: TransactionTotals = Field(default_factory=TransactionTotals)
+
+    def add_totals(
+        self, transaction_type: TransactionType, count: int, amount: int,
+    ) -> None:
+        """
+        Добавляет транзакции к итогам их типа.
+
+        :param transaction_type: Тип транзакций.
+        :type transaction_type: TransactionType
+        :param count: Количество транзакций.
+        :type count: int
+        :param amount: Сумма транзакций.
+        :type amount: int
+        """
+        totals = self.deposit
+        if transaction_type == TransactionType.withdraw:
+            totals = self.withdraw
+        totals.count += count
+        totals.amount += amount
+
+
+def _pick_amount(
+    pick: Callable[[list[int]], int], *amounts: int | None,
+) -> int | None:
+    known = [amount for amount in amounts if amount is not None]
+    return pick(known) if known else None
+
+
+def _merge_aggregate(
+    target: 'TransactionAggregate', source: 'TransactionAggregate',
+) -> None:
+    target.count += source.count
+    target.amount += source.amount
+    target.min_amount = _pick_amount(min, target.min_amount, source.min_amount)
+    target.max_amount = _pick_amount(max, target.max_amount, source.max_amount)
+
+
+class AggregateBucket(StrEnum):
+    """Интервал группировки транзакций агрегированного отчета."""
+
+    hour = 'hour'
+    day = 'day'
+    month = 'month'
+
+    def truncate(self, moment: datetime) -> datetime:
+        """
+        Округляет время вниз до начала интервала, как date_trunc.
+
+        :param moment: Время транзакции.
+        :type moment: datetime
+        :return: Начало интервала.
+        :rtype: datetime
+        """
+        moment = moment.replace(minute=0, second=0, microsecond=0)
+        if self is AggregateBucket.hour:
+            return moment
+        moment = moment.replace(hour=0)
+        if self is AggregateBucket.day:
+            return moment
+        return moment.replace(day=1)
+
+
+class TransactionAggregateRequest(BaseModel):
+    """
+    Запрос агрегированного отчета о транзакциях пользователя.
+
+    Attributes:
+        username: str - имя пользователя.
+        start_date: datetime - дата начала периода отчета.
+        end_date: datetime - дата конца периода отчета.
+        bucket: AggregateBucket - интервал группировки транзакций.
+    """
+
+    username: str
+    start_date: datetime
+    end_date: datetime
+    bucket: AggregateBucket = AggregateBucket.day
+
+
+class TransactionAggregate(TransactionTotals):
+    """Количество, сумма, минимальная и максимальная суммы транзакций."""
+
+    min_amount: int | None = None
+    max_amount: int | None = None
+
+
+class TransactionBucket(BaseModel):
+    """
+    Агрегаты транзакций за интервал.
+
+    Attributes:
+        start: datetime - начало интервала.
+        deposit: TransactionAggregate - агрегаты пополнений.
+        withdraw: TransactionAggregate - агрегаты списаний.
+    """
+
+    start: datetime
+    deposit: TransactionAggregate = Field(default_factory=TransactionAggregate)
+    withdraw: TransactionAggregate = Field(
+        default_factory=TransactionAggregate,
+    )
+
+    def get_aggregate(
+        self, transaction_type: TransactionType,
+    ) -> TransactionAggregate:
+        """
+        Возвращает агрегаты транзакций типа.
+
+        :param transaction_type: Тип транзакций.
+        :type transaction_type: TransactionType
+        :return: Агрегаты транзакций типа.
+        :rtype: TransactionAggregate
+        """
+        if transaction_type == TransactionType.withdraw:
+            return self.withdraw
+        return self.deposit
+
+
+class TransactionAggregateReport(BaseModel):
+    """
+    Агрегированный отчет о транзакциях пользователя.
+
+    Attributes:
+        username: str - имя пользователя.
+        start_date: datetime - дата начала периода отчета.
+        end_date: datetime - дата конца периода отчета.
+        bucket: AggregateBucket - интервал группировки транзакций.
+        deposit: TransactionAggregate - агрегаты пополнений за период.
+        withdraw: TransactionAggregate - агрегаты списаний за период.
+        buckets: list[TransactionBucket] - агрегаты по интервалам.
+    """
+
+    username: str
+    start_date: datetime
+    end_date: datetime
+    bucket: AggregateBucket
+    deposit: TransactionAggregate = Field(default_factory=TransactionAggregate)
+    withdraw: TransactionAggregate = Field(
+        default_factory=TransactionAggregate,
+    )
+    buckets: list[TransactionBucket] = Field(default_factory=list)
+
+    def add_aggregate(
+        self,
+        start: datetime,
+        transaction_type: TransactionType,
+        aggregate: TransactionAggregate,
+    ) -> None:
+        """
+        Добавляет агрегаты транзакций интервала к отчету.
+
+        Интервалы добавляются в порядке времени начала.
+
+        :param start: Начало интервала.
+        :type start: datetime
+        :param transaction_type: Тип транзакций.
+        :type transaction_type: TransactionType
+        :param aggregate: Агрегаты транзакций интервала.
+        :type aggregate: TransactionAggregate
+        """
+        if not self.buckets or self.buckets[-1].start != start:
+            self.buckets.append(TransactionBucket(start=start))
+        _merge_aggregate(
+            self.buckets[-1].get_aggregate(transaction_type), aggregate,
+        )
+        total = self.deposit
+        if transaction_type == TransactionType.withdraw:
+            total = self.withdraw
+        _merge_aggregate(total, aggregate)
+
+
 class User(BaseModel):
     """Пользователь."""
 
@@ -123,13 +418,13 @@ class User(BaseModel):
     is_verified: bool
 
     def validate_transaction(
-        self, transaction_request: TransactionRequest,
+        self, transaction_request: TransactionRequest | Transaction,
     ) -> None:
         """
         Валидирует транзакцию и баланс.
 
         :param transaction_request: Запрос на создание транзакции.
-        :type transaction_request: TransactionRequest
+        :type transaction_request: TransactionRequest, Transaction
         :raises ValidationError: Если транзакция не прошла валидацию.
         """
         valid = True
@@ -0,0 +1,441 @@
+import time
+from collections import OrderedDict
+from collections.abc import Hashable
+from typing import Any
+
+from app.core.interfaces import Cache
+from app.core.models import (
+    CacheVersion,
+    ReportBody,
+    Transaction,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
+    TransactionReportRequest,
+    User,
+)
+from app.core.segments import Segments, get_days
+from app.metrics.prometheus import near_cache_hits, near_cache_misses
+
+
+class LRUCache:
+    """
+    Словарь ограниченного размера с вытеснением давно не читанных записей.
+
+    Записи старше ttl секунд не читаются и удаляются при обращении.
+    """
+
+    def __init__(self, max_entries: int, ttl: float) -> None:
+        """
+        Метод инициализации LRUCache.
+
+        :param max_entries: Максимальное число записей.
+        :type max_entries: int
+        :param ttl: Время жизни записи в секундах.
+        :type ttl: float
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = (
+            OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        """
+        Возвращает число записей.
+
+        :return: Число записей, включая истекшие.
+        :rtype: int
+        """
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Получает запись и делает ее последней вытесняемой.
+
+        :param key: Ключ записи.
+        :type key: Hashable
+        :return: Значение записи.
+        :rtype: Any
+        :raises KeyError: Если запись не найдена или истекла.
+        """
+        expires_at, cache_value = self._entries[key]
+        if expires_at < time.monotonic():
+            self._entries.pop(key)
+            raise KeyError(key)
+        self._entries.move_to_end(key)
+        return cache_value
+
+    def set(self, key: Hashable, cache_value: Any) -> None:
+        """
+        Записывает значение, вытесняя самую давно читанную запись.
+
+        :param key: Ключ записи.
+        :type key: Hashable
+        :param cache_value: Значение записи.
+        :type cache_value: Any
+        """
+        self._entries[key] = (time.monotonic() + self.ttl, cache_value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Удаляет запись, если она есть.
+
+        :param key: Ключ записи.
+        :type key: Hashable
+        """
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Удаляет все записи."""
+        self._entries.clear()
+
+
+class NearCache:  # noqa: WPS214 cache protocol methods
+    """
+    Кэш в памяти процесса перед кэшем сервиса.
+
+    Хранит версии и записи пользователей, сегменты дней, готовые тела
+    ответов и страницы истории. Записи сегментов и тел входят в ключ
+    вместе с версией пользователя, поэтому инвалидация и дописывание
+    транзакций через кэш сервиса делают их недоступными так же,
+    как в redis. Версия и запись пользователя, изменившиеся в другом
+    процессе, читаются не позже, чем через ttl секунд: столько отчеты
+    и балансы могут отставать от транзакций, проведенных другими
+    процессами. Изменения через этот процесс читаются сразу.
+
+    Инвалидация пользователя увеличивает локальные часы и запоминает
+    их показание для пользователя. Версия или запись пользователя,
+    чтение которой из кэша сервиса началось до инвалидации,
+    в память не записывается: иначе она читалась бы до ttl секунд.
+    """
+
+    def __init__(self, cache: Cache, max_entries: int, ttl: float) -> None:
+        """
+        Метод инициализации NearCache.
+
+        :param cache: Кэш сервиса.
+        :type cache: Cache
+        :param max_entries: Максимальное число записей в памяти.
+        :type max_entries: int
+        :param ttl: Время жизни записи в памяти в секундах.
+        :type ttl: float
+        """
+        self.cache = cache
+        self.entries = LRUCache(max_entries, ttl)
+        self._clock = 0
+        self._drops: OrderedDict[str, int] = OrderedDict()
+        self._evicted_drop = 0
+
+    async def get_user_version(self, username: str) -> CacheVersion:
+        """
+        Получает версию кэша пользователя.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :return: Версия кэша пользователя.
+        :rtype: CacheVersion
+        """
+        key = ('version', username)
+        try:
+            version: CacheVersion = self._get(key)
+        except KeyError:
+            started = self._clock
+            version = await self.cache.get_user_version(username)
+            self._set_user_entry(key, version, started)
+        return version
+
+    async def invalidate_user(self, username: str) -> None:
+        """
+        Делает недоступными все кэшированные отчеты пользователя.
+
+        :param username: Имя пользователя.
+        :type username: str
+        """
+        await self.cache.invalidate_user(username)
+        self._drop_user(username)
+
+    async def append_transaction(self, transaction: Transaction) -> None:
+        """
+        Дописывает транзакцию в кэшированный сегмент ее дня.
+
+        :param transaction: Проведенная транзакция.
+        :type transaction: Transaction
+        """
+        await self.cache.append_transaction(transaction)
+        self._drop_user(transaction.username)
+
+    async def get_user_cache(self, username: str) -> User:
+        """
+        Получает пользователя.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :return: Пользователь.
+        :rtype: User
+        """
+        key = ('user', username)
+        try:
+            user: User = self._get(key)
+        except KeyError:
+            started = self._clock
+            user = await self.cache.get_user_cache(username)
+            self._set_user_entry(key, user, started)
+        return user
+
+    async def create_user_cache(
+        self, user: User, version: CacheVersion,
+    ) -> None:
+        """
+        Записывает пользователя, прочитанного из хранилища, в кэш сервиса.
+
+        В памяти пользователь появляется при чтении из кэша сервиса,
+        который не сохраняет пользователей, прочитанных до транзакции.
+
+        :param user: Пользователь.
+        :type user: User
+        :param version: Версия кэша пользователя до чтения из хранилища.
+        :type version: CacheVersion
+        """
+        await self.cache.create_user_cache(user, version)
+
+    async def get_segments(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> Segments:
+        """
+        Получает сегменты дней периода отчета.
+
+        Если в памяти есть все дни периода, кэш сервиса не читается.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: Транзакции по дням, только для дней, найденных в кэше.
+        :rtype: Segments
+        """
+        try:
+            return {
+                day: self._get(('segment', request.username, day, version))
+                for day in get_days(request)
+            }
+        except KeyError:
+            segments = await self.cache.get_segments(request, version)
+        self._set_segments(request.username, segments, version)
+        return segments
+
+    async def create_segments(
+        self,
+        username: str,
+        segments: Segments,
+        version: CacheVersion,
+        token: int = 0,
+    ) -> bool:
+        """
+        Записывает сегменты дней в кэш.
+
+        В память записываются только сегменты, принятые кэшем сервиса.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :param segments: Транзакции по дням.
+        :type segments: Segments
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :param token: Токен аренды, под которой прочитаны дни, 0 - без аренды.
+        :type token: int
+        :return: True, если сегменты записаны.
+        :rtype: bool
+        """
+        created = await self.cache.create_segments(
+            username, segments, version, token,
+        )
+        if created:
+            self._set_segments(username, segments, version)
+        return created
+
+    async def acquire_lease(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> int | None:
+        """
+        Берет аренду чтения дней периода в кэше сервиса.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: Токен аренды, 0, если аренды отключены, или None,
+            если период читает другой процесс.
+        :rtype: int | None
+        """
+        return await self.cache.acquire_lease(request, version)
+
+    async def release_lease(
+        self,
+        request: TransactionReportRequest,
+        version: CacheVersion,
+        token: int,
+    ) -> None:
+        """
+        Возвращает аренду в кэше сервиса.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :param token: Токен аренды.
+        :type token: int
+        """
+        await self.cache.release_lease(request, version, token)
+
+    async def wait_lease(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> bool:
+        """
+        Ожидает возврата чужой аренды в кэше сервиса.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: True, если аренда возвращена или истекла до таймаута.
+        :rtype: bool
+        """
+        return await self.cache.wait_lease(request, version)
+
+    async def get_report_body(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> ReportBody:
+        """
+        Получает готовое тело ответа с отчетом.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: Тело ответа в том виде, в котором хранится в кэше.
+        :rtype: ReportBody
+        """
+        key = self._get_body_key(request, version)
+        try:
+            body: ReportBody = self._get(key)
+        except KeyError:
+            body = await self.cache.get_report_body(request, version)
+            self.entries.set(key, body)
+        return body
+
+    async def create_report_body(
+        self,
+        request: TransactionReportRequest,
+        payload: bytes,
+        version: CacheVersion,
+    ) -> bool:
+        """
+        Записывает готовое тело ответа с отчетом в кэш.
+
+        В памяти тело хранится несжатым, в кэше сервиса - в формате
+        его конфигурации. В память записывается только тело, принятое
+        кэшем сервиса.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param payload: Отчет, сериализованный в JSON.
+        :type payload: bytes
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: True, если тело записано.
+        :rtype: bool
+        """
+        created = await self.cache.create_report_body(
+            request, payload, version,
+        )
+        if created:
+            self.entries.set(
+                self._get_body_key(request, version), ReportBody(payload),
+            )
+        return created
+
+    async def get_history_cache(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :return: Страница истории транзакций.
+        :rtype: TransactionHistoryPage
+        """
+        key = self._get_history_key(request)
+        try:
+            page: TransactionHistoryPage = self._get(key)
+        except KeyError:
+            page = await self.cache.get_history_cache(request)
+            self.entries.set(key, page)
+        return page
+
+    async def create_history_cache(
+        self,
+        request: TransactionHistoryRequest,
+        page: TransactionHistoryPage,
+    ) -> None:
+        """
+        Записывает страницу истории транзакций в кэш.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :param page: Страница истории.
+        :type page: TransactionHistoryPage
+        """
+        await self.cache.create_history_cache(request, page)
+        self.entries.set(self._get_history_key(request), page)
+
+    async def flush_cache(self) -> None:
+        """Удаляет все записи в памяти и ключи кэша сервиса."""
+        self.entries.clear()
+        await self.cache.flush_cache()
+
+    def _get(self, key: tuple[Any, ...]) -> Any:
+        try:
+            cache_value = self.entries.get(key)
+        except KeyError:
+            near_cache_misses.labels(key[0]).inc()
+            raise
+        near_cache_hits.labels(key[0]).inc()
+        return cache_value
+
+    def _drop_user(self, username: str) -> None:
+        self._clock += 1
+        self._drops[username] = self._clock
+        self._drops.move_to_end(username)
+        if len(self._drops) > self.entries.max_entries:
+            # Показания вытесненных пользователей не больше этого.
+            self._evicted_drop = self._drops.popitem(last=False)[1]
+        self.entries.pop(('version', username))
+        self.entries.pop(('user', username))
+
+    def _set_user_entry(
+        self, key: tuple[str, str], cache_value: Any, started: int,
+    ) -> None:
+        dropped = self._drops.get(key[1], self._evicted_drop)
+        if dropped <= started:
+            self.entries.set(key, cache_value)
+
+    def _set_segments(
+        self, username: str, segments: Segments, version: CacheVersion,
+    ) -> None:
+        for day, transactions in segments.items():
+            self.entries.set(('segment', username, day, version), transactions)
+
+    def _get_body_key(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> tuple[Any, ...]:
+        period = (request.start_date, request.end_date)
+        return ('report-body', request.username, period, version)
+
+    def _get_history_key(
+        self, request: TransactionHistoryRequest,
+    ) -> tuple[Any, ...]:
+        return ('history', request.username, request.page_size, request.cursor)
@@ -0,0 +1,77 @@
+import base64
+import json
+import logging
+from datetime import datetime
+
+from app.core.errors import ValidationError
+from app.core.models import Transaction, TransactionHistoryPage
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(transaction: Transaction) -> str:
+    """
+    Создает токен продолжения после транзакции.
+
+    Токен содержит ключ (created_at, id) последней транзакции страницы
+    и не должен разбираться клиентом.
+
+    :param transaction: Последняя транзакция страницы.
+    :type transaction: Transaction
+    :return: Токен продолжения.
+    :rtype: str
+    """
+    position = [transaction.timestamp.isoformat(), transaction.transaction_id]
+    return base64.urlsafe_b64encode(
+        json.dumps(position).encode(),
+    ).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, int]:
+    """
+    Получает ключ (created_at, id) из токена продолжения.
+
+    :param cursor: Токен продолжения.
+    :type cursor: str
+    :return: Время создания и ID последней транзакции страницы.
+    :rtype: tuple[datetime, int]
+    :raises ValidationError: Если токен поврежден.
+    """
+    try:
+        return _parse_cursor(cursor)
+    except (TypeError, ValueError) as err:
+        logger.info(f'invalid history cursor {cursor}')
+        raise ValidationError(detail='Неверный токен продолжения') from err
+
+
+def get_history_page(
+    username: str, transactions: list[Transaction], page_size: int,
+) -> TransactionHistoryPage:
+    """
+    Создает страницу истории из page_size + 1 транзакций.
+
+    Лишняя транзакция означает, что за страницей есть следующая.
+
+    :param username: Имя пользователя.
+    :type username: str
+    :param transactions: Транзакции от новых к старым, до page_size + 1.
+    :type transactions: list[Transaction]
+    :param page_size: Размер страницы.
+    :type page_size: int
+    :return: Страница истории транзакций.
+    :rtype: TransactionHistoryPage
+    """
+    page = transactions[:page_size]
+    next_cursor = None
+    if len(transactions) > page_size:
+        next_cursor = encode_cursor(page[-1])
+    return TransactionHistoryPage(
+        username=username, transactions=page, next_cursor=next_cursor,
+    )
+
+
+def _parse_cursor(cursor: str) -> tuple[datetime, int]:
+    timestamp, transaction_id = json.loads(
+        base64.urlsafe_b64decode(cursor.encode()),
+    )
+    return datetime.fromisoformat(timestamp), int(transaction_id)
@@ -0,0 +1,171 @@
+"""
+Сборка отчетов из дневных сегментов кэша.
+
+Кэш хранит транзакции пользователя сегментами по дням. Отчет за любой
+период собирается из сегментов его дней: из хранилища читаются только
+отсутствующие в кэше дни, а результат обрезается по точным границам
+периода. Отчеты со скользящим периодом, например за последние 30 дней,
+поэтому почти целиком читаются из кэша.
+"""
+from collections.abc import Iterable
+from datetime import date, datetime, time, timedelta
+
+from app.core.models import (
+    Transaction,
+    TransactionReport,
+    TransactionReportRequest,
+)
+
+Segments = dict[date, list[Transaction]]
+
+one_day = timedelta(days=1)
+
+
+def get_days(request: TransactionReportRequest) -> list[date]:
+    """
+    Возвращает дни периода отчета.
+
+    :param request: Запрос отчета.
+    :type request: TransactionReportRequest
+    :return: Дни от начала до конца периода включительно.
+    :rtype: list[date]
+    """
+    days = []
+    day = request.start_date.date()
+    while day <= request.end_date.date():
+        days.append(day)
+        day += one_day
+    return days
+
+
+def count_days(request: TransactionReportRequest) -> int:
+    """
+    Считает дни периода отчета, не перебирая их.
+
+    :param request: Запрос отчета.
+    :type request: TransactionReportRequest
+    :return: Число дней от начала до конца периода включительно.
+    :rtype: int
+    """
+    return (request.end_date.date() - request.start_date.date()).days + 1
+
+
+def get_missing_periods(
+    request: TransactionReportRequest, cached_days: Iterable[date],
+) -> list[TransactionReportRequest]:
+    """
+    Объединяет отсутствующие в кэше дни периода в непрерывные периоды.
+
+    Каждый период начинается в начале первого дня и заканчивается
+    в конце последнего, чтобы из хранилища читались целые дни.
+
+    :param request: Запрос отчета.
+    :type request: TransactionReportRequest
+    :param cached_days: Дни, сегменты которых есть в кэше.
+    :type cached_days: Iterable[date]
+    :return: Запросы транзакций отсутствующих дней.
+    :rtype: list[TransactionReportRequest]
+    """
+    cached = set(cached_days)
+    runs: list[list[date]] = []
+    for day in get_days(request):
+        if day in cached:
+            continue
+        if runs and runs[-1][-1] + one_day == day:
+            runs[-1].append(day)
+        else:
+            runs.append([day])
+    return [
+        TransactionReportRequest(
+            username=request.username,
+            start_date=datetime.combine(run[0], time.min),
+            end_date=datetime.combine(run[-1], time.max),
+        )
+        for run in runs
+    ]
+
+
+def get_period_key(
+    periods: list[TransactionReportRequest],
+) -> tuple[tuple[datetime, datetime], ...]:
+    """
+    Возвращает ключ периодов для объединения одинаковых чтений.
+
+    :param periods: Периоды, читаемые из хранилища.
+    :type periods: list[TransactionReportRequest]
+    :return: Границы периодов.
+    :rtype: tuple[tuple[datetime, datetime], ...]
+    """
+    return tuple((period.start_date, period.end_date) for period in periods)
+
+
+def get_span(
+    periods: list[TransactionReportRequest],
+) -> TransactionReportRequest:
+    """
+    Возвращает период от начала первого до конца последнего периода.
+
+    Одинаковые запросы при одинаковом состоянии кэша дают один и тот же
+    период, поэтому он служит ключом аренды чтения дней из хранилища.
+
+    :param periods: Периоды, читаемые из хранилища, в порядке времени.
+    :type periods: list[TransactionReportRequest]
+    :return: Запрос транзакций всех дней от первого до последнего.
+    :rtype: TransactionReportRequest
+    """
+    return TransactionReportRequest(
+        username=periods[0].username,
+        start_date=periods[0].start_date,
+        end_date=periods[-1].end_date,
+    )
+
+
+def split_by_day(
+    periods: list[TransactionReportRequest],
+    transactions: Iterable[Transaction],
+) -> Segments:
+    """
+    Раскладывает транзакции периодов по дневным сегментам.
+
+    Дни периодов без транзакций получают пустые сегменты.
+
+    :param periods: Периоды, прочитанные из хранилища.
+    :type periods: list[TransactionReportRequest]
+    :param transactions: Транзакции периодов в порядке времени.
+    :type transactions: Iterable[Transaction]
+    :return: Транзакции по дням.
+    :rtype: Segments
+    """
+    segments: Segments = {
+        day: [] for period in periods for day in get_days(period)
+    }
+    for transaction in transactions:
+        segments[transaction.timestamp.date()].append(transaction)
+    return segments
+
+
+def assemble_report(
+    request: TransactionReportRequest, segments: Segments,
+) -> TransactionReport:
+    """
+    Собирает отчет из дневных сегментов.
+
+    :param request: Запрос отчета.
+    :type request: TransactionReportRequest
+    :param segments: Сегменты всех дней периода.
+    :type segments: Segments
+    :return: Отчет с транзакциями в точных границах периода.
+    :rtype: TransactionReport
+    """
+    return TransactionReport(
+        username=request.username,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        transactions=[
+            transaction
+            for day in get_days(request)
+            for transaction in segments[day]
+            if request.start_date <= transaction.timestamp <= request.end_date
+        ],
+        report_id=None,
+    )
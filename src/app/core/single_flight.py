@@ -0,0 +1,64 @@
+"""
+Объединение одинаковых одновременных операций.
+
+Пока операция с ключом выполняется, повторные вызовы с тем же ключом
+не запускают ее снова, а ожидают результата первого вызова. Ключи
+живут только до завершения операции: результаты не кэшируются.
+"""
+import asyncio
+from collections.abc import Awaitable, Callable, Hashable
+from typing import Any, TypeVar
+
+FlightResult = TypeVar('FlightResult')
+
+
+class SingleFlight:
+    """Выполняет не больше одной операции с каждым ключом одновременно."""
+
+    def __init__(self) -> None:
+        """Метод инициализации SingleFlight."""
+        self._flights: dict[Hashable, asyncio.Future[Any]] = {}
+
+    def __len__(self) -> int:
+        """
+        Возвращает число выполняемых операций.
+
+        :return: Число выполняемых операций.
+        :rtype: int
+        """
+        return len(self._flights)
+
+    async def run(
+        self,
+        key: Hashable,
+        operation: Callable[[], Awaitable[FlightResult]],
+    ) -> FlightResult:
+        """
+        Выполняет операцию или ожидает уже выполняемую с тем же ключом.
+
+        Операция выполняется отдельной задачей: отмена одного из
+        ожидающих не отменяет ее для остальных. Исключение операции
+        получает каждый ожидающий.
+
+        :param key: Ключ операции.
+        :type key: Hashable
+        :param operation: Функция, запускающая операцию.
+        :type operation: Callable[[], Awaitable[FlightResult]]
+        :return: Результат операции.
+        :rtype: FlightResult
+        """
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(operation())
+            self._flights[key] = flight
+            flight.add_done_callback(self._land(key))
+        return await asyncio.shield(flight)
+
+    def _land(self, key: Hashable) -> Callable[[asyncio.Future[Any]], None]:
+        def land(flight: asyncio.Future[Any]) -> None:  # noqa: WPS430 callback
+            if self._flights.get(key) is flight:
+                self._flights.pop(key, None)
+            # Ошибка считается полученной, даже если все ожидающие отменены.
+            if not flight.cancelled():
+                flight.exception()
+        return land
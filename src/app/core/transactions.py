@@ -1,21 +1,49 @@
-import asyncio
 import logging
-from datetime import datetime
+from collections.abc import AsyncIterator
+from datetime import date, datetime
+from functools import partial
 
-from app.core.errors import NotFoundError, RepositoryError, ValidationError
+from fastapi import status
+
+from app.core.errors import NotFoundError, ServerError, ValidationError
 from app.core.interfaces import Cache, Repository
-from app.core.models import (
+from app.core.models import (  # noqa: WPS235 service uses all models
+    CacheVersion,
+    ReportBody,
     Transaction,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
     TransactionReport,
     TransactionReportRequest,
     TransactionRequest,
+    TransactionResult,
+    TransactionSummary,
+    TransactionSummaryRequest,
     TransactionType,
+    User,
+)
+from app.core.pagination import decode_cursor
+from app.core.segments import (
+    Segments,
+    assemble_report,
+    count_days,
+    get_missing_periods,
+    get_period_key,
+    get_span,
+    split_by_day,
 )
+from app.core.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+max_batch_size = 10000
+max_page_size = 1000
+max_segment_days = 366
 
-class Validator:
+
+class Validator:  # noqa: WPS214 validation rules
     """Валидатор для определения логики валидации поступающих данных."""
 
     def validate_user_id(self, user_id: int) -> None:
@@ -58,28 +86,28 @@ class Validator:
                 f'Not valid transaction type {tran_type}',
             )
 
-    def validate_date(self, date: datetime) -> None:
+    def validate_date(self, moment: datetime) -> None:
         """
         Метод валидации даты.
 
-        :param date: дата
-        :type date: datetime
+        :param moment: дата
+        :type moment: datetime
         :raises ValueError: если валидация не пройдена
         """
-        if not isinstance(date, datetime):
-            logger.error(f'date {date} is not a valid date')  # type: ignore
-            raise ValueError(f'date {date} is not a valid date')
+        if not isinstance(moment, datetime):
+            logger.error(f'date {moment} is not a valid date')  # type: ignore
+            raise ValueError(f'date {moment} is not a valid date')
 
     def validate_time_period(
-        self, start_date: datetime, end_date: datetime,
+        self, start_date: date, end_date: date,
     ) -> None:
         """
         Метод валидации периода времени.
 
         :param start_date: начальная дата периода
-        :type start_date: datetime
+        :type start_date: date, datetime
         :param end_date: конечная дата периода
-        :type end_date: datetime
+        :type end_date: date, datetime
         :raises ValidationError: если валидация не пройдена
         """
         if start_date > end_date:
@@ -90,11 +118,103 @@ class Validator:
                 detail=f"{start_date} can't be greater than {end_date}",
             )
 
+    def validate_page_size(self, page_size: int) -> None:
+        """
+        Метод валидации размера страницы истории.
+
+        :param page_size: Размер страницы
+        :type page_size: int
+        :raises ValidationError: если размер вне диапазона 1..max_page_size
+        """
+        if page_size <= 0 or page_size > max_page_size:
+            logger.error(f'not valid page size {page_size}')
+            raise ValidationError(
+                detail=f'page size must be in range 1..{max_page_size}',
+            )
+
+    def validate_transaction_batch(
+        self, transaction_requests: list[TransactionRequest],
+    ) -> dict[int, str]:
+        """
+        Метод валидации пакета транзакций.
+
+        Проверяет размер пакета и все транзакции пакета за один проход.
+
+        :param transaction_requests: пакет запросов транзакций
+        :type transaction_requests: list[TransactionRequest]
+        :return: ошибки валидации по индексу транзакции в пакете
+        :rtype: dict[int, str]
+        :raises ValidationError: если пакет больше допустимого размера
+        """
+        batch_size = len(transaction_requests)
+        if batch_size > max_batch_size:
+            logger.error(f'batch size {batch_size} > {max_batch_size}')
+            raise ValidationError(
+                detail=f'batch size is limited to {max_batch_size}',
+            )
+        errors = {}
+        for index, transaction_request in enumerate(transaction_requests):
+            try:
+                self.validate_transaction_request(transaction_request)
+            except ValueError as err:
+                errors[index] = str(err)
+        return errors
+
+    def validate_transaction_request(
+        self, transaction_request: TransactionRequest,
+    ) -> None:
+        """
+        Метод валидации запроса транзакции.
+
+        :param transaction_request: запрос транзакции
+        :type transaction_request: TransactionRequest
+        """
+        self.validate_amount(transaction_request.amount)
+        self.validate_transaction_type(transaction_request.transaction_type)
+
 
 default_validator = Validator()
 
 
-class TransactionService:
+def apply_transactions(
+    users: dict[str, User], transactions: list[Transaction],
+) -> list[TransactionResult]:
+    """
+    Применяет пакет транзакций к балансам пользователей.
+
+    Транзакции применяются по порядку: правило овердрафта проверяется
+    с учетом предыдущих транзакций пакета того же пользователя.
+    Балансы объектов User в users изменяются на месте.
+
+    :param users: пользователи пакета по имени пользователя
+    :type users: dict[str, User]
+    :param transactions: транзакции пакета
+    :type transactions: list[Transaction]
+    :return: результаты транзакций в порядке пакета
+    :rtype: list[TransactionResult]
+    """
+    outcomes = []
+    for transaction in transactions:
+        user = users.get(transaction.username)
+        if user is None:
+            outcomes.append(TransactionResult(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f'Пользователь {transaction.username} не найден',
+            ))
+            continue
+        try:
+            user.validate_transaction(transaction)
+        except ValidationError as err:
+            outcomes.append(TransactionResult(
+                status_code=err.status_code, detail=err.detail,
+            ))
+            continue
+        user.process_transaction(transaction)
+        outcomes.append(TransactionResult(transaction=transaction))
+    return outcomes
+
+
+class TransactionService:  # noqa: WPS214 service operations
     """Сервис обработки транзакций пользователя."""
 
     def __init__(
@@ -102,6 +222,7 @@ class TransactionService:
         repository: Repository,
         validator: Validator = default_validator,
         cache: Cache | None = None,
+        segment_days: int = max_segment_days,
     ) -> None:
         """
         Функция инициализации.
@@ -112,10 +233,15 @@ class TransactionService:
         :type validator: Validator
         :param cache: Кэш сервиса
         :type cache: Cache
+        :param segment_days: наибольшее число дней отчета, собираемого
+            из сегментов кэша, отчеты длиннее читаются из хранилища.
+        :type segment_days: int
         """
         self.repository = repository
         self.validator = validator
         self.cache = cache
+        self.segment_days = segment_days
+        self.flights = SingleFlight()
 
     async def create_transaction(
         self, transaction_request: TransactionRequest,
@@ -123,40 +249,61 @@ class TransactionService:
         """
         Метод создание записи о проведенной транзакции.
 
-        Создает запись о проведенной транзакции в хранилище данных.
+        Проводит транзакцию в хранилище данных: проверка баланса,
+        изменение баланса и запись о транзакции выполняются
+        хранилищем атомарно. Транзакция дописывается в кэшированный
+        сегмент ее дня.
 
         :param transaction_request: Запрос о транзакции
         :type transaction_request: TransactionRequest
         :return: объект транзакции
         :rtype: Transaction
-        :raises NotFoundError: если данные не найдены
         """
-        user = await self.repository.get_user(transaction_request.username)
-        if not user:
-            logger.warning(
-                f'Пользователь {transaction_request.username} не найден',
-            )
-            raise NotFoundError(
-                detail=f'Пользователь {transaction_request.username} не найден',
-            )
-        user.validate_transaction(transaction_request)
-
+        self.validator.validate_transaction_request(transaction_request)
         transaction = Transaction(
             username=transaction_request.username,
             amount=transaction_request.amount,
             transaction_type=transaction_request.transaction_type,
             timestamp=datetime.now(),
         )
+        transaction = await self.repository.post_transaction(transaction)
+        await self._append_to_cache(transaction)
+        return transaction
 
-        user.process_transaction(transaction)
-        update_user_task = asyncio.create_task(
-            self.repository.update_user(user),
+    async def create_transactions(
+        self, transaction_requests: list[TransactionRequest],
+    ) -> list[TransactionResult]:
+        """
+        Метод проведения пакета транзакций.
+
+        Валидирует пакет целиком и проводит прошедшие валидацию
+        транзакции одним обращением к хранилищу данных.
+        Результаты возвращаются в порядке запросов пакета.
+
+        :param transaction_requests: Пакет запросов транзакций
+        :type transaction_requests: list[TransactionRequest]
+        :return: результаты транзакций пакета
+        :rtype: list[TransactionResult]
+        """
+        errors = self.validator.validate_transaction_batch(
+            transaction_requests,
+        )
+        transactions = self._get_batch_transactions(
+            transaction_requests, errors,
+        )
+        posted = iter(
+            await self.repository.post_transactions(transactions)
+            if transactions else [],
         )
-        create_transaction_task = asyncio.create_task(
-            self.repository.create_transaction(transaction),
+        await self._invalidate_cache(
+            {transaction.username for transaction in transactions},
         )
-        await update_user_task
-        return await create_transaction_task
+        return [
+            TransactionResult(
+                status_code=status.HTTP_403_FORBIDDEN, detail=errors[index],
+            ) if index in errors else next(posted)
+            for index in range(len(transaction_requests))
+        ]
 
     async def create_transaction_report(
         self,
@@ -179,7 +326,7 @@ class TransactionService:
 
         if self.cache:
             report = await self._create_transaction_report_with_cache(
-                report_request,
+                report_request, self.cache,
             )
         else:
             report = await self._create_transaction_report_without_cache(
@@ -187,24 +334,337 @@ class TransactionService:
             )
         return report
 
+    async def get_transaction_report_body(
+        self,
+        report_request: TransactionReportRequest,
+    ) -> ReportBody:
+        """
+        Метод получения отчета в виде готового тела ответа.
+
+        При попадании в кэш тело ответа возвращается как хранится,
+        без разбора и повторной сериализации отчета.
+
+        :param report_request: Запрос отчета
+        :type report_request: TransactionReportRequest
+        :return: отчет о транзакциях, сериализованный в JSON
+        :rtype: ReportBody
+        """
+        self.validator.validate_time_period(
+            report_request.start_date, report_request.end_date,
+        )
+        if self.cache is None:
+            report = await self._create_transaction_report_without_cache(
+                report_request,
+            )
+            return ReportBody(report.model_dump_json().encode())
+        version = await self.cache.get_user_version(report_request.username)
+        try:
+            return await self.cache.get_report_body(report_request, version)
+        except KeyError:
+            report = await self._save_cached_report(
+                report_request, self.cache, version,
+            )
+        payload = report.model_dump_json().encode()
+        await self.cache.create_report_body(report_request, payload, version)
+        return ReportBody(payload)
+
+    async def stream_transaction_report(
+        self, report_request: TransactionReportRequest,
+    ) -> AsyncIterator[Transaction]:
+        """
+        Метод потокового отчета о транзакциях пользователя.
+
+        Проверяет запрос до начала потока, чтобы ошибки возвращались
+        кодом ответа. Отчет не сохраняется и не кэшируется.
+
+        :param report_request: Запрос отчета
+        :type report_request: TransactionReportRequest
+        :return: транзакции пользователя за период
+        :rtype: AsyncIterator[Transaction]
+        """
+        self.validator.validate_time_period(
+            report_request.start_date, report_request.end_date,
+        )
+        await self._check_user_exists(report_request.username)
+        return self.repository.stream_transactions(report_request)
+
+    async def get_transaction_history(
+        self, history_request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Метод получения страницы истории транзакций пользователя.
+
+        Первая страница всегда читается из хранилища, так как меняется
+        с каждой новой транзакцией. Следующие страницы неизменны
+        и кэшируются по токену продолжения.
+
+        :param history_request: Запрос страницы истории
+        :type history_request: TransactionHistoryRequest
+        :return: страница истории транзакций
+        :rtype: TransactionHistoryPage
+        """
+        self.validator.validate_page_size(history_request.page_size)
+        if history_request.cursor is None:
+            return await self._get_first_history_page(history_request)
+        decode_cursor(history_request.cursor)
+        if self.cache is None:
+            return await self.repository.get_transaction_history(
+                history_request,
+            )
+        return await self._get_history_page_with_cache(
+            history_request, self.cache,
+        )
+
+    async def get_transaction_summary(
+        self, summary_request: TransactionSummaryRequest,
+    ) -> TransactionSummary:
+        """
+        Метод получения сводки по транзакциям пользователя за период.
+
+        Сводка считается по дневным итогам хранилища, без чтения
+        отдельных транзакций.
+
+        :param summary_request: Запрос сводки
+        :type summary_request: TransactionSummaryRequest
+        :return: итоги пополнений и списаний за период
+        :rtype: TransactionSummary
+        """
+        self.validator.validate_time_period(
+            summary_request.start_date, summary_request.end_date,
+        )
+        await self._check_user_exists(summary_request.username)
+        return await self.repository.get_transaction_summary(summary_request)
+
+    async def create_aggregate_report(
+        self, aggregate_request: TransactionAggregateRequest,
+    ) -> TransactionAggregateReport:
+        """
+        Метод создания агрегированного отчета о транзакциях пользователя.
+
+        Агрегаты считаются хранилищем, отчет не сохраняется
+        и не кэшируется.
+
+        :param aggregate_request: Запрос агрегированного отчета
+        :type aggregate_request: TransactionAggregateRequest
+        :return: агрегаты транзакций за период и по интервалам
+        :rtype: TransactionAggregateReport
+        """
+        self.validator.validate_time_period(
+            aggregate_request.start_date, aggregate_request.end_date,
+        )
+        await self._check_user_exists(aggregate_request.username)
+        return await self.repository.create_aggregate_report(
+            aggregate_request,
+        )
+
     async def _create_transaction_report_with_cache(
+        self, request: TransactionReportRequest, cache: Cache,
+    ) -> TransactionReport:
+        # Версия читается до хранилища: кэш не сохранит сегменты,
+        # в которые не попала параллельная транзакция.
+        version = await cache.get_user_version(request.username)
+        return await self._save_cached_report(request, cache, version)
+
+    async def _save_cached_report(
+        self,
+        request: TransactionReportRequest,
+        cache: Cache,
+        version: CacheVersion,
+    ) -> TransactionReport:
+        # Отчет из сегментов сохраняется так же, как отчет хранилища.
+        # Одинаковые одновременные запросы сохраняют один отчет.
+        key = (request.username, request.start_date, request.end_date, version)
+        return await self.flights.run(
+            key, partial(self._assemble_and_save, request, cache, version),
+        )
+
+    async def _assemble_and_save(
+        self,
+        request: TransactionReportRequest,
+        cache: Cache,
+        version: CacheVersion,
+    ) -> TransactionReport:
+        report = await self._assemble_report(request, cache, version)
+        return await self.repository.save_transaction_report(report)
+
+    async def _assemble_report(
+        self,
+        request: TransactionReportRequest,
+        cache: Cache,
+        version: CacheVersion,
+    ) -> TransactionReport:
+        if count_days(request) > self.segment_days:
+            # Сегменты заняли бы в кэше ключ на каждый день периода.
+            return await self._read_report(request)
+        # Из хранилища читаются только дни, которых нет в кэше.
+        segments = await cache.get_segments(request, version)
+        periods = get_missing_periods(request, segments)
+        if periods:
+            # Одновременные промахи по тем же дням читают хранилище
+            # один раз. Версия входит в ключ: отчет, запрошенный после
+            # транзакции, не получит дни, прочитанные до нее.
+            key = (request.username, get_period_key(periods), version)
+            read_days = partial(self._read_days, periods, cache, version)
+            segments.update(await self.flights.run(key, read_days))
+        return assemble_report(request, segments)
+
+    async def _read_days(
+        self,
+        periods: list[TransactionReportRequest],
+        cache: Cache,
+        version: CacheVersion,
+    ) -> Segments:
+        # Одинаковые промахи в разных процессах читают хранилище один
+        # раз: дни читает процесс, взявший аренду их периода.
+        span = get_span(periods)
+        token = await cache.acquire_lease(span, version)
+        if token is None:
+            return await self._wait_for_days(span, cache, version)
+        try:  # noqa: WPS501 the lease is returned on errors too
+            return await self._cache_periods(periods, cache, version, token)
+        finally:
+            await cache.release_lease(span, version, token)
+
+    async def _cache_periods(
+        self,
+        periods: list[TransactionReportRequest],
+        cache: Cache,
+        version: CacheVersion,
+        token: int,
+    ) -> Segments:
+        missing = await self._read_periods(periods)
+        await cache.create_segments(
+            periods[0].username, missing, version, token,
+        )
+        return missing
+
+    async def _wait_for_days(
+        self,
+        span: TransactionReportRequest,
+        cache: Cache,
+        version: CacheVersion,
+    ) -> Segments:
+        await cache.wait_lease(span, version)
+        segments = await cache.get_segments(span, version)
+        periods = get_missing_periods(span, segments)
+        if periods:
+            # Владелец аренды не записал сегменты до таймаута или
+            # завершился ошибкой: дни читаются без кэширования, чтобы
+            # не перезаписать результат следующего владельца.
+            segments.update(await self._read_periods(periods))
+        return segments
+
+    async def _read_report(
         self, request: TransactionReportRequest,
     ) -> TransactionReport:
-        report = None
-        if self.cache:
-            try:
-                report = await self.cache.get_cache(request)
-            except KeyError:
-                report = await self.repository.create_transaction_report(
+        await self._check_user_exists(request.username)
+        return TransactionReport(
+            username=request.username,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            transactions=[
+                transaction
+                async for transaction in self.repository.stream_transactions(
                     request,
                 )
-                await self.cache.create_cache(report)
-        if report:
-            return report
-        logger.error('ошибка хранилища данных')
-        raise RepositoryError(detail='ошибка хранилища данных')
+            ],
+            report_id=None,
+        )
+
+    async def _read_periods(
+        self, periods: list[TransactionReportRequest],
+    ) -> Segments:
+        await self._check_user_exists(periods[0].username)
+        return split_by_day(periods, [
+            transaction
+            for period in periods
+            async for transaction in self.repository.stream_transactions(
+                period,
+            )
+        ])
 
     async def _create_transaction_report_without_cache(
         self, request: TransactionReportRequest,
     ) -> TransactionReport:
-        return await self.repository.create_transaction_report(request)
+        # Одинаковые одновременные запросы сохраняют один отчет.
+        key = (request.username, request.start_date, request.end_date)
+        create_report = partial(
+            self.repository.create_transaction_report, request,
+        )
+        return await self.flights.run(key, create_report)
+
+    async def _append_to_cache(self, transaction: Transaction) -> None:
+        if self.cache is None:
+            return
+        try:
+            await self.cache.append_transaction(transaction)
+        except ServerError:
+            logger.error(f'{transaction} is not appended to cache')
+            await self._invalidate_cache({transaction.username})
+
+    async def _invalidate_cache(self, usernames: set[str]) -> None:
+        if self.cache is None:
+            return
+        for username in usernames:
+            try:
+                await self.cache.invalidate_user(username)
+            except ServerError:
+                # Транзакция уже проведена: отчеты устареют по TTL.
+                logger.error(f'cache of {username} is not invalidated')
+
+    def _get_batch_transactions(
+        self,
+        transaction_requests: list[TransactionRequest],
+        errors: dict[int, str],
+    ) -> list[Transaction]:
+        timestamp = datetime.now()
+        return [
+            Transaction(
+                username=transaction_request.username,
+                amount=transaction_request.amount,
+                transaction_type=transaction_request.transaction_type,
+                timestamp=timestamp,
+            )
+            for index, transaction_request in enumerate(transaction_requests)
+            if index not in errors
+        ]
+
+    async def _get_first_history_page(
+        self, history_request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        page = await self.repository.get_transaction_history(history_request)
+        if not page.transactions:
+            await self._check_user_exists(history_request.username)
+        return page
+
+    async def _get_history_page_with_cache(
+        self, history_request: TransactionHistoryRequest, cache: Cache,
+    ) -> TransactionHistoryPage:
+        try:
+            return await cache.get_history_cache(history_request)
+        except KeyError:
+            page = await self.repository.get_transaction_history(
+                history_request,
+            )
+        await cache.create_history_cache(history_request, page)
+        return page
+
+    async def _check_user_exists(self, username: str) -> None:
+        user = await self._get_user(username)
+        if user is None:
+            logger.warning(f'{username} is not found')
+            raise NotFoundError(detail=f'Пользователь {username} не найден')
+
+    async def _get_user(self, username: str) -> User | None:
+        if self.cache is None:
+            return await self.repository.get_user(username)
+        try:
+            return await self.cache.get_user_cache(username)
+        except KeyError:
+            # Версия читается до хранилища: кэш не сохранит пользователя,
+            # баланс которого изменила параллельная транзакция.
+            version = await self.cache.get_user_version(username)
+        user = await self.repository.get_user(username)
+        if user is not None:
+            await self.cache.create_user_cache(user, version)
+        return user
@@ -1,31 +1,99 @@
+import bisect
 import logging
+from collections.abc import AsyncIterator
+from datetime import date, datetime
 
-from app.core.models import (
+from app.core.errors import NotFoundError
+from app.core.models import (  # noqa: WPS235 repository uses all models
     Transaction,
+    TransactionAggregate,
+    TransactionAggregateReport,
+    TransactionAggregateRequest,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
     TransactionReport,
     TransactionReportRequest,
+    TransactionResult,
+    TransactionSummary,
+    TransactionSummaryRequest,
     User,
 )
+from app.core.pagination import decode_cursor, get_history_page
+from app.core.transactions import apply_transactions
 
 logger = logging.getLogger(__name__)
 
 
-class InMemoryRepository:
+class InMemoryRepository:  # noqa: WPS214 repository protocol methods
     """
     Имплементация хранилища данных в оперативной памяти.
 
     Сохраняет данные только на время работы программы.
-    Для хранения данных использует списки python.
+    Пользователи хранятся в словаре по имени, транзакции каждого
+    пользователя - в списке, отсортированном по (timestamp, id).
+    Пользователь находится за O(1), транзакции периода и страница
+    истории - двоичным поиском за O(log n + k), где n - число
+    транзакций пользователя, k - число найденных.
     """
 
     def __init__(self) -> None:
         """Функция инициализации."""
-        self.transactions: list[Transaction] = []
         self.transactions_count: int = 0
         self.reports: list[TransactionReport] = []
         self.reports_count: int = 0
-        self.users: list[User] = []
         self.users_count: int = 0
+        self._transactions: list[Transaction] = []
+        self._history: dict[str, list[Transaction]] = {}
+        self._users: dict[str, User] = {}
+
+    @property
+    def transactions(self) -> list[Transaction]:
+        """
+        Возвращает все транзакции в порядке создания.
+
+        Список нельзя изменять на месте: индекс транзакций
+        пользователей перестраивается только при присваивании.
+
+        :return: транзакции всех пользователей.
+        :rtype: list[Transaction]
+        """
+        return self._transactions
+
+    @transactions.setter
+    def transactions(self, transactions: list[Transaction]) -> None:
+        """
+        Заменяет все транзакции и перестраивает их индекс.
+
+        :param transactions: транзакции всех пользователей.
+        :type transactions: list[Transaction]
+        """
+        self._transactions = list(transactions)
+        self._history = {}
+        ordered = sorted(self._transactions, key=self._get_history_key)
+        for transaction in ordered:
+            self._history.setdefault(transaction.username, []).append(
+                transaction,
+            )
+
+    @property
+    def users(self) -> list[User]:
+        """
+        Возвращает всех пользователей.
+
+        :return: пользователи в порядке создания.
+        :rtype: list[User]
+        """
+        return list(self._users.values())
+
+    @users.setter
+    def users(self, users: list[User]) -> None:
+        """
+        Заменяет всех пользователей.
+
+        :param users: пользователи.
+        :type users: list[User]
+        """
+        self._users = {user.username: user for user in users}
 
     async def create_transaction(self, transaction: Transaction) -> Transaction:
         """
@@ -40,19 +108,55 @@ class InMemoryRepository:
         :return: индексированная запись о транзакции.
         :rtype: Transaction
         """
-        indexed_transaction = Transaction(
-            username=transaction.username,
-            amount=transaction.amount,
-            transaction_type=transaction.transaction_type,
-            timestamp=transaction.timestamp,
-            transaction_id=self.transactions_count,
-        )
+        return self._add_transaction(transaction)
 
-        self.transactions.append(indexed_transaction)
-        self.transactions_count += 1
-        logger.info(f'created {transaction}')
+    async def post_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Проводит транзакцию: изменяет баланс и создает запись о транзакции.
 
-        return indexed_transaction
+        :param transaction: Неиндексированный объект Transaction.
+        :type transaction: Transaction
+        :return: индексированная запись о транзакции.
+        :rtype: Transaction
+        :raises NotFoundError: Если пользователь не найден.
+        """
+        user = await self.get_user(transaction.username)
+        if user is None:
+            logger.warning(f'{transaction.username} is not found')
+            raise NotFoundError(
+                detail=f'Пользователь {transaction.username} не найден',
+            )
+        user.validate_transaction(transaction)
+        user.process_transaction(transaction)
+        self._put_user(user)
+        return self._add_transaction(transaction)
+
+    async def post_transactions(
+        self, transactions: list[Transaction],
+    ) -> list[TransactionResult]:
+        """
+        Проводит пакет транзакций.
+
+        :param transactions: Неиндексированные объекты Transaction.
+        :type transactions: list[Transaction]
+        :return: результаты транзакций в порядке пакета.
+        :rtype: list[TransactionResult]
+        """
+        usernames = {transaction.username for transaction in transactions}
+        users = {
+            username: self._users[username]
+            for username in usernames
+            if username in self._users
+        }
+        outcomes = apply_transactions(users, transactions)
+        for user in users.values():
+            self._put_user(user)
+        for outcome in outcomes:
+            if outcome.transaction is not None:
+                outcome.transaction = self._add_transaction(
+                    outcome.transaction,
+                )
+        return outcomes
 
     async def create_transaction_report(
         self, request: TransactionReportRequest,
@@ -69,27 +173,140 @@ class InMemoryRepository:
         :return: отчет о транзакциях пользователя
         :rtype: TransactionReport
         """
-        filtered_transactions = [
-            in_transaction for in_transaction in self.transactions if (
-                in_transaction.username == request.username and
-                request.start_date.date() <=
-                in_transaction.timestamp.date() <=
-                request.end_date.date()
+        filtered_transactions = self._get_period(
+            request.username,
+            request.start_date.date(),
+            request.end_date.date(),
+        )
+
+        return await self.save_transaction_report(
+            TransactionReport(
+                report_id=None,
+                username=request.username,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                transactions=filtered_transactions,
+            ),
+        )
+
+    async def save_transaction_report(
+        self, report: TransactionReport,
+    ) -> TransactionReport:
+        """
+        Сохраняет собранный отчет в список отчетов.
+
+        :param report: Собранный отчет о транзакциях.
+        :type report: TransactionReport
+        :return: отчет с ID сохраненного отчета
+        :rtype: TransactionReport
+        """
+        report.report_id = self.reports_count
+        self.reports_count += 1
+        self.reports.append(report)
+        logger.info(f'created{report}')
+
+        return report
+
+    async def stream_transactions(
+        self, request: TransactionReportRequest,
+    ) -> AsyncIterator[Transaction]:
+        """
+        Возвращает транзакции пользователя за период по одной.
+
+        :param request: Запрос отчета
+        :type request: TransactionReportRequest
+        :yield: транзакции пользователя за период
+        """
+        filtered_transactions = self._get_period(
+            request.username,
+            request.start_date.date(),
+            request.end_date.date(),
+        )
+        for in_transaction in filtered_transactions:
+            yield in_transaction
+
+    async def get_transaction_history(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Возвращает страницу истории транзакций пользователя.
+
+        :param request: Запрос страницы истории
+        :type request: TransactionHistoryRequest
+        :return: страница истории транзакций от новых к старым
+        :rtype: TransactionHistoryPage
+        """
+        history = self._history.get(request.username, [])
+        end = len(history)
+        if request.cursor is not None:
+            end = bisect.bisect_left(
+                history,
+                decode_cursor(request.cursor),
+                key=self._get_history_key,
             )
-        ]
+        start = max(end - request.page_size - 1, 0)
+        return get_history_page(
+            request.username,
+            list(reversed(history[start:end])),
+            request.page_size,
+        )
+
+    async def get_transaction_summary(
+        self, request: TransactionSummaryRequest,
+    ) -> TransactionSummary:
+        """
+        Возвращает сводку по транзакциям пользователя за период.
 
-        report = TransactionReport(
-            report_id=self.reports_count,
+        :param request: Запрос сводки
+        :type request: TransactionSummaryRequest
+        :return: итоги пополнений и списаний за период
+        :rtype: TransactionSummary
+        """
+        summary = TransactionSummary(
             username=request.username,
             start_date=request.start_date,
             end_date=request.end_date,
-            transactions=filtered_transactions,
         )
+        filtered_transactions = self._get_period(
+            request.username, request.start_date, request.end_date,
+        )
+        for in_transaction in filtered_transactions:
+            summary.add_totals(
+                in_transaction.transaction_type, 1, in_transaction.amount,
+            )
+        return summary
 
-        self.reports_count += 1
-        self.reports.append(report)
-        logger.info(f'created{report}')
+    async def create_aggregate_report(
+        self, request: TransactionAggregateRequest,
+    ) -> TransactionAggregateReport:
+        """
+        Создает агрегированный отчет о транзакциях пользователя за период.
 
+        :param request: Запрос агрегированного отчета
+        :type request: TransactionAggregateRequest
+        :return: агрегаты транзакций за период и по интервалам
+        :rtype: TransactionAggregateReport
+        """
+        report = TransactionAggregateReport(
+            username=request.username,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            bucket=request.bucket,
+        )
+        filtered_transactions = self._get_interval(
+            request.username, request.start_date, request.end_date,
+        )
+        for in_transaction in filtered_transactions:
+            report.add_aggregate(
+                request.bucket.truncate(in_transaction.timestamp),
+                in_transaction.transaction_type,
+                TransactionAggregate(
+                    count=1,
+                    amount=in_transaction.amount,
+                    min_amount=in_transaction.amount,
+                    max_amount=in_transaction.amount,
+                ),
+            )
         return report
 
     async def update_user(
@@ -106,16 +323,15 @@ class InMemoryRepository:
         :return: индексированная запись о пользователе.
         :rtype: User
         """
-        user_in_db = await self.get_user(user.username)
+        user_in_db = self._users.get(user.username)
 
         if user_in_db is None:
             user_in_db = await self.create_user(user)
             logger.info(f'Created user {user_in_db}')
             return user_in_db
 
-        user_position = self.users.index(user_in_db)
         user.user_id = user_in_db.user_id
-        self.users[user_position] = user
+        self._put_user(user)
         logger.info(f'Updated {user}')
         return user
 
@@ -137,7 +353,7 @@ class InMemoryRepository:
             is_verified=user.is_verified,
             user_id=self.users_count,
         )
-        self.users.append(indexed_user)
+        self._put_user(indexed_user)
         self.users_count += 1
         logger.info(f'Created user {indexed_user}')
         return indexed_user
@@ -153,15 +369,63 @@ class InMemoryRepository:
         :return: индексированная запись о пользователе.
         :rtype: User
         """
-        try:
-            in_db_user = [
-                member for member in self.users if (
-                    member.username == username
-                )
-            ][0]
-        except IndexError:
+        in_db_user = self._users.get(username)
+        if in_db_user is None:
             logger.warning(f'{username} is not found')
             return None
 
         logger.info(f'got {in_db_user}')
         return in_db_user
+
+    def _add_transaction(self, transaction: Transaction) -> Transaction:
+        indexed_transaction = Transaction(
+            username=transaction.username,
+            amount=transaction.amount,
+            transaction_type=transaction.transaction_type,
+            timestamp=transaction.timestamp,
+            transaction_id=self.transactions_count,
+        )
+
+        self._transactions.append(indexed_transaction)
+        # Транзакции обычно приходят по порядку и вставляются в конец.
+        bisect.insort(
+            self._history.setdefault(transaction.username, []),
+            indexed_transaction,
+            key=self._get_history_key,
+        )
+        self.transactions_count += 1
+        logger.info(f'created {transaction}')
+
+        return indexed_transaction
+
+    def _put_user(self, user: User) -> None:
+        self._users[user.username] = user
+
+    def _get_period(
+        self, username: str, start_date: date, end_date: date,
+    ) -> list[Transaction]:
+        history = self._history.get(username, [])
+        start = bisect.bisect_left(history, start_date, key=self._get_day)
+        end = bisect.bisect_right(history, end_date, key=self._get_day)
+        return history[start:end]
+
+    def _get_interval(
+        self, username: str, start_date: datetime, end_date: datetime,
+    ) -> list[Transaction]:
+        history = self._history.get(username, [])
+        start = bisect.bisect_left(
+            history, start_date, key=self._get_timestamp,
+        )
+        end = bisect.bisect_right(history, end_date, key=self._get_timestamp)
+        return history[start:end]
+
+    def _get_timestamp(self, transaction: Transaction) -> datetime:
+        return transaction.timestamp
+
+    def _get_day(self, transaction: Transaction) -> date:
+        return transaction.timestamp.date()
+
+    def _get_history_key(
+        self, transaction: Transaction,
+    ) -> tuple[datetime, int]:
+        return transaction.timestamp, transaction.transaction_id or 0
@@ -0,0 +1 @@
+"""Пакет встроенного хранилища с журналом на диске."""
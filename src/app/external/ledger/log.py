@@ -0,0 +1,202 @@
+"""
+Журнал записей хранилища.
+
+Журнал разбит на сегменты, файл сегмента называется по номеру
+его первой записи. Новый сегмент начинается при создании снимка,
+после чего сегменты, вошедшие в снимок, удаляются. Каталог журнала
+открывает только один процесс: его занимает блокировка файла.
+"""
+import asyncio
+import fcntl
+import os
+from pathlib import Path
+from typing import BinaryIO
+
+from pydantic import BaseModel
+
+from app.core.errors import ConfigError
+from app.external.ledger.records import RecordKind, encode_record
+from app.metrics.prometheus import ledger_commit_size
+
+segment_prefix = 'ledger-'
+segment_suffix = '.log'
+lock_name = 'ledger.lock'
+
+
+def lock_directory(directory: Path) -> BinaryIO:
+    """
+    Занимает каталог журнала для текущего процесса.
+
+    Блокировка снимается закрытием возвращенного файла или
+    завершением процесса.
+
+    :param directory: Каталог журнала.
+    :type directory: Path
+    :return: Файл блокировки.
+    :rtype: BinaryIO
+    :raises ConfigError: Если каталог занят другим процессом.
+    """
+    lock_file = (directory / lock_name).open('ab')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError as exc:
+        lock_file.close()
+        raise ConfigError(
+            detail=f'Каталог журнала {directory} занят другим процессом',
+        ) from exc
+    return lock_file
+
+
+def open_segment(directory: Path, lsn: int) -> BinaryIO:
+    """
+    Открывает для дописывания сегмент журнала, начинающийся с записи lsn.
+
+    :param directory: Каталог журнала.
+    :type directory: Path
+    :param lsn: Номер первой записи сегмента.
+    :type lsn: int
+    :return: Файл сегмента.
+    :rtype: BinaryIO
+    """
+    segment = directory / f'{segment_prefix}{lsn:020d}{segment_suffix}'
+    segment_file = segment.open('ab')
+    sync_directory(directory)
+    return segment_file
+
+
+def get_segment_lsn(segment: Path) -> int:
+    """
+    Получает номер первой записи сегмента по имени файла.
+
+    :param segment: Путь к сегменту журнала.
+    :type segment: Path
+    :return: Номер первой записи сегмента.
+    :rtype: int
+    """
+    return int(segment.stem.removeprefix(segment_prefix))
+
+
+def get_segments(directory: Path) -> list[Path]:
+    """
+    Получает сегменты журнала в порядке записи.
+
+    :param directory: Каталог журнала.
+    :type directory: Path
+    :return: Пути к сегментам журнала.
+    :rtype: list[Path]
+    """
+    return sorted(directory.glob(f'{segment_prefix}*{segment_suffix}'))
+
+
+def sync_directory(directory: Path) -> None:
+    """
+    Сохраняет на диск создание и переименование файлов каталога.
+
+    :param directory: Каталог.
+    :type directory: Path
+    """
+    descriptor = os.open(directory, os.O_RDONLY)
+    try:  # noqa: WPS501 descriptor is closed even if fsync fails
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
+
+
+class LedgerLog:
+    """
+    Журнал записей хранилища с групповым сохранением на диск.
+
+    Записи дописываются в буфер файла текущего сегмента сразу.
+    Первый ожидающий сохранения запускает группу: через commit_window
+    секунд все записи, накопленные к этому моменту, сохраняются одним
+    fsync. Группы сохраняются по очереди, поэтому подтвержденная запись
+    означает, что сохранены и все записи до нее.
+    """
+
+    def __init__(
+        self, directory: Path, lsn: int, commit_window: float,
+    ) -> None:
+        """
+        Метод инициализации LedgerLog.
+
+        :param directory: Каталог журнала.
+        :type directory: Path
+        :param lsn: Номер последней записи журнала.
+        :type lsn: int
+        :param commit_window: Время ожидания записей группы в секундах.
+        :type commit_window: float
+        """
+        self.directory = directory
+        self.lsn = lsn
+        self.commit_window = commit_window
+        self.records = 0
+        self._segment = open_segment(directory, lsn + 1)
+        self._retired: list[BinaryIO] = []
+        self._group_size = 0
+        self._group: asyncio.Future[None] | None = None
+        self._lock = asyncio.Lock()
+
+    def append(self, kind: RecordKind, model: BaseModel) -> None:
+        """
+        Дописывает запись в текущий сегмент без сохранения на диск.
+
+        :param kind: Тип записи.
+        :type kind: RecordKind
+        :param model: Модель записи.
+        :type model: BaseModel
+        """
+        self.lsn += 1
+        self.records += 1
+        self._group_size += 1
+        self._segment.write(encode_record(self.lsn, kind, model))
+
+    async def commit(self) -> None:
+        """Ожидает сохранения на диск всех дописанных записей."""
+        if self._group is None:
+            self._group = asyncio.ensure_future(self._sync())
+        await asyncio.shield(self._group)
+
+    def rotate(self) -> int:
+        """
+        Начинает новый сегмент журнала.
+
+        Предыдущий сегмент закрывается после сохранения его записей.
+
+        :return: Номер последней записи предыдущих сегментов.
+        :rtype: int
+        """
+        self._retired.append(self._segment)
+        self._segment = open_segment(self.directory, self.lsn + 1)
+        self.records = 0
+        return self.lsn
+
+    def remove_segments(self, lsn: int) -> None:
+        """
+        Удаляет сегменты, все записи которых вошли в снимок.
+
+        :param lsn: Номер последней записи журнала, вошедшей в снимок.
+        :type lsn: int
+        """
+        for segment in get_segments(self.directory):
+            if get_segment_lsn(segment) <= lsn:
+                segment.unlink()
+
+    async def close(self) -> None:
+        """Сохраняет дописанные записи и закрывает журнал."""
+        await self.commit()
+        self._segment.close()
+
+    async def _sync(self) -> None:
+        await asyncio.sleep(self.commit_window)
+        self._group = None
+        async with self._lock:
+            segments = [*self._retired, self._segment]
+            self._retired = []
+            ledger_commit_size.observe(self._group_size)
+            self._group_size = 0
+            loop = asyncio.get_running_loop()
+            for segment in segments:
+                segment.flush()
+                await loop.run_in_executor(None, os.fsync, segment.fileno())
+            for retired in segments[:-1]:
+                retired.close()
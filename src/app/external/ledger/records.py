@@ -0,0 +1,121 @@
+"""
+Формат записей журнала и снимка.
+
+Запись состоит из заголовка с длиной данных, номером и типом записи,
+данных в JSON и crc32 заголовка и данных. Запись, прерванная при
+сбое, не проходит проверку crc32 и не читается.
+"""
+import mmap
+import struct
+import zlib
+from collections.abc import Iterator
+from enum import IntEnum
+from pathlib import Path
+from typing import NamedTuple
+
+from pydantic import BaseModel
+
+record_header = struct.Struct('<IQB')
+record_checksum = struct.Struct('<I')
+
+
+class RecordKind(IntEnum):
+    """
+    Тип записи журнала.
+
+    checkpoint - последняя запись снимка, ее LSN - номер последней
+    записи журнала, вошедшей в снимок.
+    user - пользователь целиком, последняя запись заменяет предыдущие.
+    transaction - созданная транзакция.
+    """
+
+    checkpoint = 0
+    user = 1
+    transaction = 2
+
+
+class LedgerRecord(NamedTuple):
+    """
+    Запись журнала или снимка.
+
+    Attributes:
+        lsn: int - номер записи в журнале, 0 - запись снимка.
+        kind: RecordKind - тип записи.
+        payload: bytes - модель записи в JSON.
+    """
+
+    lsn: int
+    kind: RecordKind
+    payload: bytes
+
+
+class Checkpoint(BaseModel):
+    """Данные записи checkpoint: ее номер хранится в заголовке."""
+
+
+def encode_record(lsn: int, kind: RecordKind, model: BaseModel) -> bytes:
+    """
+    Кодирует запись журнала.
+
+    :param lsn: Номер записи, 0 - запись снимка.
+    :type lsn: int
+    :param kind: Тип записи.
+    :type kind: RecordKind
+    :param model: Модель записи.
+    :type model: BaseModel
+    :return: Закодированная запись.
+    :rtype: bytes
+    """
+    payload = model.model_dump_json().encode()
+    body = record_header.pack(len(payload), lsn, kind) + payload
+    return body + record_checksum.pack(zlib.crc32(body))
+
+
+def decode_records(buffer: bytes) -> Iterator[tuple[int, LedgerRecord]]:
+    """
+    Читает записи до конца буфера или до первой поврежденной записи.
+
+    :param buffer: Содержимое файла журнала или снимка.
+    :type buffer: bytes
+    :yield: Смещение конца записи и запись.
+    """
+    offset = 0
+    record = _decode_record(buffer, offset)
+    while record is not None:
+        offset += (
+            record_header.size + len(record.payload) + record_checksum.size
+        )
+        yield offset, record
+        record = _decode_record(buffer, offset)
+
+
+def read_records(path: Path) -> Iterator[tuple[int, LedgerRecord]]:
+    """
+    Читает записи файла, отображенного в память.
+
+    :param path: Путь к файлу журнала или снимка.
+    :type path: Path
+    :yield: Смещение конца записи и запись.
+    """
+    if not path.stat().st_size:
+        return
+    with path.open('rb') as ledger_file:
+        with mmap.mmap(
+            ledger_file.fileno(), 0, access=mmap.ACCESS_READ,
+        ) as buffer:
+            yield from decode_records(buffer)  # type: ignore[arg-type]
+
+
+def _decode_record(buffer: bytes, offset: int) -> LedgerRecord | None:
+    if offset + record_header.size > len(buffer):
+        return None
+    length, lsn, kind = record_header.unpack_from(buffer, offset)
+    end = offset + record_header.size + length
+    if end + record_checksum.size > len(buffer):
+        return None
+    checksum = record_checksum.unpack_from(buffer, end)[0]
+    if checksum != zlib.crc32(buffer[offset:end]):
+        return None
+    return LedgerRecord(
+        lsn, RecordKind(kind), bytes(buffer[offset + record_header.size:end]),
+    )
@@ -0,0 +1,302 @@
+"""
+Встроенное хранилище с журналом на диске.
+
+Изменения хранилища в памяти дописываются в журнал. Записи,
+накопленные за commit_window секунд, сохраняются на диск одним fsync,
+и изменяющий вызов завершается только после сохранения своих записей.
+Когда в текущем сегменте журнала набирается snapshot_interval записей,
+состояние сохраняется в снимок, а сегменты до снимка удаляются.
+При запуске читается снимок и записи журнала после него.
+"""
+import asyncio
+import logging
+import os
+from pathlib import Path
+
+from app.core.models import Transaction, TransactionResult, User
+from app.external.in_memory_repository import InMemoryRepository
+from app.external.ledger.log import (
+    LedgerLog,
+    get_segments,
+    lock_directory,
+    sync_directory,
+)
+from app.external.ledger.records import (
+    Checkpoint,
+    LedgerRecord,
+    RecordKind,
+    encode_record,
+    read_records,
+)
+
+logger = logging.getLogger(__name__)
+
+snapshot_name = 'snapshot.ledger'
+
+
+def write_snapshot(
+    directory: Path,
+    lsn: int,
+    users: list[User],
+    transactions: list[Transaction],
+) -> None:
+    """
+    Записывает снимок состояния и заменяет им предыдущий.
+
+    :param directory: Каталог журнала.
+    :type directory: Path
+    :param lsn: Номер последней записи журнала, вошедшей в снимок.
+    :type lsn: int
+    :param users: Пользователи.
+    :type users: list[User]
+    :param transactions: Транзакции.
+    :type transactions: list[Transaction]
+    """
+    temporary = directory / f'{snapshot_name}.tmp'
+    with temporary.open('wb') as snapshot:
+        for user in users:
+            snapshot.write(encode_record(0, RecordKind.user, user))
+        for transaction in transactions:
+            snapshot.write(
+                encode_record(0, RecordKind.transaction, transaction),
+            )
+        snapshot.write(
+            encode_record(lsn, RecordKind.checkpoint, Checkpoint()),
+        )
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    temporary.replace(directory / snapshot_name)
+    sync_directory(directory)
+
+
+class LedgerState:
+    """Состояние хранилища, восстановленное из снимка и журнала."""
+
+    def __init__(self) -> None:
+        """Метод инициализации LedgerState."""
+        self.lsn = 0
+        self.users: dict[str, User] = {}
+        self.transactions: list[Transaction] = []
+
+    def recover(self, directory: Path) -> None:
+        """
+        Читает снимок и записи журнала после него.
+
+        Чтение журнала останавливается на первой поврежденной записи:
+        ни одна запись после нее не была подтверждена, поэтому
+        сегмент обрезается по ней, а следующие сегменты удаляются.
+
+        :param directory: Каталог журнала.
+        :type directory: Path
+        """
+        snapshot = directory / snapshot_name
+        if snapshot.exists():
+            self._read(snapshot)
+        segments = get_segments(directory)
+        while segments:
+            if not self._read_segment(segments.pop(0)):
+                for segment in segments:
+                    segment.unlink()
+                return
+
+    def apply(self, record: LedgerRecord) -> None:
+        """
+        Применяет запись, если она новее прочитанных.
+
+        :param record: Запись журнала или снимка.
+        :type record: LedgerRecord
+        """
+        if record.lsn and record.lsn <= self.lsn:
+            return
+        if record.kind == RecordKind.user:
+            user = User.model_validate_json(record.payload)
+            self.users[user.username] = user
+        elif record.kind == RecordKind.transaction:
+            self.transactions.append(
+                Transaction.model_validate_json(record.payload),
+            )
+        self.lsn = max(self.lsn, record.lsn)
+
+    def _read(self, path: Path) -> int:
+        valid_size = 0
+        for record_end, record in read_records(path):
+            self.apply(record)
+            valid_size = record_end
+        return valid_size
+
+    def _read_segment(self, segment: Path) -> bool:
+        valid_size = self._read(segment)
+        if valid_size == segment.stat().st_size:
+            return True
+        logger.warning(f'{segment} is damaged, truncated to {valid_size}')
+        os.truncate(segment, valid_size)
+        return False
+
+
+class LedgerRepository(InMemoryRepository):  # noqa: WPS214, E501 repository protocol methods
+    """
+    Хранилище в памяти, сохраняющее изменения в журнал на диске.
+
+    Пользователи и транзакции переживают перезапуск сервиса, отчеты
+    не сохраняются. Изменяющие вызовы завершаются после сохранения их
+    записей, чтения видят изменения сразу, до сохранения на диск.
+    Присваивание transactions и users в журнал не записывается.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        commit_window: float,
+        snapshot_interval: int,
+    ) -> None:
+        """
+        Метод инициализации LedgerRepository.
+
+        Занимает каталог журнала и восстанавливает состояние из снимка
+        и журнала каталога. Если каталог занят другим процессом,
+        выбрасывает ConfigError.
+
+        :param directory: Каталог журнала.
+        :type directory: Path
+        :param commit_window: Время ожидания записей группы в секундах.
+        :type commit_window: float
+        :param snapshot_interval: Число записей сегмента, после которого
+            создается снимок.
+        :type snapshot_interval: int
+        """
+        super().__init__()
+        directory.mkdir(parents=True, exist_ok=True)
+        self._lock_file = lock_directory(directory)
+        state = LedgerState()
+        state.recover(directory)
+        self.users = list(state.users.values())
+        self.users_count = len(state.users)
+        self.transactions = state.transactions
+        self.transactions_count = len(state.transactions)
+        self.log = LedgerLog(directory, state.lsn, commit_window)
+        self._directory = directory
+        self._snapshot_interval = snapshot_interval
+        self._snapshot: asyncio.Future[None] | None = None
+        logger.info(f'recovered ledger {directory} at {state.lsn}')
+
+    async def create_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Создает запись о транзакции и сохраняет ее в журнал.
+
+        :param transaction: Неиндексированный объект Transaction.
+        :type transaction: Transaction
+        :return: индексированная запись о транзакции.
+        :rtype: Transaction
+        """
+        indexed_transaction = await super().create_transaction(transaction)
+        await self._commit()
+        return indexed_transaction
+
+    async def post_transaction(self, transaction: Transaction) -> Transaction:
+        """
+        Проводит транзакцию и сохраняет ее и баланс в журнал.
+
+        :param transaction: Неиндексированный объект Transaction.
+        :type transaction: Transaction
+        :return: индексированная запись о транзакции.
+        :rtype: Transaction
+        """
+        indexed_transaction = await super().post_transaction(transaction)
+        await self._commit()
+        return indexed_transaction
+
+    async def post_transactions(
+        self, transactions: list[Transaction],
+    ) -> list[TransactionResult]:
+        """
+        Проводит пакет транзакций и сохраняет его в журнал.
+
+        :param transactions: Неиндексированные объекты Transaction.
+        :type transactions: list[Transaction]
+        :return: результаты транзакций в порядке пакета.
+        :rtype: list[TransactionResult]
+        """
+        outcomes = await super().post_transactions(transactions)
+        await self._commit()
+        return outcomes
+
+    async def update_user(self, user: User) -> User | None:
+        """
+        Создает или обновляет пользователя и сохраняет его в журнал.
+
+        :param user: Пользователь
+        :type user: User
+        :return: индексированная запись о пользователе.
+        :rtype: User
+        """
+        updated_user = await super().update_user(user)
+        await self._commit()
+        return updated_user
+
+    async def create_user(self, user: User) -> User:
+        """
+        Создает пользователя и сохраняет его в журнал.
+
+        :param user: неиндексированная запись о пользователе.
+        :type user: User
+        :return: индексированная запись о пользователе.
+        :rtype: User
+        """
+        indexed_user = await super().create_user(user)
+        await self._commit()
+        return indexed_user
+
+    async def snapshot(self) -> None:
+        """
+        Сохраняет состояние в снимок и удаляет журнал до него.
+
+        Если снимок уже создается, ожидает его.
+        """
+        await asyncio.shield(self._start_snapshot())
+
+    async def close(self) -> None:
+        """Дожидается снимка и сохранения записей и закрывает журнал."""
+        if self._snapshot is not None:
+            await asyncio.wait([self._snapshot])
+        await self.log.close()
+        self._lock_file.close()
+
+    def _add_transaction(self, transaction: Transaction) -> Transaction:
+        indexed_transaction = super()._add_transaction(transaction)
+        self.log.append(RecordKind.transaction, indexed_transaction)
+        return indexed_transaction
+
+    def _put_user(self, user: User) -> None:
+        super()._put_user(user)
+        self.log.append(RecordKind.user, user)
+
+    async def _commit(self) -> None:
+        await self.log.commit()
+        if self.log.records >= self._snapshot_interval:
+            self._start_snapshot()  # type: ignore[unused-awaitable]
+
+    def _start_snapshot(self) -> asyncio.Future[None]:
+        if self._snapshot is None:
+            self._snapshot = asyncio.ensure_future(self._write_snapshot())
+            self._snapshot.add_done_callback(self._finish_snapshot)
+        return self._snapshot
+
+    async def _write_snapshot(self) -> None:
+        lsn = self.log.rotate()
+        # Пользователи изменяются на месте, транзакции - нет.
+        users = [user.model_copy() for user in self._users.values()]
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            write_snapshot,
+            self._directory,
+            lsn,
+            users,
+            list(self._transactions),
+        )
+        self.log.remove_segments(lsn)
+        logger.info(f'ledger snapshot at {lsn}')
+
+    def _finish_snapshot(self, snapshot: asyncio.Future[None]) -> None:
+        self._snapshot = None
+        if not snapshot.cancelled() and snapshot.exception() is not None:
+            logger.error(f'ledger snapshot failed: {snapshot.exception()}')
@@ -0,0 +1,97 @@
+"""
+Запросы агрегированного отчета о транзакциях.
+
+Агрегаты считаются в базе данных группировкой по интервалу
+date_trunc и типу транзакции, поэтому из базы читается строка
+на интервал и тип, а не на транзакцию.
+"""
+from collections.abc import Sequence
+from datetime import datetime
+
+from sqlalchemy import BigInteger, bindparam, cast, func, not_, select
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.expression import Select
+
+from app.core import models as srv
+from app.external.postgres import models as db
+
+AggregateRow = Row[tuple[datetime, bool, int, int, int, int]]
+
+
+def select_aggregates(
+    request: srv.TransactionAggregateRequest,
+) -> Select[tuple[datetime, bool, int, int, int, int]]:
+    """
+    Создает запрос агрегатов транзакций по интервалу и типу.
+
+    Интервал подставляется в SQL как литерал, чтобы выражение
+    date_trunc в SELECT и GROUP BY совпадало для любого драйвера.
+
+    :param request: Запрос агрегированного отчета
+    :type request: TransactionAggregateRequest
+    :return: Запрос агрегатов, упорядоченных по началу интервала.
+    :rtype: Select
+    """
+    bucket = func.date_trunc(
+        bindparam('bucket', request.bucket.value, literal_execute=True),
+        db.Transaction.created_at,
+    )
+    return select(
+        bucket,
+        db.Transaction.transaction_type,
+        func.count(),
+        cast(func.sum(db.Transaction.amount), BigInteger),
+        func.min(db.Transaction.amount),
+        func.max(db.Transaction.amount),
+    ).join(db.Transaction.user).where(
+        db.User.username == request.username,
+        not_(db.Transaction.is_deleted),
+        db.Transaction.created_at >= request.start_date,
+        db.Transaction.created_at <= request.end_date,
+    ).group_by(
+        bucket, db.Transaction.transaction_type,
+    ).order_by(bucket, db.Transaction.transaction_type)
+
+
+def get_aggregate_report(
+    request: srv.TransactionAggregateRequest, rows: Sequence[AggregateRow],
+) -> srv.TransactionAggregateReport:
+    """
+    Создает агрегированный отчет из строк запроса select_aggregates.
+
+    :param request: Запрос агрегированного отчета
+    :type request: TransactionAggregateRequest
+    :param rows: Агрегаты по интервалу и типу транзакции
+    :type rows: Sequence[AggregateRow]
+    :return: Агрегированный отчет о транзакциях.
+    :rtype: TransactionAggregateReport
+    """
+    report = srv.TransactionAggregateReport(
+        username=request.username,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        bucket=request.bucket,
+    )
+    for row in rows:
+        report.add_aggregate(
+            row[0], srv.TransactionType(row[1]), get_row_aggregate(row),
+        )
+    return report
+
+
+def get_row_aggregate(row: AggregateRow) -> srv.TransactionAggregate:
+    """
+    Получает агрегаты транзакций из строки запроса select_aggregates.
+
+    :param row: Агрегаты интервала и типа транзакции
+    :type row: AggregateRow
+    :return: Агрегаты транзакций.
+    :rtype: TransactionAggregate
+    """
+    count, amount, min_amount, max_amount = row[2:]
+    return srv.TransactionAggregate(
+        count=count,
+        amount=amount,
+        min_amount=min_amount,
+        max_amount=max_amount,
+    )
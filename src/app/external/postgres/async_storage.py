@@ -0,0 +1,510 @@
+import logging
+from collections.abc import AsyncIterator, Sequence
+
+from sqlalchemy import insert, make_url
+from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from app.core import models as srv
+from app.core.config import ReportPersistence, get_settings
+from app.core.errors import NotFoundError, RepositoryError
+from app.core.pagination import get_history_page
+from app.external.postgres import aggregates
+from app.external.postgres import models as db
+from app.external.postgres import queries, rollups
+
+logger = logging.getLogger(__name__)
+
+async_driver = 'postgresql+asyncpg'
+
+
+def create_async_pool() -> AsyncEngine:
+    """
+    Создает асинхронный sqlalchemy engine с пулом соединений.
+
+    Использует адрес базы данных из конфигурации,
+    заменяя драйвер на asyncpg.
+
+    :return: Асинхронный sqlalchemy engine с пулом соединений.
+    :rtype: AsyncEngine
+    """
+    settings = get_settings()
+    url = make_url(str(settings.postgres.pg_dns)).set(drivername=async_driver)
+    return create_async_engine(
+        url,
+        pool_size=settings.postgres.pool_size,
+        max_overflow=settings.postgres.max_overflow,
+    )
+
+
+class AsyncSessionMixin:
+    """Миксин для создания асинхронных сессий базы данных."""
+
+    def __init__(self) -> None:
+        """Метод инициализации AsyncSessionMixin."""
+        self.pool = create_async_pool()
+        self.session_maker = async_sessionmaker(
+            self.pool, expire_on_commit=False,
+        )
+
+    async def close(self) -> None:
+        """Закрывает соединения пула."""
+        await self.pool.dispose()
+
+    async def _get_db_user(
+        self, username: str, session: AsyncSession,
+    ) -> db.User | None:
+        try:
+            return (
+                await session.scalars(queries.select_user(username))
+            ).first()
+        except Exception as err:
+            logger.error(f"repository error can't get {username}")
+            raise RepositoryError(
+                detail=f"can't get {username}",
+            ) from err
+
+    def _get_srv_transaction(
+        self, transaction: db.Transaction, username: str,
+    ) -> srv.Transaction:
+        return srv.Transaction(
+            username=username,
+            transaction_type=queries.get_transaction_type(
+                transaction.transaction_type,
+            ),
+            amount=transaction.amount,
+            timestamp=transaction.created_at,
+            transaction_id=transaction.id,
+        )
+
+
+class AsyncDBTransactionStorage(AsyncSessionMixin):
+    """Асинхронная база данных для работы с транзакциями."""
+
+    async def create_transaction(
+        self, transaction: srv.Transaction,
+    ) -> srv.Transaction:
+        """
+        Метод создания транзакции.
+
+        :param transaction: Объект транзакции бизнес логики.
+        :type transaction: Transaction
+        :return: Объект транзакции созданной в базе данных
+        :rtype: Transaction
+        :raises NotFoundError: Если пользователь не найден в базе данных.
+        :raises RepositoryError: При ошибки записи в базу данных.
+        """
+        async with self.session_maker() as session:
+            user = await self._get_db_user(transaction.username, session)
+            if user is None:
+                logger.error(f'{transaction.username} not found in db')
+                raise NotFoundError(
+                    detail=f'{transaction.username} not found',
+                )
+            db_transaction = db.Transaction(
+                transaction_type=transaction.transaction_type.value,
+                amount=transaction.amount,
+                created_at=transaction.timestamp,
+                is_deleted=False,
+                id_user=user.id,
+            )
+            session.add(db_transaction)
+            try:
+                await self._commit_with_totals(transaction, user.id, session)
+            except Exception as err:
+                logger.error(
+                    f"repository error can't create transaction for {transaction.username}",  # noqa: E501
+                )
+                raise RepositoryError(
+                    detail=f"can't create transaction for {transaction.username}",  # noqa: E501
+                ) from err
+        return self._get_srv_transaction(db_transaction, user.username)
+
+    async def post_transaction(
+        self, transaction: srv.Transaction,
+    ) -> srv.Transaction:
+        """
+        Метод проведения транзакции за один запрос к базе данных.
+
+        Изменяет баланс пользователя с проверкой правила овердрафта
+        и создает запись о транзакции одним запросом.
+
+        :param transaction: Объект транзакции бизнес логики.
+        :type transaction: Transaction
+        :return: Объект транзакции созданной в базе данных
+        :rtype: Transaction
+        :raises RepositoryError: При ошибки записи в базу данных.
+        """
+        async with self.session_maker() as session:
+            try:
+                row = await self._execute_posting(transaction, session)
+            except Exception as err:
+                logger.error(
+                    f"repository error can't post transaction for {transaction.username}",  # noqa: E501
+                )
+                raise RepositoryError(
+                    detail=f"can't post transaction for {transaction.username}",  # noqa: E501
+                ) from err
+        return queries.get_posted_transaction(transaction, row)
+
+    async def post_transactions(
+        self, transactions: list[srv.Transaction],
+    ) -> list[srv.TransactionResult]:
+        """
+        Метод проведения пакета транзакций в одной транзакции базы данных.
+
+        Блокирует пользователей пакета, применяет транзакции по порядку,
+        изменяет баланс каждого пользователя одним UPDATE и записывает
+        проведенные транзакции одним INSERT. Число запросов к базе данных
+        не зависит от размера пакета.
+
+        :param transactions: Объекты транзакций бизнес логики.
+        :type transactions: list[Transaction]
+        :return: Результаты транзакций в порядке пакета.
+        :rtype: list[TransactionResult]
+        :raises RepositoryError: При ошибки записи в базу данных.
+        """
+        async with self.session_maker() as session:
+            try:
+                return await self._execute_batch_posting(
+                    transactions, session,
+                )
+            except Exception as err:
+                logger.error("repository error can't post transactions batch")
+                raise RepositoryError(
+                    detail="can't post transactions batch",
+                ) from err
+
+    async def _commit_with_totals(
+        self, transaction: srv.Transaction, id_user: int, session: AsyncSession,
+    ) -> None:
+        await session.execute(
+            rollups.insert_daily_totals(),
+            rollups.get_transaction_total_rows(transaction, id_user),
+        )
+        await session.commit()
+
+    async def _execute_posting(
+        self, transaction: srv.Transaction, session: AsyncSession,
+    ) -> queries.PostingRow | None:
+        row = (
+            await session.execute(queries.post_transaction(transaction))
+        ).first()
+        await session.commit()
+        return row
+
+    async def _execute_batch_posting(
+        self, transactions: list[srv.Transaction], session: AsyncSession,
+    ) -> list[srv.TransactionResult]:
+        db_users = (await session.scalars(queries.select_users_for_update(
+            {transaction.username for transaction in transactions},
+        ))).all()
+        outcomes, deltas = queries.apply_batch(db_users, transactions)
+        if deltas:
+            await session.execute(queries.update_balances(deltas))
+        rows = queries.get_transaction_rows(
+            outcomes, {db_user.username: db_user.id for db_user in db_users},
+        )
+        transaction_ids: list[int] = []
+        if rows:
+            transaction_ids = list(await session.scalars(
+                queries.insert_transactions(), rows,
+            ))
+            await session.execute(
+                rollups.insert_daily_totals(),
+                rollups.get_daily_total_rows(rows),
+            )
+        await session.commit()
+        return queries.set_transaction_ids(outcomes, transaction_ids)
+
+
+class AsyncDBUserStorage(AsyncSessionMixin):
+    """Асинхронная база данных пользователей."""
+
+    async def get_user(self, username: str) -> srv.User | None:
+        """
+        Получает пользователя из базы данных.
+
+        Читает только поля пользователя, которые нужны сервису.
+
+        :param username: Имя пользователя
+        :type username: str
+        :return: Пользователь в базе данных
+        :rtype: sev.User | None
+        """
+        async with self.session_maker() as session:
+            row = await self._get_user_row(username, session)
+        return None if row is None else queries.get_row_user(row)
+
+    async def update_user(  # type: ignore  # deprecated
+        self, user: srv.User,
+    ) -> srv.User | None:
+        """
+        Создает пользователя в базе данных.
+
+        Создает, сохраняет в базе данных
+        и возвращает индексированную запись о пользователе.
+
+        :param user: Пользователь
+        :type user: User
+        """
+        logger.warning(
+            'DEPRECATED: user balance is updated in post_transaction',
+        )
+
+    async def _get_user_row(
+        self, username: str, session: AsyncSession,
+    ) -> queries.UserRow | None:
+        try:
+            return (
+                await session.execute(queries.select_user_row(username))
+            ).first()
+        except Exception as err:
+            logger.error(f"repository error can't get {username}")
+            raise RepositoryError(
+                detail=f"can't get {username}",
+            ) from err
+
+
+class AsyncDBReportStorage(AsyncSessionMixin):  # noqa: WPS214, E501 repository protocol methods
+    """Асинхронная база данных отчетов."""
+
+    async def create_transaction_report(
+        self,
+        request: srv.TransactionReportRequest,
+    ) -> srv.TransactionReport:
+        """
+        Метод создания отчета.
+
+        Поднимает NotFoundError, если пользователь не найден в базе
+        данных, и RepositoryError при ошибке записи в базу данных.
+
+        :param request: Объект запроса отчета бизнес логики.
+        :type request: TransactionReportRequest
+        :return: Объект отчета созданного в базе данных
+        :rtype: TransactionReport
+        """
+        async with self.session_maker() as session:
+            user = await self._get_report_user(request.username, session)
+            report = self._get_srv_report(
+                request, await self._get_transactions(request, session),
+            )
+            return await self._persist_report(report, user.id, session)
+
+    async def save_transaction_report(
+        self, report: srv.TransactionReport,
+    ) -> srv.TransactionReport:
+        """
+        Сохраняет отчет, собранный без чтения базы данных.
+
+        Отчет сохраняется способом postgres.report_persistence,
+        как и отчет, созданный методом create_transaction_report,
+        с теми же ошибками NotFoundError и RepositoryError.
+
+        :param report: Собранный отчет о транзакциях.
+        :type report: TransactionReport
+        :return: Отчет с ID сохраненного отчета.
+        :rtype: TransactionReport
+        """
+        async with self.session_maker() as session:
+            user = await self._get_report_user(report.username, session)
+            return await self._persist_report(report, user.id, session)
+
+    async def stream_transactions(
+        self, request: srv.TransactionReportRequest,
+    ) -> AsyncIterator[srv.Transaction]:
+        """
+        Потоково читает транзакции пользователя за период отчета.
+
+        Строки читаются серверным курсором частями по postgres.yield_per,
+        поэтому потребление памяти не зависит от размера периода.
+
+        :param request: Объект запроса отчета бизнес логики.
+        :type request: TransactionReportRequest
+        :yield: Транзакции за период в порядке времени создания.
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = queries.select_report_rows(request).execution_options(
+            yield_per=get_settings().postgres.yield_per,
+        )
+        async with self.session_maker() as session:
+            try:
+                rows = await session.stream(stmt)
+            except Exception as err:
+                logger.error("repository error can't stream transactions")
+                raise RepositoryError(
+                    detail="can't stream transactions",
+                ) from err
+            async for row in rows:
+                yield queries.get_row_transaction(row, request.username)
+
+    async def get_transaction_history(
+        self, request: srv.TransactionHistoryRequest,
+    ) -> srv.TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций пользователя.
+
+        Keyset пагинация по (created_at, id): стоимость страницы
+        не зависит от глубины, на которой она находится.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :return: Страница истории транзакций.
+        :rtype: TransactionHistoryPage
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = queries.select_history_rows(request)
+        async with self.session_maker() as session:
+            try:
+                rows = (await session.execute(stmt)).all()
+            except Exception as err:
+                logger.error("repository error can't get history")
+                raise RepositoryError(detail="can't get history") from err
+        return get_history_page(
+            request.username,
+            [
+                queries.get_row_transaction(row, request.username)
+                for row in rows
+            ],
+            request.page_size,
+        )
+
+    async def get_transaction_summary(
+        self, request: srv.TransactionSummaryRequest,
+    ) -> srv.TransactionSummary:
+        """
+        Получает сводку по транзакциям пользователя за период.
+
+        Сводка считается по таблице daily_totals: одна строка
+        на день и тип транзакции, независимо от числа транзакций.
+
+        :param request: Запрос сводки.
+        :type request: TransactionSummaryRequest
+        :return: Итоги пополнений и списаний за период.
+        :rtype: TransactionSummary
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = rollups.select_daily_totals(request)
+        async with self.session_maker() as session:
+            try:
+                rows = (await session.execute(stmt)).all()
+            except Exception as err:
+                logger.error("repository error can't get summary")
+                raise RepositoryError(detail="can't get summary") from err
+        return rollups.get_transaction_summary(request, rows)
+
+    async def create_aggregate_report(
+        self, request: srv.TransactionAggregateRequest,
+    ) -> srv.TransactionAggregateReport:
+        """
+        Создает агрегированный отчет о транзакциях пользователя.
+
+        Агрегаты считаются в базе данных, транзакции периода
+        не передаются в приложение.
+
+        :param request: Запрос агрегированного отчета.
+        :type request: TransactionAggregateRequest
+        :return: Агрегаты транзакций за период и по интервалам.
+        :rtype: TransactionAggregateReport
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = aggregates.select_aggregates(request)
+        async with self.session_maker() as session:
+            try:
+                rows = (await session.execute(stmt)).all()
+            except Exception as err:
+                logger.error("repository error can't get aggregates")
+                raise RepositoryError(detail="can't get aggregates") from err
+        return aggregates.get_aggregate_report(request, rows)
+
+    async def _get_transactions(
+        self, request: srv.TransactionReportRequest, session: AsyncSession,
+    ) -> Sequence[db.Transaction]:
+        stmt = queries.select_report_transactions(request)
+        try:
+            return (await session.scalars(stmt)).all()
+        except Exception as err:
+            logger.error("repository error can't get transactions")
+            raise RepositoryError(
+                detail="can't get transactions",
+            ) from err
+
+    async def _get_report_user(
+        self, username: str, session: AsyncSession,
+    ) -> db.User:
+        user = await self._get_db_user(username, session)
+        if user is None:
+            logger.error(f'{username} not found in db')
+            raise NotFoundError(detail=f'{username} not found')
+        return user
+
+    async def _persist_report(
+        self,
+        report: srv.TransactionReport,
+        id_user: int,
+        session: AsyncSession,
+    ) -> srv.TransactionReport:
+        try:
+            report.report_id = await self._save_report(
+                report, id_user, session,
+            )
+        except Exception as err:
+            logger.error(
+                f"repository error can't create report for {report.username}",
+            )
+            raise RepositoryError(
+                detail=f"can't create report for {report.username}",
+            ) from err
+        return report
+
+    async def _save_report(
+        self,
+        report: srv.TransactionReport,
+        id_user: int,
+        session: AsyncSession,
+    ) -> int | None:
+        persistence = get_settings().postgres.report_persistence
+        if persistence == ReportPersistence.disabled:
+            return None
+        report_id: int = (await session.execute(
+            queries.insert_report(
+                report,
+                id_user,
+                queries.get_max_transaction_id(
+                    persistence, report.transactions,
+                ),
+            ),
+        )).scalar_one()
+        if persistence == ReportPersistence.bulk and report.transactions:
+            await session.execute(
+                insert(db.report_transaction),
+                queries.get_report_links(report_id, report.transactions),
+            )
+        await session.commit()
+        return report_id
+
+    def _get_srv_report(
+        self,
+        request: srv.TransactionReportRequest,
+        transactions: Sequence[db.Transaction],
+    ) -> srv.TransactionReport:
+        return srv.TransactionReport(
+            username=request.username,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            transactions=[
+                self._get_srv_transaction(trn, request.username)
+                for trn in transactions
+            ],
+            report_id=None,
+        )
+
+
+class AsyncDBStorage(
+    AsyncDBTransactionStorage, AsyncDBUserStorage, AsyncDBReportStorage,
+):
+    """Асинхронная база данных на драйвере asyncpg."""
@@ -0,0 +1,48 @@
+"""
+Заполнение дневных итогов по уже записанным транзакциям.
+
+Запуск: python -m app.external.postgres.backfill
+"""
+import logging
+
+from sqlalchemy import Engine, delete, text
+from sqlalchemy.orm import Session
+
+from app.external.postgres import models as db
+from app.external.postgres import rollups
+from app.external.postgres.storage import create_pool
+
+logger = logging.getLogger(__name__)
+
+
+def backfill_daily_totals(pool: Engine) -> int:
+    """
+    Пересчитывает таблицу daily_totals по таблице transactions.
+
+    На время пересчета запись в transactions блокируется, чтобы
+    транзакции, проведенные во время пересчета, не потерялись
+    при перезаписи итогов. Старые итоги удаляются под той же
+    блокировкой, поэтому дни без транзакций не сохраняют итоги.
+
+    :param pool: sqlalchemy engine с пулом соединений.
+    :type pool: Engine
+    :return: Количество записанных строк итогов.
+    :rtype: int
+    """
+    with Session(pool) as session:
+        session.execute(text('LOCK TABLE transactions IN SHARE MODE'))
+        session.execute(delete(db.DailyTotal))
+        rowcount = session.execute(rollups.backfill_daily_totals()).rowcount
+        session.commit()
+    return rowcount
+
+
+def main() -> None:
+    """Точка входа команды заполнения итогов."""
+    logging.basicConfig(level=logging.INFO)
+    rowcount = backfill_daily_totals(create_pool())
+    logger.info(f'daily totals backfilled: {rowcount} rows')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,25 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List
 
-from sqlalchemy import Column, ForeignKey, Integer, String, Table
+from sqlalchemy import (  # noqa: WPS235 models use all schema types
+    DDL,
+    BigInteger,
+    Column,
+    DateTime,
+    ForeignKey,
+    ForeignKeyConstraint,
+    Index,
+    Integer,
+    String,
+    Table,
+    event,
+    text,
+)
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 username_max_len = 200
 hash_max_len = 1000
+default_partition = 'transactions_default'
 
 
 class Base(DeclarativeBase):
@@ -13,13 +27,20 @@ class Base(DeclarativeBase):
 
 
 class User(Base):
-    """Пользователь."""
+    """
+    Пользователь.
+
+    Пароль и вектор пользователя не нужны сервису и загружаются
+    только при обращении к ним.
+    """
 
     __tablename__ = 'users'
 
     id: Mapped[int] = mapped_column(primary_key=True)
     username: Mapped[str] = mapped_column(String(username_max_len), unique=True)
-    hashed_password: Mapped[str] = mapped_column(String(hash_max_len))
+    hashed_password: Mapped[str] = mapped_column(
+        String(hash_max_len), deferred=True,
+    )
     balance: Mapped[int] = mapped_column(default=0)
     is_verified: Mapped[bool] = mapped_column(default=False)
     is_deleted: Mapped[bool] = mapped_column(default=False)
@@ -27,25 +48,70 @@ class User(Base):
         back_populates='user',
     )
     reports: Mapped[List['Report']] = relationship(back_populates='user')
-    vector: Mapped[bytes] = mapped_column(nullable=True)
+    vector: Mapped[bytes] = mapped_column(nullable=True, deferred=True)
 
 
 class Transaction(Base):
-    """Транзакция."""
+    """
+    Транзакция.
+
+    Таблица секционирована по created_at, по секции на месяц,
+    поэтому created_at входит в первичный ключ. Секции создаются
+    заранее командой python -m app.external.postgres.partitions.
+    """
 
     __tablename__ = 'transactions'
+    __table_args__ = (
+        Index(
+            'ix_transactions_id_user_created_at',
+            'id_user',
+            'created_at',
+            'id',
+            postgresql_where=text('NOT is_deleted'),
+        ),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
 
-    id: Mapped[int] = mapped_column(primary_key=True)
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     transaction_type: Mapped[bool]
     amount: Mapped[int]
-    created_at: Mapped[datetime]
+    created_at: Mapped[datetime] = mapped_column(primary_key=True)
     is_deleted: Mapped[bool] = mapped_column(default=False)
     id_user: Mapped[int] = mapped_column(ForeignKey('users.id'))
     user: Mapped['User'] = relationship(back_populates='transactions')
 
 
+event.listen(
+    Transaction.__table__,
+    'after_create',
+    DDL(  # type: ignore[no-untyped-call]
+        f'CREATE TABLE {default_partition} PARTITION OF transactions DEFAULT',
+    ),
+)
+
+
+report_transaction = Table(
+    'report_transaction',
+    Base.metadata,
+    Column('id', Integer, primary_key=True),
+    Column('id_transaction', Integer, index=True),
+    Column('transaction_created_at', DateTime),
+    Column('id_report', Integer, ForeignKey('reports.id'), index=True),
+    ForeignKeyConstraint(
+        ['id_transaction', 'transaction_created_at'],
+        ['transactions.id', 'transactions.created_at'],
+    ),
+)
+
+
 class Report(Base):
-    """Отчет."""
+    """
+    Отчет.
+
+    max_transaction_id - максимальный ID транзакции отчета, если отчет
+    сохранен без связей с транзакциями: транзакции отчета это
+    транзакции пользователя за период с ID не больше max_transaction_id.
+    """
 
     __tablename__ = 'reports'
 
@@ -54,15 +120,30 @@ class Report(Base):
     end_date: Mapped[datetime]
     is_deleted: Mapped[bool] = mapped_column(default=False)
     id_user: Mapped[int] = mapped_column(ForeignKey('users.id'))
+    max_transaction_id: Mapped[int] = mapped_column(nullable=True)
     user: Mapped['User'] = relationship(back_populates='reports')
     transactions = relationship(
         'Transaction',
-        secondary=Table(
-            'report_transaction',
-            Base.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('id_transaction', Integer, ForeignKey('transactions.id')),
-            Column('id_report', Integer, ForeignKey('reports.id')),
-        ),
+        secondary=report_transaction,
         backref='reports',
     )
+
+
+class DailyTotal(Base):
+    """
+    Итоги транзакций пользователя за день по типу транзакции.
+
+    Обновляются в той же транзакции базы данных, что и проведение.
+    Для транзакций, созданных до появления таблицы, итоги заполняются
+    командой python -m app.external.postgres.backfill.
+    """
+
+    __tablename__ = 'daily_totals'
+
+    id_user: Mapped[int] = mapped_column(
+        ForeignKey('users.id'), primary_key=True,
+    )
+    day: Mapped[date] = mapped_column(primary_key=True)
+    transaction_type: Mapped[bool] = mapped_column(primary_key=True)
+    total_count: Mapped[int] = mapped_column(default=0)
+    total_amount: Mapped[int] = mapped_column(BigInteger, default=0)
@@ -0,0 +1,179 @@
+"""
+Обслуживание секций таблицы transactions.
+
+Таблица секционирована по created_at, по секции на месяц. Секции
+создаются заранее, на partitions_ahead месяцев вперед. Транзакции вне
+созданных секций попадают в секцию по умолчанию: при создании секции
+месяца его строки переносятся из секции по умолчанию в новую секцию.
+
+Запуск: python -m app.external.postgres.partitions, в kubernetes -
+по расписанию CronJob чарта helm.
+"""
+import logging
+from datetime import date
+
+from sqlalchemy import Engine, text
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import TextClause
+
+from app.core.config import get_settings
+from app.external.postgres.models import default_partition
+from app.external.postgres.storage import create_pool
+
+logger = logging.getLogger(__name__)
+
+months_in_year = 12
+
+select_partition = 'SELECT to_regclass(:name)'
+# Пока секции месяца нет, все его строки лежат в секции по умолчанию.
+stash_transactions = """
+    CREATE TEMP TABLE moved_transactions AS
+    SELECT * FROM transactions
+    WHERE created_at >= :start AND created_at < :end
+"""
+stash_links = """
+    CREATE TEMP TABLE moved_links AS
+    SELECT * FROM report_transaction
+    WHERE (id_transaction, transaction_created_at) IN (
+        SELECT id, created_at FROM moved_transactions
+    )
+"""
+stash_month_rows = (
+    stash_transactions,
+    stash_links,
+    'DELETE FROM report_transaction WHERE id IN (SELECT id FROM moved_links)',
+    'DELETE FROM transactions WHERE created_at >= :start AND created_at < :end',
+)
+restore_month_rows = (
+    'INSERT INTO transactions SELECT * FROM moved_transactions',
+    'INSERT INTO report_transaction SELECT * FROM moved_links',
+    'DROP TABLE moved_transactions, moved_links',
+)
+
+
+def add_months(month: date, months: int) -> date:
+    """
+    Возвращает первый день месяца, отстоящего на months месяцев.
+
+    :param month: Любой день исходного месяца.
+    :type month: date
+    :param months: Количество месяцев.
+    :type months: int
+    :return: Первый день месяца.
+    :rtype: date
+    """
+    index = month.year * months_in_year + month.month - 1 + months
+    return date(index // months_in_year, index % months_in_year + 1, 1)
+
+
+def get_partition_name(month: date) -> str:
+    """
+    Возвращает имя секции месяца.
+
+    :param month: Любой день месяца.
+    :type month: date
+    :return: Имя секции вида transactions_y2024m01.
+    :rtype: str
+    """
+    return f'transactions_y{month.year}m{month.month:02}'
+
+
+def create_partition(month: date) -> TextClause:
+    """
+    Создает запрос создания секции месяца, если ее еще нет.
+
+    :param month: Любой день месяца.
+    :type month: date
+    :return: Запрос создания секции.
+    :rtype: TextClause
+    """
+    start = add_months(month, 0)
+    end = add_months(start, 1)
+    name = get_partition_name(start)
+    return text(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF transactions
+        FOR VALUES FROM ('{start}') TO ('{end}')
+    """)
+
+
+def create_default_partition() -> TextClause:
+    """
+    Создает запрос создания секции по умолчанию, если ее еще нет.
+
+    :return: Запрос создания секции.
+    :rtype: TextClause
+    """
+    return text(f"""
+        CREATE TABLE IF NOT EXISTS {default_partition}
+        PARTITION OF transactions DEFAULT
+    """)
+
+
+def attach_partition(session: Session, month: date) -> None:
+    """
+    Создает секцию месяца, перенося в нее строки из секции по умолчанию.
+
+    Строки месяца из секции по умолчанию и связи отчетов с ними
+    копируются во временные таблицы и удаляются: внешний ключ связей
+    не дает удалить транзакции, на которые они ссылаются. После
+    создания секции строки вставляются обратно и попадают в нее.
+    Уже созданная секция пропускается.
+
+    :param session: Сессия базы данных.
+    :type session: Session
+    :param month: Любой день месяца.
+    :type month: date
+    """
+    name = get_partition_name(month)
+    if session.scalar(text(select_partition), {'name': name}) is not None:
+        return
+    bounds = {'start': add_months(month, 0), 'end': add_months(month, 1)}
+    for stash in stash_month_rows:
+        session.execute(text(stash), bounds)
+    session.execute(create_partition(month))
+    for restore in restore_month_rows:
+        session.execute(text(restore))
+
+
+def create_partitions(pool: Engine, start: date, months: int) -> list[str]:
+    """
+    Создает секции months месяцев, начиная с месяца start.
+
+    Уже созданные секции пропускаются, поэтому повторный запуск
+    безопасен. Создание секции ненадолго блокирует таблицу
+    transactions, поэтому секции создаются заранее. Строки месяцев,
+    попавшие в секцию по умолчанию, переносятся в созданные секции.
+
+    :param pool: sqlalchemy engine с пулом соединений.
+    :type pool: Engine
+    :param start: Любой день первого месяца.
+    :type start: date
+    :param months: Количество месяцев.
+    :type months: int
+    :return: Имена секций месяцев.
+    :rtype: list[str]
+    """
+    partitions = []
+    with Session(pool) as session:
+        session.execute(create_default_partition())
+        for offset in range(months):
+            month = add_months(start, offset)
+            attach_partition(session, month)
+            partitions.append(get_partition_name(month))
+        session.commit()
+    return partitions
+
+
+def main() -> None:
+    """Точка входа команды обслуживания секций."""
+    logging.basicConfig(level=logging.INFO)
+    partitions = create_partitions(
+        create_pool(),
+        date.today(),
+        get_settings().postgres.partitions_ahead + 1,
+    )
+    logger.info(f'transactions partitions ensured: {partitions}')
+
+
+if __name__ == '__main__':
+    main()
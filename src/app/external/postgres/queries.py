@@ -0,0 +1,543 @@
+"""
+Запросы к базе данных.
+
+Запросы общие для синхронного и асинхронного хранилищ,
+чтобы обе реализации выполняли одинаковый SQL.
+"""
+import logging
+from collections.abc import Sequence
+from datetime import datetime
+from typing import Any, Optional
+
+from sqlalchemy import Integer, insert, literal, not_, or_, select, true, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.expression import (
+    ColumnElement,
+    Insert,
+    Select,
+    Update,
+    column,
+    tuple_,
+    values,
+)
+
+from app.core import models as srv
+from app.core.config import ReportPersistence
+from app.core.errors import NotFoundError, ValidationError
+from app.core.pagination import decode_cursor
+from app.core.transactions import apply_transactions
+from app.external.postgres import models as db
+from app.external.postgres import rollups
+
+logger = logging.getLogger(__name__)
+
+PostingRow = Row[tuple[int, Optional[int], Optional[int]]]
+UserRow = Row[tuple[int, str, int, bool]]
+
+
+def select_user(username: str) -> Select[tuple[db.User]]:
+    """
+    Создает запрос пользователя по имени.
+
+    :param username: Имя пользователя
+    :type username: str
+    :return: Запрос пользователя.
+    :rtype: Select
+    """
+    return select(db.User).where(db.User.username == username)
+
+
+def select_user_row(username: str) -> Select[tuple[int, str, int, bool]]:
+    """
+    Создает запрос полей пользователя, которые нужны сервису.
+
+    Читает по уникальному индексу username только id, имя, баланс
+    и признак верификации, без пароля и вектора пользователя.
+
+    :param username: Имя пользователя
+    :type username: str
+    :return: Запрос полей пользователя.
+    :rtype: Select
+    """
+    return select(
+        db.User.id, db.User.username, db.User.balance, db.User.is_verified,
+    ).where(db.User.username == username)
+
+
+def get_row_user(row: UserRow) -> srv.User:
+    """
+    Создает пользователя из результата запроса select_user_row.
+
+    :param row: Строка результата запроса select_user_row.
+    :type row: Row
+    :return: Пользователь бизнес логики.
+    :rtype: User
+    """
+    user_id, username, balance, is_verified = row
+    return srv.User(
+        user_id=user_id,
+        username=username,
+        balance=balance,
+        is_verified=is_verified,
+    )
+
+
+def select_report_transactions(
+    request: srv.TransactionReportRequest,
+) -> Select[tuple[db.Transaction]]:
+    """
+    Создает запрос транзакций пользователя за период отчета.
+
+    :param request: Запрос отчета
+    :type request: TransactionReportRequest
+    :return: Запрос транзакций.
+    :rtype: Select
+    """
+    return select(db.Transaction).join(db.Transaction.user).where(  # noqa: WPS221, E501 working with database
+        db.User.username == request.username,
+        not_(db.Transaction.is_deleted),
+    ).where(
+        db.Transaction.created_at >= request.start_date,
+    ).where(db.Transaction.created_at <= request.end_date)
+
+
+def insert_report(
+    report: srv.TransactionReport,
+    id_user: int,
+    max_transaction_id: int | None,
+) -> Insert:
+    """
+    Создает запрос записи отчета, возвращающий ID отчета.
+
+    :param report: Отчет о транзакциях
+    :type report: TransactionReport
+    :param id_user: ID пользователя отчета
+    :type id_user: int
+    :param max_transaction_id: Максимальный ID транзакции отчета
+    :type max_transaction_id: int | None
+    :return: Запрос записи отчета.
+    :rtype: Insert
+    """
+    return insert(db.Report).values(
+        start_date=report.start_date,
+        end_date=report.end_date,
+        is_deleted=False,
+        id_user=id_user,
+        max_transaction_id=max_transaction_id,
+    ).returning(db.Report.id)
+
+
+def get_max_transaction_id(
+    persistence: ReportPersistence,
+    transactions: Sequence[srv.Transaction],
+) -> int | None:
+    """
+    Получает ID последней транзакции отчета для режима watermark.
+
+    :param persistence: Способ сохранения отчетов
+    :type persistence: ReportPersistence
+    :param transactions: Транзакции отчета
+    :type transactions: Sequence[Transaction]
+    :return: Максимальный ID транзакции или None.
+    :rtype: int | None
+    """
+    if persistence != ReportPersistence.watermark or not transactions:
+        return None
+    return max(trn.transaction_id or 0 for trn in transactions)
+
+
+def get_report_links(
+    id_report: int, transactions: Sequence[srv.Transaction],
+) -> list[dict[str, Any]]:
+    """
+    Создает строки связей отчета с транзакциями для записи одним запросом.
+
+    Транзакция ссылается по первичному ключу секционированной таблицы:
+    ID и времени создания.
+
+    :param id_report: ID отчета
+    :type id_report: int
+    :param transactions: Транзакции отчета
+    :type transactions: Sequence[Transaction]
+    :return: Строки таблицы report_transaction.
+    :rtype: list[dict[str, Any]]
+    """
+    return [
+        {
+            'id_report': id_report,
+            'id_transaction': trn.transaction_id,
+            'transaction_created_at': trn.timestamp,
+        }
+        for trn in transactions
+    ]
+
+
+def select_report_rows(
+    request: srv.TransactionReportRequest,
+) -> Select[tuple[int, bool, int, datetime]]:
+    """
+    Создает запрос строк транзакций за период отчета для потокового чтения.
+
+    Запрашивает только колонки транзакции, без загрузки ORM объектов,
+    в порядке времени создания.
+
+    :param request: Запрос отчета
+    :type request: TransactionReportRequest
+    :return: Запрос строк транзакций.
+    :rtype: Select
+    """
+    return select(
+        db.Transaction.id,
+        db.Transaction.transaction_type,
+        db.Transaction.amount,
+        db.Transaction.created_at,
+    ).join(db.Transaction.user).where(
+        db.User.username == request.username,
+        not_(db.Transaction.is_deleted),
+        db.Transaction.created_at >= request.start_date,
+        db.Transaction.created_at <= request.end_date,
+    ).order_by(db.Transaction.created_at, db.Transaction.id)
+
+
+def select_history_rows(
+    request: srv.TransactionHistoryRequest,
+) -> Select[tuple[int, bool, int, datetime]]:
+    """
+    Создает запрос страницы истории транзакций.
+
+    Keyset пагинация: страница начинается после ключа (created_at, id)
+    из токена продолжения, запрашивается page_size + 1 строк,
+    чтобы определить наличие следующей страницы.
+
+    :param request: Запрос страницы истории
+    :type request: TransactionHistoryRequest
+    :return: Запрос строк транзакций.
+    :rtype: Select
+    """
+    stmt = select(
+        db.Transaction.id,
+        db.Transaction.transaction_type,
+        db.Transaction.amount,
+        db.Transaction.created_at,
+    ).join(db.Transaction.user).where(
+        db.User.username == request.username,
+        not_(db.Transaction.is_deleted),
+    ).order_by(
+        db.Transaction.created_at.desc(), db.Transaction.id.desc(),
+    ).limit(request.page_size + 1)
+    if request.cursor is not None:
+        created_at, transaction_id = decode_cursor(request.cursor)
+        stmt = stmt.where(
+            tuple_(db.Transaction.created_at, db.Transaction.id) <
+            tuple_(literal(created_at), literal(transaction_id)),
+        )
+    return stmt
+
+
+def get_row_transaction(
+    row: Row[tuple[int, bool, int, datetime]], username: str,
+) -> srv.Transaction:
+    """
+    Создает транзакцию из строки запроса транзакций пользователя.
+
+    :param row: Строка запроса транзакций.
+    :type row: Row
+    :param username: Имя пользователя.
+    :type username: str
+    :return: Транзакция бизнес логики.
+    :rtype: Transaction
+    """
+    transaction_id, transaction_type, amount, created_at = row
+    return srv.Transaction(
+        username=username,
+        transaction_type=get_transaction_type(transaction_type),
+        amount=amount,
+        timestamp=created_at,
+        transaction_id=transaction_id,
+    )
+
+
+def get_transaction_type(transaction_type: bool) -> srv.TransactionType:
+    """
+    Преобразует тип транзакции из базы данных в TransactionType.
+
+    :param transaction_type: Тип транзакции в базе данных.
+    :type transaction_type: bool
+    :return: Тип транзакции бизнес логики.
+    :rtype: TransactionType
+    """
+    if transaction_type is False:
+        return srv.TransactionType.deposit
+    return srv.TransactionType.withdraw
+
+
+def post_transaction(
+    transaction: srv.Transaction,
+) -> Select[tuple[int, int | None, int | None]]:
+    """
+    Создает запрос проведения транзакции за один запрос к базе данных.
+
+    Запрос состоит из CTE: target находит пользователя, updated изменяет
+    баланс, если транзакция разрешена правилом овердрафта, inserted
+    создает запись о транзакции для измененного пользователя.
+    Условие овердрафта проверяется в UPDATE под блокировкой строки,
+    поэтому параллельные списания не уводят баланс в минус.
+
+    CTE rolled добавляет транзакцию к дневным итогам пользователя.
+
+    Возвращает строку (user_id, balance, transaction_id). Если пользователь
+    не найден, строк нет. Если транзакция запрещена, balance и
+    transaction_id равны None.
+
+    :param transaction: Транзакция бизнес логики.
+    :type transaction: Transaction
+    :return: Запрос проведения транзакции.
+    :rtype: Select
+    """
+    target = select(db.User.id).where(
+        db.User.username == transaction.username,
+    ).cte('target')
+    updated = update(db.User).where(
+        db.User.username == transaction.username,
+        get_balance_guard(transaction),
+    ).values(
+        balance=db.User.balance + get_balance_delta(transaction),
+    ).returning(db.User.id, db.User.balance).cte('updated')
+    inserted = insert(db.Transaction).from_select(
+        ['transaction_type', 'amount', 'created_at', 'is_deleted', 'id_user'],
+        select(
+            literal(transaction.transaction_type.value),
+            literal(transaction.amount),
+            literal(transaction.timestamp),
+            literal(False),  # noqa: WPS425 is_deleted value
+            updated.c.id,
+        ),
+    ).returning(
+        db.Transaction.id, db.Transaction.id_user, db.Transaction.is_deleted,
+    ).cte('inserted')
+    rolled = rollups.add_to_daily_totals(
+        pg_insert(db.DailyTotal).from_select(
+            rollups.daily_total_columns,
+            select(
+                inserted.c.id_user,
+                literal(transaction.timestamp.date()),
+                literal(transaction.transaction_type.value),
+                literal(1),
+                literal(transaction.amount),
+            ).where(not_(inserted.c.is_deleted)),
+        ),
+    ).returning(db.DailyTotal.id_user).cte('rolled')
+    return select(
+        target.c.id, updated.c.balance, inserted.c.id,
+    ).select_from(
+        target.outerjoin(updated, true()).outerjoin(
+            inserted, true(),
+        ).outerjoin(rolled, true()),
+    )
+
+
+def get_balance_delta(transaction: srv.Transaction) -> int:
+    """
+    Вычисляет изменение баланса пользователя после транзакции.
+
+    :param transaction: Транзакция бизнес логики.
+    :type transaction: Transaction
+    :return: Изменение баланса.
+    :rtype: int
+    """
+    if transaction.transaction_type == srv.TransactionType.withdraw:
+        return -transaction.amount
+    return transaction.amount
+
+
+def get_balance_guard(transaction: srv.Transaction) -> ColumnElement[bool]:
+    """
+    Создает условие овердрафта для изменения баланса.
+
+    Пополнение разрешено всегда. Списание разрешено, если баланс
+    не станет отрицательным или пользователь верифицирован.
+
+    :param transaction: Транзакция бизнес логики.
+    :type transaction: Transaction
+    :return: Условие, при котором транзакция разрешена.
+    :rtype: ColumnElement[bool]
+    """
+    if transaction.transaction_type == srv.TransactionType.deposit:
+        return true()
+    return or_(
+        db.User.balance >= transaction.amount,
+        db.User.is_verified.is_(True),
+    )
+
+
+def get_posted_transaction(
+    transaction: srv.Transaction,
+    row: PostingRow | None,
+) -> srv.Transaction:
+    """
+    Создает проведенную транзакцию из результата запроса post_transaction.
+
+    :param transaction: Транзакция бизнес логики.
+    :type transaction: Transaction
+    :param row: Строка результата запроса post_transaction.
+    :type row: Row | None
+    :return: Транзакция с ID записи в базе данных.
+    :rtype: Transaction
+    :raises NotFoundError: Если пользователь не найден в базе данных.
+    :raises ValidationError: Если транзакция запрещена правилом овердрафта.
+    """
+    if row is None:
+        logger.error(f'{transaction.username} not found in db')
+        raise NotFoundError(detail=f'{transaction.username} not found')
+    _, _, transaction_id = row
+    if transaction_id is None:
+        detail = f'Баланс пользователя {transaction.username} не может быть отрицательным'  # noqa: E501, WPS221
+        logger.info(detail)
+        raise ValidationError(detail=detail)
+    return srv.Transaction(
+        username=transaction.username,
+        amount=transaction.amount,
+        transaction_type=transaction.transaction_type,
+        timestamp=transaction.timestamp,
+        transaction_id=transaction_id,
+    )
+
+
+def select_users_for_update(
+    usernames: set[str],
+) -> Select[tuple[db.User]]:
+    """
+    Создает запрос пользователей пакета с блокировкой строк.
+
+    Строки блокируются в порядке id, чтобы параллельные пакеты
+    с пересекающимися пользователями не приводили к взаимоблокировке.
+
+    :param usernames: Имена пользователей пакета
+    :type usernames: set[str]
+    :return: Запрос пользователей.
+    :rtype: Select
+    """
+    return select(db.User).where(
+        db.User.username.in_(usernames),
+    ).order_by(db.User.id).with_for_update()
+
+
+def apply_batch(
+    db_users: Sequence[db.User],
+    transactions: list[srv.Transaction],
+) -> tuple[list[srv.TransactionResult], dict[int, int]]:
+    """
+    Применяет пакет транзакций к заблокированным пользователям.
+
+    :param db_users: Пользователи пакета из базы данных.
+    :type db_users: Sequence[User]
+    :param transactions: Транзакции пакета.
+    :type transactions: list[Transaction]
+    :return: Результаты транзакций и изменения балансов по id пользователя.
+    :rtype: tuple[list[TransactionResult], dict[int, int]]
+    """
+    users = {
+        db_user.username: srv.User(
+            username=db_user.username,
+            balance=db_user.balance,
+            is_verified=db_user.is_verified,
+            user_id=db_user.id,
+        )
+        for db_user in db_users
+    }
+    outcomes = apply_transactions(users, transactions)
+    deltas = {
+        db_user.id: users[db_user.username].balance - db_user.balance
+        for db_user in db_users
+        if users[db_user.username].balance != db_user.balance
+    }
+    return outcomes, deltas
+
+
+def update_balances(deltas: dict[int, int]) -> Update:
+    """
+    Создает запрос изменения балансов пользователей пакета.
+
+    Изменение баланса каждого пользователя применяется один раз
+    через UPDATE ... FROM (VALUES ...).
+
+    :param deltas: Изменения балансов по id пользователя.
+    :type deltas: dict[int, int]
+    :return: Запрос изменения балансов.
+    :rtype: Update
+    """
+    balance_deltas = values(
+        column('id', Integer), column('delta', Integer), name='deltas',
+    ).data(list(deltas.items()))
+    return update(db.User).where(
+        db.User.id == balance_deltas.c.id,
+    ).values(
+        balance=db.User.balance + balance_deltas.c.delta,
+    ).execution_options(synchronize_session=False)
+
+
+def insert_transactions() -> Insert:
+    """
+    Создает запрос записи транзакций пакета.
+
+    Запрос выполняется как executemany и объединяется sqlalchemy
+    в многострочный INSERT. ID возвращаются в порядке параметров.
+
+    :return: Запрос записи транзакций.
+    :rtype: Insert
+    """
+    return insert(db.Transaction).returning(
+        db.Transaction.id, sort_by_parameter_order=True,
+    )
+
+
+def get_transaction_rows(
+    outcomes: list[srv.TransactionResult],
+    user_ids: dict[str, int],
+) -> list[dict[str, Any]]:
+    """
+    Создает параметры записи проведенных транзакций пакета.
+
+    :param outcomes: Результаты транзакций пакета.
+    :type outcomes: list[TransactionResult]
+    :param user_ids: ID пользователей по имени пользователя.
+    :type user_ids: dict[str, int]
+    :return: Строки запроса insert_transactions.
+    :rtype: list[dict[str, Any]]
+    """
+    return [
+        {
+            'transaction_type': outcome.transaction.transaction_type.value,
+            'amount': outcome.transaction.amount,
+            'created_at': outcome.transaction.timestamp,
+            'is_deleted': False,
+            'id_user': user_ids[outcome.transaction.username],
+        }
+        for outcome in outcomes
+        if outcome.transaction is not None
+    ]
+
+
+def set_transaction_ids(
+    outcomes: list[srv.TransactionResult],
+    transaction_ids: Sequence[int],
+) -> list[srv.TransactionResult]:
+    """
+    Добавляет ID записей в проведенные транзакции пакета.
+
+    :param outcomes: Результаты транзакций пакета.
+    :type outcomes: list[TransactionResult]
+    :param transaction_ids: ID записей в порядке проведенных транзакций.
+    :type transaction_ids: Sequence[int]
+    :return: Результаты транзакций пакета.
+    :rtype: list[TransactionResult]
+    """
+    posted = (
+        outcome for outcome in outcomes if outcome.transaction is not None
+    )
+    for outcome, transaction_id in zip(posted, transaction_ids, strict=True):
+        outcome.transaction = outcome.transaction.model_copy(  # type: ignore
+            update={'transaction_id': transaction_id},
+        )
+    return outcomes
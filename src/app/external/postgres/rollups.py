@@ -0,0 +1,188 @@
+"""
+Запросы к дневным итогам транзакций.
+
+Итоги daily_totals обновляются при каждом проведении транзакций
+и позволяют считать сводку за период по дням, а не по транзакциям.
+"""
+from collections import Counter
+from collections.abc import Sequence
+from datetime import date
+from typing import Any
+
+from sqlalchemy import BigInteger, Date, cast, func, not_, select
+from sqlalchemy.dialects.postgresql import Insert, insert
+from sqlalchemy.engine import Row
+from sqlalchemy.sql.expression import Select
+
+from app.core import models as srv
+from app.external.postgres import models as db
+
+SummaryRow = Row[tuple[bool, int, int]]
+
+daily_total_columns = (
+    'id_user', 'day', 'transaction_type', 'total_count', 'total_amount',
+)
+daily_total_key = daily_total_columns[:3]
+
+# Условие строк transactions, которые входят в дневные итоги.
+counted_transaction = not_(db.Transaction.is_deleted)
+
+
+def add_to_daily_totals(stmt: Insert) -> Insert:
+    """
+    Дополняет запись итогов прибавлением к уже записанным итогам дня.
+
+    :param stmt: Запрос записи строк daily_totals
+    :type stmt: Insert
+    :return: Запрос записи или обновления итогов.
+    :rtype: Insert
+    """
+    return stmt.on_conflict_do_update(
+        index_elements=daily_total_key,
+        set_={
+            db.DailyTotal.total_count: (
+                db.DailyTotal.total_count + stmt.excluded.total_count
+            ),
+            db.DailyTotal.total_amount: (
+                db.DailyTotal.total_amount + stmt.excluded.total_amount
+            ),
+        },
+    )
+
+
+def insert_daily_totals() -> Insert:
+    """
+    Создает запрос прибавления строк к дневным итогам.
+
+    :return: Запрос записи или обновления итогов.
+    :rtype: Insert
+    """
+    return add_to_daily_totals(insert(db.DailyTotal))
+
+
+def get_daily_total_rows(
+    rows: list[dict[str, Any]],
+) -> list[dict[str, Any]]:
+    """
+    Суммирует строки записанных транзакций по пользователю, дню и типу.
+
+    Ключи итогов в одном INSERT ... ON CONFLICT должны быть уникальны,
+    поэтому транзакции пакета суммируются до записи. Удаленные
+    транзакции пропускаются, как и в backfill_daily_totals.
+
+    :param rows: Строки записи транзакций.
+    :type rows: list[dict[str, Any]]
+    :return: Строки запроса insert_daily_totals.
+    :rtype: list[dict[str, Any]]
+    """
+    counts: Counter[tuple[int, date, bool]] = Counter()
+    amounts: Counter[tuple[int, date, bool]] = Counter()
+    for row in rows:
+        if row.get('is_deleted'):
+            continue
+        key = (
+            row['id_user'], row['created_at'].date(), row['transaction_type'],
+        )
+        counts[key] += 1
+        amounts[key] += row['amount']
+    return [
+        dict(zip(daily_total_columns, (*key, counts[key], amounts[key])))
+        for key in counts
+    ]
+
+
+def get_transaction_total_rows(
+    transaction: srv.Transaction, id_user: int,
+) -> list[dict[str, Any]]:
+    """
+    Создает строку дневных итогов для одной транзакции.
+
+    :param transaction: Транзакция бизнес логики.
+    :type transaction: Transaction
+    :param id_user: ID пользователя транзакции.
+    :type id_user: int
+    :return: Строки запроса insert_daily_totals.
+    :rtype: list[dict[str, Any]]
+    """
+    return get_daily_total_rows([{
+        'id_user': id_user,
+        'created_at': transaction.timestamp,
+        'transaction_type': transaction.transaction_type.value,
+        'amount': transaction.amount,
+    }])
+
+
+def select_daily_totals(
+    request: srv.TransactionSummaryRequest,
+) -> Select[tuple[bool, int, int]]:
+    """
+    Создает запрос итогов пользователя за период по типу транзакции.
+
+    Читает по строке на день и тип транзакции.
+
+    :param request: Запрос сводки
+    :type request: TransactionSummaryRequest
+    :return: Запрос итогов.
+    :rtype: Select
+    """
+    return select(
+        db.DailyTotal.transaction_type,
+        cast(func.sum(db.DailyTotal.total_count), BigInteger),
+        cast(func.sum(db.DailyTotal.total_amount), BigInteger),
+    ).join(db.User, db.User.id == db.DailyTotal.id_user).where(
+        db.User.username == request.username,
+        db.DailyTotal.day >= request.start_date,
+        db.DailyTotal.day <= request.end_date,
+    ).group_by(db.DailyTotal.transaction_type)
+
+
+def get_transaction_summary(
+    request: srv.TransactionSummaryRequest, rows: Sequence[SummaryRow],
+) -> srv.TransactionSummary:
+    """
+    Создает сводку из строк запроса select_daily_totals.
+
+    :param request: Запрос сводки
+    :type request: TransactionSummaryRequest
+    :param rows: Итоги по типу транзакции
+    :type rows: Sequence[SummaryRow]
+    :return: Сводка по транзакциям.
+    :rtype: TransactionSummary
+    """
+    summary = srv.TransactionSummary(
+        username=request.username,
+        start_date=request.start_date,
+        end_date=request.end_date,
+    )
+    for transaction_type, count, amount in rows:
+        summary.add_totals(
+            srv.TransactionType(transaction_type), count, amount,
+        )
+    return summary
+
+
+def backfill_daily_totals() -> Insert:
+    """
+    Создает запрос пересчета дневных итогов по всем транзакциям.
+
+    Запрос записывает итоги в пустую таблицу daily_totals, перед ним
+    старые итоги удаляются, чтобы не осталось дней без транзакций.
+
+    :return: Запрос пересчета итогов.
+    :rtype: Insert
+    """
+    day = cast(db.Transaction.created_at, Date)
+    return insert(db.DailyTotal).from_select(
+        daily_total_columns,
+        select(
+            db.Transaction.id_user,
+            day,
+            db.Transaction.transaction_type,
+            func.count(),
+            func.sum(db.Transaction.amount),
+        ).where(
+            counted_transaction,
+        ).group_by(
+            db.Transaction.id_user, day, db.Transaction.transaction_type,
+        ),
+    )
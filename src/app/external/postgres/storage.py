@@ -1,12 +1,16 @@
 import logging
+from collections.abc import AsyncIterator, Sequence
 
-from sqlalchemy import Engine, Sequence, create_engine, select
+from sqlalchemy import Engine, create_engine, insert
 from sqlalchemy.orm import Session
 
 from app.core import models as srv
-from app.core.config import get_settings
+from app.core.config import ReportPersistence, get_settings
 from app.core.errors import NotFoundError, RepositoryError
+from app.core.pagination import get_history_page
+from app.external.postgres import aggregates
 from app.external.postgres import models as db
+from app.external.postgres import queries, rollups
 
 logger = logging.getLogger(__name__)
 
@@ -32,7 +36,7 @@ def create_all_tables() -> None:
     db.Base.metadata.create_all(pool)
 
 
-class DBTransactionStorage():
+class DBTransactionStorage():  # noqa: WPS214 repository protocol methods
     """База данных для работы с транзакциями."""
 
     def __init__(self) -> None:
@@ -69,7 +73,7 @@ class DBTransactionStorage():
             session.add(db_transaction)
             transaction = self._get_srv_transaction(db_transaction)
             try:
-                session.commit()
+                self._commit_with_totals(transaction, user.id, session)
             except Exception as err:
                 logger.error(
                     f"repository error can't create transaction for {transaction.username}",  # noqa: E501
@@ -79,11 +83,102 @@ class DBTransactionStorage():
                 ) from err
         return transaction
 
+    async def post_transaction(
+        self, transaction: srv.Transaction,
+    ) -> srv.Transaction:
+        """
+        Метод проведения транзакции за один запрос к базе данных.
+
+        Изменяет баланс пользователя с проверкой правила овердрафта
+        и создает запись о транзакции одним запросом.
+
+        :param transaction: Объект транзакции бизнес логики.
+        :type transaction: Transaction
+        :return: Объект транзакции созданной в базе данных
+        :rtype: Transaction
+        :raises RepositoryError: При ошибки записи в базу данных.
+        """
+        with Session(self.pool) as session:
+            try:
+                row = self._execute_posting(transaction, session)
+            except Exception as err:
+                logger.error(
+                    f"repository error can't post transaction for {transaction.username}",  # noqa: E501
+                )
+                raise RepositoryError(
+                    detail=f"can't post transaction for {transaction.username}",  # noqa: E501
+                ) from err
+        return queries.get_posted_transaction(transaction, row)
+
+    async def post_transactions(
+        self, transactions: list[srv.Transaction],
+    ) -> list[srv.TransactionResult]:
+        """
+        Метод проведения пакета транзакций в одной транзакции базы данных.
+
+        Блокирует пользователей пакета, применяет транзакции по порядку,
+        изменяет баланс каждого пользователя одним UPDATE и записывает
+        проведенные транзакции одним INSERT. Число запросов к базе данных
+        не зависит от размера пакета.
+
+        :param transactions: Объекты транзакций бизнес логики.
+        :type transactions: list[Transaction]
+        :return: Результаты транзакций в порядке пакета.
+        :rtype: list[TransactionResult]
+        :raises RepositoryError: При ошибки записи в базу данных.
+        """
+        with Session(self.pool) as session:
+            try:
+                return self._execute_batch_posting(transactions, session)
+            except Exception as err:
+                logger.error("repository error can't post transactions batch")
+                raise RepositoryError(
+                    detail="can't post transactions batch",
+                ) from err
+
+    def _commit_with_totals(
+        self, transaction: srv.Transaction, id_user: int, session: Session,
+    ) -> None:
+        session.execute(
+            rollups.insert_daily_totals(),
+            rollups.get_transaction_total_rows(transaction, id_user),
+        )
+        session.commit()
+
+    def _execute_posting(
+        self, transaction: srv.Transaction, session: Session,
+    ) -> queries.PostingRow | None:
+        row = session.execute(queries.post_transaction(transaction)).first()
+        session.commit()
+        return row
+
+    def _execute_batch_posting(
+        self, transactions: list[srv.Transaction], session: Session,
+    ) -> list[srv.TransactionResult]:
+        db_users = session.scalars(queries.select_users_for_update(
+            {transaction.username for transaction in transactions},
+        )).all()
+        outcomes, deltas = queries.apply_batch(db_users, transactions)
+        if deltas:
+            session.execute(queries.update_balances(deltas))
+        rows = queries.get_transaction_rows(
+            outcomes, {db_user.username: db_user.id for db_user in db_users},
+        )
+        transaction_ids: list[int] = []
+        if rows:
+            transaction_ids = list(session.scalars(
+                queries.insert_transactions(), rows,
+            ))
+            session.execute(
+                rollups.insert_daily_totals(),
+                rollups.get_daily_total_rows(rows),
+            )
+        session.commit()
+        return queries.set_transaction_ids(outcomes, transaction_ids)
+
     def _get_db_user(self, username: str, session: Session) -> db.User | None:
         try:
-            return session.scalars(
-                select(db.User).where(db.User.username == username),
-            ).first()
+            return session.scalars(queries.select_user(username)).first()
         except Exception as err:
             logger.error(f"repository error can't get {username}")
             raise RepositoryError(
@@ -93,13 +188,11 @@ class DBTransactionStorage():
     def _get_srv_transaction(
         self, transaction: db.Transaction,
     ) -> srv.Transaction:
-        if transaction.transaction_type is False:
-            transaction_type = srv.TransactionType.deposit
-        else:
-            transaction_type = srv.TransactionType.withdraw
         return srv.Transaction(
             username=transaction.user.username,
-            transaction_type=transaction_type,
+            transaction_type=queries.get_transaction_type(
+                transaction.transaction_type,
+            ),
             amount=transaction.amount,
             timestamp=transaction.created_at,
             transaction_id=transaction.id,
@@ -117,7 +210,7 @@ class DBUserStorage:
         """
         Получает пользователя из базы данных.
 
-        Получает и возвращает запись о пользователе из базы данных.
+        Читает только поля пользователя, которые нужны сервису.
 
         :param username: Имя пользователя
         :type username: str
@@ -125,10 +218,8 @@ class DBUserStorage:
         :rtype: sev.User | None
         """
         with Session(self.pool) as session:
-            db_user = self._get_db_user(username, session)
-            if db_user is not None:
-                return self._get_srv_user(db_user)
-            return None
+            row = self._get_user_row(username, session)
+        return None if row is None else queries.get_row_user(row)
 
     async def update_user(  # type: ignore  # deprecated
         self, user: srv.User,
@@ -143,30 +234,22 @@ class DBUserStorage:
         :type user: User
         """
         logger.warning(
-            'DEPRECATED: user should be updated in create_transaction',
+            'DEPRECATED: user balance is updated in post_transaction',
         )
 
-    def _get_db_user(self, username: str, session: Session) -> db.User | None:
+    def _get_user_row(
+        self, username: str, session: Session,
+    ) -> queries.UserRow | None:
         try:
-            return session.scalars(
-                select(db.User).where(db.User.username == username),
-            ).first()
+            return session.execute(queries.select_user_row(username)).first()
         except Exception as err:
             logger.error(f"repository error can't get {username}")
             raise RepositoryError(
                 detail=f"can't get {username}",
             ) from err
 
-    def _get_srv_user(self, db_user: db.User) -> srv.User:
-        return srv.User(
-            username=db_user.username,
-            balance=db_user.balance,
-            is_verified=db_user.is_verified,
-            user_id=db_user.id,
-        )
-
 
-class DBReportStorage:
+class DBReportStorage:  # noqa: WPS214 repository protocol methods
     """База данных DBReportStorage."""
 
     def __init__(self) -> None:
@@ -180,50 +263,155 @@ class DBReportStorage:
         """
         Метод создания отчета.
 
+        Поднимает NotFoundError, если пользователь не найден в базе
+        данных, и RepositoryError при ошибке записи в базу данных.
+
         :param request: Объект запроса отчета бизнес логики.
         :type request: TransactionReportRequest
         :return: Объект отчета созданного в базе данных
         :rtype: TransactionReport
-        :raises NotFoundError: Если пользователь не найден в базе данных.
-        :raises RepositoryError: При ошибки записи в базу данных.
         """
         with Session(self.pool) as session:
-            user = self._get_db_user(request.username, session)
-            if user is None:
-                logger.error(f'{request.username} not found in db')
-                raise NotFoundError(
-                    detail=f'{request.username} not found',
-                )
-            transactions = self._get_transactions(request, session)
-            report = db.Report(
-                start_date=request.start_date,
-                end_date=request.end_date,
-                user=user,
-                transactions=transactions,
+            # Пользователь остается в сессии: транзакции отчета ссылаются
+            # на него без отдельного SELECT.
+            user = self._get_report_user(request.username, session)
+            report = self._get_srv_report(
+                request, self._get_transactions(request, session),
             )
-            session.add(report)
-            srv_report = self._get_srv_report(report)
+            return self._persist_report(report, user.id, session)
+
+    async def save_transaction_report(
+        self, report: srv.TransactionReport,
+    ) -> srv.TransactionReport:
+        """
+        Сохраняет отчет, собранный без чтения базы данных.
+
+        Отчет сохраняется способом postgres.report_persistence,
+        как и отчет, созданный методом create_transaction_report,
+        с теми же ошибками NotFoundError и RepositoryError.
+
+        :param report: Собранный отчет о транзакциях.
+        :type report: TransactionReport
+        :return: Отчет с ID сохраненного отчета.
+        :rtype: TransactionReport
+        """
+        with Session(self.pool) as session:
+            user = self._get_report_user(report.username, session)
+            return self._persist_report(report, user.id, session)
+
+    async def stream_transactions(
+        self, request: srv.TransactionReportRequest,
+    ) -> AsyncIterator[srv.Transaction]:
+        """
+        Потоково читает транзакции пользователя за период отчета.
+
+        Строки читаются серверным курсором частями по postgres.yield_per,
+        поэтому потребление памяти не зависит от размера периода.
+
+        :param request: Объект запроса отчета бизнес логики.
+        :type request: TransactionReportRequest
+        :yield: Транзакции за период в порядке времени создания.
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = queries.select_report_rows(request).execution_options(
+            yield_per=get_settings().postgres.yield_per,
+        )
+        with Session(self.pool) as session:
             try:
-                session.commit()
+                rows = session.execute(stmt)
             except Exception as err:
-                logger.error(
-                    f"repository error can't create report for {request.username}",  # noqa: E501
-                )
+                logger.error("repository error can't stream transactions")
                 raise RepositoryError(
-                    detail=f"can't create report for {request.username}",
+                    detail="can't stream transactions",
                 ) from err
-            return srv_report
+            for row in rows:
+                yield queries.get_row_transaction(row, request.username)
+
+    async def get_transaction_history(
+        self, request: srv.TransactionHistoryRequest,
+    ) -> srv.TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций пользователя.
+
+        Keyset пагинация по (created_at, id): стоимость страницы
+        не зависит от глубины, на которой она находится.
+
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :return: Страница истории транзакций.
+        :rtype: TransactionHistoryPage
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = queries.select_history_rows(request)
+        with Session(self.pool) as session:
+            try:
+                rows = session.execute(stmt).all()
+            except Exception as err:
+                logger.error("repository error can't get history")
+                raise RepositoryError(detail="can't get history") from err
+        return get_history_page(
+            request.username,
+            [
+                queries.get_row_transaction(row, request.username)
+                for row in rows
+            ],
+            request.page_size,
+        )
+
+    async def get_transaction_summary(
+        self, request: srv.TransactionSummaryRequest,
+    ) -> srv.TransactionSummary:
+        """
+        Получает сводку по транзакциям пользователя за период.
+
+        Сводка считается по таблице daily_totals: одна строка
+        на день и тип транзакции, независимо от числа транзакций.
+
+        :param request: Запрос сводки.
+        :type request: TransactionSummaryRequest
+        :return: Итоги пополнений и списаний за период.
+        :rtype: TransactionSummary
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = rollups.select_daily_totals(request)
+        with Session(self.pool) as session:
+            try:
+                rows = session.execute(stmt).all()
+            except Exception as err:
+                logger.error("repository error can't get summary")
+                raise RepositoryError(detail="can't get summary") from err
+        return rollups.get_transaction_summary(request, rows)
+
+    async def create_aggregate_report(
+        self, request: srv.TransactionAggregateRequest,
+    ) -> srv.TransactionAggregateReport:
+        """
+        Создает агрегированный отчет о транзакциях пользователя.
+
+        Агрегаты считаются в базе данных, транзакции периода
+        не передаются в приложение.
+
+        :param request: Запрос агрегированного отчета.
+        :type request: TransactionAggregateRequest
+        :return: Агрегаты транзакций за период и по интервалам.
+        :rtype: TransactionAggregateReport
+        :raises RepositoryError: При ошибки чтения из базы данных.
+        """
+        stmt = aggregates.select_aggregates(request)
+        with Session(self.pool) as session:
+            try:
+                rows = session.execute(stmt).all()
+            except Exception as err:
+                logger.error("repository error can't get aggregates")
+                raise RepositoryError(detail="can't get aggregates") from err
+        return aggregates.get_aggregate_report(request, rows)
 
     def _get_transactions(
         self, request: srv.TransactionReportRequest, session: Session,
-    ) -> Sequence:
-        stmt = select(db.Transaction).join(db.Transaction.user).where(  # noqa: WPS221, E501 working with database
-            db.User.username == request.username,
-        ).where(
-            db.Transaction.created_at >= request.start_date,
-        ).where(db.Transaction.created_at <= request.end_date)
+    ) -> Sequence[db.Transaction]:
+        stmt = queries.select_report_transactions(request)
         try:
-            return session.scalars(stmt).all()  # type: ignore
+            return session.scalars(stmt).all()
         except Exception as err:
             logger.error("repository error can't get transactions")
             raise RepositoryError(
@@ -232,9 +420,7 @@ class DBReportStorage:
 
     def _get_db_user(self, username: str, session: Session) -> db.User | None:
         try:
-            return session.scalars(
-                select(db.User).where(db.User.username == username),
-            ).first()
+            return session.scalars(queries.select_user(username)).first()
         except Exception as err:
             logger.error(f"repository error can't get {username}")
             raise RepositoryError(
@@ -244,28 +430,73 @@ class DBReportStorage:
     def _get_srv_transaction(
         self, transaction: db.Transaction,
     ) -> srv.Transaction:
-        if transaction.transaction_type is False:
-            transaction_type = srv.TransactionType.deposit
-        else:
-            transaction_type = srv.TransactionType.withdraw
         return srv.Transaction(
             username=transaction.user.username,
-            transaction_type=transaction_type,
+            transaction_type=queries.get_transaction_type(
+                transaction.transaction_type,
+            ),
             amount=transaction.amount,
             timestamp=transaction.created_at,
             transaction_id=transaction.id,
         )
 
-    def _get_srv_report(self, report: db.Report) -> srv.TransactionReport:
-        transactions = [
-            self._get_srv_transaction(trn) for trn in report.transactions
-        ]
+    def _get_report_user(self, username: str, session: Session) -> db.User:
+        user = self._get_db_user(username, session)
+        if user is None:
+            logger.error(f'{username} not found in db')
+            raise NotFoundError(detail=f'{username} not found')
+        return user
+
+    def _persist_report(
+        self, report: srv.TransactionReport, id_user: int, session: Session,
+    ) -> srv.TransactionReport:
+        try:
+            report.report_id = self._save_report(report, id_user, session)
+        except Exception as err:
+            logger.error(
+                f"repository error can't create report for {report.username}",
+            )
+            raise RepositoryError(
+                detail=f"can't create report for {report.username}",
+            ) from err
+        return report
+
+    def _save_report(
+        self, report: srv.TransactionReport, id_user: int, session: Session,
+    ) -> int | None:
+        persistence = get_settings().postgres.report_persistence
+        if persistence == ReportPersistence.disabled:
+            return None
+        report_id: int = session.execute(
+            queries.insert_report(
+                report,
+                id_user,
+                queries.get_max_transaction_id(
+                    persistence, report.transactions,
+                ),
+            ),
+        ).scalar_one()
+        if persistence == ReportPersistence.bulk and report.transactions:
+            session.execute(
+                insert(db.report_transaction),
+                queries.get_report_links(report_id, report.transactions),
+            )
+        session.commit()
+        return report_id
+
+    def _get_srv_report(
+        self,
+        request: srv.TransactionReportRequest,
+        transactions: Sequence[db.Transaction],
+    ) -> srv.TransactionReport:
         return srv.TransactionReport(
-            username=report.user.username,
-            start_date=report.start_date,
-            end_date=report.end_date,
-            transactions=transactions,
-            report_id=report.id,
+            username=request.username,
+            start_date=request.start_date,
+            end_date=request.end_date,
+            transactions=[
+                self._get_srv_transaction(trn) for trn in transactions
+            ],
+            report_id=None,
         )
 
 
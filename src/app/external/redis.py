@@ -1,173 +1,450 @@
+import asyncio
+import gzip
 import logging
-from datetime import datetime
+from datetime import date, datetime
 from enum import StrEnum
+from functools import lru_cache
+from itertools import chain
 from typing import Any
 
-import redis
+from pydantic import TypeAdapter
+from redis.asyncio import ConnectionPool, Redis
+from redis.asyncio.client import Pipeline
+from redis.client import NEVER_DECODE
+from redis.exceptions import WatchError
 
-from app.core.config import get_settings
+from app.core.config import ReportCacheFormat, get_settings
 from app.core.errors import ServerError
 from app.core.models import (
+    CacheVersion,
+    ReportBody,
     Transaction,
-    TransactionReport,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
     TransactionReportRequest,
     TransactionType,
+    User,
 )
+from app.core.segments import Segments, get_days
 
 logger = logging.getLogger(__name__)
 
+key_separator = ':'
+entry_separator = '|'
+
+# Выполняется последней командой MULTI/EXEC записи в кэш. Удаляет
+# записанные ключи, если после чтения версии пользователя в кэш
+# дописывались транзакции или запись превысила объем кэша пользователя.
+# Объем и его TTL обновляются только принятой записью.
+commit_script = """
+local writes = tonumber(redis.call('HGET', KEYS[1], 'writes') or '0')
+local used = tonumber(redis.call('GET', KEYS[2]) or '0') + tonumber(ARGV[2])
+if writes == tonumber(ARGV[1]) and used <= tonumber(ARGV[3]) then
+    redis.call('INCRBY', KEYS[2], ARGV[2])
+    redis.call('EXPIRE', KEYS[2], ARGV[4])
+    return 1
+end
+for index = 3, #KEYS do
+    redis.call('DEL', KEYS[index])
+end
+return 0
+"""
+
+# Дописывает транзакцию в сегмент ее дня, если он есть в кэше.
+# Сегмент передается ключом поколения, прочитанного до вызова: после
+# инвалидации сегменты старого поколения не читаются и не дополняются.
+# Готовые тела ответов дописать нельзя: тела открытых отчетов,
+# период которых покрывает транзакцию, удаляются. Закрытые и истекшие
+# тела снимаются с учета. Тела не передаются в KEYS, поэтому удаляются
+# только ключи с хэш-тегом пользователя из ключа реестра: они лежат в
+# одном слоте redis cluster с KEYS. Запись пользователя с изменившимся
+# балансом удаляется вместе с учетом транзакции в версии пользователя.
+append_transaction_script = """
+local generation = redis.call('HGET', KEYS[1], 'generation') or '0'
+redis.call('HINCRBY', KEYS[1], 'writes', 1)
+redis.call('DEL', KEYS[4])
+local tag = string.match(KEYS[2], '^[^:]*:(.*)$')
+local entries = redis.call('HGETALL', KEYS[2])
+for index = 1, #entries, 2 do
+    local key = entries[index]
+    local start, finish = string.match(entries[index + 1], '^(.-)|(.*)$')
+    if not string.find(key, tag, 1, true) then
+        redis.call('HDEL', KEYS[2], key)
+    elseif ARGV[1] > finish or redis.call('EXISTS', key) == 0 then
+        redis.call('HDEL', KEYS[2], key)
+    elseif ARGV[1] >= start then
+        redis.call('DEL', key)
+        redis.call('HDEL', KEYS[2], key)
+    end
+end
+if generation ~= ARGV[3] or redis.call('EXISTS', KEYS[5]) == 0 then
+    return 0
+end
+if redis.call('LPOS', KEYS[5], KEYS[3]) then
+    return 0
+end
+redis.call('RPUSH', KEYS[5], KEYS[3])
+redis.call('LSET', KEYS[5], 0, tonumber(redis.call('LINDEX', KEYS[5], 0)) + 1)
+redis.call('HSET', KEYS[3], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[3], ARGV[2])
+return 1
+"""
+
+# Записывает пользователя, прочитанного из хранилища, если с чтения
+# версии пользователя его транзакции не проводились и кэш пользователя
+# не инвалидировался.
+create_user_script = """
+local version = redis.call('HMGET', KEYS[1], 'generation', 'writes')
+if (version[1] or '0') ~= ARGV[1] or (version[2] or '0') ~= ARGV[2] then
+    return 0
+end
+redis.call('HSET', KEYS[2], unpack(ARGV, 4))
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# Выдает аренду, если она свободна. Токен аренды берется из счетчика
+# пользователя и растет с каждой выданной ему арендой. Ключ аренды
+# и счетчик имеют хэш-тег пользователя и лежат в одном слоте.
+acquire_lease_script = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return 0
+end
+local token = redis.call('INCR', KEYS[2])
+redis.call('SET', KEYS[1], token, 'PX', ARGV[1])
+return token
+"""
+
+# Возвращает аренду, только если ее не выдали заново другому токену.
+release_lease_script = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+transactions_adapter = TypeAdapter(list[Transaction])
+
 
 class Key(StrEnum):
     """Часто используемые ключи словарей."""
 
     username = 'username'
+    transaction_id = 'transaction_id'
 
 
-class ReportCacheMixin:
-    """Миксин для кэширования отчетов."""
+@lru_cache
+def get_pool() -> ConnectionPool:
+    """
+    Возвращает общий пул соединений redis.
 
-    def __init__(self) -> None:
-        """Метод инициализации класса ReportCacheMixin."""
-        settings = get_settings()
-        self.storage = redis.Redis(
-            host=settings.redis.host,
-            port=settings.redis.port,
-            decode_responses=settings.redis.decode_responses,
-            db=settings.redis.db,
-        )
+    Пул создается при первом обращении, соединения открываются
+    по мере необходимости и переиспользуются всеми клиентами кэша.
 
-    def create_report_cache(
-        self,
-        report_request: TransactionReportRequest | TransactionReport,
-        transactions_key: str,
-    ) -> None:
+    :return: Пул соединений redis.
+    :rtype: ConnectionPool
+    """
+    settings = get_settings()
+    return ConnectionPool(
+        host=settings.redis.host,
+        port=settings.redis.port,
+        db=settings.redis.db,
+        decode_responses=settings.redis.decode_responses,
+        max_connections=settings.redis.max_connections,
+        socket_timeout=settings.redis.socket_timeout,
+        socket_connect_timeout=settings.redis.socket_connect_timeout,
+        health_check_interval=settings.redis.health_check_interval,
+    )
+
+
+def get_user_tag(username: str) -> str:
+    """
+    Возвращает хэш-тег ключей пользователя.
+
+    Ключи с одним хэш-тегом лежат в одном слоте redis cluster, поэтому
+    скрипты и транзакции MULTI/EXEC могут менять ключи пользователя
+    вместе.
+
+    :param username: Имя пользователя.
+    :type username: str
+    :return: Хэш-тег вида {username}.
+    :rtype: str
+    """
+    return f'{{{username}}}'
+
+
+async def close_pool() -> None:
+    """
+    Закрывает соединения общего пула redis.
+
+    Пул остается пригодным: при следующем обращении соединения
+    открываются заново.
+    """
+    await get_pool().aclose()
+
+
+def is_committed(responses: list[Any]) -> bool:
+    """
+    Проверяет, что commit_script принял записи транзакции MULTI/EXEC.
+
+    Скрипт ставится в транзакцию последним. Пустой ответ означает,
+    что транзакция отменена изменением ключей под WATCH.
+
+    :param responses: Ответы команд транзакции.
+    :type responses: list[Any]
+    :return: True, если записи сохранены.
+    :rtype: bool
+    """
+    return bool(responses) and responses[-1] == 1
+
+
+class RedisStorage:
+    """Клиент redis на общем пуле соединений."""
+
+    def __init__(self, pool: ConnectionPool | None = None) -> None:
         """
-        Создает кэш отчета.
+        Метод инициализации класса RedisStorage.
 
-        :param report_request: Данные для создания отчета.
-        :type report_request: TransactionReportRequest, TransactionReport,
-        :param transactions_key: Ключ списка транзакций.
-        :type transactions_key: str
-        :raises ServerError: При ошибке при записи в кэш.
+        :param pool: Пул соединений, по умолчанию общий пул.
+        :type pool: ConnectionPool | None
         """
-        key = self._get_key(report_request)
-        mapping = self._get_mapping(report_request, transactions_key)
+        self.storage = Redis(connection_pool=pool or get_pool())
+
+    async def _execute(self, pipeline: Pipeline, operation: str) -> list[Any]:
         try:
-            self.storage.hset(key, mapping=mapping)
+            responses: list[Any] = await pipeline.execute()
+        except WatchError:
+            # Ключи под WATCH изменились: транзакция не выполнена.
+            logger.info(f'{operation} is discarded by watched keys')
+            return []
         except Exception as exc:
-            logger.error(
-                'unexpected cache error on create report cache', exc_info=exc,
-            )
+            logger.error(f'cache error during {operation}', exc_info=exc)
             raise ServerError() from exc
+        return responses
 
-    def get_report_cache(
-        self, report_request: TransactionReportRequest,
-    ) -> dict[str, Any]:
+
+class UserCacheMixin(RedisStorage):
+    """
+    Миксин версий и объема кэша пользователя.
+
+    Поколение версии пользователя входит в ключи его отчетов.
+    Увеличение поколения делает все отчеты пользователя недоступными
+    одной командой, без поиска ключей. Старые ключи удаляются
+    по истечении их TTL.
+
+    Новые транзакции дописываются в кэш. Данные, прочитанные
+    из хранилища до того, как в кэш дописали транзакцию, не
+    записываются: число дописанных транзакций сверяется с версией,
+    прочитанной до обращения к хранилищу.
+
+    Объем записанного в кэш отчетов пользователя считается счетчиком
+    поколения, который живет не меньше любого из учтенных ключей.
+    Пока счетчик не истек, данные сверх user_cache_bytes не кэшируются.
+    Инвалидация начинает новое поколение с пустым счетчиком: ключи
+    старого поколения больше не читаются и истекают.
+    """
+
+    async def get_user_version(self, username: str) -> CacheVersion:
         """
-        Получает кэш отчета.
+        Получает версию кэша пользователя.
 
-        :param report_request: Данные для создания отчета.
-        :type report_request: TransactionReportRequest
-        :return: Получает данные о отчете из кэша.
-        :rtype: dict[str, Any]
-        :raises KeyError: Если запрошенные данные не найдены в кэше.
+        :param username: Имя пользователя.
+        :type username: str
+        :return: Версия кэша пользователя.
+        :rtype: CacheVersion
         :raises ServerError: При ошибке доступа к кэшу.
         """
-        key = self._get_key(report_request)
         try:
-            value_from_cache: dict[str, Any] = self.storage.hgetall(key)  # type:ignore # noqa: E501
+            generation, writes = await self.storage.hmget(  # type: ignore[misc] # noqa: E501
+                self._get_version_key(username), ['generation', 'writes'],
+            )
         except Exception as exc:
-            logger.error('error during cache access', exc_info=exc)
+            logger.error('cache error during get user version', exc_info=exc)
             raise ServerError() from exc
-        if value_from_cache:
-            logger.debug(f'got value from cache {value_from_cache}')
-            return value_from_cache
-        logger.debug(f'report not found: {report_request}')
-        raise KeyError(f'{report_request} not found')
-
-    def _get_key(
-        self, cache_value: TransactionReport | TransactionReportRequest,
-    ) -> str:
-        date_format = '%d-%m-%Y'  # noqa: WPS323 date format
-        return f'report:{cache_value.username}{cache_value.start_date.strftime(date_format)}{cache_value.end_date.strftime(date_format)}'  # noqa: E501, WPS237, WPS221 cant help
+        return CacheVersion(int(generation or 0), int(writes or 0))
 
-    def _get_mapping(
-        self,
-        report_request: TransactionReportRequest | TransactionReport,
-        transactions_key: str,
-    ) -> dict[str, Any]:
-        return {
-            Key.username: report_request.username,
-            'start_date': report_request.start_date.isoformat(),
-            'end_date': report_request.end_date.isoformat(),
-            'transactions': transactions_key,
-        }
+    async def invalidate_user(self, username: str) -> None:
+        """
+        Делает недоступными все кэшированные отчеты пользователя.
 
+        Запись пользователя удаляется.
 
-class TransactionCacheMixin:
-    """Миксин для кэширования транзакций."""
+        :param username: Имя пользователя.
+        :type username: str
+        """
+        pipeline = self.storage.pipeline()
+        pipeline.hincrby(self._get_version_key(username), 'generation', 1)
+        pipeline.delete(self._get_user_key(username))
+        await self._execute(pipeline, 'invalidate user')
 
-    def __init__(self) -> None:
-        """Метод инициализации класса TransactionCacheMixin."""
-        settings = get_settings()
-        self.storage = redis.Redis(
-            host=settings.redis.host,
-            port=settings.redis.port,
-            decode_responses=settings.redis.decode_responses,
-            db=settings.redis.db,
+    def _commit(  # noqa: WPS211 arguments of the script
+        self,
+        pipeline: Pipeline,
+        username: str,
+        version: CacheVersion,
+        size: int,
+        keys: list[str],
+    ) -> None:
+        settings = get_settings().redis
+        pipeline.eval(
+            commit_script,
+            len(keys) + 2,
+            self._get_version_key(username),
+            self._get_bytes_key(username, version),
+            *keys,
+            str(version.writes),
+            str(size),
+            str(settings.user_cache_bytes),
+            str(max(
+                settings.report_ttl,
+                settings.segment_ttl,
+                settings.transaction_ttl,
+            )),
         )
 
+    def _get_version_key(self, username: str) -> str:
+        return key_separator.join(('user-version', get_user_tag(username)))
+
+    def _get_bytes_key(self, username: str, version: CacheVersion) -> str:
+        return key_separator.join((
+            'user-bytes', get_user_tag(username), str(version.generation),
+        ))
+
+    def _get_registry_key(self, username: str) -> str:
+        return key_separator.join((
+            'open-report-bodies', get_user_tag(username),
+        ))
+
+    def _get_user_key(self, username: str) -> str:
+        return key_separator.join(('user', get_user_tag(username)))
+
+
+class UserRecordCacheMixin(UserCacheMixin):
+    """
+    Миксин для кэширования пользователей.
+
+    Пользователь хранится hash по имени пользователя. Проведение
+    транзакции удаляет его запись тем же скриптом, которым учитывает
+    транзакцию в версии пользователя, инвалидация - той же транзакцией
+    MULTI/EXEC, которой увеличивает поколение. Пользователь,
+    прочитанный из хранилища до проведения транзакции, не записывается:
+    версия пользователя сверяется с прочитанной до хранилища.
+    """
+
+    async def get_user_cache(self, username: str) -> User:
+        """
+        Получает пользователя из кэша.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :return: Пользователь.
+        :rtype: User
+        :raises KeyError: Если пользователь не найден в кэше.
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        try:
+            mapping = await self.storage.hgetall(  # type: ignore[misc]
+                self._get_user_key(username),
+            )
+        except Exception as exc:
+            logger.error('cache error during get user', exc_info=exc)
+            raise ServerError() from exc
+        if not mapping:
+            raise KeyError(f'{username} not found')
+        return User.model_validate(mapping)
+
+    async def create_user_cache(
+        self, user: User, version: CacheVersion,
+    ) -> None:
+        """
+        Записывает пользователя в кэш.
+
+        Пользователь не сохраняется, если после чтения версии
+        его транзакции проводились или кэш пользователя инвалидировался.
+
+        :param user: Пользователь, прочитанный из хранилища.
+        :type user: User
+        :param version: Версия кэша пользователя до чтения из хранилища.
+        :type version: CacheVersion
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        mapping = user.model_dump(exclude_none=True)
+        mapping['is_verified'] = int(user.is_verified)
+        try:
+            await self.storage.eval(  # type: ignore[misc]
+                create_user_script,
+                2,
+                self._get_version_key(user.username),
+                self._get_user_key(user.username),
+                str(version.generation),
+                str(version.writes),
+                str(get_settings().redis.user_ttl),
+                *chain.from_iterable(mapping.items()),
+            )
+        except Exception as exc:
+            logger.error('cache error during create user', exc_info=exc)
+            raise ServerError() from exc
+
+
+class TransactionCacheMixin(RedisStorage):
+    """
+    Миксин для кэширования транзакций.
+
+    Транзакция хранится одним hash по ID, присвоенному хранилищем,
+    с хэш-тегом пользователя и общая для всех сегментов и поколений
+    пользователя, которые на нее ссылаются. Запись сегмента продлевает
+    TTL его транзакций, транзакции, на которые больше не ссылаются,
+    удаляются по TTL.
+    """
+
     def create_transactions_cache(
-        self, transactions: list[Transaction],
+        self, pipeline: Pipeline, transactions: list[Transaction],
     ) -> list[str]:
         """
-        Создает кэш транзакций.
+        Добавляет запись кэша транзакций в конвейер.
 
+        :param pipeline: Конвейер команд redis.
+        :type pipeline: Pipeline
         :param transactions: Список транзакций.
         :type transactions: list[Transaction]
-        :return: Список ключей созданных транзакций.
+        :return: Список ключей создаваемых транзакций.
         :rtype: list[str]
-        :raises ServerError: При ошибке доступа к кэшу.
         """
+        ttl = get_settings().redis.transaction_ttl
         transactions_keys = []
         for transaction in transactions:
             key = self._get_transaction_key(transaction)
-            try:
-                self.storage.hset(
-                    key, mapping=self._get_transaction_mapping(transaction),
-                )
-            except Exception as exc:
-                logger.error(
-                    'cache error during create transaction', exc_info=exc,
-                )
-                raise ServerError() from exc
+            pipeline.hset(
+                key, mapping=self._get_transaction_mapping(transaction),
+            )
+            pipeline.expire(key, ttl)
             transactions_keys.append(key)
         return transactions_keys
 
-    def get_transactions_from_cache(
+    async def get_transactions_from_cache(
         self, keys: list[str],
-    ) -> list[Transaction]:
+    ) -> dict[str, Transaction]:
         """
-        Получает транзакции из кэша.
+        Получает транзакции из кэша за один запрос к redis.
+
+        Транзакции с истекшим TTL пропускаются.
 
         :param keys: Список ключей транзакций.
         :type keys: list[str]
-        :return: Список транзакций полученных из кэша.
-        :rtype: list[Transaction]
-        :raises ServerError: При ошибке доступа к кэшу.
+        :return: Транзакции полученные из кэша по ключам.
+        :rtype: dict[str, Transaction]
         """
-        transactions = []
-        for key in keys:
-            try:
-                transaction = self.storage.hgetall(key)
-            except Exception as exc:
-                logger.error(
-                    'cache error during get transaction', exc_info=exc,
-                )
-                raise ServerError() from exc
-            if transaction:
-                transactions.append(self._get_transaction(transaction))  # type:ignore # noqa:E501
-        return transactions
+        if not keys:
+            return {}
+        pipeline = self.storage.pipeline(transaction=False)
+        for transaction_key in keys:
+            pipeline.hgetall(transaction_key)
+        mappings = await self._execute(pipeline, 'get transactions')
+        return {
+            key: self._get_transaction(mapping)
+            for key, mapping in zip(keys, mappings)
+            if mapping
+        }
 
     def _get_transaction(self, mapping: dict[str, Any]) -> Transaction:
         transaction_type = TransactionType.from_int(
@@ -179,17 +456,22 @@ class TransactionCacheMixin:
             amount=mapping['amount'],
             transaction_type=transaction_type,
             timestamp=timestamp,
+            transaction_id=mapping[Key.transaction_id],
         )
 
-    def _get_transaction_key(self, cache_value: Transaction) -> str:
-        date_format = '%d-%m-%Y-%H-%M-%S'  # noqa: WPS323 date format
-        return f'transaction:{cache_value.username}{cache_value.timestamp.strftime(date_format)}'  # noqa: E501, WPS237, WPS221 cant help
+    def _get_transaction_key(self, transaction: Transaction) -> str:
+        return key_separator.join((
+            'transaction',
+            get_user_tag(transaction.username),
+            str(transaction.transaction_id),
+        ))
 
     def _get_transaction_mapping(
         self,
         transaction: Transaction,
     ) -> dict[str, Any]:
         return {
+            Key.transaction_id: transaction.transaction_id,
             Key.username: transaction.username,
             'amount': transaction.amount,
             'transaction_type': transaction.transaction_type.to_int(),
@@ -197,102 +479,490 @@ class TransactionCacheMixin:
         }
 
 
-class TransactionsListCacheMixin:
-    """Миксин для кэширования транзакций."""
+class SegmentCacheMixin(RedisStorage):
+    """
+    Миксин для кэширования дневных сегментов транзакций.
+
+    Сегмент - список redis, первый элемент которого - число транзакций
+    дня, остальные - ключи транзакций. Пустой день хранится списком
+    из одного числа и поэтому отличается от отсутствующего в кэше.
+    """
+
+    async def _get_segment_lists(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> dict[date, list[str]]:
+        days = get_days(request)
+        pipeline = self.storage.pipeline(transaction=False)
+        for day in days:
+            pipeline.lrange(
+                self._get_segment_key(request.username, day, version), 0, -1,
+            )
+        return dict(zip(days, await self._execute(pipeline, 'get segments')))
+
+    def _get_segment_key(
+        self, username: str, day: date, version: CacheVersion,
+    ) -> str:
+        return key_separator.join((
+            'segment',
+            get_user_tag(username),
+            str(version.generation),
+            day.isoformat(),
+        ))
+
+    def _create_segment_cache(
+        self, pipeline: Pipeline, key: str, transactions_keys: list[str],
+    ) -> None:
+        # Сегмент перезаписывается: параллельные промахи не дублируют ключи.
+        pipeline.delete(key)
+        pipeline.rpush(key, len(transactions_keys), *transactions_keys)
+        pipeline.expire(key, get_settings().redis.segment_ttl)
+
+    def _is_complete(
+        self, segment: list[str], transactions: dict[str, Transaction],
+    ) -> bool:
+        if not segment:
+            return False
+        keys = segment[1:]
+        return int(segment[0]) == len(keys) and all(
+            key in transactions for key in keys
+        )
+
+    def _get_size(self, segments: Segments) -> int:
+        return len(transactions_adapter.dump_json(
+            list(chain.from_iterable(segments.values())),
+        ))
+
+
+class ReportBodyCacheMixin(UserCacheMixin):
+    """
+    Миксин для кэширования готовых тел ответов с отчетами.
+
+    Тело хранится строкой redis и читается без декодирования,
+    в формате gzip - сжатым.
+    """
+
+    async def get_report_body(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> ReportBody:
+        """
+        Получает готовое тело ответа с отчетом из кэша.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: Тело ответа в том виде, в котором хранится в кэше.
+        :rtype: ReportBody
+        :raises KeyError: Если отчет не найден в кэше.
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        try:
+            payload = await self.storage.execute_command(  # type: ignore[no-untyped-call] # noqa: E501
+                'GET',
+                self._get_body_key(request, version),
+                **{NEVER_DECODE: True},
+            )
+        except Exception as exc:
+            logger.error('cache error during get report body', exc_info=exc)
+            raise ServerError() from exc
+        if payload is None:
+            raise KeyError(f'{request} not found')
+        if self._is_compressed():
+            return ReportBody(payload, ReportCacheFormat.gzip)
+        return ReportBody(payload)
 
-    def __init__(self) -> None:
-        """Метод инициализации класса TransactionsListCacheMixin."""
-        settings = get_settings()
-        self.storage = redis.Redis(
-            host=settings.redis.host,
-            port=settings.redis.port,
-            decode_responses=settings.redis.decode_responses,
-            db=settings.redis.db,
+    async def create_report_body(
+        self,
+        request: TransactionReportRequest,
+        payload: bytes,
+        version: CacheVersion,
+    ) -> bool:
+        """
+        Записывает готовое тело ответа с отчетом в кэш.
+
+        Тело не сохраняется, если превышает объем кэша пользователя
+        или если после чтения версии в кэш дописывались транзакции.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param payload: Отчет, сериализованный в JSON.
+        :type payload: bytes
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: True, если тело записано.
+        :rtype: bool
+        """
+        if self._is_compressed():
+            payload = gzip.compress(payload)
+        ttl = get_settings().redis.report_ttl
+        key = self._get_body_key(request, version)
+        pipeline = self.storage.pipeline()
+        pipeline.set(key, payload, ex=ttl)
+        if request.end_date >= datetime.now():
+            registry = self._get_registry_key(request.username)
+            pipeline.hset(registry, key, entry_separator.join((
+                request.start_date.isoformat(), request.end_date.isoformat(),
+            )))
+            pipeline.expire(registry, ttl)
+        self._commit(pipeline, request.username, version, len(payload), [key])
+        return is_committed(
+            await self._execute(pipeline, 'create report body'),
         )
 
-    def _get_transactions_key(
-        self, cache_value: TransactionReport | TransactionReportRequest,
+    def _is_compressed(self) -> bool:
+        report_format = get_settings().redis.report_format
+        return report_format == ReportCacheFormat.gzip
+
+    def _get_body_key(
+        self, request: TransactionReportRequest, version: CacheVersion,
     ) -> str:
-        date_format = '%d-%m-%Y'  # noqa: WPS323 date format
-        return f'transactions:{cache_value.username}{cache_value.start_date.strftime(date_format)}{cache_value.end_date.strftime(date_format)}'  # noqa: E501, WPS237, WPS221 cant help
+        # Формат входит в ключ: после смены формата старые тела не читаются.
+        return key_separator.join((
+            'report-body',
+            get_settings().redis.report_format,
+            get_user_tag(request.username),
+            str(version.generation),
+            request.start_date.isoformat(),
+            request.end_date.isoformat(),
+        ))
+
+
+class HistoryCacheMixin(RedisStorage):
+    """Миксин для кэширования страниц истории транзакций."""
+
+    async def get_history_cache(
+        self, request: TransactionHistoryRequest,
+    ) -> TransactionHistoryPage:
+        """
+        Получает страницу истории транзакций из кэша.
 
-    def _create_transactions_list_cache(
-        self, key: str, transactions_list: list[str],
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :return: Страница истории транзакций.
+        :rtype: TransactionHistoryPage
+        :raises KeyError: Если страница не найдена в кэше.
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        try:
+            page = await self.storage.get(self._get_history_key(request))
+        except Exception as exc:
+            logger.error('cache error during get history', exc_info=exc)
+            raise ServerError() from exc
+        if page is None:
+            raise KeyError(f'{request} not found')
+        return TransactionHistoryPage.model_validate_json(page)
+
+    async def create_history_cache(
+        self,
+        request: TransactionHistoryRequest,
+        page: TransactionHistoryPage,
     ) -> None:
-        if transactions_list:
-            try:
-                self.storage.rpush(key, *transactions_list)
-            except Exception as exc:
-                logger.error(
-                    'cache error during create transactions list', exc_info=exc,
-                )
-                raise ServerError() from exc
+        """
+        Записывает страницу истории транзакций в кэш.
 
-    def _get_transactions_list_cache(self, key: str) -> list[str]:
+        :param request: Запрос страницы истории.
+        :type request: TransactionHistoryRequest
+        :param page: Страница истории транзакций.
+        :type page: TransactionHistoryPage
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
         try:
-            return self.storage.lrange(key, 0, -1)  # type:ignore # noqa:E501
+            await self.storage.set(
+                self._get_history_key(request),
+                page.model_dump_json(),
+                ex=get_settings().redis.history_ttl,
+            )
         except Exception as exc:
-            logger.error(
-                'cache error during get transactions list', exc_info=exc,
+            logger.error('cache error during create history', exc_info=exc)
+            raise ServerError() from exc
+
+    def _get_history_key(self, request: TransactionHistoryRequest) -> str:
+        return key_separator.join((
+            'history',
+            get_user_tag(request.username),
+            str(request.page_size),
+            str(request.cursor),
+        ))
+
+
+class LeaseCacheMixin(RedisStorage):
+    """
+    Миксин аренд чтения дней отчетов из хранилища.
+
+    Одинаковые промахи кэша в разных процессах читают хранилище один
+    раз: процесс, взявший аренду периода, читает дни и записывает
+    сегменты, остальные ждут возврата аренды и читают сегменты из кэша.
+    Аренда истекает через ttl, если процесс не вернул ее.
+
+    Процесс, аренда которого истекла, может записать сегменты позже
+    следующего владельца. Поэтому сегменты записываются с токеном
+    аренды и не перезаписывают сегменты, записанные с большим токеном.
+    """
+
+    async def acquire_lease(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> int | None:
+        """
+        Берет аренду чтения дней периода из хранилища.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: Токен аренды, 0, если аренды отключены, или None,
+            если период читает другой процесс.
+        :rtype: int | None
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        settings = get_settings().report_lease
+        if not settings.enabled:
+            return 0
+        try:
+            token = await self.storage.eval(  # type: ignore[misc]
+                acquire_lease_script,
+                2,
+                self._get_lease_key(request, version),
+                self._get_lease_token_key(request.username),
+                str(int(settings.ttl * 1000)),
             )
+        except Exception as exc:
+            logger.error('cache error during acquire lease', exc_info=exc)
             raise ServerError() from exc
+        return int(token) or None
 
+    async def release_lease(
+        self,
+        request: TransactionReportRequest,
+        version: CacheVersion,
+        token: int,
+    ) -> None:
+        """
+        Возвращает аренду, если она еще принадлежит токену.
+
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :param token: Токен аренды.
+        :type token: int
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        if not token:
+            return
+        try:
+            await self.storage.eval(  # type: ignore[misc]
+                release_lease_script,
+                1,
+                self._get_lease_key(request, version),
+                str(token),
+            )
+        except Exception as exc:
+            logger.error('cache error during release lease', exc_info=exc)
+            raise ServerError() from exc
+
+    async def wait_lease(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> bool:
+        """
+        Ожидает возврата или истечения чужой аренды периода.
+
+        Аренда проверяется раз в poll_interval, не дольше timeout.
 
-class TransactionReportCache(
-    ReportCacheMixin, TransactionCacheMixin, TransactionsListCacheMixin,
+        :param request: Период, читаемый из хранилища.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: True, если аренда возвращена или истекла до таймаута.
+        :rtype: bool
+        :raises ServerError: При ошибке доступа к кэшу.
+        """
+        settings = get_settings().report_lease
+        key = self._get_lease_key(request, version)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.timeout
+        while loop.time() < deadline:
+            await asyncio.sleep(settings.poll_interval)
+            try:
+                is_leased = await self.storage.exists(key)
+            except Exception as exc:
+                logger.error('cache error during wait lease', exc_info=exc)
+                raise ServerError() from exc
+            if not is_leased:
+                return True
+        logger.warning(f'lease {key} is not released in time')
+        return False
+
+    async def _fence(
+        self, pipeline: Pipeline, keys: list[str], token: int,
+    ) -> list[str] | None:
+        # Токены, с которыми записаны сегменты, проверяются под WATCH:
+        # если их перезапишут до EXEC, транзакция не выполнится.
+        fences = [key_separator.join(('fence', key)) for key in keys]
+        try:
+            tokens = await self._watch(pipeline, fences)
+        except Exception as exc:
+            logger.error('cache error during fence segments', exc_info=exc)
+            raise ServerError() from exc
+        if any(int(fence_token or 0) > token for fence_token in tokens):
+            return None
+        pipeline.multi()  # type: ignore[no-untyped-call]
+        ttl = get_settings().redis.segment_ttl
+        for fence in fences:
+            pipeline.set(fence, token, ex=ttl)
+        return fences
+
+    async def _watch(self, pipeline: Pipeline, keys: list[str]) -> list[Any]:
+        await pipeline.watch(*keys)
+        return await pipeline.mget(keys)  # type: ignore[no-any-return]
+
+    def _get_lease_key(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> str:
+        # Версия входит в ключ: после новой транзакции период читается
+        # заново, а не ждет чтения, результат которого не сохранится.
+        return key_separator.join((
+            'report-lease',
+            get_user_tag(request.username),
+            str(version.generation),
+            str(version.writes),
+            request.start_date.isoformat(),
+            request.end_date.isoformat(),
+        ))
+
+    def _get_lease_token_key(self, username: str) -> str:
+        # Токены сравниваются только для сегментов одного пользователя.
+        return key_separator.join((
+            'report-lease-token', get_user_tag(username),
+        ))
+
+
+class TransactionReportCache(  # noqa: WPS215 cache parts are mixins
+    TransactionCacheMixin,
+    SegmentCacheMixin,
+    ReportBodyCacheMixin,
+    UserRecordCacheMixin,
+    HistoryCacheMixin,
+    LeaseCacheMixin,
 ):
     """Имплементация кэша для хранения отчетов."""
 
-    def __init__(self) -> None:
-        """Метод инициализации класса TransactionReportCache."""
-        settings = get_settings()
-        self.storage = redis.Redis(
-            host=settings.redis.host,
-            port=settings.redis.port,
-            decode_responses=settings.redis.decode_responses,
-        )
-
-    async def get_cache(
-        self, cache_value: TransactionReportRequest,
-    ) -> TransactionReport:
+    async def get_segments(
+        self, request: TransactionReportRequest, version: CacheVersion,
+    ) -> Segments:
         """
-        Получает значение из кэша.
+        Получает из кэша сегменты дней периода отчета.
+
+        Сегменты читаются одним запросом к redis, их транзакции -
+        вторым, независимо от числа дней и транзакций. Сегменты,
+        часть транзакций которых истекла, считаются отсутствующими.
+
+        :param request: Запрос отчета.
+        :type request: TransactionReportRequest
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :return: Транзакции по дням, только для дней, найденных в кэше.
+        :rtype: Segments
+        """
+        segments = await self._get_segment_lists(request, version)
+        transactions = await self.get_transactions_from_cache([
+            key for segment in segments.values() for key in segment[1:]
+        ])
+        return {
+            day: [transactions[key] for key in segment[1:]]
+            for day, segment in segments.items()
+            if self._is_complete(segment, transactions)
+        }
 
-        :param cache_value: Кэшированное значение
-        :type cache_value: Token
-        :return: Кэшированное значение
+    async def create_segments(
+        self,
+        username: str,
+        segments: Segments,
+        version: CacheVersion,
+        token: int = 0,
+    ) -> bool:
+        """
+        Записывает сегменты дней в кэш.
+
+        Сегменты и их транзакции записываются одной транзакцией
+        MULTI/EXEC за один запрос к redis. Сегменты не сохраняются,
+        если превышают объем кэша пользователя или если после чтения
+        версии в кэш дописывались транзакции. Сегменты, прочитанные
+        под арендой, не сохраняются, если те же дни уже записаны
+        с большим токеном аренды.
+
+        :param username: Имя пользователя.
+        :type username: str
+        :param segments: Транзакции по дням.
+        :type segments: Segments
+        :param version: Версия кэша пользователя.
+        :type version: CacheVersion
+        :param token: Токен аренды, под которой прочитаны дни, 0 - без аренды.
+        :type token: int
+        :return: True, если сегменты записаны.
+        :rtype: bool
         """
-        report = self.get_report_cache(cache_value)
-        key = report.get('transactions', '')
-        transaction_keys = self._get_transactions_list_cache(key)
-        if not transaction_keys:
-            transaction_keys = []
-        transactions = self.get_transactions_from_cache(transaction_keys)
-        return self._get_report(report, transactions)
+        keys = [
+            self._get_segment_key(username, day, version) for day in segments
+        ]
+        async with self.storage.pipeline() as pipeline:
+            fences = await self._fence(pipeline, keys, token) if token else []
+            if fences is None:
+                logger.info(f'segments of {username} are fenced by newer lease')
+                return False
+            for key, transactions in zip(keys, segments.values()):
+                self._create_segment_cache(
+                    pipeline,
+                    key,
+                    self.create_transactions_cache(pipeline, transactions),
+                )
+            self._commit(
+                pipeline,
+                username,
+                version,
+                self._get_size(segments),
+                keys + fences,
+            )
+            return is_committed(
+                await self._execute(pipeline, 'create segments'),
+            )
 
-    async def create_cache(self, cache_value: TransactionReport) -> None:
+    async def append_transaction(self, transaction: Transaction) -> None:
         """
-        Записывает значение в кэш.
+        Дописывает транзакцию в сегмент ее дня.
 
-        :param cache_value: Кэшируемое значение
-        :type cache_value: Token
+        Сегмент дополняется, только если он уже есть в кэше. Готовые
+        тела ответов с отчетами, период которых покрывает транзакцию,
+        удаляются. Ключ сегмента строится по поколению, прочитанному
+        отдельным запросом: ключи скрипта передаются в KEYS и лежат
+        в одном слоте redis cluster.
+
+        :param transaction: Проведенная транзакция.
+        :type transaction: Transaction
+        :raises ServerError: При ошибке доступа к кэшу.
         """
-        transactions_key = self._get_transactions_key(cache_value)
-        transactions = self.create_transactions_cache(cache_value.transactions)
-        self._create_transactions_list_cache(transactions_key, transactions)
-        self.create_report_cache(cache_value, transactions_key)
+        username = transaction.username
+        version = await self.get_user_version(username)
+        mapping = self._get_transaction_mapping(transaction)
+        try:
+            await self.storage.eval(  # type: ignore[misc]
+                append_transaction_script,
+                5,  # noqa: WPS432 number of keys
+                self._get_version_key(username),
+                self._get_registry_key(username),
+                self._get_transaction_key(transaction),
+                self._get_user_key(username),
+                self._get_segment_key(
+                    username, transaction.timestamp.date(), version,
+                ),
+                transaction.timestamp.isoformat(),
+                str(get_settings().redis.transaction_ttl),
+                str(version.generation),
+                *chain.from_iterable(mapping.items()),
+            )
+        except Exception as exc:
+            logger.error('cache error during append transaction', exc_info=exc)
+            raise ServerError() from exc
 
     async def flush_cache(self) -> None:
-        """Удаляет все ключи."""
-        self.storage.flushall()
-
-    def _get_report(
-        self, report_map: dict[str, Any], transactions: list[Transaction],
-    ) -> TransactionReport:
-        return TransactionReport(
-            username=report_map[Key.username],
-            start_date=datetime.fromisoformat(report_map['start_date']),
-            end_date=datetime.fromisoformat(report_map['end_date']),
-            transactions=transactions,
-            report_id=None,
-        )
+        """Удаляет все ключи базы данных redis кэша."""
+        await self.storage.flushdb()
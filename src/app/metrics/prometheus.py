@@ -0,0 +1,27 @@
+from prometheus_client import Counter, Histogram
+
+batch_size = Histogram(
+    'transaction_batch_size',
+    'Число транзакций в пакете, проведенном за один запрос к хранилищу.',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+batch_queue_delay = Histogram(
+    'transaction_batch_queue_delay_seconds',
+    'Время ожидания транзакции в очереди до проведения пакета.',
+    buckets=(0.0005, 0.001, 0.002, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+ledger_commit_size = Histogram(
+    'ledger_commit_size',
+    'Число записей журнала, сохраненных на диск одним fsync.',
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+near_cache_hits = Counter(
+    'near_cache_hits',
+    'Число чтений из кэша в памяти процесса без обращения к redis.',
+    ['family'],
+)
+near_cache_misses = Counter(
+    'near_cache_misses',
+    'Число чтений, не найденных в кэше в памяти процесса.',
+    ['family'],
+)
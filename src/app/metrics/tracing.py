@@ -21,6 +21,7 @@ class Tag(StrEnum):
     error = 'error'
     warning = 'warning'
     token = 'token'  # noqa: S105 not a password
+    batch_size = 'batch_size'
 
 
 def get_tracer() -> Tracer | None:
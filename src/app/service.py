@@ -4,8 +4,11 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from starlette.middleware.base import BaseHTTPMiddleware
 
-from app.api.handlers import router
+from app.api.handlers import router, service
 from app.api.healthz.handlers import healthz_router
+from app.api.metrics.handlers import metrics_router
+from app.core.interfaces import close_repository
+from app.external.redis import close_pool, get_pool
 from app.metrics.tracing import get_tracer, tracing_middleware
 
 
@@ -14,15 +17,22 @@ async def lifetime(app: FastAPI):
     """
     Функция жизненного цикла сервиса.
 
+    При запуске создается общий пул соединений redis,
+    при остановке закрываются хранилище данных и соединения redis.
+
     :param app: Инстанс приложения.
     :yield: Scope запроса
     """
     tracer = get_tracer()
+    get_pool()
     yield {'tracer': tracer}
+    await close_repository(service.repository)
+    await close_pool()
 
-app = FastAPI()
+app = FastAPI(lifespan=lifetime)
 app.include_router(router)
 app.include_router(healthz_router)
+app.include_router(metrics_router)
 app.add_middleware(BaseHTTPMiddleware, dispatch=tracing_middleware)
 
 
@@ -18,6 +18,12 @@ def client() -> AsyncClient:
     return AsyncClient(app=app, base_url='http://test')
 
 
+@pytest.fixture
+def anyio_backend() -> str:
+    """Запускает тесты anyio в asyncio: кэш работает на redis.asyncio."""
+    return 'asyncio'
+
+
 @pytest.fixture
 def service():
     """
@@ -1,12 +1,23 @@
+import logging
+import time
 from datetime import datetime, timedelta
 from enum import StrEnum
 
 import pytest
 from fastapi import status
 
-from app.core.models import TransactionRequest, User
+from app.api.handlers import ndjson_media_type
+from app.core.config import ReportCacheFormat, get_settings
+from app.core.models import (
+    Transaction,
+    TransactionRequest,
+    TransactionType,
+    User,
+)
 from app.core.transactions import TransactionService
 
+logger = logging.getLogger(__name__)
+
 
 class Literals(StrEnum):
     """Часто используемые литералы."""
@@ -18,6 +29,8 @@ class Literals(StrEnum):
     peter = 'peter'
     start_date = 'start_date'
     end_date = 'end_date'
+    transactions = 'transactions'
+    report_id = 'report_id'
 
 
 verified_user = User(
@@ -55,6 +68,7 @@ big_withdraw_transaction_request = {
 day_before_now = datetime.now() - timedelta(days=1)
 day_after_now = datetime.now() + timedelta(days=1)
 two_days_before_now = datetime.now() - timedelta(days=2)
+gzip_encoding = 'gzip'
 
 all_transactions_report_request = {
     Literals.username: Literals.george,
@@ -128,6 +142,18 @@ class TestCreateTransaction:
                 status.HTTP_200_OK,
                 id='verified user accepted transaction',
             ),
+            pytest.param(
+                {**valid_transaction_request, Literals.amount: 0},
+                verified_user,
+                status.HTTP_403_FORBIDDEN,
+                id='zero amount forbidden',
+            ),
+            pytest.param(
+                {**valid_transaction_request, Literals.amount: -2},
+                verified_user,
+                status.HTTP_403_FORBIDDEN,
+                id='negative withdraw forbidden',
+            ),
         ),
     )
     async def test_create_transaction(
@@ -148,8 +174,45 @@ class TestCreateTransaction:
         )
 
         assert response.status_code == expected_status
-        if response.status_code == status.HTTP_200_OK:
-            assert len(service.repository.transactions) == 1  # type: ignore
+        posted = int(response.status_code == status.HTTP_200_OK)
+        assert len(service.repository.transactions) == posted  # type: ignore
+
+
+class TestCreateTransactions:
+    """Тестирует хэндлер /create_transactions."""
+
+    url = '/create_transactions'
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    async def test_create_transactions(
+        self, client, service_with_user_fixture, service_mocker,
+    ):
+        """Результаты пакета возвращаются в порядке запроса."""
+        service: TransactionService = await service_with_user_fixture(
+            not_verified_user,
+        )
+        service_mocker(service)
+        response = await client.post(
+            self.url,
+            json={'transactions': [
+                valid_transaction_request,
+                user_not_found_transaction_request,
+                valid_transaction_request,
+                {**valid_transaction_request, Literals.amount: 0},
+            ]},
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [
+            res['status_code'] for res in response.json()['results']
+        ] == [
+            status.HTTP_200_OK,
+            status.HTTP_404_NOT_FOUND,
+            status.HTTP_403_FORBIDDEN,
+            status.HTTP_403_FORBIDDEN,
+        ]
+        assert len(service.repository.transactions) == 1  # type: ignore
 
 
 class TestCreateReport:
@@ -212,4 +275,432 @@ class TestCreateReport:
 
         assert response.status_code == expected_status
         if response.status_code == status.HTTP_200_OK:
-            assert len(response.json()['transactions']) == expected_qnt
+            assert len(response.json()[Literals.transactions]) == expected_qnt
+            assert response.json()[Literals.report_id] is not None
+            assert len(service.repository.reports) == 1
+
+
+class TestCreateReportBody:
+    """Тестирует хэндлер /create_report с кэшем готовых тел отчетов."""
+
+    url = '/create_report'
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        'report_format, accept_encoding, expected_encoding', (
+            pytest.param(
+                ReportCacheFormat.json, gzip_encoding, None, id='json',
+            ),
+            pytest.param(
+                ReportCacheFormat.gzip,
+                gzip_encoding,
+                gzip_encoding,
+                id='gzip accepted',
+            ),
+            pytest.param(
+                ReportCacheFormat.gzip,
+                'identity',
+                None,
+                id='gzip not accepted',
+            ),
+            pytest.param(
+                ReportCacheFormat.gzip,
+                'gzip;q=0, identity',
+                None,
+                id='gzip refused',
+            ),
+            pytest.param(
+                ReportCacheFormat.gzip,
+                '*;q=0.5',
+                gzip_encoding,
+                id='any accepted',
+            ),
+        ),
+    )
+    async def test_create_report_body(  # noqa: WPS211 fixtures and params
+        self,
+        report_format,
+        accept_encoding,
+        expected_encoding,
+        client,
+        service_with_transactions_fixture,
+        service_mocker,
+        monkeypatch,
+    ):
+        """Отчет из кэша совпадает с отчетом, созданным при промахе."""
+        monkeypatch.setattr(
+            get_settings().redis, 'report_format', report_format,
+        )
+        service: TransactionService = await service_with_transactions_fixture(
+            verified_user,
+            [
+                TransactionRequest(**valid_transaction_request),
+                TransactionRequest(**valid_transaction_request),
+            ],
+        )
+        service_mocker(service)
+        headers = {'Accept-Encoding': accept_encoding}
+
+        missed = await client.post(
+            self.url, json=all_transactions_report_request, headers=headers,
+        )
+        hit = await client.post(
+            self.url, json=all_transactions_report_request, headers=headers,
+        )
+
+        assert missed.status_code == status.HTTP_200_OK
+        assert hit.status_code == status.HTTP_200_OK
+        assert hit.json() == missed.json()
+        assert len(hit.json()[Literals.transactions]) == 2
+        assert hit.headers.get('content-encoding') == expected_encoding
+
+
+@pytest.mark.slow
+class TestCreateReportBenchmark:
+    """
+    Бенчмарк попаданий в кэш отчетов разных форматов.
+
+    Отчет из size транзакций запрашивается hits раз после промаха,
+    в лог пишется среднее время ответа для каждого формата кэша.
+    """
+
+    url = '/create_report'
+    size = 5000
+    hits = 10
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    async def test_report_body_hit_is_faster(
+        self,
+        client,
+        service_with_user_fixture,
+        service_mocker,
+        monkeypatch,
+    ):
+        """Попадание в кэш готовых тел быстрее сборки отчета из hash."""
+        service: TransactionService = await service_with_user_fixture(
+            verified_user,
+        )
+        service.repository.transactions = [
+            Transaction(
+                username=Literals.george,
+                amount=1,
+                transaction_type=TransactionType.deposit,
+                timestamp=day_before_now + timedelta(seconds=second),
+                transaction_id=second,
+            )
+            for second in range(self.size)
+        ]
+        service_mocker(service)
+        # Сегменты и тела отчета делят объем кэша пользователя.
+        monkeypatch.setattr(
+            get_settings().redis, 'user_cache_bytes', self.size * 1000,
+        )
+        timings = {}
+        for report_format in ReportCacheFormat:
+            monkeypatch.setattr(
+                get_settings().redis, 'report_format', report_format,
+            )
+            await client.post(self.url, json=all_transactions_report_request)
+            timings[report_format] = await self._get_hit_time(client)
+            logger.info(
+                f'{report_format} hit: {timings[report_format]:.2f} ms',
+            )
+        assert timings[ReportCacheFormat.json] < timings[ReportCacheFormat.hash]
+        assert timings[ReportCacheFormat.gzip] < timings[ReportCacheFormat.hash]
+
+    async def _get_hit_time(self, client) -> float:
+        started = time.perf_counter()
+        for _ in range(self.hits):
+            response = await client.post(
+                self.url, json=all_transactions_report_request,
+            )
+            assert len(response.json()[Literals.transactions]) == self.size
+        return (time.perf_counter() - started) * 1000 / self.hits
+
+
+class TestStreamReport:
+    """Тестирует хэндлер /create_report/stream."""
+
+    url = '/create_report/stream'
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        'report_request, expected_status, expected_qnt', (
+            pytest.param(
+                all_transactions_report_request,
+                status.HTTP_200_OK,
+                2,
+                id='valid request, all transactions',
+            ),
+            pytest.param(
+                none_transactions_report_request,
+                status.HTTP_200_OK,
+                0,
+                id='valid request, none transactions',
+            ),
+            pytest.param(
+                invalid_user_transactions_report_request,
+                status.HTTP_404_NOT_FOUND,
+                0,
+                id='invalid request, user not found',
+            ),
+            pytest.param(
+                invalid_dates_transactions_report_request,
+                status.HTTP_403_FORBIDDEN,
+                0,
+                id='invalid request, invalid dates',
+            ),
+        ),
+    )
+    async def test_stream_report(
+        self,
+        report_request,
+        expected_status,
+        expected_qnt,
+        client,
+        service_with_transactions_fixture,
+        service_mocker,
+    ):
+        """Тестирует stream_report."""
+        service: TransactionService = await service_with_transactions_fixture(
+            verified_user,
+            [
+                TransactionRequest(**valid_transaction_request),
+                TransactionRequest(**valid_transaction_request),
+            ],
+        )
+        service_mocker(service)
+        response = await client.post(self.url, json=report_request)
+
+        assert response.status_code == expected_status
+        if response.status_code == status.HTTP_200_OK:
+            assert response.headers['content-type'] == ndjson_media_type
+            lines = response.text.splitlines()
+            assert len(lines) == expected_qnt
+            assert all(Transaction.model_validate_json(line) for line in lines)
+
+
+@pytest.mark.asyncio
+@pytest.mark.anyio
+async def test_metrics(client):
+    """Тестирует хэндлер /metrics."""
+    response = await client.get('/metrics')
+
+    assert response.status_code == status.HTTP_200_OK
+    assert 'transaction_batch_size' in response.text
+
+
+class TestHistory:
+    """Тестирует хэндлер /history."""
+
+    url = '/history'
+    transactions_qnt = 5
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    async def test_history_pages(
+        self, client, service_with_transactions_fixture, service_mocker,
+    ):
+        """Страницы истории покрывают все транзакции без повторов."""
+        service: TransactionService = await service_with_transactions_fixture(
+            verified_user,
+            [
+                TransactionRequest(**valid_transaction_request)
+                for _ in range(self.transactions_qnt)
+            ],
+        )
+        service_mocker(service)
+        history_request = {Literals.username: Literals.george, 'page_size': 2}
+        transaction_ids: list[int] = []
+        while history_request.get('cursor', '') is not None:
+            response = await client.post(self.url, json=history_request)
+            assert response.status_code == status.HTTP_200_OK
+            page = response.json()
+            transaction_ids.extend(
+                trn['transaction_id'] for trn in page[Literals.transactions]
+            )
+            history_request['cursor'] = page['next_cursor']
+
+        assert transaction_ids == sorted(set(transaction_ids), reverse=True)
+        assert len(transaction_ids) == self.transactions_qnt
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        'history_request, expected_status', (
+            pytest.param(
+                {Literals.username: Literals.peter},
+                status.HTTP_404_NOT_FOUND,
+                id='user not found',
+            ),
+            pytest.param(
+                {Literals.username: Literals.george, 'page_size': 0},
+                status.HTTP_403_FORBIDDEN,
+                id='invalid page size',
+            ),
+            pytest.param(
+                {Literals.username: Literals.george, 'cursor': 'invalid'},
+                status.HTTP_403_FORBIDDEN,
+                id='invalid cursor',
+            ),
+        ),
+    )
+    async def test_history_errors(
+        self,
+        history_request,
+        expected_status,
+        client,
+        service_with_user_fixture,
+        service_mocker,
+    ):
+        """Тестирует ошибки запроса истории."""
+        service_mocker(await service_with_user_fixture(verified_user))
+        response = await client.post(self.url, json=history_request)
+
+        assert response.status_code == expected_status
+
+
+empty_totals = {'count': 0, Literals.amount: 0}
+
+
+class TestAggregateReport:
+    """Тестирует хэндлер /create_report/aggregate."""
+
+    url = '/create_report/aggregate'
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        'aggregate_request, expected_status, expected_buckets', (
+            pytest.param(
+                all_transactions_report_request,
+                status.HTTP_200_OK,
+                1,
+                id='aggregate, all transactions',
+            ),
+            pytest.param(
+                none_transactions_report_request,
+                status.HTTP_200_OK,
+                0,
+                id='aggregate, none transactions',
+            ),
+            pytest.param(
+                invalid_user_transactions_report_request,
+                status.HTTP_404_NOT_FOUND,
+                None,
+                id='aggregate, user not found',
+            ),
+            pytest.param(
+                invalid_dates_transactions_report_request,
+                status.HTTP_403_FORBIDDEN,
+                None,
+                id='aggregate, invalid dates',
+            ),
+        ),
+    )
+    async def test_aggregate_report(
+        self,
+        aggregate_request,
+        expected_status,
+        expected_buckets,
+        client,
+        service_with_transactions_fixture,
+        service_mocker,
+    ):
+        """Тестирует create_aggregate_report."""
+        service: TransactionService = await service_with_transactions_fixture(
+            verified_user,
+            [
+                TransactionRequest(**valid_transaction_request),
+                TransactionRequest(**valid_transaction_request),
+            ],
+        )
+        service_mocker(service)
+        response = await client.post(self.url, json=aggregate_request)
+
+        assert response.status_code == expected_status
+        if response.status_code == status.HTTP_200_OK:
+            report = response.json()
+            assert len(report['buckets']) == expected_buckets
+            assert report['withdraw']['count'] == 2 * expected_buckets
+            assert report['deposit']['max_amount'] is None
+
+
+class TestSummary:
+    """Тестирует хэндлер /summary."""
+
+    url = '/summary'
+
+    @pytest.mark.asyncio
+    @pytest.mark.anyio
+    @pytest.mark.parametrize(
+        'summary_request, expected_status, expected_withdraw', (
+            pytest.param(
+                {
+                    Literals.username: Literals.george,
+                    Literals.start_date: day_before_now.date().isoformat(),
+                    Literals.end_date: day_after_now.date().isoformat(),
+                },
+                status.HTTP_200_OK,
+                {'count': 2, Literals.amount: 2},
+                id='valid request, all transactions',
+            ),
+            pytest.param(
+                {
+                    Literals.username: Literals.george,
+                    Literals.start_date: two_days_before_now.date().isoformat(),
+                    Literals.end_date: day_before_now.date().isoformat(),
+                },
+                status.HTTP_200_OK,
+                empty_totals,
+                id='valid request, none transactions',
+            ),
+            pytest.param(
+                {
+                    Literals.username: Literals.peter,
+                    Literals.start_date: day_before_now.date().isoformat(),
+                    Literals.end_date: day_after_now.date().isoformat(),
+                },
+                status.HTTP_404_NOT_FOUND,
+                None,
+                id='invalid request, user not found',
+            ),
+            pytest.param(
+                {
+                    Literals.username: Literals.george,
+                    Literals.start_date: day_after_now.date().isoformat(),
+                    Literals.end_date: day_before_now.date().isoformat(),
+                },
+                status.HTTP_403_FORBIDDEN,
+                None,
+                id='invalid request, invalid dates',
+            ),
+        ),
+    )
+    async def test_summary(
+        self,
+        summary_request,
+        expected_status,
+        expected_withdraw,
+        client,
+        service_with_transactions_fixture,
+        service_mocker,
+    ):
+        """Тестирует get_summary."""
+        service: TransactionService = await service_with_transactions_fixture(
+            verified_user,
+            [
+                TransactionRequest(**valid_transaction_request),
+                TransactionRequest(**valid_transaction_request),
+            ],
+        )
+        service_mocker(service)
+        response = await client.post(self.url, json=summary_request)
+
+        assert response.status_code == expected_status
+        if response.status_code == status.HTTP_200_OK:
+            assert response.json()['withdraw'] == expected_withdraw
+            assert response.json()['deposit'] == empty_totals
@@ -1,6 +1,22 @@
-from app.service import main
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.service import app, lifetime, main, service
 
 
 def test_main():
     """Тестирует вызов main не вызывает ошибок."""
     main()
+
+
+@pytest.mark.asyncio
+async def test_lifetime_closes_repository(monkeypatch):
+    """При остановке сервиса хранилище данных закрывается."""
+    close = AsyncMock()
+    monkeypatch.setattr(service.repository, 'close', close, raising=False)
+
+    async with lifetime(app):
+        close.assert_not_awaited()
+
+    close.assert_awaited_once()
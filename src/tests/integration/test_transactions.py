@@ -1,15 +1,27 @@
+import asyncio
+import gzip
+from collections.abc import Awaitable
 from datetime import datetime, timedelta
+from typing import Any
 
 import pytest
 
+from app.core.batching import BatchingRepository
+from app.core.config import ReportCacheFormat, get_settings
 from app.core.errors import NotFoundError, ValidationError
 from app.core.models import (
+    CacheVersion,
     Transaction,
+    TransactionReport,
     TransactionReportRequest,
     TransactionRequest,
     TransactionType,
     User,
 )
+from app.core.near_cache import NearCache
+from app.core.segments import get_missing_periods, get_span
+from app.core.transactions import TransactionService
+from app.external.redis import TransactionReportCache
 
 user_positive_balance = User(
     username='george', balance=1, is_verified=False, user_id=1,
@@ -17,6 +29,93 @@ user_positive_balance = User(
 user_zero_balance = User(
     username='george', balance=0, is_verified=False, user_id=1,
 )
+batching_window = 0.01
+lease_poll_interval = 0.001
+wide_report_spans = 50
+deposit_request = TransactionRequest(
+    username=user_positive_balance.username,
+    amount=1,
+    transaction_type=TransactionType.deposit,
+)
+open_report_request = TransactionReportRequest(
+    username=user_positive_balance.username,
+    start_date=datetime.now() - timedelta(days=1),
+    end_date=datetime.now() + timedelta(days=1),
+)
+
+
+async def later(delay: float, operation: Awaitable[Any]) -> Any:
+    """Выполняет операцию через delay секунд."""
+    await asyncio.sleep(delay)
+    return await operation
+
+
+def slow_down_reports(service: TransactionService, monkeypatch) -> None:
+    """Задерживает чтение транзакций из хранилища, как ответы базы данных."""
+    read_transactions = service.repository.stream_transactions
+
+    async def slow_read_transactions(request):  # noqa: WPS430 patches method
+        async for transaction in read_transactions(request):
+            yield transaction
+        # Транзакции проводятся, пока отчет идет из хранилища.
+        await asyncio.sleep(batching_window)
+
+    monkeypatch.setattr(
+        service.repository, 'stream_transactions', slow_read_transactions,
+    )
+
+
+def spy_reads(service: TransactionService, monkeypatch) -> list[Any]:
+    """Записывает периоды, транзакции которых читаются из хранилища."""
+    periods: list[Any] = []
+    read_transactions = service.repository.stream_transactions
+
+    def spy_read_transactions(request):  # noqa: WPS430 patches the method
+        periods.append(request)
+        return read_transactions(request)
+
+    monkeypatch.setattr(
+        service.repository, 'stream_transactions', spy_read_transactions,
+    )
+    return periods
+
+
+def spy_user_reads(service: TransactionService, monkeypatch) -> list[str]:
+    """Записывает имена пользователей, читаемых из хранилища."""
+    usernames: list[str] = []
+    get_user = service.repository.get_user
+
+    async def spy_get_user(username):  # noqa: WPS430 patches the method
+        usernames.append(username)
+        return await get_user(username)
+
+    monkeypatch.setattr(service.repository, 'get_user', spy_get_user)
+    return usernames
+
+
+def spy_redis(cache: Any, monkeypatch) -> list[Any]:
+    """Записывает команды и конвейеры, отправленные в redis."""
+    calls: list[Any] = []
+
+    async def execute_command(*args, **kwargs):  # noqa: WPS430 spy method
+        calls.append(args)
+
+    def pipeline(*args, **kwargs):  # noqa: WPS430 spy method
+        calls.append(args)
+
+    monkeypatch.setattr(cache.storage, 'execute_command', execute_command)
+    monkeypatch.setattr(cache.storage, 'pipeline', pipeline)
+    return calls
+
+
+async def hold_lease(
+    service: TransactionService, request: TransactionReportRequest,
+) -> tuple[TransactionReportRequest, CacheVersion]:
+    """Берет аренду дней запроса, как процесс, который ее не вернет."""
+    version = await service.cache.get_user_version(request.username)
+    span = get_span(get_missing_periods(request, []))
+    await service.cache.acquire_lease(span, version)
+    return span, version
 
 
 @pytest.mark.asyncio
@@ -99,6 +198,259 @@ async def test_create_transaction_raises(
         await service.create_transaction(request)
 
 
+@pytest.mark.asyncio
+async def test_create_transactions(service):
+    """Тест метода create_transactions."""
+    await service.repository.create_user(user_positive_balance)
+    requests = [
+        TransactionRequest(
+            username=user_positive_balance.username,
+            amount=1,
+            transaction_type=transaction_type,
+        )
+        for transaction_type in (
+            TransactionType.withdraw,
+            TransactionType.withdraw,
+            TransactionType.deposit,
+        )
+    ]
+
+    outcomes = await service.create_transactions(requests)
+
+    assert [res.transaction is not None for res in outcomes] == [
+        True, False, True,
+    ]
+    assert len(service.repository.transactions) == 2
+    user = await service.repository.get_user(user_positive_balance.username)
+    assert user.balance == user_positive_balance.balance
+
+
+@pytest.mark.asyncio
+async def test_create_transaction_with_batching(service):
+    """Одновременные транзакции проводятся пакетами с учетом баланса."""
+    await service.repository.create_user(user_positive_balance)
+    service.repository = BatchingRepository(
+        service.repository, window=batching_window, max_batch_size=2,
+    )
+    request = TransactionRequest(
+        username=user_positive_balance.username,
+        amount=1,
+        transaction_type=TransactionType.withdraw,
+    )
+
+    outcomes = await asyncio.gather(
+        service.create_transaction(request),
+        service.create_transaction(request),
+        return_exceptions=True,
+    )
+
+    assert isinstance(outcomes[0], Transaction)
+    assert isinstance(outcomes[1], ValidationError)
+    assert len(service.repository.repository.transactions) == 1
+
+
+@pytest.mark.asyncio
+async def test_create_transaction_appends_to_report(
+    service_with_user_fixture, monkeypatch,
+):
+    """Новая транзакция дописывается в кэшированный отчет."""
+    service = await service_with_user_fixture(user_positive_balance)
+    await service.create_transaction(deposit_request)
+    cached = await service.create_transaction_report(open_report_request)
+    periods = spy_reads(service, monkeypatch)
+
+    await service.create_transaction(deposit_request)
+    report = await service.create_transaction_report(open_report_request)
+
+    assert not periods
+    assert len(cached.transactions) == 1
+    assert len(report.transactions) == 2
+
+
+@pytest.mark.asyncio
+async def test_concurrent_transactions_and_reports(
+    service_with_user_fixture, monkeypatch,
+):
+    """Отчет в кэше не теряет параллельно проведенных транзакций."""
+    service = await service_with_user_fixture(user_positive_balance)
+    writes = 20
+    slow_down_reports(service, monkeypatch)
+
+    await asyncio.gather(*(
+        later(
+            index * batching_window / writes,
+            service.create_transaction(deposit_request)
+            if index % 2 else
+            service.create_transaction_report(open_report_request),
+        )
+        for index in range(writes * 2)
+    ))
+    cached = await service.create_transaction_report(open_report_request)
+    stored = await service.repository.create_transaction_report(
+        open_report_request,
+    )
+
+    assert len(cached.transactions) == writes
+    assert sorted(
+        transaction.timestamp for transaction in cached.transactions
+    ) == sorted(
+        transaction.timestamp for transaction in stored.transactions
+    )
+
+
+@pytest.mark.asyncio
+async def test_sliding_report_reads_missing_days(
+    service_with_user_fixture, monkeypatch,
+):
+    """Сдвинутый период читает из хранилища только новые дни."""
+    service = await service_with_user_fixture(user_positive_balance)
+    await service.create_transaction(deposit_request)
+    await service.create_transaction_report(open_report_request)
+    periods = spy_reads(service, monkeypatch)
+    shifted_request = open_report_request.model_copy(update={
+        'start_date': open_report_request.start_date + timedelta(days=1),
+        'end_date': open_report_request.end_date + timedelta(days=1),
+    })
+
+    report = await service.create_transaction_report(shifted_request)
+    await service.create_transaction_report(shifted_request)
+
+    assert len(report.transactions) == 1
+    assert len(periods) == 1
+    assert periods[0].start_date.date() == shifted_request.end_date.date()
+    assert periods[0].end_date.date() == shifted_request.end_date.date()
+
+
+@pytest.mark.asyncio
+async def test_wide_report_skips_segments(
+    service_with_user_fixture, monkeypatch,
+):
+    """Отчет длиннее segment_days дней читается из хранилища целиком."""
+    service = await service_with_user_fixture(user_positive_balance)
+    await service.create_transaction(deposit_request)
+    periods = spy_reads(service, monkeypatch)
+    wide_request = open_report_request.model_copy(update={
+        'start_date': open_report_request.start_date - timedelta(
+            days=service.segment_days * wide_report_spans,
+        ),
+    })
+
+    report = await service.create_transaction_report(wide_request)
+
+    assert len(report.transactions) == 1
+    assert periods == [wide_request]
+    assert not await service.cache.storage.keys('segment:*')
+
+
+@pytest.mark.asyncio
+async def test_concurrent_cache_misses_read_once(
+    service_with_user_fixture, monkeypatch,
+):
+    """Одинаковые одновременные промахи кэша читают хранилище один раз."""
+    service = await service_with_user_fixture(user_positive_balance)
+    await service.create_transaction(deposit_request)
+    slow_down_reports(service, monkeypatch)
+    periods = spy_reads(service, monkeypatch)
+
+    reports = await asyncio.gather(*(
+        service.create_transaction_report(open_report_request)
+        for _ in range(10)
+    ))
+
+    assert len(periods) == 1
+    assert all(len(report.transactions) == 1 for report in reports)
+
+
+@pytest.mark.asyncio
+async def test_cache_misses_read_once_across_processes(
+    service_with_user_fixture, monkeypatch,
+):
+    """Одинаковые промахи кэша в разных процессах читают хранилище один раз."""
+    service = await service_with_user_fixture(user_positive_balance)
+    await service.create_transaction(deposit_request)
+    slow_down_reports(service, monkeypatch)
+    periods = spy_reads(service, monkeypatch)
+    monkeypatch.setattr(
+        get_settings().report_lease, 'poll_interval', lease_poll_interval,
+    )
+    replicas = [
+        TransactionService(service.repository, cache=TransactionReportCache())
+        for _ in range(3)
+    ]
+
+    reports = await asyncio.gather(*(
+        replica.create_transaction_report(open_report_request)
+        for replica in replicas
+        for _ in range(3)
+    ))
+
+    assert len(periods) == 1
+    assert all(len(report.transactions) == 1 for report in reports)
+
+
+@pytest.mark.asyncio
+async def test_lease_timeout_falls_back_to_repository(
+    service_with_user_fixture, monkeypatch,
+):
+    """Процесс не ждет чужую аренду дольше таймаута и читает дни сам."""
+    service = await service_with_user_fixture(user_positive_balance)
+    await service.create_transaction(deposit_request)
+    monkeypatch.setattr(
+        get_settings().report_lease, 'poll_interval', lease_poll_interval,
+    )
+    monkeypatch.setattr(get_settings().report_lease, 'timeout', batching_window)
+    span, version = await hold_lease(service, open_report_request)
+    periods = spy_reads(service, monkeypatch)
+
+    report = await service.create_transaction_report(open_report_request)
+
+    assert len(report.transactions) == 1
+    assert len(periods) == 1
+    assert not await service.cache.get_segments(span, version)
+
+
+@pytest.mark.asyncio
+async def test_user_is_read_once_per_balance_change(
+    service_with_user_fixture, monkeypatch,
+):
+    """Пользователь читается из хранилища снова после новой транзакции."""
+    service = await service_with_user_fixture(user_positive_balance)
+    usernames = spy_user_reads(service, monkeypatch)
+
+    for _ in range(3):
+        await service.stream_transaction_report(open_report_request)
+    hot_reads = len(usernames)
+    await service.create_transaction(deposit_request)
+    # Хранилище в памяти читает пользователя и при проведении транзакции.
+    usernames.clear()
+    await service.stream_transaction_report(open_report_request)
+
+    user = await service.cache.get_user_cache(deposit_request.username)
+    assert hot_reads == 1
+    assert len(usernames) == 1
+    assert user.balance == user_positive_balance.balance + 1
+
+
+@pytest.mark.asyncio
+async def test_near_cache_serves_hot_report(
+    service_with_user_fixture, monkeypatch,
+):
+    """Горячий отчет читается из памяти и видит новые транзакции."""
+    service = await service_with_user_fixture(user_positive_balance)
+    service.cache = NearCache(service.cache, max_entries=100, ttl=60)
+    await service.get_transaction_report_body(open_report_request)
+    redis_calls = spy_redis(service.cache.cache, monkeypatch)
+
+    hit = await service.get_transaction_report_body(open_report_request)
+    monkeypatch.undo()
+    await service.create_transaction(deposit_request)
+    report = await service.create_transaction_report(open_report_request)
+
+    assert not redis_calls
+    assert not TransactionReport.model_validate_json(hit.payload).transactions
+    assert len(report.transactions) == 1
+
+
 class TestCreateTransactionReport:
     """Тесты метода create_transaction_report."""
 
@@ -126,6 +478,12 @@ class TestCreateTransactionReport:
         ),
     ]
 
+    body_report_request = TransactionReportRequest(
+        username=username,
+        start_date=base_date,
+        end_date=base_date + timedelta(days=2),
+    )
+
     @pytest.fixture
     def service_with_transactions_without_cache(self, service):
         """Фикстура для создания сервиса без кэша."""
@@ -134,8 +492,10 @@ class TestCreateTransactionReport:
 
     @pytest.fixture
     def service_with_transactions_with_cache(self, service_with_cache):
-        """Фикстура для создания сервиса без кэша."""
+        """Фикстура для создания сервиса с кэшем."""
         service_with_cache.repository.transactions = self.transactions_in_db
+        # Кэш проверяет пользователя перед чтением отсутствующих дней.
+        service_with_cache.repository.users = [user_positive_balance]
         return service_with_cache
 
     @pytest.fixture(
@@ -190,6 +550,8 @@ class TestCreateTransactionReport:
         service_with_transactions,
     ):
         """Тест метода create_transaction_report."""
+        if service_with_transactions.cache is not None:
+            await service_with_transactions.cache.flush_cache()
         report = await service_with_transactions.create_transaction_report(
             report_request,
         )
@@ -198,3 +560,34 @@ class TestCreateTransactionReport:
         assert report.start_date == report_request.start_date
         assert report.end_date == report_request.end_date
         assert report.username == report_request.username
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        'report_format',
+        (ReportCacheFormat.json, ReportCacheFormat.gzip),
+    )
+    async def test_get_transaction_report_body(
+        self, report_format, service_with_transactions, monkeypatch,
+    ):
+        """Готовое тело отчета одинаково при промахе и попадании в кэш."""
+        monkeypatch.setattr(
+            get_settings().redis, 'report_format', report_format,
+        )
+        if service_with_transactions.cache is not None:
+            await service_with_transactions.cache.flush_cache()
+
+        missed = await service_with_transactions.get_transaction_report_body(
+            self.body_report_request,
+        )
+        hit = await service_with_transactions.get_transaction_report_body(
+            self.body_report_request,
+        )
+
+        hit_payload = hit.payload
+        if hit.encoding is not None:
+            hit_payload = gzip.decompress(hit_payload)
+        report = TransactionReport.model_validate_json(missed.payload)
+        hit_report = TransactionReport.model_validate_json(hit_payload)
+        assert missed.encoding is None
+        assert report.transactions == self.transactions_in_db
+        assert hit_report.transactions == report.transactions
@@ -2,7 +2,7 @@ from unittest.mock import AsyncMock
 
 import pytest
 
-from app.core.errors import NotFoundError, RepositoryError
+from app.core.errors import NotFoundError, RepositoryError, ValidationError
 from app.core.transactions import TransactionService, Validator
 
 
@@ -22,34 +22,50 @@ def service():
 
 
 @pytest.fixture
-def service_error_on_get_user(service: TransactionService):
+def service_error_on_user_not_found(service: TransactionService):
     """
     Фикстура для получения сервиса с моком репозитория.
 
-    Метод репозитория get_user вызывает ошибку.
+    Метод репозитория post_transaction не находит пользователя.
 
     :param service: экземпляр сервиса
     :type service: TransactionService
     :return: экземпляр сервиса
     :rtype: TransactionService
     """
-    service.repository.get_user.side_effect = NotFoundError
+    service.repository.post_transaction.side_effect = NotFoundError
     return service
 
 
 @pytest.fixture
-def service_error_on_update_user(service: TransactionService):
+def service_error_on_overdraft(service: TransactionService):
     """
     Фикстура для получения сервиса с моком репозитория.
 
-    Метод репозитория get_user вызывает ошибку.
+    Метод репозитория post_transaction запрещает транзакцию.
 
     :param service: экземпляр сервиса
     :type service: TransactionService
     :return: экземпляр сервиса
     :rtype: TransactionService
     """
-    service.repository.update_user.side_effect = RepositoryError
+    service.repository.post_transaction.side_effect = ValidationError
+    return service
+
+
+@pytest.fixture
+def service_error_on_post_transaction(service: TransactionService):
+    """
+    Фикстура для получения сервиса с моком репозитория.
+
+    Метод репозитория post_transaction вызывает ошибку хранилища.
+
+    :param service: экземпляр сервиса
+    :type service: TransactionService
+    :return: экземпляр сервиса
+    :rtype: TransactionService
+    """
+    service.repository.post_transaction.side_effect = RepositoryError
     return service
 
 
@@ -0,0 +1,160 @@
+import asyncio
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+from fastapi import status
+from prometheus_client import REGISTRY
+
+from app.core.batching import BatchingRepository
+from app.core.errors import NotFoundError, RepositoryError, ValidationError
+from app.core.models import Transaction, TransactionResult, TransactionType
+
+window = 0.01
+long_window = 10
+
+transactions = [
+    Transaction(
+        username=username,
+        amount=1,
+        transaction_type=TransactionType.withdraw,
+        timestamp=datetime.now(),
+    )
+    for username in ('george', 'peter', 'unknown')
+]
+
+
+async def post_outcomes(posted: list[Transaction]) -> list[TransactionResult]:
+    """Проводит транзакции george, запрещает peter, остальных не находит."""
+    outcomes = []
+    for index, trn in enumerate(posted):
+        if trn.username == transactions[0].username:
+            outcomes.append(TransactionResult(
+                transaction=trn.model_copy(update={'transaction_id': index}),
+            ))
+        elif trn.username == transactions[1].username:
+            outcomes.append(TransactionResult(
+                status_code=status.HTTP_403_FORBIDDEN, detail=trn.username,
+            ))
+        else:
+            outcomes.append(TransactionResult(
+                status_code=status.HTTP_404_NOT_FOUND, detail=trn.username,
+            ))
+    return outcomes
+
+
+@pytest.fixture
+def repository():
+    """Мок хранилища, проводящий пакет через post_outcomes."""
+    mock = AsyncMock()
+    mock.post_transactions.side_effect = post_outcomes
+    return mock
+
+
+class TestBatchingRepository:
+    """Тестирует BatchingRepository."""
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_batch(self, repository):
+        """Одновременные транзакции проводятся одним пакетом."""
+        batching = BatchingRepository(
+            repository, window=window, max_batch_size=len(transactions) + 1,
+        )
+
+        outcomes = await asyncio.gather(
+            *(batching.post_transaction(trn) for trn in transactions),
+            return_exceptions=True,
+        )
+
+        repository.post_transactions.assert_awaited_once()
+        assert isinstance(outcomes[0], Transaction)
+        assert outcomes[0].transaction_id == 0
+        assert isinstance(outcomes[1], ValidationError)
+        assert isinstance(outcomes[2], NotFoundError)
+
+    @pytest.mark.asyncio
+    async def test_max_batch_size_flushes(self, repository):
+        """Пакет проводится сразу при достижении максимального размера."""
+        batching = BatchingRepository(
+            repository, window=long_window, max_batch_size=2,
+        )
+
+        await asyncio.wait_for(
+            asyncio.gather(
+                batching.post_transaction(transactions[0]),
+                batching.post_transaction(transactions[0]),
+            ),
+            timeout=1,
+        )
+
+        repository.post_transactions.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_repository_error(self, repository):
+        """Ошибка хранилища передается каждому вызывающему."""
+        repository.post_transactions.side_effect = RepositoryError()
+        batching = BatchingRepository(
+            repository, window=window, max_batch_size=len(transactions),
+        )
+
+        outcomes = await asyncio.gather(
+            *(batching.post_transaction(trn) for trn in transactions),
+            return_exceptions=True,
+        )
+
+        assert all(isinstance(res, RepositoryError) for res in outcomes)
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, repository):
+        """Размер пакета и время ожидания попадают в метрики."""
+        batches_before = get_sample('transaction_batch_size_count')
+        delays_before = get_sample(
+            'transaction_batch_queue_delay_seconds_count',
+        )
+        batching = BatchingRepository(
+            repository, window=window, max_batch_size=len(transactions),
+        )
+
+        await batching.post_transaction(transactions[0])
+
+        assert get_sample('transaction_batch_size_count') == (
+            batches_before + 1
+        )
+        assert get_sample(
+            'transaction_batch_queue_delay_seconds_count',
+        ) == delays_before + 1
+
+    @pytest.mark.asyncio
+    async def test_delegates_other_methods(self, repository):
+        """Остальные методы передаются хранилищу."""
+        batching = BatchingRepository(
+            repository, window=window, max_batch_size=1,
+        )
+
+        await batching.get_user('george')
+        await batching.post_transactions(transactions)
+
+        repository.get_user.assert_awaited_once_with('george')
+        repository.post_transactions.assert_awaited_once_with(transactions)
+
+    @pytest.mark.asyncio
+    async def test_close_posts_pending(self, repository):
+        """Ожидающие транзакции проводятся до закрытия хранилища."""
+        batching = BatchingRepository(
+            repository, window=long_window, max_batch_size=len(transactions),
+        )
+        posting = asyncio.ensure_future(
+            batching.post_transaction(transactions[0]),
+        )
+        await asyncio.sleep(0)
+
+        await batching.close()
+
+        assert posting.done()
+        assert posting.result().transaction_id == 0
+        repository.close.assert_awaited_once()
+
+
+def get_sample(name: str) -> float:
+    """Получает значение метрики из реестра prometheus."""
+    return REGISTRY.get_sample_value(name) or 0
@@ -0,0 +1,247 @@
+import logging
+import time
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.core.columnar import ColumnarRepository
+from app.core.models import (
+    AggregateBucket,
+    Transaction,
+    TransactionAggregateRequest,
+    TransactionSummaryRequest,
+    TransactionType,
+    User,
+)
+from app.external.in_memory_repository import InMemoryRepository
+
+logger = logging.getLogger(__name__)
+
+username = 'george'
+other_username = 'anna'
+start = datetime(year=2024, month=1, day=1)  # noqa: WPS432
+step = timedelta(minutes=37)  # noqa: WPS432
+last_day = 40  # noqa: WPS432
+size = 2000
+max_users = 10
+ttl = 60
+last_microsecond = timedelta(days=1, microseconds=-1)
+
+
+def get_transactions(
+    count: int, interval: timedelta, name: str = username,
+) -> list[Transaction]:
+    """Создает count пополнений и списаний разных сумм с шагом interval."""
+    return [
+        Transaction.model_construct(
+            username=name,
+            amount=position % 7 + 1,
+            transaction_type=(
+                TransactionType.withdraw
+                if position % 3 else TransactionType.deposit
+            ),
+            timestamp=start + interval * position,
+            transaction_id=position,
+        )
+        for position in range(count)
+    ]
+
+
+def get_aggregate_request(
+    first_day: int, last_day: int, bucket: AggregateBucket,
+) -> TransactionAggregateRequest:
+    """Создает запрос агрегатов за дни с first_day по last_day от start."""
+    return TransactionAggregateRequest(
+        username=username,
+        start_date=start + timedelta(days=first_day),
+        end_date=start + timedelta(days=last_day) + last_microsecond,
+        bucket=bucket,
+    )
+
+
+def get_summary_request(
+    first_day: int, last_day: int,
+) -> TransactionSummaryRequest:
+    """Создает запрос сводки за дни с first_day по last_day от start."""
+    return TransactionSummaryRequest(
+        username=username,
+        start_date=(start + timedelta(days=first_day)).date(),
+        end_date=(start + timedelta(days=last_day)).date(),
+    )
+
+
+@pytest.fixture
+def repository() -> InMemoryRepository:
+    """Создает хранилище с транзакциями двух пользователей."""
+    repository = InMemoryRepository()
+    repository.transactions = (
+        get_transactions(size, step) +
+        get_transactions(size, step, other_username)
+    )
+    repository.users = [
+        User(username=username, balance=size, is_verified=True),
+    ]
+    return repository
+
+
+class TestColumnarRepository:
+    """Тестирует ColumnarRepository."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('bucket', list(AggregateBucket))
+    async def test_aggregates_match_repository(self, repository, bucket):
+        """Агрегаты по столбцам совпадают с агрегатами хранилища."""
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        request = get_aggregate_request(3, last_day, bucket)
+
+        report = await columnar.create_aggregate_report(request)
+
+        assert report == await repository.create_aggregate_report(request)
+        assert report.deposit.count
+        assert report.withdraw.count
+
+    @pytest.mark.asyncio
+    async def test_summary_matches_repository(self, repository):
+        """Сводка по столбцам совпадает со сводкой хранилища."""
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        request = get_summary_request(2, last_day // 2)
+
+        summary = await columnar.get_transaction_summary(request)
+
+        assert summary == await repository.get_transaction_summary(request)
+
+    @pytest.mark.asyncio
+    async def test_created_transactions_are_counted(self, repository):
+        """Транзакции, созданные через хранилище, видны без перезагрузки."""
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        request = get_aggregate_request(0, 1, AggregateBucket.hour)
+        loaded = await columnar.create_aggregate_report(request)
+        repository.transactions = []
+
+        await columnar.create_transaction(
+            get_transactions(1, step)[0].model_copy(update={'amount': 100}),
+        )
+
+        report = await columnar.create_aggregate_report(request)
+        assert report.deposit.count == loaded.deposit.count + 1
+        assert report.deposit.max_amount == 100
+        assert report.buckets[0].deposit.count == 2
+
+    @pytest.mark.asyncio
+    async def test_loaded_during_post_is_counted_once(
+        self, repository, monkeypatch,
+    ):
+        """Транзакция, прочитанная загрузкой до дописывания, не удваивается."""
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        request = get_summary_request(0, last_day)
+        loaded = await repository.get_transaction_summary(request)
+
+        async def post_during_load(transaction):  # noqa: WPS430 slow post
+            created = await repository.create_transaction(transaction)
+            await columnar.get_transaction_summary(request)
+            return created
+
+        monkeypatch.setattr(repository, 'post_transaction', post_during_load)
+        await columnar.post_transaction(get_transactions(1, step)[0])
+
+        summary = await columnar.get_transaction_summary(request)
+        assert summary.deposit.count == loaded.deposit.count + 1
+
+    @pytest.mark.asyncio
+    async def test_expired_columns_are_reloaded(
+        self, repository, monkeypatch,
+    ):
+        """Столбцы перечитываются из хранилища через ttl секунд."""
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        request = get_summary_request(0, 100)
+        await columnar.get_transaction_summary(request)
+        repository.transactions = []
+        cached = await columnar.get_transaction_summary(request)
+        expired = time.monotonic() + ttl * 2
+        monkeypatch.setattr(
+            'app.core.near_cache.time.monotonic', lambda: expired,
+        )
+
+        reloaded = await columnar.get_transaction_summary(request)
+
+        assert cached.deposit.count + cached.withdraw.count == size
+        assert not reloaded.deposit.count
+
+    @pytest.mark.asyncio
+    async def test_open_ended_period(self, repository):
+        """Период до datetime.max и date.max включает все транзакции."""
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        aggregate_request = get_aggregate_request(0, 0, AggregateBucket.month)
+        summary_request = get_summary_request(0, 0)
+
+        report = await columnar.create_aggregate_report(
+            aggregate_request.model_copy(update={'end_date': datetime.max}),
+        )
+        summary = await columnar.get_transaction_summary(
+            summary_request.model_copy(update={'end_date': date.max}),
+        )
+
+        assert report.deposit.count + report.withdraw.count == size
+        assert summary.deposit.count + summary.withdraw.count == size
+
+    @pytest.mark.asyncio
+    async def test_close_closes_repository(self, repository, monkeypatch):
+        """Закрытие хранилища по столбцам закрывает его хранилище."""
+        close = AsyncMock()
+        monkeypatch.setattr(repository, 'close', close, raising=False)
+
+        await ColumnarRepository(repository, max_users, ttl).close()
+
+        close.assert_awaited_once()
+
+
+@pytest.mark.slow
+class TestColumnarBenchmark:
+    """
+    Бенчмарк агрегатов по столбцам.
+
+    Агрегаты по дням за весь период миллиона транзакций считаются
+    по столбцам и по моделям InMemoryRepository. В лог пишется
+    время загрузки столбцов и среднее время запроса.
+    """
+
+    size = 1000000
+    queries = 10
+    minutes_per_day = 1440
+
+    @pytest.mark.asyncio
+    async def test_aggregates_faster_than_models(self):
+        """Агрегаты по столбцам считаются быстрее, чем по моделям."""
+        repository = InMemoryRepository()
+        repository.transactions = get_transactions(
+            self.size, timedelta(minutes=1),
+        )
+        columnar = ColumnarRepository(repository, max_users, ttl)
+        request = get_aggregate_request(
+            0, self.size // self.minutes_per_day, AggregateBucket.day,
+        )
+        await self._get_query_time(columnar, request, 1, 'columns load')
+        columns_time = await self._get_query_time(
+            columnar, request, self.queries, 'columns query',
+        )
+        models_time = await self._get_query_time(
+            repository, request, 1, 'models query',
+        )
+
+        assert columns_time * 10 < models_time
+
+    async def _get_query_time(
+        self,
+        repository: InMemoryRepository | ColumnarRepository,
+        request: TransactionAggregateRequest,
+        queries: int,
+        label: str,
+    ) -> float:
+        started = time.perf_counter()
+        for _ in range(queries):
+            report = await repository.create_aggregate_report(request)
+            assert report.deposit.count + report.withdraw.count == self.size
+        elapsed = (time.perf_counter() - started) * 1000 / queries
+        logger.info(f'{label}: {elapsed:.1f} ms')
+        return elapsed
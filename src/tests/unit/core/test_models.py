@@ -2,7 +2,15 @@ from datetime import datetime
 
 import pytest
 
-from app.core.models import Transaction, TransactionType, User
+from app.core.models import (
+    AggregateBucket,
+    Transaction,
+    TransactionAggregate,
+    TransactionAggregateReport,
+    TransactionSummary,
+    TransactionType,
+    User,
+)
 
 username = 'george'
 
@@ -20,6 +28,8 @@ withdraw_transaction = Transaction(
 )
 balance_after_deposit = 20  # noqa: WPS432 no magic
 balance_after_withdraw = 0
+moment = datetime(2024, 5, 17, 13, 45, 12, 500)  # noqa: WPS432 no magic
+deposit_amount = 12  # noqa: WPS432 no magic
 
 
 @pytest.fixture
@@ -51,3 +61,83 @@ def test_user_process_transaction(test_user, transaction, expected_balance):
     test_user.process_transaction(transaction)
 
     assert test_user.balance == expected_balance
+
+
+def test_summary_add_totals():
+    """Итоги добавляются к итогам своего типа транзакции."""
+    summary = TransactionSummary(
+        username=username,
+        start_date=deposit_transaction.timestamp.date(),
+        end_date=deposit_transaction.timestamp.date(),
+    )
+
+    summary.add_totals(TransactionType.deposit, 1, deposit_transaction.amount)
+    summary.add_totals(TransactionType.withdraw, 2, withdraw_transaction.amount)
+    summary.add_totals(TransactionType.deposit, 1, deposit_transaction.amount)
+
+    assert summary.deposit.count == 2
+    assert summary.deposit.amount == balance_after_deposit
+    assert summary.withdraw.count == 2
+    assert summary.withdraw.amount == withdraw_transaction.amount
+
+
+@pytest.mark.parametrize(
+    'bucket, expected_start', (
+        pytest.param(
+            AggregateBucket.hour,
+            moment.replace(minute=0, second=0, microsecond=0),
+            id='hour',
+        ),
+        pytest.param(
+            AggregateBucket.day,
+            datetime.combine(moment.date(), datetime.min.time()),
+            id='day',
+        ),
+        pytest.param(
+            AggregateBucket.month,
+            datetime(moment.year, moment.month, 1),
+            id='month',
+        ),
+    ),
+)
+def test_bucket_truncate(bucket, expected_start):
+    """Время округляется вниз до начала интервала."""
+    assert bucket.truncate(moment) == expected_start
+
+
+def test_aggregate_report_add_aggregate():
+    """Агрегаты добавляются к интервалу и к итогам периода."""
+    report = TransactionAggregateReport(
+        username=username,
+        start_date=moment,
+        end_date=moment,
+        bucket=AggregateBucket.hour,
+    )
+    first_bucket = AggregateBucket.hour.truncate(moment)
+    second_bucket = first_bucket.replace(hour=moment.hour + 1)
+
+    report.add_aggregate(
+        first_bucket,
+        TransactionType.deposit,
+        TransactionAggregate(count=2, amount=5, min_amount=1, max_amount=4),
+    )
+    report.add_aggregate(
+        first_bucket,
+        TransactionType.withdraw,
+        TransactionAggregate(count=1, amount=3, min_amount=3, max_amount=3),
+    )
+    report.add_aggregate(
+        second_bucket,
+        TransactionType.deposit,
+        TransactionAggregate(count=1, amount=7, min_amount=7, max_amount=7),
+    )
+
+    assert [bucket.start for bucket in report.buckets] == [
+        first_bucket, second_bucket,
+    ]
+    assert report.buckets[0].withdraw.count == 1
+    assert report.buckets[1].withdraw == TransactionAggregate()
+    assert report.deposit == TransactionAggregate(
+        count=3, amount=deposit_amount, min_amount=1, max_amount=7,
+    )
+    assert report.withdraw == report.buckets[0].withdraw
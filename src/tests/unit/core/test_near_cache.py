@@ -0,0 +1,186 @@
+import time
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.core.models import (
+    CacheVersion,
+    ReportBody,
+    Transaction,
+    TransactionReportRequest,
+    TransactionType,
+)
+from app.core.near_cache import LRUCache, NearCache
+from app.core.segments import split_by_day
+
+max_entries = 100
+ttl = 60
+username = 'george'
+report_year = 2024
+body_family = 'report-body'
+request = TransactionReportRequest(
+    username=username,
+    start_date=datetime(year=report_year, month=1, day=1),
+    end_date=datetime(year=report_year, month=1, day=3),
+)
+transaction = Transaction(
+    username=username,
+    amount=1,
+    transaction_type=TransactionType.deposit,
+    timestamp=request.start_date + timedelta(hours=1),
+    transaction_id=1,
+)
+version = CacheVersion()
+body = ReportBody(b'[]')
+
+
+@pytest.fixture
+def cache():
+    """Создает мок кэша сервиса."""
+    cache = AsyncMock()
+    cache.get_user_version.return_value = version
+    cache.get_report_body.return_value = body
+    cache.get_segments.return_value = split_by_day([request], [transaction])
+    return cache
+
+
+def get_sample(name: str, family: str) -> float:
+    """Получает значение счетчика семейства из реестра prometheus."""
+    return REGISTRY.get_sample_value(name, {'family': family}) or 0
+
+
+class TestLRUCache:
+    """Тестирует LRUCache."""
+
+    def test_evicts_least_recently_read(self):
+        """Вытесняется запись, которую дольше всех не читали."""
+        entries = LRUCache(max_entries=2, ttl=ttl)
+        entries.set('first', 1)
+        entries.set('second', 2)
+
+        entries.get('first')
+        entries.set('third', 3)
+
+        assert entries.get('first') == 1
+        assert entries.get('third') == 3
+        with pytest.raises(KeyError):
+            entries.get('second')
+
+    def test_expired_entry_is_miss(self, monkeypatch):
+        """Запись старше ttl не читается и удаляется."""
+        entries = LRUCache(max_entries=max_entries, ttl=ttl)
+        entries.set('key', 1)
+        expired = time.monotonic() + ttl * 2
+        monkeypatch.setattr(
+            'app.core.near_cache.time.monotonic', lambda: expired,
+        )
+
+        with pytest.raises(KeyError):
+            entries.get('key')
+        assert not entries
+
+
+class TestNearCache:
+    """Тестирует NearCache."""
+
+    @pytest.mark.asyncio
+    async def test_hot_report_is_served_from_memory(self, cache):
+        """Повторное чтение версии и тела не обращается к кэшу сервиса."""
+        near_cache = NearCache(cache, max_entries=max_entries, ttl=ttl)
+        hits_before = get_sample('near_cache_hits_total', body_family)
+        misses_before = get_sample('near_cache_misses_total', body_family)
+
+        for _ in range(3):
+            current = await near_cache.get_user_version(username)
+            assert await near_cache.get_report_body(request, current) == body
+
+        cache.get_user_version.assert_awaited_once()
+        cache.get_report_body.assert_awaited_once()
+        assert get_sample(
+            'near_cache_hits_total', body_family,
+        ) == hits_before + 2
+        assert get_sample(
+            'near_cache_misses_total', body_family,
+        ) == misses_before + 1
+
+    @pytest.mark.asyncio
+    async def test_missing_body_is_not_cached(self, cache):
+        """Промах кэша сервиса не запоминается."""
+        cache.get_report_body.side_effect = KeyError
+        near_cache = NearCache(cache, max_entries=max_entries, ttl=ttl)
+
+        for _ in range(2):
+            with pytest.raises(KeyError):
+                await near_cache.get_report_body(request, version)
+
+        assert cache.get_report_body.await_count == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        'method, argument', (
+            pytest.param('append_transaction', transaction, id='append'),
+            pytest.param('invalidate_user', username, id='invalidate'),
+        ),
+    )
+    async def test_writes_drop_user_version(self, method, argument, cache):
+        """Изменения через процесс сразу видны по новой версии."""
+        near_cache = NearCache(cache, max_entries=max_entries, ttl=ttl)
+        await near_cache.get_user_version(username)
+
+        await getattr(near_cache, method)(argument)
+        await near_cache.get_user_version(username)
+
+        getattr(cache, method).assert_awaited_once_with(argument)
+        assert cache.get_user_version.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_segments_are_shared_by_periods(self, cache):
+        """Период, все дни которого в памяти, не читается из кэша сервиса."""
+        near_cache = NearCache(cache, max_entries=max_entries, ttl=ttl)
+        inner_request = request.model_copy(
+            update={'start_date': request.start_date + timedelta(days=1)},
+        )
+
+        segments = await near_cache.get_segments(request, version)
+        inner_segments = await near_cache.get_segments(inner_request, version)
+        await near_cache.get_segments(request, CacheVersion(writes=1))
+
+        assert cache.get_segments.await_count == 2
+        assert len(inner_segments) == len(segments) - 1
+
+    @pytest.mark.asyncio
+    async def test_version_read_before_write_is_not_kept(self, cache):
+        """Версия, прочитанная до инвалидации, не записывается в память."""
+        near_cache = NearCache(cache, max_entries=max_entries, ttl=ttl)
+
+        async def read_during_invalidate(name):  # noqa: WPS430 mock reader
+            cache.get_user_version.side_effect = None
+            await near_cache.invalidate_user(name)
+            return version
+
+        cache.get_user_version.side_effect = read_during_invalidate
+        await near_cache.get_user_version(username)
+        await near_cache.get_user_version(username)
+
+        assert cache.get_user_version.await_count == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        'created, expected_reads', ((True, 0), (False, 1)),
+        ids=('accepted', 'rejected'),
+    )
+    async def test_only_accepted_segments_are_kept(
+        self, created, expected_reads, cache,
+    ):
+        """В памяти остаются только сегменты, принятые кэшем сервиса."""
+        cache.create_segments.return_value = created
+        near_cache = NearCache(cache, max_entries=max_entries, ttl=ttl)
+
+        await near_cache.create_segments(
+            username, split_by_day([request], [transaction]), version,
+        )
+        await near_cache.get_segments(request, version)
+
+        assert cache.get_segments.await_count == expected_reads
@@ -0,0 +1,121 @@
+from datetime import datetime
+
+import pytest
+
+from app.core.errors import NotFoundError, ValidationError
+from app.core.models import (
+    Transaction,
+    TransactionHistoryPage,
+    TransactionHistoryRequest,
+    TransactionType,
+    User,
+)
+from app.core.pagination import decode_cursor, encode_cursor, get_history_page
+from app.core.transactions import max_page_size
+
+username = 'george'
+history_year = 2024
+transactions = [
+    Transaction(
+        username=username,
+        amount=1,
+        transaction_type=TransactionType.deposit,
+        timestamp=datetime(year=history_year, month=1, day=day),
+        transaction_id=day,
+    )
+    for day in (3, 2, 1)
+]
+
+
+def test_cursor_round_trip():
+    """Токен продолжения содержит ключ (created_at, id) транзакции."""
+    cursor = encode_cursor(transactions[0])
+
+    assert decode_cursor(cursor) == (
+        transactions[0].timestamp, transactions[0].transaction_id,
+    )
+
+
+@pytest.mark.parametrize(
+    'cursor', (
+        pytest.param('not a cursor', id='not base64'),
+        pytest.param('bnVsbA==', id='json null'),
+        pytest.param('WyJ4IiwgMV0=', id='invalid timestamp'),
+    ),
+)
+def test_invalid_cursor(cursor):
+    """Поврежденный токен продолжения вызывает ValidationError."""
+    with pytest.raises(ValidationError):
+        decode_cursor(cursor)
+
+
+@pytest.mark.parametrize(
+    'page_size, expected_qnt, expected_next', (
+        pytest.param(2, 2, encode_cursor(transactions[1]), id='next page'),
+        pytest.param(3, 3, None, id='last page'),
+    ),
+)
+def test_get_history_page(page_size, expected_qnt, expected_next):
+    """Лишняя транзакция определяет наличие следующей страницы."""
+    page = get_history_page(username, transactions[:page_size + 1], page_size)
+
+    assert len(page.transactions) == expected_qnt
+    assert page.next_cursor == expected_next
+
+
+@pytest.mark.parametrize(
+    'page_size', (
+        pytest.param(1, id='page size = 1'),
+        pytest.param(
+            0,
+            id='page size = 0',
+            marks=pytest.mark.xfail(raises=ValidationError),
+        ),
+        pytest.param(
+            max_page_size + 1,
+            id='page size > max',
+            marks=pytest.mark.xfail(raises=ValidationError),
+        ),
+    ),
+)
+def test_validate_page_size(page_size, validator):
+    """Тест метода validate_page_size."""
+    validator.validate_page_size(page_size)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'user', (
+        pytest.param(
+            User(username=username, balance=0, is_verified=False),
+            id='user without transactions',
+        ),
+        pytest.param(
+            None,
+            id='user not found',
+            marks=pytest.mark.xfail(raises=NotFoundError),
+        ),
+    ),
+)
+async def test_get_transaction_history_first_page(user, service):
+    """Пустая первая страница проверяет наличие пользователя."""
+    service.repository.get_transaction_history.return_value = (
+        TransactionHistoryPage(username=username, transactions=[])
+    )
+    service.repository.get_user.return_value = user
+
+    page = await service.get_transaction_history(
+        TransactionHistoryRequest(username=username),
+    )
+
+    assert not page.transactions
+
+
+@pytest.mark.asyncio
+async def test_get_transaction_history_invalid_cursor(service):
+    """Поврежденный токен отклоняется до запроса в хранилище."""
+    with pytest.raises(ValidationError):
+        await service.get_transaction_history(
+            TransactionHistoryRequest(username=username, cursor='invalid'),
+        )
+    service.repository.get_transaction_history.assert_not_awaited()
@@ -0,0 +1,100 @@
+from datetime import date, datetime, time
+
+import pytest
+
+from app.core.models import (
+    Transaction,
+    TransactionReportRequest,
+    TransactionType,
+)
+from app.core.segments import (
+    assemble_report,
+    count_days,
+    get_days,
+    get_missing_periods,
+    split_by_day,
+)
+
+username = 'george'
+segments_year = 2024
+noon = 12
+request = TransactionReportRequest(
+    username=username,
+    start_date=datetime(year=segments_year, month=1, day=1, hour=noon),
+    end_date=datetime(year=segments_year, month=1, day=5, hour=noon),
+)
+transactions = [
+    Transaction(
+        username=username,
+        amount=1,
+        transaction_type=TransactionType.deposit,
+        timestamp=datetime(year=segments_year, month=1, day=day, hour=hour),
+        transaction_id=day * 100 + hour,
+    )
+    for day in range(1, 6)
+    for hour in (6, 18)
+]
+
+
+def day_of_january(day: int) -> date:
+    """Возвращает день января тестового года."""
+    return date(year=segments_year, month=1, day=day)
+
+
+def test_get_days():
+    """Дни периода включают дни начала и конца."""
+    assert get_days(request) == [day_of_january(day) for day in range(1, 6)]
+
+
+def test_count_days():
+    """Число дней периода совпадает с числом его дней."""
+    assert count_days(request) == len(get_days(request))
+
+
+@pytest.mark.parametrize(
+    'cached_days, expected_runs', (
+        pytest.param((), [(1, 5)], id='empty cache'),
+        pytest.param((1, 2, 3, 4, 5), [], id='full cache'),
+        pytest.param((1, 2, 3, 4), [(5, 5)], id='sliding window'),
+        pytest.param((2, 4), [(1, 1), (3, 3), (5, 5)], id='gaps'),  # noqa: WPS221, E501 runs of days
+        pytest.param((3,), [(1, 2), (4, 5)], id='cached middle'),
+    ),
+)
+def test_get_missing_periods(cached_days, expected_runs):
+    """Отсутствующие дни объединяются в периоды из целых дней."""
+    periods = get_missing_periods(
+        request, [day_of_january(day) for day in cached_days],
+    )
+
+    assert [
+        (period.start_date, period.end_date) for period in periods
+    ] == [
+        (
+            datetime.combine(day_of_january(first), time.min),
+            datetime.combine(day_of_january(last), time.max),
+        )
+        for first, last in expected_runs
+    ]
+
+
+def test_split_by_day():
+    """Дни без транзакций получают пустые сегменты."""
+    period = request.model_copy(update={
+        'end_date': datetime(year=segments_year, month=1, day=7),
+    })
+
+    segments = split_by_day([period], transactions)
+
+    assert len(segments) == 7
+    assert segments[day_of_january(1)] == transactions[:2]
+    assert not segments[day_of_january(7)]
+
+
+def test_assemble_report():
+    """Отчет обрезается по точным границам периода."""
+    report = assemble_report(request, split_by_day([request], transactions))
+
+    assert report.transactions == transactions[1:-1]
+    assert report.start_date == request.start_date
+    assert report.end_date == request.end_date
+    assert report.report_id is None
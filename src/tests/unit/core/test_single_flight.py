@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.core.errors import RepositoryError
+from app.core.single_flight import SingleFlight
+
+callers = 10
+key = 'report'
+
+
+class Operation:
+    """Операция, считающая свои запуски."""
+
+    def __init__(self, error: Exception | None = None) -> None:
+        """Создает операцию, которая завершается ошибкой, если она задана."""
+        self.calls = 0
+        self.error = error
+        self.release = asyncio.Event()
+
+    async def __call__(self) -> int:
+        """Выполняет операцию после release и возвращает номер запуска."""
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.calls
+
+
+async def run_concurrently(
+    flights: SingleFlight, operation: Operation,
+) -> list[int | BaseException]:
+    """Запускает callers одинаковых операций и завершает их."""
+    waiters = asyncio.gather(
+        *(flights.run(key, operation) for _ in range(callers)),
+        return_exceptions=True,
+    )
+    await asyncio.sleep(0)
+    operation.release.set()
+    return await waiters
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_run_once():
+    """Одновременные вызовы с одним ключом выполняют операцию один раз."""
+    flights = SingleFlight()
+    operation = Operation()
+
+    outcomes = await run_concurrently(flights, operation)
+
+    assert operation.calls == 1
+    assert len(outcomes) == callers
+    assert set(outcomes) == {1}
+    assert not flights
+
+
+@pytest.mark.asyncio
+async def test_error_is_shared():
+    """Ошибку операции получает каждый ожидающий."""
+    flights = SingleFlight()
+    operation = Operation(RepositoryError())
+
+    outcomes = await run_concurrently(flights, operation)
+
+    assert operation.calls == 1
+    assert all(isinstance(outcome, RepositoryError) for outcome in outcomes)
+    assert not flights
+
+
+@pytest.mark.asyncio
+async def test_sequential_calls_run_again():
+    """Результат не кэшируется: следующий вызов выполняет операцию."""
+    flights = SingleFlight()
+    operation = Operation()
+    operation.release.set()
+
+    await flights.run(key, operation)
+    second = await flights.run(key, operation)
+
+    assert second == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_flight():
+    """Отмена одного ожидающего не отменяет операцию для остальных."""
+    flights = SingleFlight()
+    operation = Operation()
+    cancelled = asyncio.ensure_future(flights.run(key, operation))
+    waiter = asyncio.ensure_future(flights.run(key, operation))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    operation.release.set()
+
+    assert await waiter == 1
+    assert cancelled.cancelled()
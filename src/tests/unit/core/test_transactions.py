@@ -1,22 +1,30 @@
+import asyncio
 from datetime import datetime, timedelta
+from unittest.mock import MagicMock
 
 import pydantic
 import pytest
+from fastapi import status
 
 from app.core.errors import NotFoundError, RepositoryError, ValidationError
-from app.core.models import (
+from app.core.models import (  # noqa: WPS235 service uses all models
     Transaction,
+    TransactionAggregateRequest,
     TransactionReport,
     TransactionReportRequest,
     TransactionRequest,
+    TransactionResult,
+    TransactionSummaryRequest,
     TransactionType,
     User,
 )
+from app.core.transactions import apply_transactions
 
 
 class TestValidator:
     """Тестирует методы класса Validator."""
 
+    username = 'george'
     int_number_zero = 0
     int_number_one = 1
     int_number_negative = -1
@@ -125,6 +133,33 @@ class TestValidator:
         """Тест метода _validate_time_period."""
         validator.validate_time_period(start_date, end_date)
 
+    def test_validate_transaction_batch(self, validator):
+        """Тест метода validate_transaction_batch."""
+        batch = [
+            TransactionRequest(
+                username=self.username,
+                amount=amount,
+                transaction_type=TransactionType.deposit,
+            )
+            for amount in (1, self.int_number_zero, 1, self.int_number_negative)
+        ]
+
+        errors = validator.validate_transaction_batch(batch)
+
+        assert list(errors) == [1, 3]
+
+    def test_validate_transaction_batch_size(self, validator, monkeypatch):
+        """Тест ограничения размера пакета validate_transaction_batch."""
+        monkeypatch.setattr('app.core.transactions.max_batch_size', 1)
+        request = TransactionRequest(
+            username=self.username,
+            amount=1,
+            transaction_type=TransactionType.deposit,
+        )
+
+        with pytest.raises(ValidationError):
+            validator.validate_transaction_batch([request, request])
+
 
 user_positive_balance = User(
     username='george', user_id=1, balance=1, is_verified=False,
@@ -150,13 +185,6 @@ amount = 1
             TransactionType.deposit,
             id='valid attributes SELL',
         ),
-        pytest.param(
-            user_zero_balance,
-            amount,
-            TransactionType.withdraw,
-            id='invalid amount',
-            marks=pytest.mark.xfail(raises=ValidationError),
-        ),
         pytest.param(
             user_positive_balance,
             amount,
@@ -180,10 +208,11 @@ async def test_create_transaction(user, amount, transaction_type, service):
         amount=amount,
         transaction_type=transaction_type,
     )
-    service.repository.get_user.return_value = user
-    service.repository.create_transaction.return_value = expected_transaction
+    service.repository.post_transaction.return_value = expected_transaction
     transaction = await service.create_transaction(request)
     assert transaction == expected_transaction
+    service.repository.post_transaction.assert_awaited_once()
+    service.repository.get_user.assert_not_awaited()
 
 
 @pytest.mark.asyncio
@@ -193,15 +222,23 @@ async def test_create_transaction(user, amount, transaction_type, service):
             user_positive_balance,
             amount,
             TransactionType.withdraw,
-            'service_error_on_get_user',
+            'service_error_on_user_not_found',
             id='user not found',
             marks=pytest.mark.xfail(raises=NotFoundError),
         ),
+        pytest.param(
+            user_zero_balance,
+            amount,
+            TransactionType.withdraw,
+            'service_error_on_overdraft',
+            id='invalid amount',
+            marks=pytest.mark.xfail(raises=ValidationError),
+        ),
         pytest.param(
             user_positive_balance,
             amount,
             TransactionType.withdraw,
-            'service_error_on_update_user',
+            'service_error_on_post_transaction',
             id='repository error',
             marks=pytest.mark.xfail(raises=RepositoryError),
         ),
@@ -217,7 +254,6 @@ async def test_create_transaction_not_found_error(
         amount=amount,
         transaction_type=transaction_type,
     )
-    service.repository.get_user.return_value = user
     await service.create_transaction(transaction_request)
 
 
@@ -283,3 +319,180 @@ async def test_create_transaction_report_without_cache(
         request,
     )
     assert report == expected_report
+
+
+@pytest.mark.asyncio
+async def test_concurrent_reports_run_once(service):
+    """Одинаковые одновременные отчеты создаются в хранилище один раз."""
+    request = TransactionReportRequest(
+        username=user_positive_balance.username,
+        start_date=datetime.now() - timedelta(days=1),
+        end_date=datetime.now(),
+    )
+
+    reports = await asyncio.gather(*(
+        service.create_transaction_report(request) for _ in range(10)
+    ))
+
+    service.repository.create_transaction_report.assert_awaited_once_with(
+        request,
+    )
+    assert all(report is reports[0] for report in reports)
+
+
+def test_apply_transactions():
+    """Транзакции пакета применяются по порядку с учетом баланса."""
+    user = user_positive_balance.model_copy()
+    transactions = [
+        Transaction(
+            username=username,
+            amount=amount,
+            transaction_type=TransactionType.withdraw,
+            timestamp=datetime.now(),
+        )
+        for username in (user.username, user.username, 'peter')
+    ]
+
+    outcomes = apply_transactions({user.username: user}, transactions)
+
+    assert [res.status_code for res in outcomes] == [
+        status.HTTP_200_OK,
+        status.HTTP_403_FORBIDDEN,
+        status.HTTP_404_NOT_FOUND,
+    ]
+    assert user.balance == 0
+
+
+@pytest.mark.asyncio
+async def test_create_transactions(service):
+    """Отклоненные при валидации транзакции не передаются в хранилище."""
+    requests = [
+        TransactionRequest(
+            username=user_positive_balance.username,
+            amount=request_amount,
+            transaction_type=TransactionType.deposit,
+        )
+        for request_amount in (amount, 0, amount)
+    ]
+    posted = TransactionResult(
+        transaction=Transaction(
+            username=user_positive_balance.username,
+            amount=amount,
+            transaction_type=TransactionType.deposit,
+            timestamp=datetime.now(),
+            transaction_id=1,
+        ),
+    )
+    service.repository.post_transactions.return_value = [posted, posted]
+
+    outcomes = await service.create_transactions(requests)
+
+    assert [res.status_code for res in outcomes] == [
+        status.HTTP_200_OK,
+        status.HTTP_403_FORBIDDEN,
+        status.HTTP_200_OK,
+    ]
+    post_transactions = service.repository.post_transactions
+    sent = post_transactions.await_args.args[0]
+    assert len(sent) == 2
+    assert sent[0].timestamp == sent[1].timestamp
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'user', (
+        pytest.param(user_positive_balance, id='user found'),
+        pytest.param(
+            None,
+            id='user not found',
+            marks=pytest.mark.xfail(raises=NotFoundError),
+        ),
+    ),
+)
+async def test_stream_transaction_report(user, service):
+    """Поток отчета запрашивается у хранилища после проверки запроса."""
+    service.repository.get_user.return_value = user
+    service.repository.stream_transactions = MagicMock()
+    report_request = TransactionReportRequest(
+        username=user_positive_balance.username,
+        start_date=datetime.now() - timedelta(days=1),
+        end_date=datetime.now(),
+    )
+
+    await service.stream_transaction_report(report_request)
+
+    service.repository.stream_transactions.assert_called_once_with(
+        report_request,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'user, start_date', (
+        pytest.param(
+            user_positive_balance,
+            datetime.now().date(),
+            id='user found',
+        ),
+        pytest.param(
+            None,
+            datetime.now().date(),
+            id='user not found',
+            marks=pytest.mark.xfail(raises=NotFoundError),
+        ),
+        pytest.param(
+            user_positive_balance,
+            datetime.now().date() + timedelta(days=1),
+            id='invalid period',
+            marks=pytest.mark.xfail(raises=ValidationError),
+        ),
+    ),
+)
+async def test_get_transaction_summary(user, start_date, service):
+    """Сводка запрашивается у хранилища после проверки запроса."""
+    service.repository.get_user.return_value = user
+    summary_request = TransactionSummaryRequest(
+        username=user_positive_balance.username,
+        start_date=start_date,
+        end_date=datetime.now().date(),
+    )
+
+    await service.get_transaction_summary(summary_request)
+
+    service.repository.get_transaction_summary.assert_awaited_once_with(
+        summary_request,
+    )
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'user, start_date', (
+        pytest.param(user_positive_balance, datetime.now(), id='user found'),
+        pytest.param(
+            None,
+            datetime.now(),
+            id='unknown user',
+            marks=pytest.mark.xfail(raises=NotFoundError),
+        ),
+        pytest.param(
+            user_positive_balance,
+            datetime.now() + timedelta(days=1),
+            id='invalid period',
+            marks=pytest.mark.xfail(raises=ValidationError),
+        ),
+    ),
+)
+async def test_create_aggregate_report(user, start_date, service):
+    """Агрегированный отчет запрашивается у хранилища после проверки."""
+    service.repository.get_user.return_value = user
+    aggregate_request = TransactionAggregateRequest(
+        username=user_positive_balance.username,
+        start_date=start_date,
+        end_date=datetime.now(),
+    )
+
+    await service.create_aggregate_report(aggregate_request)
+
+    service.repository.create_aggregate_report.assert_awaited_once_with(
+        aggregate_request,
+    )
@@ -1,13 +1,18 @@
+import functools
 import logging
 from collections import namedtuple
 from datetime import datetime
 
 import pytest
-from sqlalchemy import select
+import pytest_asyncio
+from sqlalchemy import delete, event, func, insert, select, text
 from sqlalchemy.orm import Session
 
 from app.core import models as srv
+from app.core.config import ReportPersistence, get_settings
 from app.external.postgres import models as db
+from app.external.postgres import partitions
+from app.external.postgres.async_storage import AsyncDBStorage
 from app.external.postgres.storage import DBStorage
 
 logger = logging.getLogger(__name__)
@@ -23,6 +28,9 @@ test_user = user(  # noqa: S106
     is_verified=True,
     is_deleted=False,
 )
+unverified_test_user = test_user._replace(
+    username='peter', is_verified=False,
+)
 valid_user = srv.User(
     username=test_user.username,
     balance=test_user.balance,
@@ -48,6 +56,25 @@ test_report_request = srv.TransactionReportRequest(
     end_date=datetime(year=2024, month=1, day=15),  # noqa: WPS432
 )
 
+test_summary_request = srv.TransactionSummaryRequest(
+    username=test_user.username,
+    start_date=test_report_request.start_date.date(),
+    end_date=test_report_request.end_date.date(),
+)
+posted_deposit = srv.TransactionTotals(count=2, amount=7)
+posted_withdraw = srv.TransactionTotals(count=2, amount=3)
+test_aggregate_request = srv.TransactionAggregateRequest(
+    username=test_user.username,
+    start_date=test_report_request.start_date,
+    end_date=test_report_request.end_date,
+)
+posted_deposit_aggregate = srv.TransactionAggregate(
+    count=2, amount=7, min_amount=3, max_amount=4,
+)
+posted_withdraw_aggregate = srv.TransactionAggregate(
+    count=2, amount=3, min_amount=1, max_amount=2,
+)
+
 
 @pytest.fixture
 def storage() -> DBStorage:
@@ -55,6 +82,37 @@ def storage() -> DBStorage:
     return DBStorage()
 
 
+@pytest.fixture
+def report_partitions(storage: DBStorage):
+    """Создает секции месяца тестового отчета и следующего за ним."""
+    created = partitions.create_partitions(
+        storage.pool, test_report_request.start_date.date(), 2,
+    )
+    yield created
+    drop_partitions(storage, created)
+
+
+def get_user_ids(session: Session) -> list[int]:
+    """Возвращает ID тестовых пользователей: test_user, затем остальных."""
+    # Обращение к объектам фикстур открыло бы в их сессиях транзакции,
+    # которые блокируют удаление секций до конца теста.
+    return list(session.scalars(
+        select(db.User.id).order_by(
+            db.User.username != test_user.username, db.User.id,
+        ),
+    ))
+
+
+def drop_partitions(storage, names: list[str]) -> None:
+    """Отсоединяет и удаляет секции transactions вместе с их строками."""
+    with storage.pool.begin() as connection:
+        for name in names:
+            connection.execute(
+                text(f'ALTER TABLE transactions DETACH PARTITION {name}'),
+            )
+            connection.execute(text(f'DROP TABLE {name}'))
+
+
 @pytest.fixture
 def storage_with_user(storage: DBStorage):
     """Создает объект DBStorage с добавленным пользователем."""
@@ -73,8 +131,30 @@ def storage_with_user(storage: DBStorage):
         except Exception:
             logger.debug('exception in tests with storage_with_user')
         finally:
-            clean_storage(session, db.Report)
-            clean_storage(session, db.Transaction)
+            clean_user_data(session)
+            session.delete(user)
+            session.commit()
+
+
+@pytest.fixture
+def storage_with_unverified_user(storage: DBStorage):
+    """Создает объект DBStorage с неверифицированным пользователем."""
+    with Session(storage.pool) as session:
+        user = db.User(
+            username=unverified_test_user.username,
+            hashed_password=unverified_test_user.hashed_password,
+            balance=unverified_test_user.balance,
+            is_verified=unverified_test_user.is_verified,
+            is_deleted=unverified_test_user.is_deleted,
+        )
+        session.add(user)
+        session.commit()
+        try:
+            yield storage, user
+        except Exception:
+            logger.debug('exception in tests with storage_with_unverified_user')
+        finally:
+            clean_user_data(session)
             session.delete(user)
             session.commit()
 
@@ -106,8 +186,7 @@ def storage_with_transactions(storage_with_user):
         except Exception:
             logger.debug('exception in tests with storage_with_user')
         finally:
-            clean_storage(session, db.Report)
-            clean_storage(session, db.Transaction)
+            clean_user_data(session)
 
 
 @pytest.fixture
@@ -120,8 +199,47 @@ def storage_without_transactions(storage_with_user):
         except Exception:
             logger.debug('exception in tests with storage_with_user')
         finally:
-            clean_storage(session, db.Report)
-            clean_storage(session, db.Transaction)
+            clean_user_data(session)
+
+
+@pytest.fixture
+def report_persistence(request, monkeypatch):
+    """Включает способ сохранения отчетов из request.param."""
+    persistence = getattr(request, 'param', ReportPersistence.bulk)
+    monkeypatch.setattr(
+        get_settings().postgres, 'report_persistence', persistence,
+    )
+    return persistence
+
+
+def get_report_state(storage) -> tuple[int, int, int | None]:
+    """Возвращает число отчетов, связей и max_transaction_id отчетов."""
+    stmt = select(
+        select(func.count(db.Report.id)).scalar_subquery(),
+        select(func.count(db.report_transaction.c.id)).scalar_subquery(),
+        select(func.max(db.Report.max_transaction_id)).scalar_subquery(),
+    )
+    with storage.pool.connect() as connection:
+        return tuple(connection.execute(stmt).one())
+
+
+@pytest_asyncio.fixture
+async def async_storage():
+    """Создает объект AsyncDBStorage, закрывает пул после теста."""
+    storage = AsyncDBStorage()
+    try:
+        yield storage
+    finally:
+        await storage.close()
+
+
+@pytest.fixture
+def seeded_async_storage(request, async_storage):
+    """Создает AsyncDBStorage с данными из фикстуры в request.param."""
+    seed_fixture = getattr(request, 'param', None)
+    if seed_fixture is not None:
+        request.getfixturevalue(seed_fixture)
+    return async_storage
 
 
 def _create_db_transaction(
@@ -136,6 +254,13 @@ def _create_db_transaction(
     )
 
 
+def clean_user_data(session: Session) -> None:
+    """Очищает отчеты, транзакции и итоги после теста."""
+    clean_storage(session, db.Report)
+    clean_storage(session, db.Transaction)
+    clean_storage(session, db.DailyTotal)
+
+
 def clean_storage(session: Session, orm_model):
     """Очищает транзакции после теста."""
     stmt = select(orm_model).where()
@@ -151,3 +276,102 @@ def count_storage(storage, orm_model) -> int:
         stmt = select(orm_model).where()
         transactions = session.scalars(stmt).all()
         return len(transactions)
+
+
+def get_balance(storage, username: str) -> int:
+    """Получает баланс пользователя из базы."""
+    with Session(storage.pool) as session:
+        return session.scalars(
+            select(db.User.balance).where(db.User.username == username),
+        ).one()
+
+
+def get_batch(
+    username: str, amounts: tuple[int, ...],
+) -> list[srv.Transaction]:
+    """Создает пакет транзакций: сумма > 0 списание, < 0 пополнение."""
+    return [
+        test_transactions[0].model_copy(
+            update={
+                'username': username,
+                'amount': abs(amount),
+                'transaction_type': (
+                    srv.TransactionType.withdraw if amount > 0
+                    else srv.TransactionType.deposit
+                ),
+            },
+        )
+        for amount in amounts
+    ]
+
+
+async def walk_history(
+    storage, username: str, page_size: int,
+) -> list[srv.Transaction]:
+    """Читает всю историю пользователя постранично по токенам."""
+    walked: list[srv.Transaction] = []
+    request = srv.TransactionHistoryRequest(
+        username=username, page_size=page_size,
+    )
+    while True:
+        page = await storage.get_transaction_history(request)
+        assert len(page.transactions) <= page_size
+        walked.extend(page.transactions)
+        if page.next_cursor is None:
+            return walked
+        request = request.model_copy(update={'cursor': page.next_cursor})
+
+
+async def post_by_every_path(storage) -> None:
+    """Проводит транзакции test_user всеми способами записи хранилища."""
+    await storage.post_transaction(test_transactions[0])
+    await storage.post_transactions(
+        get_batch(test_user.username, amounts=(1, -3)),
+    )
+    await storage.create_transaction(test_transactions[1])
+
+
+def count_statement(statements: list[str], *args) -> None:
+    """Сохраняет SQL запроса, отправленного в базу данных."""
+    statements.append(args[2])
+
+
+@pytest.fixture
+def executed_statements(storage: DBStorage):
+    """Собирает SQL запросы, отправленные хранилищем в базу данных."""
+    statements: list[str] = []
+    listener = functools.partial(count_statement, statements)
+    event.listen(storage.pool, 'before_cursor_execute', listener)
+    yield statements
+    event.remove(storage.pool, 'before_cursor_execute', listener)
+
+
+def seed_transactions(storage, username: str, count: int) -> None:
+    """Заменяет транзакции в базе на count транзакций пользователя."""
+    with Session(storage.pool) as session:
+        session.execute(delete(db.report_transaction))
+        session.execute(delete(db.Transaction))
+        id_user = session.scalars(
+            select(db.User.id).where(db.User.username == username),
+        ).one()
+        rows = [
+            {
+                'transaction_type': False,
+                'amount': 1,
+                'created_at': test_report_request.start_date,
+                'is_deleted': False,
+                'id_user': id_user,
+            }
+            for _ in range(count)
+        ]
+        if rows:
+            session.execute(insert(db.Transaction), rows)
+        session.commit()
+
+
+@pytest.fixture
+def transaction_seeder(storage_with_user):
+    """Возвращает функцию замены транзакций пользователя test_user."""
+    storage = storage_with_user[0]
+    yield functools.partial(seed_transactions, storage, test_user.username)
+    seed_transactions(storage, test_user.username, 0)
@@ -0,0 +1,553 @@
+import asyncio
+import logging
+import time
+from enum import StrEnum
+
+import pytest
+from fastapi import status
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.core.batching import BatchingRepository
+from app.core.config import ReportPersistence
+from app.core.errors import NotFoundError, ValidationError
+from app.core.models import (
+    Transaction,
+    TransactionReport,
+    TransactionType,
+    User,
+)
+from app.external.postgres import models as db
+from app.external.postgres.async_storage import AsyncDBStorage
+from app.external.postgres.backfill import backfill_daily_totals
+from app.external.postgres.storage import DBStorage
+from tests.unit.external.postgres.conftest import (  # noqa: WPS235 test data
+    count_storage,
+    get_balance,
+    get_batch,
+    get_report_state,
+    post_by_every_path,
+    posted_deposit,
+    posted_deposit_aggregate,
+    posted_withdraw,
+    posted_withdraw_aggregate,
+    test_aggregate_request,
+    test_report_request,
+    test_summary_request,
+    test_transactions,
+    unverified_test_user,
+    valid_user,
+    walk_history,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class Fixtures(StrEnum):
+    """Часто используемые названия фикстур."""
+
+    storage_with_user = 'storage_with_user'
+    storage_with_unverified_user = 'storage_with_unverified_user'
+    storage_without_user = 'storage_without_user'
+    storage_with_transactions = 'storage_with_transactions'
+    storage_without_transactions = 'storage_without_transactions'
+    seeded_async_storage = 'seeded_async_storage'
+
+
+class TestGetUser:
+    """Тестирует метод get_user."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'seeded_async_storage, user, expected', (
+            pytest.param(
+                Fixtures.storage_with_user,
+                valid_user,
+                valid_user,
+                id='valid user',
+            ),
+            pytest.param(
+                Fixtures.storage_without_user,
+                valid_user,
+                None,
+                id='invalid user',
+            ),
+        ),
+        indirect=[Fixtures.seeded_async_storage],
+    )
+    async def test_get_user(
+        self, seeded_async_storage: AsyncDBStorage, user: User, expected: User,
+    ):
+        """Тестирует что метод возвращает правильный объект."""
+        db_user: User | None = await seeded_async_storage.get_user(
+            user.username,
+        )
+
+        if db_user is None:
+            assert db_user is expected
+        else:
+            assert db_user.username == expected.username
+            assert db_user.balance == expected.balance
+            assert db_user.is_verified == expected.is_verified
+
+
+class TestCreateTransaction:
+    """Тестирует метод create_transaction."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'seeded_async_storage, transaction', (
+            pytest.param(
+                Fixtures.storage_with_user,
+                test_transactions[0],
+                id='transaction for valid user',
+            ),
+            pytest.param(
+                Fixtures.storage_without_user,
+                test_transactions[0],
+                id='transaction for not valid user',
+                marks=pytest.mark.xfail(raises=NotFoundError),
+            ),
+        ),
+        indirect=[Fixtures.seeded_async_storage],
+    )
+    async def test_create_transaction_return_value(
+        self, seeded_async_storage: AsyncDBStorage, transaction: Transaction,
+    ):
+        """Проверяет что метод выполняется верно."""
+        db_transaction: Transaction = (
+            await seeded_async_storage.create_transaction(transaction)
+        )
+
+        assert db_transaction.transaction_id is not None
+        assert db_transaction.username == transaction.username
+        assert db_transaction.amount == transaction.amount
+        assert db_transaction.timestamp == transaction.timestamp
+        assert db_transaction.transaction_type == transaction.transaction_type
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_user],
+        indirect=True,
+    )
+    async def test_create_transaction_storage_state(
+        self, seeded_async_storage: AsyncDBStorage, storage,
+    ):
+        """Проверяет состояние хранилища данных."""
+        for transaction in test_transactions:
+            await seeded_async_storage.create_transaction(transaction)
+
+        assert count_storage(storage, db.Transaction) == len(test_transactions)
+
+
+class TestPostTransaction:
+    """Тестирует метод post_transaction."""
+
+    parallel_withdrawals = 20
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_without_user],
+        indirect=True,
+    )
+    async def test_post_transaction_user_not_found(
+        self, seeded_async_storage: AsyncDBStorage,
+    ):
+        """Проверяет ошибку при отсутствии пользователя."""
+        with pytest.raises(NotFoundError):
+            await seeded_async_storage.post_transaction(test_transactions[0])
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_unverified_user],
+        indirect=True,
+    )
+    async def test_parallel_withdrawals_never_overdraw(
+        self, seeded_async_storage: AsyncDBStorage, storage,
+    ):
+        """Параллельные списания не уводят баланс в минус."""
+        withdraw = test_transactions[0].model_copy(
+            update={
+                'username': unverified_test_user.username,
+                'amount': 1,
+                'transaction_type': TransactionType.withdraw,
+            },
+        )
+
+        outcomes = await asyncio.gather(
+            *(
+                seeded_async_storage.post_transaction(withdraw)
+                for _ in range(self.parallel_withdrawals)
+            ),
+            return_exceptions=True,
+        )
+
+        posted = [res for res in outcomes if isinstance(res, Transaction)]
+        rejected = [
+            res for res in outcomes if isinstance(res, ValidationError)
+        ]
+        assert len(posted) == unverified_test_user.balance
+        assert len(rejected) == (
+            self.parallel_withdrawals - unverified_test_user.balance
+        )
+        assert get_balance(storage, unverified_test_user.username) == 0
+        assert count_storage(storage, db.Transaction) == len(posted)
+
+
+class TestPostTransactions:
+    """Тестирует метод post_transactions."""
+
+    parallel_withdrawals = 20
+    batching_window = 0.05
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_unverified_user],
+        indirect=True,
+    )
+    async def test_post_transactions_results(
+        self, seeded_async_storage: AsyncDBStorage, storage,
+    ):
+        """Проверяет результаты и состояние хранилища после пакета."""
+        batch = get_batch(unverified_test_user.username, amounts=(6, 6, -1))
+
+        outcomes = await seeded_async_storage.post_transactions(batch)
+
+        assert [res.status_code for res in outcomes] == [
+            status.HTTP_200_OK,
+            status.HTTP_403_FORBIDDEN,
+            status.HTTP_200_OK,
+        ]
+        assert get_balance(storage, unverified_test_user.username) == 5
+        assert count_storage(storage, db.Transaction) == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_unverified_user],
+        indirect=True,
+    )
+    async def test_batching_shares_round_trips(
+        self, seeded_async_storage: AsyncDBStorage, storage, monkeypatch,
+    ):
+        """Одиночные транзакции объединяются в пакеты больше пула."""
+        flushed: list[int] = []
+        post_transactions = seeded_async_storage.post_transactions
+
+        async def _post_transactions(transactions):  # noqa: WPS430 spy
+            flushed.append(len(transactions))
+            return await post_transactions(transactions)
+
+        monkeypatch.setattr(
+            seeded_async_storage, 'post_transactions', _post_transactions,
+        )
+        batching = BatchingRepository(
+            seeded_async_storage,
+            window=self.batching_window,
+            max_batch_size=self.parallel_withdrawals,
+        )
+        withdraw = get_batch(unverified_test_user.username, amounts=(1,))[0]
+
+        outcomes = await asyncio.gather(
+            *(
+                batching.post_transaction(withdraw)
+                for _ in range(self.parallel_withdrawals)
+            ),
+            return_exceptions=True,
+        )
+
+        assert flushed == [self.parallel_withdrawals]
+        assert sum(isinstance(res, Transaction) for res in outcomes) == (
+            unverified_test_user.balance
+        )
+        assert get_balance(storage, unverified_test_user.username) == 0
+
+
+class TestStreamTransactions:
+    """Тестирует метод stream_transactions."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_transactions],
+        indirect=True,
+    )
+    async def test_stream_transactions(
+        self, seeded_async_storage: AsyncDBStorage,
+    ):
+        """Транзакции периода возвращаются в порядке времени создания."""
+        streamed = [
+            trn async for trn in seeded_async_storage.stream_transactions(
+                test_report_request,
+            )
+        ]
+
+        assert [trn.timestamp for trn in streamed] == [
+            trn.timestamp for trn in test_transactions
+        ]
+
+
+class TestGetTransactionHistory:
+    """Тестирует метод get_transaction_history."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_transactions],
+        indirect=True,
+    )
+    async def test_history_pages(
+        self, seeded_async_storage: AsyncDBStorage,
+    ):
+        """История читается от новых транзакций к старым."""
+        walked = await walk_history(
+            seeded_async_storage, test_report_request.username, page_size=1,
+        )
+
+        assert [trn.timestamp for trn in walked] == [
+            trn.timestamp for trn in reversed(test_transactions)
+        ]
+
+
+class TestGetTransactionSummary:
+    """Тестирует дневные итоги и метод get_transaction_summary."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_user],
+        indirect=True,
+    )
+    async def test_totals_follow_posting(
+        self, seeded_async_storage: AsyncDBStorage, storage,
+    ):
+        """Итоги совпадают с пересчетом по таблице транзакций."""
+        await post_by_every_path(seeded_async_storage)
+
+        summary = await seeded_async_storage.get_transaction_summary(
+            test_summary_request,
+        )
+        backfill_daily_totals(storage.pool)
+
+        assert summary.deposit == posted_deposit
+        assert summary.withdraw == posted_withdraw
+        assert summary == await seeded_async_storage.get_transaction_summary(
+            test_summary_request,
+        )
+
+
+class TestCreateAggregateReport:
+    """Тестирует метод create_aggregate_report."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_user],
+        indirect=True,
+    )
+    async def test_aggregates(
+        self, seeded_async_storage: AsyncDBStorage, storage,
+    ):
+        """Агрегаты совпадают с агрегатами синхронного хранилища."""
+        await post_by_every_path(seeded_async_storage)
+
+        report = await seeded_async_storage.create_aggregate_report(
+            test_aggregate_request,
+        )
+
+        assert report.deposit == posted_deposit_aggregate
+        assert report.withdraw == posted_withdraw_aggregate
+        assert report == await storage.create_aggregate_report(
+            test_aggregate_request,
+        )
+
+
+class TestCreateReport:
+    """Тестирует метод create_transaction_report."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'seeded_async_storage, report_request, expected_qnt', (
+            pytest.param(
+                Fixtures.storage_with_transactions,
+                test_report_request,
+                2,
+                id='valid user with transactions',
+            ),
+            pytest.param(
+                Fixtures.storage_without_transactions,
+                test_report_request,
+                0,
+                id='valid user without transactions',
+            ),
+            pytest.param(
+                Fixtures.storage_without_user,
+                test_report_request,
+                0,
+                id='invalid user',
+                marks=pytest.mark.xfail(raises=NotFoundError),
+            ),
+        ),
+        indirect=[Fixtures.seeded_async_storage],
+    )
+    async def test_create_report_return_values(
+        self,
+        seeded_async_storage: AsyncDBStorage,
+        report_request,
+        expected_qnt,
+    ):
+        """Проверяет что метод создания отчета возвращает верные значения."""
+        report: TransactionReport = (
+            await seeded_async_storage.create_transaction_report(report_request)
+        )
+
+        assert report.report_id is not None
+        assert report.username == report_request.username
+        assert report.start_date == report_request.start_date
+        assert report.end_date == report_request.end_date
+        assert len(report.transactions) == expected_qnt
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_transactions],
+        indirect=True,
+    )
+    async def test_create_report_storage_state(
+        self, seeded_async_storage: AsyncDBStorage, storage,
+    ):
+        """Проверяет состояние хранилища данных после выполнения метода."""
+        await seeded_async_storage.create_transaction_report(
+            test_report_request,
+        )
+
+        assert count_storage(storage, db.Report) == 1
+        with Session(storage.pool) as session:
+            report = session.query(db.Report).one()
+            assert len(report.transactions) == len(test_transactions)
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'report_persistence, expected_state', (
+            pytest.param(ReportPersistence.bulk, (1, 2), id='bulk'),
+            pytest.param(ReportPersistence.watermark, (1, 0), id='watermark'),
+            pytest.param(ReportPersistence.disabled, (0, 0), id='disabled'),
+        ),
+        indirect=['report_persistence'],
+    )
+    @pytest.mark.parametrize(
+        Fixtures.seeded_async_storage,
+        [Fixtures.storage_with_transactions],
+        indirect=True,
+    )
+    async def test_report_persistence(
+        self,
+        seeded_async_storage: AsyncDBStorage,
+        report_persistence,
+        expected_state,
+        storage,
+    ):
+        """Способ сохранения определяет записанные строки отчета."""
+        report = await seeded_async_storage.create_transaction_report(
+            test_report_request,
+        )
+
+        state = get_report_state(storage)
+        assert state[:2] == expected_state
+        assert len(report.transactions) == len(test_transactions)
+        if report_persistence == ReportPersistence.disabled:
+            assert report.report_id is None
+        if report_persistence == ReportPersistence.watermark:
+            assert state[2] == max(
+                trn.transaction_id for trn in report.transactions
+            )
+        else:
+            assert state[2] is None
+
+
+@pytest.mark.slow
+@pytest.mark.database
+class TestConcurrency:
+    """
+    Бенчмарк конкурентных запросов к базе данных.
+
+    Каждый запрос удерживает соединение delay секунд через pg_sleep,
+    имитируя медленный отчет. Синхронное хранилище блокирует event loop,
+    поэтому запросы выполняются последовательно. Асинхронное хранилище
+    выполняет их одновременно в пределах пула соединений.
+    """
+
+    requests_in_flight = 5
+    delay = 0.2
+
+    @pytest.mark.asyncio
+    async def test_sync_storage_serializes(self, storage: DBStorage):
+        """Запросы синхронного хранилища выполняются последовательно."""
+        elapsed = await self._measure(self._sync_query, storage)
+
+        logger.info(f'sync storage: {elapsed:.3f}s')
+        assert elapsed >= self.requests_in_flight * self.delay
+
+    @pytest.mark.asyncio
+    async def test_async_storage_runs_concurrently(
+        self, async_storage: AsyncDBStorage,
+    ):
+        """Запросы асинхронного хранилища выполняются одновременно."""
+        elapsed = await self._measure(self._async_query, async_storage)
+
+        logger.info(f'async storage: {elapsed:.3f}s')
+        assert elapsed < self.requests_in_flight * self.delay / 2
+
+    @pytest.mark.asyncio
+    async def test_event_loop_is_not_blocked(
+        self, async_storage: AsyncDBStorage,
+    ):
+        """Event loop продолжает обрабатывать задачи во время запросов."""
+        heartbeat = self.delay / 10
+        queries = asyncio.ensure_future(
+            self._measure(self._async_query, async_storage),
+        )
+
+        start = time.perf_counter()
+        await asyncio.sleep(heartbeat)
+        lag = time.perf_counter() - start
+        await queries
+
+        assert lag < self.delay
+
+    async def _measure(self, query, storage) -> float:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            query(storage) for _ in range(self.requests_in_flight)
+        ))
+        return time.perf_counter() - start
+
+    async def _sync_query(self, storage: DBStorage) -> None:
+        with Session(storage.pool) as session:
+            session.execute(
+                text('SELECT pg_sleep(:delay)'), {'delay': self.delay},
+            )
+
+    async def _async_query(self, storage: AsyncDBStorage) -> None:
+        async with storage.session_maker() as session:
+            await session.execute(
+                text('SELECT pg_sleep(:delay)'), {'delay': self.delay},
+            )
@@ -0,0 +1,248 @@
+import logging
+from datetime import date, datetime
+from typing import Any
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core import models as srv
+from app.external.postgres import models as db
+from app.external.postgres import partitions, queries
+from tests.unit.external.postgres.conftest import (
+    clean_user_data,
+    drop_partitions,
+    get_user_ids,
+    test_user,
+)
+
+logger = logging.getLogger(__name__)
+
+benchmark_start = date(2023, 1, 1)  # noqa: WPS432
+benchmark_months = 12
+benchmark_report = srv.TransactionReportRequest(
+    username=test_user.username,
+    start_date=datetime(2023, 6, 1),  # noqa: WPS432
+    end_date=datetime(2023, 6, 30),  # noqa: WPS432
+)
+year_days = 365
+january = date(2024, 1, 1)  # noqa: WPS432
+mid_january = date(2024, 1, 15)  # noqa: WPS432
+end_of_january = date(2024, 1, 31)  # noqa: WPS432
+december = date(2023, 12, 1)  # noqa: WPS432
+end_of_december = date(2023, 12, 31)  # noqa: WPS432
+unpartitioned_month = datetime(2041, 5, 17)  # noqa: WPS432
+
+select_moved_row = """
+    SELECT
+        tableoid::regclass::text,
+        (SELECT count(*) FROM report_transaction WHERE id_transaction = :id)
+    FROM transactions WHERE id = :id
+"""
+select_partitions = """
+    SELECT inhrelid::regclass::text FROM pg_inherits
+    WHERE inhparent = 'transactions'::regclass
+"""
+seed_year = """
+    INSERT INTO transactions
+    (transaction_type, amount, created_at, is_deleted, id_user)
+    SELECT false, 1, :start + n * interval '1 day' / :per_day, false, :id_user
+    FROM generate_series(0, :count - 1) AS n
+"""
+create_unpartitioned = """
+    CREATE TABLE unpartitioned.transactions
+    (LIKE transactions INCLUDING DEFAULTS INCLUDING INDEXES)
+"""
+
+
+def get_partitions(session: Session) -> set[str]:
+    """Возвращает имена секций таблицы transactions."""
+    return set(session.scalars(text(select_partitions)))
+
+
+def explain_analyze(
+    session: Session, stmt: Select[Any], search_path: str,
+) -> dict[str, Any]:
+    """Выполняет запрос через EXPLAIN ANALYZE в схемах search_path."""
+    compiled = stmt.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={'render_postcompile': True},
+    )
+    with session.begin():
+        session.execute(text(f'SET LOCAL search_path TO {search_path}'))
+        # Первое выполнение загружает каталог и кэш отношений.
+        session.execute(stmt).all()
+        explained = session.connection().exec_driver_sql(
+            f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {compiled}',
+            compiled.params,
+        ).scalar_one()
+    return explained[0]
+
+
+def get_read_pages(plan: dict[str, Any]) -> int:
+    """Возвращает число страниц, прочитанных запросом."""
+    root = plan['Plan']
+    return root['Shared Hit Blocks'] + root['Shared Read Blocks']
+
+
+@pytest.mark.parametrize(
+    'month, months, expected', (
+        pytest.param(mid_january, 0, january, id='same month'),
+        pytest.param(
+            end_of_january, 1, january.replace(month=2), id='next month',
+        ),
+        pytest.param(december, 1, january, id='next year'),
+        pytest.param(january, -1, december, id='previous year'),
+    ),
+)
+def test_add_months(month, months, expected):
+    """Месяцы отсчитываются от первого дня месяца через границу года."""
+    assert partitions.add_months(month, months) == expected
+
+
+def test_get_partition_name():
+    """Имя секции содержит год и номер месяца."""
+    partition = partitions.get_partition_name(end_of_december)
+
+    assert partition == 'transactions_y2023m12'
+
+
+@pytest.mark.database
+def test_create_partitions(storage):
+    """Секции создаются заранее, повторный запуск безопасен."""
+    start = date.today()
+    months = 2
+
+    created = partitions.create_partitions(storage.pool, start, months)
+    partitions.create_partitions(storage.pool, start, months)
+    partitions.main()
+
+    with Session(storage.pool) as session:
+        existing = get_partitions(session)
+    assert created == [
+        partitions.get_partition_name(partitions.add_months(start, offset))
+        for offset in range(months)
+    ]
+    assert existing >= {*created, db.default_partition}
+
+
+@pytest.fixture
+def default_partition_row(storage_with_user):
+    """Создает транзакцию с отчетом в месяце без секции."""
+    storage, _ = storage_with_user
+    # Без expire_on_commit чтение ID открыло бы транзакцию, которая
+    # блокирует создание секции до конца теста.
+    with Session(storage.pool, expire_on_commit=False) as session:
+        transaction = db.Transaction(
+            transaction_type=False,
+            amount=1,
+            created_at=unpartitioned_month,
+            id_user=get_user_ids(session)[0],
+        )
+        session.add(db.Report(
+            start_date=unpartitioned_month,
+            end_date=unpartitioned_month,
+            id_user=transaction.id_user,
+            transactions=[transaction],
+        ))
+        session.commit()
+        try:
+            yield storage, transaction.id
+        finally:
+            clean_user_data(session)
+            drop_partitions(storage, [
+                partitions.get_partition_name(unpartitioned_month),
+            ])
+
+
+@pytest.mark.database
+def test_create_partitions_moves_default_rows(default_partition_row):
+    """Строки месяца и связи отчетов переносятся в созданную секцию."""
+    storage, id_transaction = default_partition_row
+
+    created = partitions.create_partitions(
+        storage.pool, unpartitioned_month.date(), 1,
+    )
+
+    with Session(storage.pool) as session:
+        moved = session.execute(
+            text(select_moved_row), {'id': id_transaction},
+        ).one()
+    assert tuple(moved) == (created[0], 1)
+
+
+@pytest.mark.slow
+@pytest.mark.database
+class TestPartitioningBenchmark:
+    """
+    Бенчмарк секционированной таблицы transactions.
+
+    Транзакции года копируются в несекционированную таблицу схемы
+    unpartitioned. Один и тот же запрос выполняется с search_path,
+    указывающим на каждую из таблиц, и сравнивается число прочитанных
+    страниц: секционированная таблица читает только секции периода.
+    """
+
+    per_day = 100
+
+    @pytest.fixture
+    def layouts(self, storage_with_user, storage_with_unverified_user):
+        """Сессия с годом транзакций в обеих схемах хранения."""
+        storage = storage_with_user[0]
+        created = partitions.create_partitions(
+            storage.pool, benchmark_start, benchmark_months,
+        )
+        with Session(storage.pool) as session:
+            with session.begin():
+                self._seed(session, get_user_ids(session))
+            yield session
+            with session.begin():
+                session.execute(text('DROP SCHEMA unpartitioned CASCADE'))
+        drop_partitions(storage, created)
+
+    @pytest.mark.parametrize(
+        'stmt', (
+            pytest.param(
+                queries.select_report_transactions(benchmark_report),
+                id='user report',
+            ),
+            pytest.param(
+                select(func.count()).select_from(db.Transaction).where(
+                    db.Transaction.created_at >= benchmark_report.start_date,
+                    db.Transaction.created_at <= benchmark_report.end_date,
+                ),
+                id='month of all users',
+            ),
+        ),
+    )
+    def test_partitioned_reads_fewer_pages(self, stmt, layouts):
+        """Запрос за месяц читает меньше страниц секционированной таблицы."""
+        partitioned = explain_analyze(layouts, stmt, 'public')
+        unpartitioned = explain_analyze(layouts, stmt, 'unpartitioned, public')
+
+        partitioned_pages = get_read_pages(partitioned)
+        unpartitioned_pages = get_read_pages(unpartitioned)
+        logger.info(f'partitioned: {partitioned_pages} pages')
+        logger.info(f'unpartitioned: {unpartitioned_pages} pages')
+        assert partitioned_pages < unpartitioned_pages
+
+    def _seed(self, session: Session, users: list[int]) -> None:
+        for id_user in users:
+            session.execute(
+                text(seed_year),
+                {
+                    'start': benchmark_start,
+                    'per_day': self.per_day,
+                    'count': self.per_day * year_days,
+                    'id_user': id_user,
+                },
+            )
+        session.execute(text('CREATE SCHEMA unpartitioned'))
+        session.execute(text(create_unpartitioned))
+        session.execute(text(
+            'INSERT INTO unpartitioned.transactions SELECT * FROM transactions',
+        ))
+        session.execute(text('ANALYZE transactions'))
+        session.execute(text('ANALYZE unpartitioned.transactions'))
@@ -0,0 +1,217 @@
+import re
+from collections.abc import Iterator
+from datetime import timedelta
+from typing import Any
+
+import pytest
+from sqlalchemy import insert, select, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import Select
+
+from app.core import models as srv
+from app.core.pagination import encode_cursor
+from app.external.postgres import aggregates
+from app.external.postgres import models as db
+from app.external.postgres import queries
+from tests.unit.external.postgres.conftest import (
+    get_user_ids,
+    test_aggregate_request,
+    test_report_request,
+    test_transactions,
+    test_user,
+)
+
+seeded_qnt = 1000
+other_users_share = 9
+transactions_partition = re.compile(r'transactions_(y\d{4}m\d{2}|default)')
+report_partition = 'transactions_y2024m01'
+month_days = 31
+history_request = srv.TransactionHistoryRequest(username=test_user.username)
+history_cursor = encode_cursor(
+    test_transactions[1].model_copy(update={'transaction_id': seeded_qnt}),
+)
+
+
+def get_plan(session: Session, stmt: Select[Any]) -> list[dict[str, Any]]:
+    """Получает узлы плана запроса через EXPLAIN."""
+    # На тестовых объемах последовательное сканирование дешевле индекса.
+    # При запрете планировщик выбирает его, только если индекс не подходит.
+    compiled = stmt.compile(
+        dialect=postgresql.dialect(),
+        compile_kwargs={'render_postcompile': True},
+    )
+    with session.begin():
+        session.execute(text('SET LOCAL enable_seqscan = off'))
+        explained = session.connection().exec_driver_sql(
+            f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params,
+        ).scalar_one()
+    return list(iter_nodes(explained[0]['Plan']))
+
+
+def iter_nodes(node: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Обходит узлы плана запроса."""
+    yield node
+    for child in node.get('Plans', []):
+        yield from iter_nodes(child)
+
+
+def get_scan(node: dict[str, Any]) -> str:
+    """Возвращает способ чтения: имя индекса или тип узла."""
+    # Bitmap Heap Scan читает индекс в дочернем узле Bitmap Index Scan.
+    return next(
+        (
+            child['Index Name']
+            for child in iter_nodes(node)
+            if 'Index Name' in child
+        ),
+        node['Node Type'],
+    )
+
+
+def get_scans(nodes: list[dict[str, Any]], relation: str) -> set[str]:
+    """Возвращает способы чтения таблицы."""
+    return {
+        get_scan(node)
+        for node in nodes
+        if node.get('Relation Name') == relation
+    }
+
+
+def get_partition_scans(nodes: list[dict[str, Any]]) -> dict[str, str]:
+    """Возвращает способы чтения секций transactions по именам секций."""
+    return {
+        node['Relation Name']: get_scan(node)
+        for node in nodes
+        if transactions_partition.fullmatch(node.get('Relation Name', ''))
+    }
+
+
+@pytest.fixture
+def seeded_session(
+    storage_with_user,
+    storage_with_unverified_user,
+    report_partitions,
+    transaction_seeder,
+):
+    """Сессия базы данных с транзакциями и собранной статистикой."""
+    # Транзакции другого пользователя в тех же секциях делают индекс
+    # по пользователю избирательнее первичного ключа (id, created_at).
+    storage = storage_with_user[0]
+    transaction_seeder(seeded_qnt)
+    with Session(storage.pool) as session:
+        with session.begin():
+            id_other_user = get_user_ids(session)[1]
+            session.execute(
+                insert(db.Transaction),
+                [
+                    {
+                        'transaction_type': False,
+                        'amount': 1,
+                        'created_at': test_report_request.start_date,
+                        'is_deleted': False,
+                        'id_user': id_other_user,
+                    }
+                    for _ in range(seeded_qnt * other_users_share)
+                ],
+            )
+            session.execute(text('ANALYZE transactions, report_transaction'))
+        yield session
+
+
+@pytest.mark.database
+@pytest.mark.parametrize(
+    'stmt', (
+        pytest.param(
+            queries.select_report_transactions(test_report_request),
+            id='report',
+        ),
+        pytest.param(
+            queries.select_report_rows(test_report_request),
+            id='report stream',
+        ),
+        pytest.param(
+            queries.select_history_rows(history_request),
+            id='history first page',
+        ),
+        pytest.param(
+            queries.select_history_rows(
+                history_request.model_copy(update={'cursor': history_cursor}),
+            ),
+            id='history next page',
+        ),
+        pytest.param(
+            aggregates.select_aggregates(test_aggregate_request),
+            id='aggregate report',
+        ),
+    ),
+)
+def test_transactions_queries_use_index(stmt, seeded_session):
+    """Запросы транзакций пользователя читают частичный индекс секций."""
+    # Пустые секции планировщик может читать по любому индексу,
+    # поэтому проверяется секция с транзакциями.
+    scans = get_partition_scans(get_plan(seeded_session, stmt))
+
+    assert scans[report_partition] == (
+        f'{report_partition}_id_user_created_at_id_idx'
+    )
+
+
+@pytest.mark.database
+@pytest.mark.parametrize(
+    'report_request, expected_partitions', (
+        pytest.param(
+            test_report_request,
+            {report_partition},
+            id='one month',
+        ),
+        pytest.param(
+            test_report_request.model_copy(
+                update={
+                    'end_date': test_report_request.end_date + timedelta(
+                        days=month_days,
+                    ),
+                },
+            ),
+            {report_partition, 'transactions_y2024m02'},
+            id='two months',
+        ),
+    ),
+)
+def test_report_reads_overlapping_partitions(
+    report_request, expected_partitions, seeded_session,
+):
+    """Отчет читает только секции, пересекающиеся с периодом отчета."""
+    nodes = get_plan(
+        seeded_session, queries.select_report_transactions(report_request),
+    )
+
+    assert set(get_partition_scans(nodes)) == expected_partitions
+
+
+@pytest.mark.database
+@pytest.mark.parametrize(
+    'stmt, expected_index', (
+        pytest.param(
+            select(db.report_transaction).where(
+                db.report_transaction.c.id_report == 1,
+            ),
+            'ix_report_transaction_id_report',
+            id='report transactions',
+        ),
+        pytest.param(
+            select(db.report_transaction).where(
+                db.report_transaction.c.id_transaction == 1,
+            ),
+            'ix_report_transaction_id_transaction',
+            id='transaction reports',
+        ),
+    ),
+)
+def test_report_transaction_queries_use_index(
+    stmt, expected_index, seeded_session,
+):
+    """Связи отчетов и транзакций читаются по индексу."""
+    nodes = get_plan(seeded_session, stmt)
+
+    assert get_scans(nodes, 'report_transaction') == {expected_index}
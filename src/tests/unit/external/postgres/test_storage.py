@@ -1,17 +1,41 @@
 import logging
+import tracemalloc
 from enum import StrEnum
 
 import pytest
-
-from app.core.errors import NotFoundError
-from app.core.models import Transaction, TransactionReport, User
+from fastapi import status
+
+from app.core.config import ReportPersistence
+from app.core.errors import NotFoundError, ValidationError
+from app.core.models import (
+    AggregateBucket,
+    Transaction,
+    TransactionReport,
+    TransactionType,
+    User,
+)
+from app.external.postgres import backfill
 from app.external.postgres import models as db
+from app.external.postgres.queries import get_balance_delta
 from app.external.postgres.storage import DBStorage
-from tests.unit.external.postgres.conftest import (
+from tests.unit.external.postgres.conftest import (  # noqa: WPS235 test data
     count_storage,
+    get_balance,
+    get_batch,
+    get_report_state,
+    post_by_every_path,
+    posted_deposit,
+    posted_deposit_aggregate,
+    posted_withdraw,
+    posted_withdraw_aggregate,
+    test_aggregate_request,
     test_report_request,
+    test_summary_request,
     test_transactions,
+    test_user,
+    unverified_test_user,
     valid_user,
+    walk_history,
 )
 
 logger = logging.getLogger(__name__)
@@ -21,6 +45,7 @@ class Fixtures(StrEnum):
     """Часто используемые названия фикстур."""
 
     storage_with_user = 'storage_with_user'
+    storage_with_unverified_user = 'storage_with_unverified_user'
     storage_without_user = 'storage_without_user'
 
 
@@ -60,6 +85,22 @@ class TestGetUser:
             assert db_user.balance == expected.balance
             assert db_user.is_verified == expected.is_verified
 
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_get_user_reads_needed_columns(
+        self, storage_with_user, executed_statements,
+    ):
+        """Пользователь читается одним запросом без пароля и вектора."""
+        storage = storage_with_user[0]
+
+        await storage.get_user(test_user.username)
+        await storage.post_transactions(get_batch(test_user.username, (1,)))
+
+        assert executed_statements
+        for statement in executed_statements:
+            assert 'hashed_password' not in statement
+            assert 'vector' not in statement
+
 
 class TestUpdateUser:
     """Тестирует метод upgrade_user."""
@@ -149,9 +190,203 @@ class TestCreateTransaction:
         assert count_storage(storage, db.Transaction) == expected_qnt
 
 
+class TestPostTransaction:
+    """Тестирует метод post_transaction."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_post_transaction_updates_balance(self, storage_with_user):
+        """Проверяет что баланс и транзакции сохраняются одним запросом."""
+        storage, _ = storage_with_user
+        expected_balance = test_user.balance + sum(
+            get_balance_delta(trn) for trn in test_transactions
+        )
+
+        for transaction in test_transactions:
+            posted = await storage.post_transaction(transaction)
+            assert posted.transaction_id is not None
+            assert posted.amount == transaction.amount
+
+        assert get_balance(storage, test_user.username) == expected_balance
+        assert count_storage(storage, db.Transaction) == len(test_transactions)
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'storage_fixture, user, expected_balance', (
+            pytest.param(
+                Fixtures.storage_with_user,
+                test_user,
+                -1,
+                id='verified user overdraft allowed',
+            ),
+            pytest.param(
+                Fixtures.storage_with_unverified_user,
+                unverified_test_user,
+                unverified_test_user.balance,
+                id='unverified user overdraft forbidden',
+                marks=pytest.mark.xfail(raises=ValidationError),
+            ),
+        ),
+    )
+    async def test_post_transaction_overdraft(
+        self, storage_fixture, user, expected_balance, request,
+    ):
+        """Проверяет правило овердрафта."""
+        storage, _ = request.getfixturevalue(storage_fixture)
+        withdraw = test_transactions[0].model_copy(
+            update={
+                'username': user.username,
+                'amount': user.balance + 1,
+                'transaction_type': TransactionType.withdraw,
+            },
+        )
+
+        try:
+            await storage.post_transaction(withdraw)
+        finally:
+            assert get_balance(storage, user.username) == expected_balance
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_post_transaction_user_not_found(self, storage):
+        """Проверяет ошибку при отсутствии пользователя."""
+        with pytest.raises(NotFoundError):
+            await storage.post_transaction(test_transactions[0])
+        assert count_storage(storage, db.Transaction) == 0
+
+
+class TestPostTransactions:
+    """Тестирует метод post_transactions."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_post_transactions_results(
+        self, storage_with_unverified_user,
+    ):
+        """Проверяет результаты и состояние хранилища после пакета."""
+        storage = storage_with_unverified_user[0]
+        batch = get_batch(unverified_test_user.username, amounts=(6, 6, -1))
+        batch.append(batch[0].model_copy(update={'username': 'unknown'}))
+
+        outcomes = await storage.post_transactions(batch)
+
+        assert [res.status_code for res in outcomes] == [
+            status.HTTP_200_OK,
+            status.HTTP_403_FORBIDDEN,
+            status.HTTP_200_OK,
+            status.HTTP_404_NOT_FOUND,
+        ]
+        assert all(
+            res.transaction.transaction_id is not None
+            for res in outcomes
+            if res.transaction is not None
+        )
+        assert get_balance(storage, unverified_test_user.username) == 5
+        assert count_storage(storage, db.Transaction) == 2
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize('batch_size', (1, 100))
+    async def test_post_transactions_round_trips(
+        self, storage_with_user, executed_statements, batch_size,
+    ):
+        """Число запросов к базе данных не зависит от размера пакета."""
+        storage = storage_with_user[0]
+
+        await storage.post_transactions(
+            get_batch(test_user.username, amounts=(1,) * batch_size),
+        )
+
+        # FOR UPDATE, UPDATE балансов, INSERT транзакций и дневных итогов
+        assert len(executed_statements) == 4
+        assert count_storage(storage, db.Transaction) == batch_size
+
+
+class TestStreamTransactions:
+    """Тестирует метод stream_transactions."""
+
+    small_report = 2000
+    large_report = 20000
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_stream_transactions(self, storage_with_transactions):
+        """Транзакции периода возвращаются в порядке времени создания."""
+        storage = storage_with_transactions[0]
+
+        streamed = [
+            trn async for trn in storage.stream_transactions(
+                test_report_request,
+            )
+        ]
+
+        assert [trn.timestamp for trn in streamed] == [
+            trn.timestamp for trn in test_transactions
+        ]
+        assert all(trn.transaction_id is not None for trn in streamed)
+
+    @pytest.mark.asyncio
+    @pytest.mark.slow
+    @pytest.mark.database
+    async def test_stream_memory_is_flat(
+        self, storage_with_user, transaction_seeder,
+    ):
+        """Пиковая память потока не растет с размером периода."""
+        storage = storage_with_user[0]
+
+        transaction_seeder(self.small_report)
+        small_peak = await self._measure_peak(storage, self.small_report)
+        transaction_seeder(self.large_report)
+        large_peak = await self._measure_peak(storage, self.large_report)
+
+        logger.info(f'stream peak memory: {small_peak} -> {large_peak}')
+        assert large_peak < small_peak * 2
+
+    async def _measure_peak(self, storage: DBStorage, count: int) -> int:
+        streamed = 0
+        tracemalloc.start()
+        async for _ in storage.stream_transactions(test_report_request):  # noqa: WPS519, E501 rows must not be kept
+            streamed += 1
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert streamed == count
+        return peak
+
+
+class TestGetTransactionHistory:
+    """Тестирует метод get_transaction_history."""
+
+    history_qnt = 7
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'page_size', (
+            pytest.param(1, id='page size = 1'),
+            pytest.param(3, id='page size = 3'),
+            pytest.param(history_qnt, id='single page'),
+        ),
+    )
+    async def test_history_pages(
+        self, page_size, storage_with_user, transaction_seeder,
+    ):
+        """Транзакции с равным временем делятся на страницы по id."""
+        storage = storage_with_user[0]
+        transaction_seeder(self.history_qnt)
+
+        walked = await walk_history(storage, test_user.username, page_size)
+
+        transaction_ids = [trn.transaction_id for trn in walked]
+        assert transaction_ids == sorted(set(transaction_ids), reverse=True)
+        assert len(transaction_ids) == self.history_qnt
+
+
 class TestCreateReport:
     """Тестирует метод create_transaction_report."""
 
+    report_size = 50
+
     @pytest.mark.asyncio
     @pytest.mark.parametrize(
         'report_request, expected_qnt, storage_fixture', (
@@ -223,6 +458,199 @@ class TestCreateReport:
             count_storage(storage, db.Transaction) == len(report.transactions)
         )
 
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'report_persistence, expected_state', (
+            pytest.param(ReportPersistence.bulk, (1, 2), id='bulk'),
+            pytest.param(ReportPersistence.watermark, (1, 0), id='watermark'),
+            pytest.param(ReportPersistence.disabled, (0, 0), id='disabled'),
+        ),
+        indirect=['report_persistence'],
+    )
+    async def test_report_persistence(
+        self, report_persistence, expected_state, storage_with_transactions,
+    ):
+        """Способ сохранения определяет записанные строки отчета."""
+        storage = storage_with_transactions[0]
+
+        report = await storage.create_transaction_report(test_report_request)
+
+        state = get_report_state(storage)
+        assert state[:2] == expected_state
+        assert len(report.transactions) == len(test_transactions)
+        if report_persistence == ReportPersistence.disabled:
+            assert report.report_id is None
+        if report_persistence == ReportPersistence.watermark:
+            assert state[2] == max(
+                trn.transaction_id for trn in report.transactions
+            )
+        else:
+            assert state[2] is None
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'report_persistence, expected_state', (
+            pytest.param(ReportPersistence.bulk, (1, 2), id='bulk'),
+            pytest.param(ReportPersistence.watermark, (1, 0), id='watermark'),
+            pytest.param(ReportPersistence.disabled, (0, 0), id='disabled'),
+        ),
+        indirect=['report_persistence'],
+    )
+    async def test_save_assembled_report(
+        self, report_persistence, expected_state, storage_with_transactions,
+    ):
+        """Собранный отчет сохраняется так же, как созданный хранилищем."""
+        storage = storage_with_transactions[0]
+        report = TransactionReport(
+            report_id=None,
+            username=test_report_request.username,
+            start_date=test_report_request.start_date,
+            end_date=test_report_request.end_date,
+            transactions=[
+                transaction
+                async for transaction in storage.stream_transactions(
+                    test_report_request,
+                )
+            ],
+        )
+
+        saved = await storage.save_transaction_report(report)
+
+        assert get_report_state(storage)[:2] == expected_state
+        assert (saved.report_id is None) == (
+            report_persistence == ReportPersistence.disabled
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_create_report_round_trips(
+        self,
+        report_persistence,
+        storage_with_user,
+        transaction_seeder,
+        executed_statements,
+    ):
+        """Число запросов к базе данных не зависит от размера отчета."""
+        storage = storage_with_user[0]
+        transaction_seeder(self.report_size)
+        executed_statements.clear()
+
+        report = await storage.create_transaction_report(test_report_request)
+
+        # SELECT пользователя и транзакций, INSERT отчета и связей
+        assert len(executed_statements) == 4
+        assert len(report.transactions) == self.report_size
+
+
+class TestGetTransactionSummary:
+    """Тестирует дневные итоги и метод get_transaction_summary."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_totals_follow_posting(self, storage_with_user):
+        """Итоги обновляются каждым способом записи транзакций."""
+        storage = storage_with_user[0]
+
+        await post_by_every_path(storage)
+
+        summary = await storage.get_transaction_summary(test_summary_request)
+        assert summary.deposit == posted_deposit
+        assert summary.withdraw == posted_withdraw
+        last_day = await storage.get_transaction_summary(
+            test_summary_request.model_copy(
+                update={'start_date': test_summary_request.end_date},
+            ),
+        )
+        assert last_day.deposit.amount == test_transactions[1].amount
+        assert not last_day.withdraw.count
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_backfill(self, storage_with_user, transaction_seeder):
+        """Пересчет заполняет итоги и может запускаться повторно."""
+        storage = storage_with_user[0]
+        seeded_qnt = 5
+        transaction_seeder(seeded_qnt)
+        summary = await storage.get_transaction_summary(test_summary_request)
+        assert not summary.deposit.count
+
+        backfill.backfill_daily_totals(storage.pool)
+        backfill.main()
+
+        summary = await storage.get_transaction_summary(test_summary_request)
+        assert summary.deposit.count == seeded_qnt
+        assert summary.deposit.amount == seeded_qnt
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_backfill_drops_stale_totals(
+        self, storage_with_user, transaction_seeder,
+    ):
+        """Пересчет удаляет итоги дней, в которых не осталось транзакций."""
+        storage = storage_with_user[0]
+        transaction_seeder(3)
+        backfill.backfill_daily_totals(storage.pool)
+        transaction_seeder(0)
+
+        backfill.backfill_daily_totals(storage.pool)
+
+        summary = await storage.get_transaction_summary(test_summary_request)
+        assert not summary.deposit.count
+        assert not summary.deposit.amount
+
+
+class TestCreateAggregateReport:
+    """Тестирует метод create_aggregate_report."""
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    @pytest.mark.parametrize(
+        'bucket, expected_starts', (
+            pytest.param(
+                AggregateBucket.day,
+                [
+                    test_transactions[0].timestamp,
+                    test_transactions[1].timestamp,
+                ],
+                id='day',
+            ),
+            pytest.param(
+                AggregateBucket.month,
+                [test_transactions[0].timestamp],
+                id='month',
+            ),
+        ),
+    )
+    async def test_aggregates(self, bucket, expected_starts, storage_with_user):
+        """Агрегаты считаются по интервалам и за весь период."""
+        storage = storage_with_user[0]
+        await post_by_every_path(storage)
+
+        report = await storage.create_aggregate_report(
+            test_aggregate_request.model_copy(update={'bucket': bucket}),
+        )
+
+        starts = [report_bucket.start for report_bucket in report.buckets]
+        assert starts == expected_starts
+        assert report.deposit == posted_deposit_aggregate
+        assert report.withdraw == posted_withdraw_aggregate
+        assert report.buckets[-1].deposit.max_amount == (
+            test_transactions[1].amount
+        )
+
+    @pytest.mark.asyncio
+    @pytest.mark.database
+    async def test_no_transactions(self, storage_with_user):
+        """Без транзакций за период отчет не содержит интервалов."""
+        storage = storage_with_user[0]
+
+        report = await storage.create_aggregate_report(test_aggregate_request)
+
+        assert not report.buckets
+        assert report.deposit.min_amount is None
+
 
 def test_init():
     """Тестирует инициализацию DBStorage."""
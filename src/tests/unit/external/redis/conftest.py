@@ -2,7 +2,7 @@ import logging
 
 import pytest_asyncio
 
-from app.external.redis import TransactionReportCache
+from app.external.redis import TransactionReportCache, close_pool
 from tests.unit.external.redis import test_data
 
 logger = logging.getLogger(__name__)
@@ -23,12 +23,15 @@ async def redis():
         logger.debug('error during tests, cleaning')
     finally:
         await redis.flush_cache()
+        await close_pool()
 
 
 @pytest_asyncio.fixture
 async def redis_with_report(
     redis: TransactionReportCache,
 ) -> TransactionReportCache:
-    """Создает кэш с загруженным отчетом."""
-    await redis.create_cache(test_data.report)
+    """Создает кэш с загруженными сегментами отчета."""
+    await redis.create_segments(
+        test_data.report.username, test_data.segments, test_data.version,
+    )
     return redis
@@ -2,11 +2,13 @@ from datetime import datetime
 from enum import Enum
 
 from app.core.models import (
+    CacheVersion,
     Transaction,
     TransactionReport,
     TransactionReportRequest,
     TransactionType,
 )
+from app.core.segments import split_by_day
 
 year = 2024
 
@@ -29,12 +31,14 @@ transaction_one = Transaction(
     amount=TestValues.amount.value,
     transaction_type=TestValues.deposit.value,
     timestamp=TestValues.timestamp_one.value,
+    transaction_id=1,
 )
 transaction_two = Transaction(
     username=TestValues.username.value,
     amount=TestValues.amount.value,
     transaction_type=TestValues.withdraw.value,
     timestamp=TestValues.timestamp_one.value,
+    transaction_id=2,
 )
 transactions = [transaction_one, transaction_two]
 report = TransactionReport(
@@ -49,3 +53,5 @@ report_request = TransactionReportRequest(
     start_date=TestValues.start_date.value,
     end_date=TestValues.end_date.value,
 )
+version = CacheVersion()
+segments = split_by_day([report_request], transactions)
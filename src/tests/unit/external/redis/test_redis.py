@@ -1,91 +1,702 @@
-from enum import StrEnum
-from typing import Any
+import asyncio
+import gzip
+import logging
+import time
+from datetime import datetime, timedelta
 
 import pytest
+from redis.asyncio.connection import AbstractConnection
+from redis.crc import key_slot
 
-from app.core.models import TransactionReport
+from app.core.config import ReportCacheFormat, get_settings
+from app.core.models import (
+    Transaction,
+    TransactionReport,
+    TransactionReportRequest,
+    User,
+)
+from app.core.segments import get_missing_periods, split_by_day
 from app.external.redis import (
-    ReportCacheMixin,
+    SegmentCacheMixin,
     TransactionReportCache,
-    TransactionsListCacheMixin,
+    close_pool,
+    get_pool,
 )
 from tests.unit.external.redis import test_data
 
+logger = logging.getLogger(__name__)
+
+
+def get_report(size: int) -> TransactionReport:
+    """Создает отчет из size транзакций с разным временем."""
+    transactions = [
+        test_data.transaction_one.model_copy(
+            update={
+                'timestamp': test_data.transaction_one.timestamp + timedelta(
+                    seconds=second,
+                ),
+                'transaction_id': second,
+            },
+        )
+        for second in range(size)
+    ]
+    return test_data.report.model_copy(update={'transactions': transactions})
+
+
+footprint_start = datetime(year=test_data.year, month=1, day=1)
+footprint_days = 60
+footprint_window = 30
+per_day = 20
+footprint_transactions = [
+    test_data.transaction_one.model_copy(update={
+        'timestamp': footprint_start + timedelta(days=day, minutes=minute),
+        'transaction_id': day * per_day + minute,
+    })
+    for day in range(footprint_days)
+    for minute in range(per_day)
+]
+
+
+def read_transactions(
+    periods: list[TransactionReportRequest],
+) -> list[Transaction]:
+    """Читает транзакции периодов, как хранилище."""
+    return [
+        transaction
+        for period in periods
+        for transaction in footprint_transactions
+        if period.start_date <= transaction.timestamp <= period.end_date
+    ]
+
+
+lease_poll_interval = 0.01
+
+
+async def acquire(redis: TransactionReportCache) -> int | None:
+    """Берет аренду дней отчета."""
+    return await redis.acquire_lease(
+        test_data.report_request, test_data.version,
+    )
+
+
+async def release(redis: TransactionReportCache, token: int) -> None:
+    """Возвращает аренду дней отчета."""
+    await redis.release_lease(
+        test_data.report_request, test_data.version, token,
+    )
+
+
+async def release_later(redis: TransactionReportCache, token: int) -> None:
+    """Возвращает аренду дней отчета после нескольких проверок ожидающих."""
+    await asyncio.sleep(lease_poll_interval * 3)
+    await release(redis, token)
+
+
+async def get_tokens(redis: TransactionReportCache) -> tuple[int, int]:
+    """Получает токены двух аренд подряд: старой и новой."""
+    stale = await acquire(redis)
+    await release(redis, stale)
+    return stale, await acquire(redis)
+
+
+def count_round_trips(monkeypatch) -> list[int]:
+    """Подсчитывает отправки команд в redis, каждая - один запрос."""
+    round_trips: list[int] = []
+    send = AbstractConnection.send_packed_command
+
+    async def send_packed_command(connection, *args, **kwargs):  # noqa: WPS430, E501 wraps the patched method
+        round_trips.append(1)
+        return await send(connection, *args, **kwargs)
+
+    monkeypatch.setattr(
+        AbstractConnection, 'send_packed_command', send_packed_command,
+    )
+    return round_trips
 
-class Key(StrEnum):
-    """Часто встречающиеся ключи."""
 
-    username = 'username'
-    transactions = 'transactions'
+@pytest.mark.asyncio
+async def test_cache_clients_share_pool(redis: TransactionReportCache):
+    """Клиенты кэша используют общий пул, пул переживает закрытие."""
+    settings = get_settings().redis
+    pool = get_pool()
+
+    await close_pool()
+
+    assert redis.storage.connection_pool is pool
+    assert SegmentCacheMixin().storage.connection_pool is pool
+    assert pool.max_connections == settings.max_connections
+    assert await redis.storage.ping()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    'report_format, expected_encoding', (
+        pytest.param(ReportCacheFormat.json, None, id='json'),
+        pytest.param(ReportCacheFormat.gzip, 'gzip', id='gzip'),
+    ),
+)
+async def test_report_body(
+    report_format, expected_encoding, redis, monkeypatch,
+):
+    """Тело отчета возвращается в том виде, в котором хранится."""
+    monkeypatch.setattr(get_settings().redis, 'report_format', report_format)
+    payload = test_data.report.model_dump_json().encode()
+
+    with pytest.raises(KeyError):
+        await redis.get_report_body(
+            test_data.report_request, test_data.version,
+        )
+    await redis.create_report_body(
+        test_data.report_request, payload, test_data.version,
+    )
+    body = await redis.get_report_body(
+        test_data.report_request, test_data.version,
+    )
+
+    assert body.encoding == expected_encoding
+    if body.encoding is None:
+        assert body.payload == payload
+    else:
+        assert gzip.decompress(body.payload) == payload
 
 
 class TestWithEmptyCache:
     """Тестирует пустой redis."""
 
     @pytest.mark.asyncio
-    async def test_create_cache(self, redis: TransactionReportCache):
-        """Тестирует метод create_cache."""
-        await redis.create_cache(test_data.report)
+    async def test_create_segments(self, redis: TransactionReportCache):
+        """Тестирует метод create_segments."""
+        await redis.create_segments(
+            test_data.report.username, test_data.segments, test_data.version,
+        )
+
+        stored_segment = await redis.storage.lrange(
+            redis._get_segment_key(
+                test_data.report.username,
+                test_data.transaction_one.timestamp.date(),
+                test_data.version,
+            ),
+            0,
+            -1,
+        )
 
-        stored_data = self._get_stored_data(test_data.report)
+        assert int(stored_segment[0]) == len(test_data.transactions)
+        assert len(stored_segment) == len(test_data.transactions) + 1
 
-        assert (
-            stored_data[Key.username] ==
-            test_data.report.username
+    @pytest.mark.asyncio
+    async def test_get_segments_empty(self, redis: TransactionReportCache):
+        """Тестирует метод get_segments."""
+        segments = await redis.get_segments(
+            test_data.report_request, test_data.version,
+        )
+
+        assert not segments
+
+
+class TestWithNotEmptyCache:
+    """Тестирует redis с загруженными сегментами."""
+
+    @pytest.mark.asyncio
+    async def test_get_segments(
+        self, redis_with_report: TransactionReportCache,
+    ):
+        """Тестирует метод get_segments."""
+        segments = await redis_with_report.get_segments(
+            test_data.report_request, test_data.version,
         )
-        assert (
-            len(stored_data[Key.transactions]) ==
-            len(test_data.report.transactions)
+        day = test_data.transaction_one.timestamp.date()
+
+        assert segments.keys() == test_data.segments.keys()
+        assert segments[day] == test_data.transactions
+        assert sum(map(len, segments.values())) == len(
+            test_data.transactions,
         )
 
     @pytest.mark.asyncio
-    async def test_get_cache_raises(self, redis: TransactionReportCache):
-        """Тестирует метод get_cache."""
+    async def test_get_overlapping_segments(
+        self, redis_with_report: TransactionReportCache,
+    ):
+        """Запрос пересекающегося периода получает только свои дни."""
+        request = test_data.report_request.model_copy(
+            update={'end_date': test_data.report.end_date + timedelta(days=2)},
+        )
+
+        segments = await redis_with_report.get_segments(
+            request, test_data.version,
+        )
+
+        assert segments.keys() == test_data.segments.keys()
+
+
+class TestCacheLifetime:
+    """Тестирует время жизни и объем кэша пользователя."""
+
+    day = test_data.transaction_one.timestamp.date()
+
+    @pytest.mark.asyncio
+    async def test_keys_expire(self, redis_with_report: TransactionReportCache):
+        """Ключи каждого семейства записываются со своим TTL."""
+        settings = get_settings().redis
+        storage = redis_with_report.storage
+        keys = {
+            redis_with_report._get_segment_key(
+                test_data.report.username, self.day, test_data.version,
+            ): settings.segment_ttl,
+            redis_with_report._get_transaction_key(
+                test_data.transaction_one,
+            ): settings.transaction_ttl,
+        }
+
+        for key, ttl in keys.items():
+            assert 0 < await storage.ttl(key) <= ttl
+
+    @pytest.mark.asyncio
+    async def test_invalidate_user(
+        self, redis_with_report: TransactionReportCache,
+    ):
+        """Новая версия пользователя делает его сегменты недоступными."""
+        username = test_data.report.username
+
+        await redis_with_report.invalidate_user(username)
+        version = await redis_with_report.get_user_version(username)
+
+        assert version.generation == test_data.version.generation + 1
+        assert not await redis_with_report.get_segments(
+            test_data.report_request, version,
+        )
+
+    @pytest.mark.asyncio
+    async def test_incomplete_segment_is_miss(
+        self, redis_with_report: TransactionReportCache,
+    ):
+        """Сегмент, транзакции которого истекли, не читается."""
+        await redis_with_report.storage.delete(
+            redis_with_report._get_transaction_key(test_data.transaction_one),
+        )
+
+        segments = await redis_with_report.get_segments(
+            test_data.report_request, test_data.version,
+        )
+
+        assert self.day not in segments
+        assert len(segments) == len(test_data.segments) - 1
+
+    @pytest.mark.asyncio
+    async def test_user_cache_bytes(
+        self, redis: TransactionReportCache, monkeypatch,
+    ):
+        """Данные сверх объема кэша пользователя не сохраняются."""
+        monkeypatch.setattr(get_settings().redis, 'user_cache_bytes', 1)
+        payload = test_data.report.model_dump_json().encode()
+
+        await redis.create_segments(
+            test_data.report.username, test_data.segments, test_data.version,
+        )
+        await redis.create_report_body(
+            test_data.report_request, payload, test_data.version,
+        )
+
+        assert not await redis.get_segments(
+            test_data.report_request, test_data.version,
+        )
         with pytest.raises(KeyError):
-            await redis.get_cache(test_data.report_request)
+            await redis.get_report_body(
+                test_data.report_request, test_data.version,
+            )
+        assert not await redis.storage.exists(
+            redis._get_bytes_key(test_data.report.username, test_data.version),
+        )
 
-    def _get_stored_data(
-        self, external_data: TransactionReport,
-    ) -> dict[str, Any]:
-        report_storage = ReportCacheMixin()
-        transaction_list_storage = TransactionsListCacheMixin()
-        key = report_storage._get_key(external_data)
-        report: dict = report_storage.storage.hgetall(key)
-        transactions = transaction_list_storage._get_transactions_list_cache(
-            transaction_list_storage._get_transactions_key(external_data),
+    @pytest.mark.asyncio
+    async def test_user_cache_bytes_after_invalidate(
+        self, redis: TransactionReportCache, monkeypatch,
+    ):
+        """После инвалидации объем кэша пользователя считается заново."""
+        username = test_data.report.username
+        monkeypatch.setattr(
+            get_settings().redis,
+            'user_cache_bytes',
+            redis._get_size(test_data.segments),
+        )
+        await redis.create_segments(
+            username, test_data.segments, test_data.version,
         )
-        report[Key.transactions] = transactions
-        return report
+        await redis.invalidate_user(username)
+        version = await redis.get_user_version(username)
 
+        await redis.create_segments(username, test_data.segments, version)
+
+        assert await redis.get_segments(test_data.report_request, version)
 
-class TestWithNotEmptyCache:
-    """Тестирует redis с загруженным отчетом."""
+
+class TestAppendTransaction:
+    """Тестирует дописывание транзакций в сегменты."""
+
+    open_request = TransactionReportRequest(
+        username=test_data.report.username,
+        start_date=datetime.now() - timedelta(days=1),
+        end_date=datetime.now() + timedelta(days=1),
+    )
 
     @pytest.mark.asyncio
-    async def test_get_cache(self, redis_with_report: TransactionReportCache):
-        """Тестирует метод create_cache."""
-        stored_report = await redis_with_report.get_cache(
-            test_data.report_request,
+    async def test_append_to_cached_segment(
+        self, redis: TransactionReportCache,
+    ):
+        """Транзакция дописывается только в сегмент своего дня."""
+        await redis.create_segments(
+            self.open_request.username,
+            split_by_day([self.open_request], []),
+            test_data.version,
         )
+        transaction = self._get_new_transaction()
+
+        await redis.append_transaction(transaction)
+        await redis.append_transaction(transaction)
 
-        assert (
-            stored_report.username ==
-            test_data.report.username
+        segments = await redis.get_segments(
+            self.open_request, test_data.version,
         )
-        assert (
-            len(stored_report.transactions) ==
-            len(test_data.report.transactions)
+        assert segments[transaction.timestamp.date()] == [transaction]
+        assert sum(map(len, segments.values())) == 1
+
+    @pytest.mark.asyncio
+    async def test_append_skips_missing_segment(
+        self, redis: TransactionReportCache,
+    ):
+        """Сегмент, которого нет в кэше, не создается дописыванием."""
+        await redis.append_transaction(self._get_new_transaction())
+
+        assert not await redis.get_segments(
+            self.open_request, test_data.version,
         )
 
-    def _get_stored_data(
-        self, external_data: TransactionReport,
-    ) -> dict[str, Any]:
-        report_storage = ReportCacheMixin()
-        transaction_list_storage = TransactionsListCacheMixin()
-        key = report_storage._get_key(external_data)
-        report: dict = report_storage.storage.hgetall(key)
-        transactions = transaction_list_storage._get_transactions_list_cache(
-            transaction_list_storage._get_transactions_key(external_data),
+    @pytest.mark.asyncio
+    async def test_append_drops_open_body(self, redis: TransactionReportCache):
+        """Готовое тело открытого отчета удаляется новой транзакцией."""
+        payload = test_data.report.model_dump_json().encode()
+        await redis.create_report_body(
+            self.open_request, payload, test_data.version,
         )
-        report[Key.transactions] = transactions
-        return report
+
+        await redis.append_transaction(self._get_new_transaction())
+
+        with pytest.raises(KeyError):
+            await redis.get_report_body(self.open_request, test_data.version)
+
+    @pytest.mark.asyncio
+    async def test_append_keeps_foreign_body(
+        self, redis: TransactionReportCache,
+    ):
+        """Тело без хэш-тега пользователя снимается с учета, но не удаляется."""
+        registry = redis._get_registry_key(self.open_request.username)
+        foreign_key = 'report-body:foreign'
+        await redis.storage.set(foreign_key, b'{}')
+        await redis.storage.hset(registry, foreign_key, '|'.join((
+            self.open_request.start_date.isoformat(),
+            self.open_request.end_date.isoformat(),
+        )))
+
+        await redis.append_transaction(self._get_new_transaction())
+
+        assert await redis.storage.exists(foreign_key)
+        assert not await redis.storage.hexists(registry, foreign_key)
+
+    @pytest.mark.asyncio
+    async def test_stale_segments_are_not_cached(
+        self, redis: TransactionReportCache,
+    ):
+        """Сегменты, прочитанные до дописанной транзакции, не сохраняются."""
+        username = self.open_request.username
+        version = await redis.get_user_version(username)
+
+        await redis.append_transaction(self._get_new_transaction())
+        assert not await redis.create_segments(
+            username, split_by_day([self.open_request], []), version,
+        )
+
+        assert (await redis.get_user_version(username)).writes == 1
+        assert not await redis.get_segments(self.open_request, version)
+
+    def test_user_keys_share_slot(self, redis: TransactionReportCache):
+        """Ключи скриптов пользователя лежат в одном слоте redis cluster."""
+        username = self.open_request.username
+        transaction = self._get_new_transaction()
+        keys = (
+            redis._get_version_key(username),
+            redis._get_bytes_key(username, test_data.version),
+            redis._get_registry_key(username),
+            redis._get_user_key(username),
+            redis._get_transaction_key(transaction),
+            redis._get_segment_key(
+                username, transaction.timestamp.date(), test_data.version,
+            ),
+            redis._get_body_key(self.open_request, test_data.version),
+            redis._get_lease_key(self.open_request, test_data.version),
+            redis._get_lease_token_key(username),
+        )
+
+        assert len({key_slot(key.encode()) for key in keys}) == 1
+
+    def _get_new_transaction(self):
+        return test_data.transaction_one.model_copy(
+            update={'timestamp': datetime.now(), 'transaction_id': 3},
+        )
+
+
+class TestUserCache:
+    """Тестирует кэш пользователей."""
+
+    user = User(
+        username=test_data.report.username,
+        balance=test_data.TestValues.amount.value,
+        is_verified=True,
+        user_id=1,
+    )
+
+    @pytest.mark.asyncio
+    async def test_user_round_trip(self, redis: TransactionReportCache):
+        """Пользователь читается из кэша в том виде, в котором записан."""
+        with pytest.raises(KeyError):
+            await redis.get_user_cache(self.user.username)
+
+        await redis.create_user_cache(self.user, test_data.version)
+
+        assert await redis.get_user_cache(self.user.username) == self.user
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        'method, argument', (
+            pytest.param(
+                'append_transaction', test_data.transaction_one, id='append',
+            ),
+            pytest.param(
+                'invalidate_user', test_data.report.username, id='invalidate',
+            ),
+        ),
+    )
+    async def test_balance_change_drops_user(
+        self, method, argument, redis: TransactionReportCache,
+    ):
+        """Транзакция и инвалидация удаляют запись пользователя."""
+        await redis.create_user_cache(self.user, test_data.version)
+
+        await getattr(redis, method)(argument)
+
+        with pytest.raises(KeyError):
+            await redis.get_user_cache(self.user.username)
+
+    @pytest.mark.asyncio
+    async def test_stale_user_is_not_cached(
+        self, redis: TransactionReportCache,
+    ):
+        """Пользователь, прочитанный до транзакции, не сохраняется."""
+        version = await redis.get_user_version(self.user.username)
+
+        await redis.append_transaction(test_data.transaction_one)
+        await redis.create_user_cache(self.user, version)
+
+        with pytest.raises(KeyError):
+            await redis.get_user_cache(self.user.username)
+
+
+class TestReportLease:
+    """Тестирует аренды чтения дней отчетов."""
+
+    @pytest.mark.asyncio
+    async def test_lease_is_exclusive(self, redis: TransactionReportCache):
+        """Аренду держит один процесс, следующая получает больший токен."""
+        token = await acquire(redis)
+
+        assert token
+        assert await acquire(redis) is None
+        await release(redis, token)
+        assert await acquire(redis) > token
+
+    @pytest.mark.asyncio
+    async def test_expired_lease_is_kept_by_new_holder(
+        self, redis: TransactionReportCache, monkeypatch,
+    ):
+        """Владелец истекшей аренды не возвращает аренду нового владельца."""
+        monkeypatch.setattr(
+            get_settings().report_lease, 'ttl', lease_poll_interval,
+        )
+        stale = await acquire(redis)
+        await asyncio.sleep(lease_poll_interval * 5)
+        fresh = await acquire(redis)
+
+        await release(redis, stale)
+
+        assert fresh > stale
+        assert await acquire(redis) is None
+
+    @pytest.mark.asyncio
+    async def test_wait_lease(self, redis: TransactionReportCache, monkeypatch):
+        """Ожидание завершается, когда владелец возвращает аренду."""
+        monkeypatch.setattr(
+            get_settings().report_lease, 'poll_interval', lease_poll_interval,
+        )
+        token = await acquire(redis)
+
+        released, _ = await asyncio.gather(
+            redis.wait_lease(test_data.report_request, test_data.version),
+            release_later(redis, token),
+        )
+
+        assert released
+
+    @pytest.mark.asyncio
+    async def test_wait_lease_timeout(
+        self, redis: TransactionReportCache, monkeypatch,
+    ):
+        """Ожидание невозвращенной аренды ограничено таймаутом."""
+        settings = get_settings().report_lease
+        monkeypatch.setattr(settings, 'poll_interval', lease_poll_interval)
+        monkeypatch.setattr(settings, 'timeout', lease_poll_interval * 5)
+        await acquire(redis)
+
+        assert not await redis.wait_lease(
+            test_data.report_request, test_data.version,
+        )
+
+    @pytest.mark.asyncio
+    async def test_stale_holder_does_not_overwrite(
+        self, redis: TransactionReportCache,
+    ):
+        """Сегменты с меньшим токеном не перезаписывают сегменты с большим."""
+        stale, fresh = await get_tokens(redis)
+        username = test_data.report.username
+
+        assert await redis.create_segments(
+            username, test_data.segments, test_data.version, fresh,
+        )
+        assert not await redis.create_segments(
+            username,
+            split_by_day([test_data.report_request], []),
+            test_data.version,
+            stale,
+        )
+
+        segments = await redis.get_segments(
+            test_data.report_request, test_data.version,
+        )
+        assert segments == test_data.segments
+
+    @pytest.mark.asyncio
+    async def test_disabled_leases(
+        self, redis: TransactionReportCache, monkeypatch,
+    ):
+        """Без аренд каждый процесс читает дни сам."""
+        monkeypatch.setattr(get_settings().report_lease, 'enabled', value=False)
+
+        assert await acquire(redis) == 0
+        assert await acquire(redis) == 0
+
+
+@pytest.mark.slow
+class TestReportCacheRoundTrips:
+    """
+    Бенчмарк кэша отчетов.
+
+    Сегменты отчета записываются одним запросом к redis и читаются
+    двумя, поэтому время чтения из кэша растет только с объемом данных.
+    """
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize('size', (1, 100, 5000))  # noqa: WPS432
+    async def test_round_trips_independent_of_size(
+        self, size, redis, monkeypatch,
+    ):
+        """Число запросов к redis не зависит от числа транзакций."""
+        report = get_report(size)
+        round_trips = count_round_trips(monkeypatch)
+
+        await redis.create_segments(
+            report.username,
+            split_by_day([test_data.report_request], report.transactions),
+            test_data.version,
+        )
+        assert len(round_trips) == 1
+        round_trips.clear()
+        started = time.perf_counter()
+        segments = await redis.get_segments(
+            test_data.report_request, test_data.version,
+        )
+        elapsed = (time.perf_counter() - started) * 1000
+
+        logger.info(f'{size} transactions cache hit: {elapsed:.2f} ms')
+        assert len(round_trips) == 2
+        assert sum(map(len, segments.values())) == size
+
+
+@pytest.mark.slow
+class TestTransactionFootprint:
+    """
+    Бенчмарк объема кэша при пересекающихся периодах отчетов.
+
+    Отчеты за 30 дней со сдвигом на день кэшируются дважды, до и после
+    инвалидации, так же, как в сервисе: из хранилища читаются только
+    отсутствующие дни. Транзакция хранится один раз, сколько бы
+    отчетов и поколений ее ни содержали.
+    """
+
+    generations = 2
+    requests = [
+        test_data.report_request.model_copy(update={
+            'start_date': footprint_start + timedelta(days=shift),
+            'end_date': footprint_start + timedelta(
+                days=shift + footprint_window, microseconds=-1,
+            ),
+        })
+        for shift in range(footprint_days - footprint_window + 1)
+    ]
+
+    @pytest.mark.asyncio
+    async def test_overlapping_reports_share_transactions(
+        self, redis: TransactionReportCache,
+    ):
+        """Объем кэша растет с числом транзакций, а не отчетов."""
+        await self._cache_reports(redis)
+
+        transactions_keys = await self._get_keys(redis, 'transaction:*')
+        footprint = await self._get_footprint(redis, transactions_keys)
+        segments = await self._get_footprint(redis, 'segment:*')
+        copies = len(self.requests) * footprint_window * per_day * (
+            self.generations
+        )
+        per_report = footprint * copies // len(transactions_keys)
+        logger.info(f'transactions: {footprint} bytes')
+        logger.info(f'segments: {segments} bytes')
+        logger.info(f'a copy of transactions per report: {per_report} bytes')
+        assert len(transactions_keys) == len(footprint_transactions)
+
+    async def _cache_reports(self, redis: TransactionReportCache) -> None:
+        for _ in range(self.generations):
+            await redis.invalidate_user(test_data.report.username)
+            for report_request in self.requests:
+                await self._cache_report(redis, report_request)
+
+    async def _cache_report(
+        self,
+        redis: TransactionReportCache,
+        request: TransactionReportRequest,
+    ) -> None:
+        version = await redis.get_user_version(request.username)
+        segments = await redis.get_segments(request, version)
+        periods = get_missing_periods(request, segments)
+        await redis.create_segments(
+            request.username,
+            split_by_day(periods, read_transactions(periods)),
+            version,
+        )
+
+    async def _get_keys(
+        self, redis: TransactionReportCache, pattern: str,
+    ) -> list[str]:
+        return [key async for key in redis.storage.scan_iter(pattern)]
+
+    async def _get_footprint(
+        self, redis: TransactionReportCache, keys: list[str] | str,
+    ) -> int:
+        if isinstance(keys, str):
+            keys = await self._get_keys(redis, keys)
+        return sum([await redis.storage.memory_usage(key) for key in keys])
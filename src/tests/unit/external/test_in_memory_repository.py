@@ -0,0 +1,200 @@
+import logging
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.models import (
+    Transaction,
+    TransactionAggregateRequest,
+    TransactionHistoryRequest,
+    TransactionReportRequest,
+    TransactionSummaryRequest,
+    TransactionType,
+    User,
+)
+from app.external.in_memory_repository import InMemoryRepository
+
+logger = logging.getLogger(__name__)
+
+username = 'george'
+other_username = 'anna'
+start = datetime(year=2024, month=1, day=1)  # noqa: WPS432
+days = 5
+per_day = 4
+hour = timedelta(hours=1)
+half_day = timedelta(days=0.5)
+
+
+def get_transactions(
+    size: int, step: timedelta, name: str = username,
+) -> list[Transaction]:
+    """Создает size транзакций с шагом step начиная со start."""
+    return [
+        Transaction.model_construct(
+            username=name,
+            amount=1,
+            transaction_type=TransactionType.deposit,
+            timestamp=start + step * position,
+            transaction_id=position,
+        )
+        for position in range(size)
+    ]
+
+
+def get_user(name: str = username, balance: int = 0) -> User:
+    """Создает подтвержденного пользователя."""
+    return User(username=name, balance=balance, is_verified=True)
+
+
+def get_report_request(
+    first_day: int, last_day: int,
+) -> TransactionReportRequest:
+    """Создает запрос отчета с first_day по last_day от start."""
+    return TransactionReportRequest(
+        username=username,
+        start_date=start + timedelta(days=first_day),
+        end_date=start + timedelta(days=last_day) + half_day,
+    )
+
+
+@pytest.fixture
+def repository() -> InMemoryRepository:
+    """Создает хранилище с транзакциями двух пользователей, по 4 в день."""
+    repository = InMemoryRepository()
+    repository.transactions = (
+        get_transactions(days * per_day, timedelta(hours=24 / per_day)) +
+        get_transactions(days, timedelta(days=1), other_username)
+    )
+    return repository
+
+
+class TestInMemoryRepository:
+    """Тестирует InMemoryRepository."""
+
+    @pytest.mark.asyncio
+    async def test_report_selects_whole_days(self, repository):
+        """Период отчета включает первый и последний день целиком."""
+        report = await repository.create_transaction_report(
+            get_report_request(1, 2),
+        )
+
+        assert len(report.transactions) == 2 * per_day
+        assert {
+            transaction.username for transaction in report.transactions
+        } == {username}
+
+    @pytest.mark.asyncio
+    async def test_created_transactions_are_ordered(self):
+        """Транзакции в прошлом попадают в отчет в порядке времени."""
+        repository = InMemoryRepository()
+        for transaction in reversed(get_transactions(days, hour)):
+            await repository.create_transaction(transaction)
+
+        report = await repository.create_transaction_report(
+            get_report_request(0, 0),
+        )
+
+        timestamps = [
+            in_transaction.timestamp for in_transaction in report.transactions
+        ]
+        assert timestamps == sorted(timestamps)
+        assert len(repository.transactions) == days
+
+    @pytest.mark.asyncio
+    async def test_history_pages_cover_all_transactions(self, repository):
+        """Страницы истории идут от новых к старым без пропусков."""
+        request = TransactionHistoryRequest(username=username, page_size=3)
+        history = []
+        while True:
+            page = await repository.get_transaction_history(request)
+            history.extend(page.transactions)
+            if page.next_cursor is None:
+                break
+            request.cursor = page.next_cursor
+
+        assert list(reversed(range(days * per_day))) == [
+            transaction.transaction_id for transaction in history
+        ]
+
+    @pytest.mark.asyncio
+    async def test_summary_counts_period(self, repository):
+        """Сводка считает транзакции только за дни периода."""
+        summary = await repository.get_transaction_summary(
+            TransactionSummaryRequest(
+                username=username,
+                start_date=start.date(),
+                end_date=(start + timedelta(days=1)).date(),
+            ),
+        )
+
+        assert summary.deposit.count == 2 * per_day
+
+    @pytest.mark.asyncio
+    async def test_aggregates_use_exact_bounds(self, repository):
+        """Агрегаты считают транзакции внутри часов периода, а не дней."""
+        report = await repository.create_aggregate_report(
+            TransactionAggregateRequest(
+                username=username,
+                start_date=start + hour * 8,
+                end_date=start + half_day + hour * 6,
+            ),
+        )
+
+        assert report.deposit.count == 2
+
+    @pytest.mark.asyncio
+    async def test_update_user_replaces_user(self):
+        """Обновленный пользователь сохраняет ID и читается по имени."""
+        repository = InMemoryRepository()
+        created = await repository.create_user(get_user())
+
+        await repository.update_user(get_user(balance=10))
+
+        user = await repository.get_user(username)
+        assert user.user_id == created.user_id
+        assert user.balance == 10
+        assert repository.users == [user]
+
+
+@pytest.mark.slow
+class TestInMemoryRepositoryBenchmark:
+    """
+    Бенчмарк поиска в InMemoryRepository.
+
+    Время поиска пользователя и отчета за день почти не зависит
+    от числа транзакций: в лог пишется среднее время запроса
+    для хранилищ разного размера.
+    """
+
+    small = 10000
+    large = 1000000
+    queries = 100
+
+    @pytest.mark.asyncio
+    async def test_lookup_independent_of_size(self):
+        """Запрос к большому хранилищу не медленнее в десятки раз."""
+        timings = {}
+        for size in (self.small, self.large):
+            repository = InMemoryRepository()
+            repository.transactions = get_transactions(
+                size, timedelta(minutes=1),
+            )
+            repository.users = [
+                get_user(f'{username}{position}')
+                for position in range(size // 100)
+            ] + [get_user()]
+            elapsed = await self._get_query_time(repository)
+            logger.info(f'{size} transactions query: {elapsed:.3f} ms')
+            timings[size] = elapsed
+
+        assert timings[self.large] < timings[self.small] * 10
+
+    async def _get_query_time(self, repository: InMemoryRepository) -> float:
+        request = get_report_request(1, 1)
+        started = time.perf_counter()
+        for _ in range(self.queries):
+            assert await repository.get_user(username) is not None
+            report = await repository.create_transaction_report(request)
+            assert len(report.transactions) == 24 * 60
+        return (time.perf_counter() - started) * 1000 / self.queries
@@ -0,0 +1,182 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from app.core.errors import ConfigError
+from app.core.models import Transaction, TransactionType, User
+from app.external.ledger.log import get_segments
+from app.external.ledger.repository import LedgerRepository, snapshot_name
+
+logger = logging.getLogger(__name__)
+
+username = 'george'
+commit_window = 0.001
+snapshot_interval = 1000
+postings = 50
+start = datetime(year=2024, month=1, day=1)  # noqa: WPS432
+
+
+def get_transaction(position: int) -> Transaction:
+    """Создает пополнение на 1 через position минут после start."""
+    return Transaction(
+        username=username,
+        amount=1,
+        transaction_type=TransactionType.deposit,
+        timestamp=start + timedelta(minutes=position),
+    )
+
+
+def open_ledger(
+    directory: Path, interval: int = snapshot_interval,
+) -> LedgerRepository:
+    """Открывает хранилище с журналом в каталоге."""
+    return LedgerRepository(
+        directory, commit_window=commit_window, snapshot_interval=interval,
+    )
+
+
+async def post_concurrently(
+    repository: LedgerRepository, first: int, count: int,
+) -> None:
+    """Одновременно проводит count пополнений начиная с first."""
+    await asyncio.gather(*(
+        repository.post_transaction(get_transaction(position))
+        for position in range(first, first + count)
+    ))
+
+
+async def create_ledger(directory: Path, interval: int = snapshot_interval):
+    """Открывает хранилище и создает в нем пользователя."""
+    repository = open_ledger(directory, interval)
+    await repository.create_user(
+        User(username=username, balance=0, is_verified=True),
+    )
+    return repository
+
+
+class TestLedgerRepository:
+    """Тестирует LedgerRepository."""
+
+    @pytest.mark.asyncio
+    async def test_restart_recovers_state(self, tmp_path):
+        """После перезапуска читаются пользователи и транзакции."""
+        repository = await create_ledger(tmp_path)
+        await post_concurrently(repository, 0, postings)
+        await repository.close()
+
+        recovered = open_ledger(tmp_path)
+        posted = await recovered.post_transaction(get_transaction(postings))
+        await recovered.close()
+
+        assert recovered.users == [
+            User(user_id=0, username=username, balance=postings + 1, is_verified=True),  # noqa: E501
+        ]
+        assert recovered.transactions[:postings] == repository.transactions
+        assert posted.transaction_id == postings
+
+    @pytest.mark.asyncio
+    async def test_concurrent_postings_share_fsync(
+        self, tmp_path, monkeypatch,
+    ):
+        """Одновременные транзакции сохраняются на диск одним fsync."""
+        repository = await create_ledger(tmp_path)
+        fsyncs = []
+        fsync = os.fsync
+
+        def count_fsync(descriptor: int) -> None:  # noqa: WPS430 spy
+            fsyncs.append(descriptor)
+            fsync(descriptor)
+
+        monkeypatch.setattr(os, 'fsync', count_fsync)
+        await post_concurrently(repository, 0, postings)
+        group_fsyncs = len(fsyncs)
+        await repository.close()
+
+        assert group_fsyncs == 1
+
+    @pytest.mark.asyncio
+    async def test_snapshot_replaces_log(self, tmp_path):
+        """Снимок заменяет сегменты журнала, вошедшие в него."""
+        repository = await create_ledger(tmp_path, interval=postings // 5)
+        for position in range(postings):
+            await repository.post_transaction(get_transaction(position))
+        await repository.snapshot()
+        await repository.close()
+
+        recovered = open_ledger(tmp_path)
+        await recovered.close()
+
+        assert (tmp_path / snapshot_name).exists()
+        assert len(get_segments(tmp_path)) == 1
+        assert recovered.transactions == repository.transactions
+        assert recovered.users == repository.users
+
+    @pytest.mark.asyncio
+    async def test_damaged_tail_is_discarded(self, tmp_path):
+        """Запись, прерванная при сбое, отбрасывается при запуске."""
+        repository = await create_ledger(tmp_path)
+        await post_concurrently(repository, 0, postings)
+        await repository.close()
+        segment = get_segments(tmp_path)[-1]
+        size = segment.stat().st_size
+        with segment.open('ab') as segment_file:
+            segment_file.write(b'\x10\x00\x00')
+
+        recovered = open_ledger(tmp_path)
+        await recovered.post_transaction(get_transaction(postings))
+        await recovered.close()
+
+        assert segment.stat().st_size == size
+        assert len(open_ledger(tmp_path).transactions) == postings + 1
+
+    @pytest.mark.asyncio
+    async def test_directory_is_locked(self, tmp_path):
+        """Каталог открытого журнала не открывается второй раз до закрытия."""
+        repository = open_ledger(tmp_path)
+
+        with pytest.raises(ConfigError):
+            open_ledger(tmp_path)
+        await repository.close()
+
+        await open_ledger(tmp_path).close()
+
+
+@pytest.mark.slow
+class TestLedgerBenchmark:
+    """
+    Бенчмарк проведения транзакций с сохранением в журнал.
+
+    Транзакции проводятся группами по concurrency одновременных
+    вызовов, в середине проведения создается снимок. В лог пишется
+    число проведенных транзакций в секунду.
+    """
+
+    size = 20000
+    concurrency = 100
+
+    @pytest.mark.asyncio
+    async def test_postings_per_second(self, tmp_path):
+        """Транзакции проводятся с сохранением и читаются после запуска."""
+        repository = await create_ledger(tmp_path, interval=self.size)
+        rate = await self._post_all(repository)
+        await repository.close()
+        logger.info(f'{rate:.0f} postings per second')
+
+        started = time.perf_counter()
+        recovered = open_ledger(tmp_path)
+        elapsed = time.perf_counter() - started
+        await recovered.close()
+        logger.info(f'{self.size} postings recovered in {elapsed:.2f} s')
+
+        assert len(recovered.transactions) == self.size
+
+    async def _post_all(self, repository: LedgerRepository) -> float:
+        started = time.perf_counter()
+        for first in range(0, self.size, self.concurrency):
+            await post_concurrently(repository, first, self.concurrency)
+        return self.size / (time.perf_counter() - started)